@@ -21,6 +21,7 @@ datastore.
 """
 
 import base64
+import collections
 import time
 
 from oslo_config import cfg
@@ -948,18 +949,32 @@ class CloudController(object):
                 'status': ec2_attach_status,
                 'volumeId': ec2utils.id_to_ec2_vol_id(volume_id)}
 
-    def _format_kernel_id(self, context, instance_ref, result, key):
+    @staticmethod
+    def _glance_id_to_ec2_id(context, glance_id, image_type='ami',
+                             image_ids=None):
+        if image_ids is None:
+            return ec2utils.glance_id_to_ec2_id(context, glance_id,
+                                                image_type)
+        image_id = image_ids.get(glance_id)
+        if image_id is None:
+            return
+        return ec2utils.image_ec2_id(image_id, image_type=image_type)
+
+    def _format_kernel_id(self, context, instance_ref, result, key,
+                          image_ids=None):
         kernel_uuid = instance_ref['kernel_id']
         if kernel_uuid is None or kernel_uuid == '':
             return
-        result[key] = ec2utils.glance_id_to_ec2_id(context, kernel_uuid, 'aki')
+        result[key] = self._glance_id_to_ec2_id(context, kernel_uuid, 'aki',
+                                                image_ids)
 
-    def _format_ramdisk_id(self, context, instance_ref, result, key):
+    def _format_ramdisk_id(self, context, instance_ref, result, key,
+                           image_ids=None):
         ramdisk_uuid = instance_ref['ramdisk_id']
         if ramdisk_uuid is None or ramdisk_uuid == '':
             return
-        result[key] = ec2utils.glance_id_to_ec2_id(context, ramdisk_uuid,
-                                                   'ari')
+        result[key] = self._glance_id_to_ec2_id(context, ramdisk_uuid, 'ari',
+                                                image_ids)
 
     def describe_instance_attribute(self, context, instance_id, attribute,
                                     **kwargs):
@@ -1101,15 +1116,16 @@ class CloudController(object):
         return {'instancesSet': instances_set}
 
     def _format_instance_bdm(self, context, instance_uuid, root_device_name,
-                             result):
+                             result, bdms=None):
         """Format InstanceBlockDeviceMappingResponseItemType."""
         root_device_type = 'instance-store'
         root_device_short_name = block_device.strip_dev(root_device_name)
         if root_device_name == root_device_short_name:
             root_device_name = block_device.prepend_dev(root_device_name)
         mapping = []
-        bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
-                context, instance_uuid)
+        if bdms is None:
+            bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
+                    context, instance_uuid)
         for bdm in bdms:
             volume_id = bdm.volume_id
             if volume_id is None or bdm.no_device:
@@ -1160,6 +1176,32 @@ class CloudController(object):
         result['groupSet'] = utils.convert_to_list_dict(
             security_group_names, 'groupId')
 
+    @staticmethod
+    def _prefetch_instances_info(context, instances):
+        """Look up what formatting needs for a set of instances in bulk.
+
+        Returns the EC2 integer ids of the instances, the internal ids of
+        their images, kernels and ramdisks, and their block device
+        mappings, with a few queries in total rather than several per
+        instance.
+        """
+        instance_uuids = [instance.uuid for instance in instances]
+        image_uuids = set()
+        for instance in instances:
+            image_uuids.update([instance.image_ref, instance.kernel_id,
+                                instance.ramdisk_id])
+
+        instance_ids = ec2utils.get_int_ids_from_instance_uuids(
+            context, instance_uuids)
+        image_ids = ec2utils.glance_ids_to_ids(context, image_uuids)
+        instance_bdms = collections.defaultdict(list)
+        if instance_uuids:
+            bdms = objects.BlockDeviceMappingList.get_by_instance_uuids(
+                context, instance_uuids)
+            for bdm in bdms:
+                instance_bdms[bdm.instance_uuid].append(bdm)
+        return instance_ids, image_ids, instance_bdms
+
     def _format_instances(self, context, instance_id=None, use_v6=False,
             instances_cache=None, **search_opts):
         # TODO(termie): this method is poorly named as its name does not imply
@@ -1198,18 +1240,24 @@ class CloudController(object):
             except exception.NotFound:
                 instances = []
 
+        if not context.is_admin:
+            instances = [inst for inst in instances
+                         if not pipelib.is_vpn_image(inst.image_ref)]
+        instance_ids, image_ids, instance_bdms = (
+            self._prefetch_instances_info(context, instances))
+
         for instance in instances:
-            if not context.is_admin:
-                if pipelib.is_vpn_image(instance.image_ref):
-                    continue
             i = {}
             instance_uuid = instance.uuid
-            ec2_id = ec2utils.id_to_ec2_inst_id(instance_uuid)
+            ec2_id = ec2utils.id_to_ec2_id(instance_ids[instance_uuid])
             i['instanceId'] = ec2_id
             image_uuid = instance.image_ref
-            i['imageId'] = ec2utils.glance_id_to_ec2_id(context, image_uuid)
-            self._format_kernel_id(context, instance, i, 'kernelId')
-            self._format_ramdisk_id(context, instance, i, 'ramdiskId')
+            i['imageId'] = self._glance_id_to_ec2_id(context, image_uuid,
+                                                     image_ids=image_ids)
+            self._format_kernel_id(context, instance, i, 'kernelId',
+                                   image_ids)
+            self._format_ramdisk_id(context, instance, i, 'ramdiskId',
+                                    image_ids)
             i['instanceState'] = _state_description(
                 instance.vm_state, instance.shutdown_terminate)
 
@@ -1236,7 +1284,11 @@ class CloudController(object):
             for k, v in six.iteritems(utils.instance_meta(instance)):
                 i['tagSet'].append({'key': k, 'value': v})
 
-            client_token = self._get_client_token(context, instance_uuid)
+            if instance.obj_attr_is_set('system_metadata'):
+                client_token = instance.system_metadata.get(
+                    'EC2_client_token')
+            else:
+                client_token = self._get_client_token(context, instance_uuid)
             if client_token:
                 i['clientToken'] = client_token
 
@@ -1251,7 +1303,8 @@ class CloudController(object):
             i['amiLaunchIndex'] = instance.launch_index
             self._format_instance_root_device_name(instance, i)
             self._format_instance_bdm(context, instance.uuid,
-                                      i['rootDeviceName'], i)
+                                      i['rootDeviceName'], i,
+                                      instance_bdms[instance_uuid])
             zone = availability_zones.get_instance_availability_zone(context,
                                                                      instance)
             i['placement'] = {'availabilityZone': zone}
@@ -119,6 +119,23 @@ def glance_id_to_id(context, glance_id):
         return s3imap.id
 
 
+def glance_ids_to_ids(context, glance_ids):
+    """Convert a set of glance ids to internal (db) ids.
+
+    Existing mappings are looked up in a single query rather than one per
+    image. Returns a dict of glance id to internal id.
+    """
+    glance_ids = set(glance_id for glance_id in glance_ids if glance_id)
+    if not glance_ids:
+        return {}
+    image_ids = {s3imap.uuid: s3imap.id for s3imap in
+                 objects.S3ImageMappingList.get_by_uuids(context,
+                                                         list(glance_ids))}
+    for glance_id in glance_ids - set(image_ids):
+        image_ids[glance_id] = glance_id_to_id(context, glance_id)
+    return image_ids
+
+
 def ec2_id_to_glance_id(context, ec2_id):
     image_id = ec2_id_to_id(ec2_id)
     return id_to_glance_id(context, image_id)
@@ -307,6 +324,24 @@ def get_int_id_from_instance_uuid(context, instance_uuid):
         return imap.id
 
 
+def get_int_ids_from_instance_uuids(context, instance_uuids):
+    """Get or create the ec2 integer ids of a set of instances.
+
+    Existing mappings are looked up in a single query rather than one per
+    instance. Returns a dict of instance uuid to integer id.
+    """
+    instance_uuids = set(uuid for uuid in instance_uuids if uuid)
+    if not instance_uuids:
+        return {}
+    int_ids = {imap.uuid: imap.id for imap in
+               objects.EC2InstanceMappingList.get_by_uuids(
+                   context, list(instance_uuids))}
+    for instance_uuid in instance_uuids - set(int_ids):
+        int_ids[instance_uuid] = get_int_id_from_instance_uuid(context,
+                                                               instance_uuid)
+    return int_ids
+
+
 @memoize
 def get_int_id_from_volume_uuid(context, volume_uuid):
     if volume_uuid is None:
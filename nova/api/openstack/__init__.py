@@ -18,8 +18,16 @@
 WSGI middleware for OpenStack API controllers.
 """
 
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
+import pkg_resources
 import routes
 import six
 import stevedore
@@ -37,6 +45,7 @@ from nova.i18n import _LW
 from nova.i18n import translate
 from nova import notifications
 from nova import utils
+from nova import version
 from nova import wsgi as base_wsgi
 
 
@@ -54,7 +63,19 @@ api_opts = [
                     default=[],
                     help='If the list is not empty then a v3 API extension '
                     'will only be loaded if it exists in this list. Specify '
-                    'the extension aliases here.')
+                    'the extension aliases here.'),
+        cfg.BoolOpt('lazy_load_extensions',
+                    default=False,
+                    help='If True, the v2.1 API maps its routes from the '
+                    'cache in route_cache_file and only imports an '
+                    'extension when the first request for one of its '
+                    'resources arrives. All extensions are loaded, and the '
+                    'cache rewritten, when the cache is missing or out of '
+                    'date.'),
+        cfg.StrOpt('route_cache_file',
+                   help='File caching the routes of the v2.1 API '
+                   'extensions, written every time all extensions are '
+                   'loaded. Required by lazy_load_extensions.'),
 ]
 api_opts_group = cfg.OptGroup(name='osapi_v3', title='API v3 Options')
 
@@ -293,6 +314,76 @@ class APIRouter(base_wsgi.Router):
         raise NotImplementedError()
 
 
+class _ExtensionLoadTimer(object):
+    """Measures how long each v2.1 API extension took to load.
+
+    stevedore imports and instantiates an entry point right before passing
+    it to the check function, so the time elapsed since the previous check
+    is the load time of the extension being checked.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self._mark = time.time()
+
+    def record(self, name):
+        self.times[name] = time.time() - self._mark
+
+    def restart(self):
+        self._mark = time.time()
+
+    def log(self):
+        if not self.times:
+            return
+        slowest = sorted(six.iteritems(self.times),
+                         key=lambda item: item[1], reverse=True)
+        LOG.info(_LI("Imported %(count)d API extensions in %(total).2fs, "
+                     "slowest: %(slowest)s"),
+                 {'count': len(self.times),
+                  'total': sum(self.times.values()),
+                  'slowest': ', '.join('%s (%.2fs)' % item
+                                       for item in slowest[:5])})
+        for name, seconds in slowest:
+            LOG.debug("API extension %(name)s loaded in %(seconds).3fs",
+                      {'name': name, 'seconds': seconds})
+
+
+class _ExtensionStub(object):
+    """Stands in for an extension which has not been imported yet.
+
+    Carries what the extension info API reports about an extension, as
+    recorded in the route cache.
+    """
+
+    def __init__(self, info):
+        self.name = info['ext_name']
+        self.alias = info['alias']
+        self.version = info['version']
+        self.__doc__ = info['description']
+
+    def __repr__(self):
+        return "<ExtensionStub: name=%s, alias=%s, version=%s>" % (
+            self.name, self.alias, self.version)
+
+    def is_valid(self):
+        return True
+
+
+class _LazyResource(object):
+    """WSGI application routed to in place of a resource not loaded yet."""
+
+    def __init__(self, router, collection):
+        self._router = router
+        self._collection = collection
+        self._resource = None
+
+    def __call__(self, environ, start_response):
+        if self._resource is None:
+            self._resource = self._router._get_lazy_resource(
+                self._collection)
+        return self._resource(environ, start_response)
+
+
 class APIRouterV21(base_wsgi.Router):
     """Routes requests on the OpenStack v2.1 API to the appropriate controller
     and method.
@@ -330,6 +421,13 @@ class APIRouterV21(base_wsgi.Router):
                         return self._register_extension(ext)
             return False
 
+        def _timed_check_load_extension(ext):
+            load_timer.record(ext.name)
+            try:
+                return _check_load_extension(ext)
+            finally:
+                load_timer.restart()
+
         if not CONF.osapi_v3.enabled:
             LOG.info(_LI("V3 API has been disabled by configuration"))
             return
@@ -347,26 +445,42 @@ class APIRouterV21(base_wsgi.Router):
             LOG.warning(_LW("Extensions in both blacklist and whitelist: %s"),
                         list(in_blacklist_and_whitelist))
 
-        self.api_extension_manager = stevedore.enabled.EnabledExtensionManager(
-            namespace=self.api_extension_namespace(),
-            check_func=_check_load_extension,
-            invoke_on_load=True,
-            invoke_kwds={"extension_info": self.loaded_extension_info})
-
         if v3mode:
             mapper = PlainMapper()
         else:
             mapper = ProjectMapper()
 
         self.resources = {}
+        self._extension_routes = {}
+
+        route_cache = None
+        if CONF.osapi_v3.lazy_load_extensions and self.init_only is None:
+            route_cache = self._read_route_cache(v3mode)
 
-        # NOTE(cyeoh) Core API support is rewritten as extensions
-        # but conceptually still have core
-        if list(self.api_extension_manager):
-            # NOTE(cyeoh): Stevedore raises an exception if there are
-            # no plugins detected. I wonder if this is a bug.
-            self._register_resources_check_inherits(mapper)
-            self.api_extension_manager.map(self._register_controllers)
+        if route_cache is not None:
+            self._setup_lazy_routes(mapper, route_cache)
+        else:
+            load_timer = _ExtensionLoadTimer()
+            self.api_extension_manager = (
+                stevedore.enabled.EnabledExtensionManager(
+                    namespace=self.api_extension_namespace(),
+                    check_func=_timed_check_load_extension,
+                    invoke_on_load=True,
+                    invoke_kwds={"extension_info":
+                                 self.loaded_extension_info}))
+            load_timer.log()
+
+            # NOTE(cyeoh) Core API support is rewritten as extensions
+            # but conceptually still have core
+            if list(self.api_extension_manager):
+                # NOTE(cyeoh): Stevedore raises an exception if there are
+                # no plugins detected. I wonder if this is a bug.
+                self._register_resources_check_inherits(mapper)
+                self.api_extension_manager.map(self._register_controllers)
+
+                if (CONF.osapi_v3.route_cache_file and
+                        self.init_only is None):
+                    self._write_route_cache(v3mode)
 
         missing_core_extensions = self.get_missing_core_extensions(
             self.loaded_extension_info.get_extensions().keys())
@@ -412,6 +526,40 @@ class APIRouterV21(base_wsgi.Router):
     def _register_extension(self, ext):
         raise NotImplementedError()
 
+    def _extension_routes_entry(self, ext):
+        return self._extension_routes.setdefault(
+            ext.name, {'resources': [], 'extends': [], 'eager': False})
+
+    def _create_resource(self, resource):
+        inherits = None
+        if resource.inherits:
+            inherits = self.resources.get(resource.inherits)
+            if not resource.controller:
+                resource.controller = inherits.controller
+        wsgi_resource = wsgi.ResourceV21(resource.controller,
+                                         inherits=inherits)
+        self.resources[resource.collection] = wsgi_resource
+        return wsgi_resource
+
+    def _map_resource(self, mapper, resource, wsgi_resource):
+        kargs = dict(
+            controller=wsgi_resource,
+            collection=resource.collection_actions,
+            member=resource.member_actions)
+
+        if resource.parent:
+            kargs['parent_resource'] = resource.parent
+
+        # non core-API plugins use the collection name as the
+        # member name, but the core-API plugins use the
+        # singular/plural convention for member/collection names
+        if resource.member_name:
+            member_name = resource.member_name
+        else:
+            member_name = resource.collection
+        mapper.resource(member_name, resource.collection,
+                        **kargs)
+
     def _register_resources(self, ext, mapper):
         """Register resources defined by the extensions
 
@@ -421,38 +569,26 @@ class APIRouterV21(base_wsgi.Router):
 
         handler = ext.obj
         LOG.debug("Running _register_resources on %s", ext.obj)
+        routes_entry = self._extension_routes_entry(ext)
 
         for resource in handler.get_resources():
             LOG.debug('Extended resource: %s', resource.collection)
 
-            inherits = None
-            if resource.inherits:
-                inherits = self.resources.get(resource.inherits)
-                if not resource.controller:
-                    resource.controller = inherits.controller
-            wsgi_resource = wsgi.ResourceV21(resource.controller,
-                                             inherits=inherits)
-            self.resources[resource.collection] = wsgi_resource
-            kargs = dict(
-                controller=wsgi_resource,
-                collection=resource.collection_actions,
-                member=resource.member_actions)
-
-            if resource.parent:
-                kargs['parent_resource'] = resource.parent
-
-            # non core-API plugins use the collection name as the
-            # member name, but the core-API plugins use the
-            # singular/plural convention for member/collection names
-            if resource.member_name:
-                member_name = resource.member_name
-            else:
-                member_name = resource.collection
-            mapper.resource(member_name, resource.collection,
-                            **kargs)
+            wsgi_resource = self._create_resource(resource)
+            self._map_resource(mapper, resource, wsgi_resource)
+            routes_entry['resources'].append({
+                'collection': resource.collection,
+                'member_name': resource.member_name,
+                'parent': resource.parent,
+                'collection_actions': resource.collection_actions,
+                'member_actions': resource.member_actions,
+                'inherits': resource.inherits})
 
             if resource.custom_routes_fn:
                     resource.custom_routes_fn(mapper, wsgi_resource)
+                    # NOTE: custom routes can't be described in the route
+                    # cache, so the extension has to be loaded up front.
+                    routes_entry['eager'] = True
 
     def _register_controllers(self, ext):
         """Register controllers defined by the extensions
@@ -463,11 +599,11 @@ class APIRouterV21(base_wsgi.Router):
 
         handler = ext.obj
         LOG.debug("Running _register_controllers on %s", ext.obj)
+        routes_entry = self._extension_routes_entry(ext)
 
         for extension in handler.get_controller_extensions():
             ext_name = extension.extension.name
             collection = extension.collection
-            controller = extension.controller
 
             if collection not in self.resources:
                 LOG.warning(_LW('Extension %(ext_name)s: Cannot extend '
@@ -475,10 +611,179 @@ class APIRouterV21(base_wsgi.Router):
                             {'ext_name': ext_name, 'collection': collection})
                 continue
 
-            LOG.debug('Extension %(ext_name)s extending resource: '
-                      '%(collection)s',
-                      {'ext_name': ext_name, 'collection': collection})
+            routes_entry['extends'].append(collection)
+            self._extend_resource(extension)
+
+    def _extend_resource(self, extension):
+        LOG.debug('Extension %(ext_name)s extending resource: '
+                  '%(collection)s',
+                  {'ext_name': extension.extension.name,
+                   'collection': extension.collection})
+
+        resource = self.resources[extension.collection]
+        resource.register_actions(extension.controller)
+        resource.register_extensions(extension.controller)
+
+    def _route_cache_fingerprint(self, v3mode):
+        """Identify the set of extensions a route cache was written for."""
+        entry_points = sorted(
+            str(ep) for ep in
+            pkg_resources.iter_entry_points(self.api_extension_namespace()))
+        data = jsonutils.dumps([entry_points,
+                                sorted(CONF.osapi_v3.extensions_whitelist),
+                                sorted(CONF.osapi_v3.extensions_blacklist),
+                                v3mode,
+                                version.version_string_with_package()])
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def _read_route_cache(self, v3mode):
+        path = CONF.osapi_v3.route_cache_file
+        if not path:
+            LOG.warning(_LW("lazy_load_extensions requires route_cache_file "
+                            "to be set, loading all API extensions"))
+            return None
 
-            resource = self.resources[collection]
-            resource.register_actions(controller)
-            resource.register_extensions(controller)
+        try:
+            with open(path) as f:
+                cache = jsonutils.load(f)
+        except (IOError, ValueError) as e:
+            LOG.info(_LI("API route cache %(path)s can not be used, loading "
+                         "all API extensions: %(error)s"),
+                     {'path': path, 'error': e})
+            return None
+
+        if cache.get('fingerprint') != self._route_cache_fingerprint(v3mode):
+            LOG.info(_LI("API route cache %s is out of date, loading all "
+                         "API extensions"), path)
+            return None
+        return cache['extensions']
+
+    def _write_route_cache(self, v3mode):
+        """Atomically save the routes of the loaded extensions."""
+        path = CONF.osapi_v3.route_cache_file
+        cached = []
+        for ext in self.api_extension_manager:
+            info = {'name': ext.name,
+                    'ext_name': ext.obj.name,
+                    'alias': ext.obj.alias,
+                    'version': ext.obj.version,
+                    'description': ext.obj.__doc__}
+            info.update(self._extension_routes_entry(ext))
+            cached.append(info)
+        data = jsonutils.dumps(
+            {'fingerprint': self._route_cache_fingerprint(v3mode),
+             'extensions': cached},
+            indent=1)
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.routes')
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            LOG.warning(_LW("Unable to write API route cache %(path)s: "
+                            "%(error)s"), {'path': path, 'error': e})
+
+    def _setup_lazy_routes(self, mapper, route_cache):
+        """Map the cached routes of all extensions without importing them.
+
+        An extension is imported when the first request for one of its
+        resources arrives, together with the extensions extending those
+        resources. Extensions with custom routes are loaded right away.
+        """
+        self._lazy_lock = threading.RLock()
+        self._lazy_info = {}
+        self._lazy_extensions = {}
+        self._lazy_controller_extensions = {}
+        self._resource_owners = {}
+        self._resource_extenders = {}
+
+        for info in route_cache:
+            self._register_extension(stevedore.extension.Extension(
+                info['name'], None, None, _ExtensionStub(info)))
+            self._lazy_info[info['name']] = info
+            for resource_info in info['resources']:
+                self._resource_owners[resource_info['collection']] = (
+                    info['name'])
+            for collection in info['extends']:
+                self._resource_extenders.setdefault(
+                    collection, []).append(info['name'])
+
+        # Same order as _register_resources_check_inherits: extensions
+        # inheriting resources are mapped after all others.
+        ordered = sorted(route_cache,
+                         key=lambda info: any(r['inherits']
+                                              for r in info['resources']))
+        eager = 0
+        for info in ordered:
+            if info['eager']:
+                self._load_lazy_resources(info['name'], mapper)
+                eager += 1
+                continue
+            for resource_info in info['resources']:
+                resource = extensions.ResourceExtension(**resource_info)
+                self._map_resource(mapper, resource,
+                                   _LazyResource(self, resource.collection))
+
+        LOG.info(_LI("Mapped routes of %(count)d API extensions from "
+                     "%(path)s, %(eager)d loaded on startup"),
+                 {'count': len(route_cache), 'eager': eager,
+                  'path': CONF.osapi_v3.route_cache_file})
+
+    def _get_lazy_resource(self, collection):
+        with self._lazy_lock:
+            if collection not in self.resources:
+                self._load_lazy_resources(self._resource_owners[collection])
+            return self.resources[collection]
+
+    def _load_lazy_extension(self, name):
+        ext = self._lazy_extensions.get(name)
+        if ext is not None:
+            return ext
+
+        start = time.time()
+        manager = stevedore.named.NamedExtensionManager(
+            namespace=self.api_extension_namespace(),
+            names=[name],
+            invoke_on_load=True,
+            invoke_kwds={"extension_info": self.loaded_extension_info})
+        if name not in manager.names():
+            raise exception.NovaException(
+                _("API extension %s could not be loaded") % name)
+        ext = manager[name]
+        self._lazy_extensions[name] = ext
+        LOG.info(_LI("Loaded API extension %(name)s on first use in "
+                     "%(seconds).2fs"),
+                 {'name': name, 'seconds': time.time() - start})
+        return ext
+
+    def _load_lazy_resources(self, name, mapper=None):
+        """Build the resources of an extension and apply their extensions.
+
+        If a mapper is given the resources are mapped as well, otherwise
+        their routes are expected to be in place already.
+        """
+        info = self._lazy_info[name]
+        for resource_info in info['resources']:
+            if resource_info['inherits']:
+                self._get_lazy_resource(resource_info['inherits'])
+
+        ext = self._load_lazy_extension(name)
+        if mapper is not None:
+            self._register_resources(ext, mapper)
+        else:
+            for resource in ext.obj.get_resources():
+                self._create_resource(resource)
+
+        for resource_info in info['resources']:
+            collection = resource_info['collection']
+            for extender in self._resource_extenders.get(collection, []):
+                if extender not in self._lazy_controller_extensions:
+                    handler = self._load_lazy_extension(extender).obj
+                    self._lazy_controller_extensions[extender] = (
+                        handler.get_controller_extensions())
+                for extension in self._lazy_controller_extensions[extender]:
+                    if extension.collection == collection:
+                        self._extend_resource(extension)
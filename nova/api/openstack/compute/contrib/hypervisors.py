@@ -15,6 +15,7 @@
 
 """The hypervisors admin extension."""
 
+from oslo_config import cfg
 import webob.exc
 
 from nova.api.openstack import extensions
@@ -25,6 +26,9 @@ from nova.i18n import _
 from nova import servicegroup
 
 
+CONF = cfg.CONF
+CONF.import_opt('compute_topic', 'nova.compute.rpcapi')
+
 authorize = extensions.extension_authorizer('compute', 'hypervisors')
 
 
@@ -38,7 +42,7 @@ class HypervisorsController(object):
         self.ext_mgr = ext_mgr
 
     def _view_hypervisor(self, hypervisor, service, detail, servers=None,
-                         **kwargs):
+                         alive=None, **kwargs):
         hyp_dict = {
             'id': hypervisor.id,
             'hypervisor_hostname': hypervisor.hypervisor_hostname,
@@ -46,7 +50,8 @@ class HypervisorsController(object):
 
         ext_status_loaded = self.ext_mgr.is_loaded('os-hypervisor-status')
         if ext_status_loaded:
-            alive = self.servicegroup_api.service_is_up(service)
+            if alive is None:
+                alive = self.servicegroup_api.service_is_up(service)
             hyp_dict['state'] = 'up' if alive else "down"
             hyp_dict['status'] = (
                 'disabled' if service.disabled else 'enabled')
@@ -81,6 +86,23 @@ class HypervisorsController(object):
 
         return hyp_dict
 
+    def _view_hypervisors(self, context, compute_nodes, detail):
+        services = [self.host_api.service_get_by_compute_host(context,
+                                                              hyp.host)
+                    for hyp in compute_nodes]
+        up_hosts = None
+        if self.ext_mgr.is_loaded('os-hypervisor-status'):
+            up_hosts = self.servicegroup_api.get_up_services(
+                CONF.compute_topic, services)
+        hypervisors = []
+        for hyp, service in zip(compute_nodes, services):
+            alive = None
+            if up_hosts is not None:
+                alive = service.host in up_hosts
+            hypervisors.append(self._view_hypervisor(hyp, service, detail,
+                                                     alive=alive))
+        return hypervisors
+
     def index(self, req):
         context = req.environ['nova.context']
         authorize(context)
@@ -93,12 +115,9 @@ class HypervisorsController(object):
 
         compute_nodes = self.host_api.compute_node_get_all(context)
         req.cache_db_compute_nodes(compute_nodes)
-        return dict(hypervisors=[self._view_hypervisor(
-                                 hyp,
-                                 self.host_api.service_get_by_compute_host(
-                                     context, hyp.host),
-                                 False)
-                                 for hyp in compute_nodes])
+        return dict(hypervisors=self._view_hypervisors(context,
+                                                       compute_nodes,
+                                                       False))
 
     def detail(self, req):
         context = req.environ['nova.context']
@@ -112,12 +131,9 @@ class HypervisorsController(object):
 
         compute_nodes = self.host_api.compute_node_get_all(context)
         req.cache_db_compute_nodes(compute_nodes)
-        return dict(hypervisors=[self._view_hypervisor(
-                                 hyp,
-                                 self.host_api.service_get_by_compute_host(
-                                     context, hyp.host),
-                                 True)
-                                 for hyp in compute_nodes])
+        return dict(hypervisors=self._view_hypervisors(context,
+                                                       compute_nodes,
+                                                       True))
 
     def show(self, req, id):
         context = req.environ['nova.context']
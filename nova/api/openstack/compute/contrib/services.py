@@ -57,8 +57,16 @@ class ServiceController(object):
 
         return services
 
-    def _get_service_detail(self, svc, detailed):
-        alive = self.servicegroup_api.service_is_up(svc)
+    def _get_up_hosts_by_topic(self, services):
+        """Return the hosts whose service is up, keyed by service topic."""
+        services_by_topic = {}
+        for svc in services:
+            services_by_topic.setdefault(svc['topic'], []).append(svc)
+        return {topic: self.servicegroup_api.get_up_services(topic, svcs)
+                for topic, svcs in services_by_topic.items()}
+
+    def _get_service_detail(self, svc, detailed, up_hosts_by_topic):
+        alive = svc['host'] in up_hosts_by_topic[svc['topic']]
         state = (alive and "up") or "down"
         active = 'enabled'
         if svc['disabled']:
@@ -76,9 +84,11 @@ class ServiceController(object):
 
     def _get_services_list(self, req, detailed):
         services = self._get_services(req)
+        up_hosts_by_topic = self._get_up_hosts_by_topic(services)
         svcs = []
         for svc in services:
-            svcs.append(self._get_service_detail(svc, detailed))
+            svcs.append(self._get_service_detail(svc, detailed,
+                                                 up_hosts_by_topic))
 
         return svcs
 
@@ -0,0 +1,119 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""The host drain admin extension."""
+
+from oslo_log import log as logging
+from oslo_utils import strutils
+import webob.exc
+
+from nova.api.openstack import common
+from nova.api.openstack.compute.schemas.v3 import host_drain
+from nova.api.openstack import extensions
+from nova.api.openstack import wsgi
+from nova.api import validation
+from nova import compute
+from nova import exception
+from nova.i18n import _LI
+
+LOG = logging.getLogger(__name__)
+ALIAS = 'os-host-drain'
+authorize = extensions.os_compute_authorizer(ALIAS)
+
+
+class HostDrainController(wsgi.Controller):
+    """Live-migrates all the instances off a host, a few at a time."""
+
+    def __init__(self):
+        self.api = compute.HostAPI()
+        super(HostDrainController, self).__init__()
+
+    @wsgi.Controller.api_version("2.11")
+    @wsgi.response(202)
+    @extensions.expected_errors((400, 404, 409, 501))
+    @validation.schema(host_drain.create)
+    def create(self, req, body):
+        """Starts draining a host of its instances.
+
+        The compute service of the host is disabled and its instances are
+        live-migrated by the conductor.  Returns the progress of the drain,
+        as show does.
+        """
+        context = req.environ['nova.context']
+        authorize(context)
+        drain = body['host_drain']
+        host_name = drain['host']
+        block_migration = strutils.bool_from_string(
+            drain.get('block_migration', False), strict=True)
+        disk_over_commit = strutils.bool_from_string(
+            drain.get('disk_over_commit', False), strict=True)
+
+        LOG.info(_LI("Draining host %s."), host_name)
+        try:
+            progress = self.api.drain_host(context, host_name,
+                                           block_migration, disk_over_commit,
+                                           order=drain.get('order'))
+        except NotImplementedError:
+            common.raise_feature_not_supported()
+        except exception.HostNotFound as e:
+            raise webob.exc.HTTPNotFound(explanation=e.format_message())
+        except exception.ComputeServiceUnavailable as e:
+            raise webob.exc.HTTPBadRequest(explanation=e.format_message())
+        except exception.HostDrainInProgress as e:
+            raise webob.exc.HTTPConflict(explanation=e.format_message())
+        return {'host_drain': progress}
+
+    @wsgi.Controller.api_version("2.11")
+    @extensions.expected_errors((404, 501))
+    def show(self, req, id):
+        """Returns the progress of the drain of a host.
+
+        :param id: hostname
+        :returns: dict in the format
+
+        |   {'host_drain': {'host': 'compute1.host.com',
+        |                   'status': 'draining',
+        |                   'instances': 3,
+        |                   'migrating': ['<uuid>', '<uuid>'],
+        |                   'failed': ['<uuid>']}}
+
+        status is 'draining' while the instances get migrated, 'drained'
+        once the drain is over and None when the host was not drained.
+        instances counts those still on the host, migrating and failed
+        list those being migrated and those whose last live migration off
+        the host failed.
+        """
+        context = req.environ['nova.context']
+        authorize(context)
+        try:
+            progress = self.api.get_host_drain(context, id)
+        except NotImplementedError:
+            common.raise_feature_not_supported()
+        except exception.HostNotFound as e:
+            raise webob.exc.HTTPNotFound(explanation=e.format_message())
+        return {'host_drain': progress}
+
+
+class HostDrain(extensions.V3APIExtensionBase):
+    """Admin-only live migration of all instances off a host."""
+
+    name = "HostDrain"
+    alias = ALIAS
+    version = 1
+
+    def get_resources(self):
+        resources = [extensions.ResourceExtension(ALIAS,
+                                                  HostDrainController())]
+        return resources
+
+    def get_controller_extensions(self):
+        return []
@@ -51,8 +51,16 @@ class ServiceController(wsgi.Controller):
 
         return _services
 
-    def _get_service_detail(self, svc):
-        alive = self.servicegroup_api.service_is_up(svc)
+    def _get_up_hosts_by_topic(self, services):
+        """Return the hosts whose service is up, keyed by service topic."""
+        services_by_topic = {}
+        for svc in services:
+            services_by_topic.setdefault(svc['topic'], []).append(svc)
+        return {topic: self.servicegroup_api.get_up_services(topic, svcs)
+                for topic, svcs in services_by_topic.items()}
+
+    def _get_service_detail(self, svc, up_hosts_by_topic):
+        alive = svc['host'] in up_hosts_by_topic[svc['topic']]
         state = (alive and "up") or "down"
         active = 'enabled'
         if svc['disabled']:
@@ -70,7 +78,9 @@ class ServiceController(wsgi.Controller):
 
     def _get_services_list(self, req):
         _services = self._get_services(req)
-        return [self._get_service_detail(svc) for svc in _services]
+        up_hosts_by_topic = self._get_up_hosts_by_topic(_services)
+        return [self._get_service_detail(svc, up_hosts_by_topic)
+                for svc in _services]
 
     def _enable(self, body, context):
         """Enable scheduling for a service."""
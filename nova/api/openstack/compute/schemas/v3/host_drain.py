@@ -0,0 +1,36 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova.api.validation import parameter_types
+
+
+create = {
+    'type': 'object',
+    'properties': {
+        'host_drain': {
+            'type': 'object',
+            'properties': {
+                'host': parameter_types.hostname,
+                'block_migration': parameter_types.boolean,
+                'disk_over_commit': parameter_types.boolean,
+                'order': {
+                    'type': 'string',
+                    'enum': ['smallest', 'priority'],
+                },
+            },
+            'required': ['host'],
+            'additionalProperties': False,
+        },
+    },
+    'required': ['host_drain'],
+    'additionalProperties': False,
+}
@@ -27,9 +27,11 @@ reached.
 The interface into this module is the MessageRunner class.
 """
 
+import collections
 import sys
 import traceback
 
+from eventlet import greenthread
 from eventlet import queue
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -65,7 +67,20 @@ cell_messaging_opts = [
             help='Maximum number of hops for cells routing.'),
     cfg.StrOpt('scheduler',
             default='nova.cells.scheduler.CellsScheduler',
-            help='Cells scheduler to use')]
+            help='Cells scheduler to use'),
+    cfg.FloatOpt('broadcast_coalesce_window',
+            default=0.0,
+            help='Number of seconds to hold instance_update_at_top, '
+                 'instance_destroy_at_top and bw_usage_update_at_top '
+                 'broadcasts so that they can be coalesced and sent to '
+                 'parent cells as a single message.  Only the latest '
+                 'update per instance is kept.  Set to 0 to send every '
+                 'broadcast immediately.'),
+    cfg.IntOpt('broadcast_coalesce_max_batch',
+            default=100,
+            help='Maximum number of coalesced updates to hold for a '
+                 'single method before the batch is sent without waiting '
+                 'for broadcast_coalesce_window to expire.')]
 
 CONF = cfg.CONF
 CONF.import_opt('name', 'nova.cells.opts', group='cells')
@@ -1086,6 +1101,28 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
             return
         self.db.bw_usage_update(message.ctxt, **bw_update_info)
 
+    def coalesced_at_top(self, message, method_name, batch, **kwargs):
+        """Expand a batch of coalesced broadcasts if we're a top level
+        cell.  Each entry in 'batch' holds the kwargs for one call to
+        'method_name'.  A failure of one entry doesn't stop the rest of
+        the batch from being processed.
+        """
+        if not self._at_the_top():
+            return
+        if method_name not in _COALESCED_METHODS:
+            LOG.warning(_LW("Ignoring coalesced broadcast for unsupported "
+                            "method %(method)s"), {'method': method_name})
+            return
+        fn = getattr(self, method_name)
+        LOG.debug("Got %(count)d coalesced %(method)s updates",
+                  {'count': len(batch), 'method': method_name})
+        for method_kwargs in batch:
+            try:
+                fn(message, **method_kwargs)
+            except Exception:
+                LOG.exception(_LE("Error processing coalesced %(method)s "
+                                  "update"), {'method': method_name})
+
     def _sync_instance(self, ctxt, instance):
         if instance.deleted:
             self.msg_runner.instance_destroy_at_top(ctxt, instance)
@@ -1198,6 +1235,142 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
         return self.compute_api.get_migrations(context, filters)
 
 
+def _merge_instance_updates(older, newer):
+    """Fold a pending instance_update_at_top into a newer one for the
+    same instance.
+
+    Updates are not always full instances (info cache updates only carry
+    the uuid and info_cache, for example), so anything the older update
+    changed that the newer one doesn't carry is copied over.  Fields both
+    of them carry keep the newer value but stay marked as changed so they
+    are still saved at the top.
+    """
+    old_inst = older['instance']
+    new_inst = newer['instance']
+    new_changes = new_inst.obj_what_changed()
+    for field in old_inst.obj_what_changed():
+        if field in new_changes:
+            continue
+        if new_inst.obj_attr_is_set(field):
+            setattr(new_inst, field, getattr(new_inst, field))
+        elif old_inst.obj_attr_is_set(field):
+            setattr(new_inst, field, getattr(old_inst, field))
+    return newer
+
+
+def _bw_usage_key(method_kwargs):
+    info = method_kwargs['bw_update_info']
+    return (info['uuid'], info['mac'], str(info['start_period']))
+
+
+def _instance_key(method_kwargs):
+    return method_kwargs['instance'].uuid
+
+
+# Broadcast methods that may be coalesced, mapped to a function returning
+# the key under which only the latest update is kept and an optional
+# function to merge a superseded update into its replacement.  The order
+# here is also the order batches are flushed in.
+_COALESCED_METHODS = collections.OrderedDict([
+    ('instance_update_at_top', (_instance_key, _merge_instance_updates)),
+    ('instance_destroy_at_top', (_instance_key, None)),
+    ('bw_usage_update_at_top', (_bw_usage_key, None)),
+])
+
+
+class _BroadcastCoalescer(object):
+    """Hold 'up' broadcasts for a short window and send them as batches.
+
+    Updates are keyed per method so that only the latest one for an
+    instance (or bandwidth usage record) is sent.  When the window
+    expires, or a batch for a method grows to
+    CONF.cells.broadcast_coalesce_max_batch, each method's batch is sent
+    to parent cells as a single 'coalesced_at_top' broadcast which the
+    top level cell expands back into individual calls.
+    """
+
+    def __init__(self, msg_runner):
+        self.msg_runner = msg_runner
+        self.pending = collections.OrderedDict(
+                (method, collections.OrderedDict())
+                for method in _COALESCED_METHODS)
+        self.ctxt = None
+        self.timer = None
+        # Counters, so the compression ratio can be reported.
+        self.updates_received = 0
+        self.updates_sent = 0
+        self.messages_sent = 0
+
+    def add(self, ctxt, method_name, method_kwargs):
+        key_fn, merge_fn = _COALESCED_METHODS[method_name]
+        key = key_fn(method_kwargs)
+        batch = self.pending[method_name]
+        older = batch.pop(key, None)
+        if older is not None and merge_fn is not None:
+            method_kwargs = merge_fn(older, method_kwargs)
+        if method_name == 'instance_destroy_at_top':
+            # Don't bother updating an instance we're about to destroy.
+            self.pending['instance_update_at_top'].pop(key, None)
+        batch[key] = method_kwargs
+        # NOTE: A batch goes out with the context of the latest update
+        # that was added to it.
+        self.ctxt = ctxt
+        self.updates_received += 1
+
+        if len(batch) >= CONF.cells.broadcast_coalesce_max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = greenthread.spawn_after(
+                    CONF.cells.broadcast_coalesce_window, self._flush_timer)
+
+    def _flush_timer(self):
+        self.timer = None
+        self.flush()
+
+    def flush(self):
+        """Send all pending updates, one message per method."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        ctxt = self.ctxt
+        for method_name, batch in self.pending.items():
+            if not batch:
+                continue
+            updates = list(batch.values())
+            batch.clear()
+            method_kwargs = dict(method_name=method_name, batch=updates)
+            message = _BroadcastMessage(self.msg_runner, ctxt,
+                                        'coalesced_at_top', method_kwargs,
+                                        'up', run_locally=False)
+            try:
+                message.process()
+            except Exception:
+                LOG.exception(_LE("Error sending %(count)d coalesced "
+                                  "%(method)s updates"),
+                              {'count': len(updates), 'method': method_name})
+                continue
+            self.updates_sent += len(updates)
+            self.messages_sent += 1
+        LOG.debug("Coalesced broadcast stats: %s", self.get_stats())
+
+    def get_stats(self):
+        """Return the coalescing counters.  'compression_ratio' is the
+        number of updates received per message sent upwards.
+        """
+        ratio = 0.0
+        if self.messages_sent:
+            ratio = (float(self.updates_received - self.pending_count()) /
+                     self.messages_sent)
+        return {'updates_received': self.updates_received,
+                'updates_sent': self.updates_sent,
+                'messages_sent': self.messages_sent,
+                'pending': self.pending_count(),
+                'compression_ratio': ratio}
+
+    def pending_count(self):
+        return sum(len(batch) for batch in self.pending.values())
+
+
 _CELL_MESSAGE_TYPE_TO_MESSAGE_CLS = {'targeted': _TargetedMessage,
                                      'broadcast': _BroadcastMessage,
                                      'response': _ResponseMessage}
@@ -1243,6 +1416,7 @@ class MessageRunner(object):
         for msg_type, cls in six.iteritems(_CELL_MESSAGE_TYPE_TO_METHODS_CLS):
             self.methods_by_type[msg_type] = cls(self)
         self.serializer = objects_base.NovaObjectSerializer()
+        self.coalescer = _BroadcastCoalescer(self)
 
     def _process_message_locally(self, message):
         """Message processing will call this when its determined that
@@ -1407,19 +1581,34 @@ class MessageRunner(object):
                                    cell_name, need_response=call)
         return message.process()
 
+    def _broadcast_up(self, ctxt, method_name, method_kwargs):
+        """Broadcast to the top level cell, going through the coalescer
+        if CONF.cells.broadcast_coalesce_window is set.
+        """
+        if CONF.cells.broadcast_coalesce_window > 0:
+            self.coalescer.add(ctxt, method_name, method_kwargs)
+            return
+        message = _BroadcastMessage(self, ctxt, method_name, method_kwargs,
+                                    'up', run_locally=False)
+        message.process()
+
+    def flush_coalesced_broadcasts(self):
+        """Send any broadcasts held for coalescing right away."""
+        self.coalescer.flush()
+
+    def get_coalesced_broadcast_stats(self):
+        """Return counters describing broadcast coalescing."""
+        return self.coalescer.get_stats()
+
     def instance_update_at_top(self, ctxt, instance):
         """Update an instance at the top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'instance_update_at_top',
-                                    dict(instance=instance), 'up',
-                                    run_locally=False)
-        message.process()
+        self._broadcast_up(ctxt, 'instance_update_at_top',
+                           dict(instance=instance))
 
     def instance_destroy_at_top(self, ctxt, instance):
         """Destroy an instance at the top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'instance_destroy_at_top',
-                                    dict(instance=instance), 'up',
-                                    run_locally=False)
-        message.process()
+        self._broadcast_up(ctxt, 'instance_destroy_at_top',
+                           dict(instance=instance))
 
     def instance_delete_everywhere(self, ctxt, instance, delete_type):
         """This is used by API cell when it didn't know what cell
@@ -1443,10 +1632,8 @@ class MessageRunner(object):
 
     def bw_usage_update_at_top(self, ctxt, bw_update_info):
         """Update bandwidth usage at top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'bw_usage_update_at_top',
-                                    dict(bw_update_info=bw_update_info),
-                                    'up', run_locally=False)
-        message.process()
+        self._broadcast_up(ctxt, 'bw_usage_update_at_top',
+                           dict(bw_update_info=bw_update_info))
 
     def sync_instances(self, ctxt, project_id, updated_since, deleted):
         """Force a sync of all instances, potentially by project_id,
@@ -3382,8 +3382,16 @@ class HostAPI(base.Base):
     def __init__(self, rpcapi=None):
         self.rpcapi = rpcapi or compute_rpcapi.ComputeAPI()
         self.servicegroup_api = servicegroup.API()
+        self._compute_task_api = None
         super(HostAPI, self).__init__()
 
+    @property
+    def compute_task_api(self):
+        if self._compute_task_api is None:
+            from nova import conductor
+            self._compute_task_api = conductor.ComputeTaskAPI()
+        return self._compute_task_api
+
     def _assert_host_exists(self, context, host_name, must_be_up=False):
         """Raise HostNotFound if compute host doesn't exist."""
         service = objects.Service.get_by_compute_host(context, host_name)
@@ -3446,6 +3454,74 @@ class HostAPI(base.Base):
                                                payload)
         return result
 
+    @wrap_exception()
+    def drain_host(self, context, host_name, block_migration,
+                   disk_over_commit, order=None):
+        """Live-migrates all the instances off a host.
+
+        The compute service of the host is disabled, so that no instance
+        gets scheduled to it, and the migrations are run by the conductor,
+        a few at a time.  Their progress is returned by get_host_drain.
+        """
+        service = objects.Service.get_by_compute_host(context, host_name)
+        if not self.servicegroup_api.service_is_up(service):
+            raise exception.ComputeServiceUnavailable(host=host_name)
+        if service.disabled_reason == compute_utils.HOST_DRAINING:
+            raise exception.HostDrainInProgress(host=host_name)
+        # Only the request which still finds the reason it read gets to
+        # start a drain when several ones race.
+        values = {'disabled': True,
+                  'disabled_reason': compute_utils.HOST_DRAINING}
+        if self.db.service_update_if(
+                context, service.id, values,
+                {'disabled_reason': service.disabled_reason}) is None:
+            raise exception.HostDrainInProgress(host=host_name)
+        service.disabled = True
+        service.disabled_reason = compute_utils.HOST_DRAINING
+        service.obj_reset_changes(['disabled', 'disabled_reason'])
+
+        payload = {'host_name': host_name}
+        compute_utils.notify_about_host_update(context, 'drain.start',
+                                               payload)
+        self.compute_task_api.drain_host(context, host_name, block_migration,
+                                         disk_over_commit, order=order)
+        return self.get_host_drain(context, host_name, service=service)
+
+    def get_host_drain(self, context, host_name, service=None):
+        """Returns the progress of the drain of a host: the instances
+        still on it, those being migrated, and those whose last live
+        migration off it failed.
+        """
+        if service is None:
+            service = objects.Service.get_by_compute_host(context, host_name)
+        if service.disabled_reason == compute_utils.HOST_DRAINING:
+            status = 'draining'
+        elif service.disabled_reason == compute_utils.HOST_DRAINED:
+            status = 'drained'
+        else:
+            status = None
+
+        instances = objects.InstanceList.get_by_host(context, host_name)
+        migrations = objects.MigrationList.get_by_filters(
+            context, {'source_compute': host_name,
+                      'migration_type': 'live-migration'})
+        last_status = {}
+        for migration in sorted(migrations, key=lambda m: m.id):
+            last_status[migration.instance_uuid] = migration.status
+
+        migrating = []
+        failed = []
+        for instance in instances:
+            if instance.task_state == task_states.MIGRATING:
+                migrating.append(instance.uuid)
+            elif last_status.get(instance.uuid) in ('failed', 'error'):
+                failed.append(instance.uuid)
+        return {'host': host_name,
+                'status': status,
+                'instances': len(instances),
+                'migrating': migrating,
+                'failed': failed}
+
     def service_get_all(self, context, filters=None, set_zones=False):
         """Returns a list of services, optionally filtering the results.
 
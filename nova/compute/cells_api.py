@@ -517,6 +517,13 @@ class HostAPI(compute_api.HostAPI):
         """Returns the result of calling "uptime" on the target host."""
         return self.cells_rpcapi.get_host_uptime(context, host_name)
 
+    def drain_host(self, context, host_name, block_migration,
+                   disk_over_commit, order=None):
+        raise NotImplementedError()
+
+    def get_host_drain(self, context, host_name):
+        raise NotImplementedError()
+
     def service_get_all(self, context, filters=None, set_zones=False):
         if filters is None:
             filters = {}
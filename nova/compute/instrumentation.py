@@ -0,0 +1,190 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Lightweight timing instrumentation for the compute manager.
+
+Spans (a build phase, a periodic task run, ...) are timed and folded into
+in-memory histograms which can be dumped to a local JSON file and, if
+configured, emitted as ``compute.timing`` notifications.
+
+The compute manager names its spans after what they time:
+
+* ``build.total``, ``build.networks``, ``build.block_device`` and
+  ``build.spawn`` for the phases of an instance build;
+* ``periodic.<task>`` for the runs of a periodic task, e.g.
+  ``periodic._sync_power_states``.
+"""
+
+import contextlib
+import functools
+import os
+import tempfile
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+
+import nova.context
+from nova.i18n import _LW
+from nova import rpc
+
+LOG = logging.getLogger(__name__)
+
+instrumentation_opts = [
+    cfg.StrOpt('compute_timing_stats_file',
+               help='If set, the compute manager periodically writes the '
+                    'histograms of its build phase and periodic task '
+                    'timings to this file as JSON.'),
+    cfg.BoolOpt('compute_timing_notifications',
+                default=False,
+                help='If set, send a compute.timing notification for every '
+                     'timed build phase and periodic task run.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(instrumentation_opts)
+
+# Upper bounds, in seconds, of the histogram buckets.  Anything slower than
+# the last bound lands in the overflow bucket.
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Histogram(object):
+    """Running count/sum/min/max and bucketed distribution of durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.failures = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, duration, failed=False):
+        self.count += 1
+        self.total += duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if self.max is None or duration > self.max:
+            self.max = duration
+        if failed:
+            self.failures += 1
+        for i, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def to_dict(self):
+        buckets = dict(zip([str(b) for b in BUCKETS], self.buckets))
+        buckets['+Inf'] = self.buckets[-1]
+        return {
+            'count': self.count,
+            'failures': self.failures,
+            'sum': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'buckets': buckets,
+        }
+
+
+class TimingRecorder(object):
+    """Collects span timings into per-name histograms."""
+
+    def __init__(self, host=None):
+        self.host = host or CONF.host
+        self._histograms = {}
+
+    @contextlib.contextmanager
+    def span(self, name, instance=None):
+        """Time the enclosed block and record it under ``name``.
+
+        Exceptions propagate unchanged; the span is still recorded and
+        counted as a failure.
+        """
+        watch = timeutils.StopWatch()
+        watch.start()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.record(name, watch.elapsed(), failed=failed,
+                        instance=instance)
+
+    def record(self, name, duration, failed=False, instance=None):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram()
+        histogram.add(duration, failed=failed)
+
+        LOG.debug('%(name)s took %(duration).3f seconds',
+                  {'name': name, 'duration': duration}, instance=instance)
+        if CONF.compute_timing_notifications:
+            self._notify(name, duration, failed, instance)
+
+    def _notify(self, name, duration, failed, instance):
+        payload = {'name': name, 'duration': duration, 'failed': failed,
+                   'host': self.host}
+        if instance is not None:
+            payload['instance_id'] = instance.uuid
+        try:
+            rpc.get_notifier('compute', self.host).info(
+                nova.context.get_admin_context(), 'compute.timing', payload)
+        except Exception:
+            LOG.warning(_LW('Failed to send timing notification for %s'),
+                        name, exc_info=True)
+
+    def get_stats(self):
+        return {name: histogram.to_dict()
+                for name, histogram in self._histograms.items()}
+
+    def reset(self):
+        self._histograms = {}
+
+    def dump(self, path):
+        """Atomically write the current histograms to ``path`` as JSON."""
+        data = jsonutils.dumps({'host': self.host,
+                                'generated_at': timeutils.utcnow(),
+                                'timings': self.get_stats()},
+                               sort_keys=True, indent=2)
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.timings')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.rename(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+def timed(name):
+    """Decorator recording each call of a manager method as a span.
+
+    The decorated method's instance must have a ``timings`` attribute
+    holding a :class:`TimingRecorder`.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def decorated_function(self, *args, **kwargs):
+            with self.timings.span(name):
+                return function(self, *args, **kwargs)
+        return decorated_function
+    return decorator
@@ -57,6 +57,7 @@ from nova.cells import rpcapi as cells_rpcapi
 from nova.cloudpipe import pipelib
 from nova import compute
 from nova.compute import build_results
+from nova.compute import instrumentation
 from nova.compute import power_state
 from nova.compute import resource_tracker
 from nova.compute import rpcapi as compute_rpcapi
@@ -688,6 +689,7 @@ class ComputeManager(manager.Manager):
 
         super(ComputeManager, self).__init__(service_name="compute",
                                              *args, **kwargs)
+        self.timings = instrumentation.TimingRecorder(self.host)
 
         # NOTE(russellb) Load the driver last.  It may call back into the
         # compute manager via the virtapi, so we want it to be fully
@@ -1193,6 +1195,39 @@ class ComputeManager(manager.Manager):
         instance = objects.Instance.get_by_uuid(context,
                                                 event.get_instance_uuid(),
                                                 expected_attrs=[])
+        self._handle_lifecycle_event(context, instance, event)
+
+    def handle_lifecycle_events(self, events):
+        """Handle a batch of lifecycle events, at most one per instance.
+
+        The instances of the whole batch are looked up with a single
+        query instead of one per event.
+        """
+        context = nova.context.get_admin_context(read_deleted='yes')
+        uuids = [event.get_instance_uuid() for event in events]
+        instances = objects.InstanceList.get_by_filters(
+            context, {'uuid': uuids}, expected_attrs=[])
+        instances = {instance.uuid: instance for instance in instances}
+        for event in events:
+            LOG.info(_LI("VM %(state)s (Lifecycle Event)"),
+                     {'state': event.get_name()},
+                     instance_uuid=event.get_instance_uuid())
+            instance = instances.get(event.get_instance_uuid())
+            if instance is None:
+                LOG.debug("Event %s arrived for non-existent instance. The "
+                          "instance was probably deleted.", event)
+                continue
+            try:
+                self._handle_lifecycle_event(context, instance, event)
+            except exception.InstanceNotFound:
+                LOG.debug("Event %s arrived for non-existent instance. The "
+                          "instance was probably deleted.", event)
+            except Exception:
+                # Keep going, one instance must not hold up the others.
+                LOG.exception(_LE("Failed to handle lifecycle event %s"),
+                              event, instance=instance)
+
+    def _handle_lifecycle_event(self, context, instance, event):
         vm_power_state = None
         if event.get_transition() == virtevent.EVENT_LIFECYCLE_STOPPED:
             vm_power_state = power_state.SHUTDOWN
@@ -1228,7 +1263,9 @@ class ComputeManager(manager.Manager):
                                             vm_power_state)
 
     def handle_events(self, event):
-        if isinstance(event, virtevent.LifecycleEvent):
+        if isinstance(event, virtevent.LifecycleEventBatch):
+            self.handle_lifecycle_events(event.get_events())
+        elif isinstance(event, virtevent.LifecycleEvent):
             try:
                 self.handle_lifecycle_event(event)
             except exception.InstanceNotFound:
@@ -1953,6 +1990,7 @@ class ComputeManager(manager.Manager):
             self._set_instance_obj_error_state(context, instance)
             return build_results.FAILED
 
+    @instrumentation.timed('build.total')
     def _build_and_run_instance(self, context, instance, image, injected_files,
             admin_password, requested_networks, security_groups,
             block_device_mapping, node, limits, filter_properties):
@@ -1980,10 +2018,11 @@ class ComputeManager(manager.Manager):
                             task_states.BLOCK_DEVICE_MAPPING)
                     block_device_info = resources['block_device_info']
                     network_info = resources['network_info']
-                    self.driver.spawn(context, instance, image,
-                                      injected_files, admin_password,
-                                      network_info=network_info,
-                                      block_device_info=block_device_info)
+                    with self.timings.span('build.spawn', instance=instance):
+                        self.driver.spawn(context, instance, image,
+                                          injected_files, admin_password,
+                                          network_info=network_info,
+                                          block_device_info=block_device_info)
         except (exception.InstanceNotFound,
                 exception.UnexpectedDeletingTaskStateError) as e:
             with excutils.save_and_reraise_exception():
@@ -2057,8 +2096,9 @@ class ComputeManager(manager.Manager):
         resources = {}
         network_info = None
         try:
-            network_info = self._build_networks_for_instance(context, instance,
-                    requested_networks, security_groups)
+            with self.timings.span('build.networks', instance=instance):
+                network_info = self._build_networks_for_instance(context,
+                        instance, requested_networks, security_groups)
             resources['network_info'] = network_info
         except (exception.InstanceNotFound,
                 exception.UnexpectedDeletingTaskStateError):
@@ -2085,8 +2125,9 @@ class ComputeManager(manager.Manager):
             instance.task_state = task_states.BLOCK_DEVICE_MAPPING
             instance.save()
 
-            block_device_info = self._prep_block_device(context, instance,
-                    block_device_mapping)
+            with self.timings.span('build.block_device', instance=instance):
+                block_device_info = self._prep_block_device(context,
+                        instance, block_device_mapping)
             resources['block_device_info'] = block_device_info
         except (exception.InstanceNotFound,
                 exception.UnexpectedDeletingTaskStateError):
@@ -5294,6 +5335,7 @@ class ComputeManager(manager.Manager):
 
     @periodic_task.periodic_task(
         spacing=CONF.heal_instance_info_cache_interval)
+    @instrumentation.timed('periodic._heal_instance_info_cache')
     def _heal_instance_info_cache(self, context):
         """Called periodically.  On every call, try to update the
         info_cache's network information for another instance by
@@ -5729,6 +5771,7 @@ class ComputeManager(manager.Manager):
 
     @periodic_task.periodic_task(spacing=CONF.sync_power_state_interval,
                                  run_immediately=True)
+    @instrumentation.timed('periodic._sync_power_states')
     def _sync_power_states(self, context):
         """Align power states between the database and the hypervisor.
 
@@ -6004,6 +6047,7 @@ class ComputeManager(manager.Manager):
                                 e, instance=instance)
 
     @periodic_task.periodic_task(spacing=CONF.update_resources_interval)
+    @instrumentation.timed('periodic.update_available_resource')
     def update_available_resource(self, context):
         """See driver.get_available_resource()
 
@@ -6247,6 +6291,7 @@ class ComputeManager(manager.Manager):
 
     @periodic_task.periodic_task(spacing=CONF.image_cache_manager_interval,
                                  external_process_ok=True)
+    @instrumentation.timed('periodic._run_image_cache_manager_pass')
     def _run_image_cache_manager_pass(self, context):
         """Run a single pass of the image cache manager."""
 
@@ -6270,6 +6315,17 @@ class ComputeManager(manager.Manager):
 
         self.driver.manage_image_cache(context, filtered_instances)
 
+    @periodic_task.periodic_task
+    def _write_timing_stats(self, context):
+        """Dump the build and periodic task timing histograms to disk."""
+        if not CONF.compute_timing_stats_file:
+            return
+        try:
+            self.timings.dump(CONF.compute_timing_stats_file)
+        except Exception:
+            LOG.warning(_LW('Failed to write timing stats to %s'),
+                        CONF.compute_timing_stats_file, exc_info=True)
+
     @periodic_task.periodic_task(spacing=CONF.instance_delete_interval)
     def _run_pending_deletes(self, context):
         """Retry any pending instance file deletes."""
@@ -14,6 +14,7 @@ import itertools
 
 import nova.compute.api
 import nova.compute.flavors
+import nova.compute.instrumentation
 import nova.compute.manager
 import nova.compute.monitors
 import nova.compute.resource_tracker
@@ -26,6 +27,7 @@ def list_opts():
          itertools.chain(
              nova.compute.api.compute_opts,
              nova.compute.flavors.flavor_opts,
+             nova.compute.instrumentation.instrumentation_opts,
              nova.compute.manager.compute_opts,
              nova.compute.manager.instance_cleaning_opts,
              nova.compute.manager.interval_opts,
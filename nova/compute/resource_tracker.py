@@ -82,7 +82,9 @@ class ResourceTracker(object):
         self.monitors = monitor_handler.monitors
         self.ext_resources_handler = \
             ext_resources.ResourceHandler(CONF.compute_resources)
-        self.old_resources = objects.ComputeNode()
+        # Primitive values of the compute node fields as last reported
+        # to the scheduler, see _resource_change().
+        self._reported_fields = {}
         self.scheduler_client = scheduler_client.SchedulerClient()
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
@@ -316,6 +318,7 @@ class ResourceTracker(object):
         # now try to get the compute node record from the
         # database. If we get one we use resources to initialize
         self.compute_node = self._get_compute_node(context)
+        self._reported_fields = {}
         if self.compute_node:
             self._copy_resources(resources)
             return
@@ -324,6 +327,7 @@ class ResourceTracker(object):
         # so we need to create a new compute node. This needs
         # to be initialised with resource values.
         self.compute_node = objects.ComputeNode(context)
+        self._reported_fields = {}
         # TODO(pmurray) service_id is deprecated but is still a required field.
         # This should be removed when the field is changed.
         self.compute_node.service_id = service.id
@@ -582,19 +586,40 @@ class ResourceTracker(object):
                   'pci_stats': pci_stats})
 
     def _resource_change(self):
-        """Check to see if any resources have changed."""
-        if not obj_base.obj_equal_prims(self.compute_node, self.old_resources):
-            self.old_resources = copy.deepcopy(self.compute_node)
-            return True
-        return False
+        """Check to see if any resources have changed.
+
+        Only the fields assigned since the compute node was last saved are
+        looked at, and each is compared with the value last reported.  The
+        ones which were merely re-assigned the same value are dropped from
+        the object's changes, so that the save only writes real changes.
+
+        :returns: dict of the changed field names to their primitive
+                  values, empty if nothing changed.
+        """
+        compute_node = self.compute_node
+        changed = {}
+        unchanged = []
+        for field in compute_node.obj_what_changed():
+            value = compute_node.fields[field].to_primitive(
+                compute_node, field, getattr(compute_node, field))
+            if (field in self._reported_fields and
+                    self._reported_fields[field] == value):
+                unchanged.append(field)
+            else:
+                changed[field] = value
+        if unchanged:
+            compute_node.obj_reset_changes(unchanged, recursive=True)
+        return changed
 
     def _update(self, context):
         """Update partial stats locally and populate them to Scheduler."""
         self._write_ext_resources(self.compute_node)
-        if not self._resource_change():
+        changed = self._resource_change()
+        if not changed:
             return
         # Persist the stats to the Scheduler
         self.scheduler_client.update_resource_stats(self.compute_node)
+        self._reported_fields.update(changed)
         if self.pci_tracker:
             self.pci_tracker.save(context)
 
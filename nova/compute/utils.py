@@ -39,6 +39,11 @@ CONF = cfg.CONF
 CONF.import_opt('host', 'nova.netconf')
 LOG = log.getLogger(__name__)
 
+# disabled_reason of the compute service of a host while its instances are
+# drained off it, and once the drain is over
+HOST_DRAINING = 'Draining instances'
+HOST_DRAINED = 'Instances drained'
+
 
 def exception_to_dict(fault):
     """Converts exceptions to a dict for use in notifications."""
@@ -271,6 +276,9 @@ def notify_about_instance_usage(notifier, context, instance, event_suffix,
     :param extra_usage_info: Dictionary containing extra values to add or
         override in the notification.
     """
+    if not rpc.notifications_enabled():
+        return
+
     if not extra_usage_info:
         extra_usage_info = {}
 
@@ -114,6 +114,11 @@ class LocalComputeTaskAPI(object):
             context, instance, scheduler_hint, True, False, None,
             block_migration, disk_over_commit, None)
 
+    def drain_host(self, context, host, block_migration, disk_over_commit,
+                   order=None):
+        utils.spawn_n(self._manager.drain_host, context, host,
+                      block_migration, disk_over_commit, order=order)
+
     def build_instances(self, context, instances, image,
             filter_properties, admin_password, injected_files,
             requested_networks, security_groups, block_device_mapping,
@@ -227,6 +232,11 @@ class ComputeTaskAPI(object):
             context, instance, scheduler_hint, True, False, None,
             block_migration, disk_over_commit, None)
 
+    def drain_host(self, context, host, block_migration, disk_over_commit,
+                   order=None):
+        self.conductor_compute_rpcapi.drain_host(
+            context, host, block_migration, disk_over_commit, order=order)
+
     def build_instances(self, context, instances, image, filter_properties,
             admin_password, injected_files, requested_networks,
             security_groups, block_device_mapping, legacy_bdm=True):
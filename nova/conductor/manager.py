@@ -33,6 +33,7 @@ from nova.compute import rpcapi as compute_rpcapi
 from nova.compute import task_states
 from nova.compute import utils as compute_utils
 from nova.compute import vm_states
+from nova.conductor.tasks import drain
 from nova.conductor.tasks import live_migrate
 from nova.conductor.tasks import migrate
 from nova.db import base
@@ -489,7 +490,7 @@ class ComputeTaskManager(base.Base):
     may involve coordinating activities on multiple compute nodes.
     """
 
-    target = messaging.Target(namespace='compute_task', version='1.11')
+    target = messaging.Target(namespace='compute_task', version='1.12')
 
     def __init__(self):
         super(ComputeTaskManager, self).__init__()
@@ -654,6 +655,14 @@ class ComputeTaskManager(base.Base):
             migration.status = 'failed'
             migration.save()
             raise exception.MigrationError(reason=six.text_type(ex))
+        return migration
+
+    def drain_host(self, context, host, block_migration, disk_over_commit,
+                   order=None):
+        task = drain.HostDrainTask(context, host, block_migration,
+                                   disk_over_commit, order,
+                                   self._live_migrate)
+        task.execute()
 
     def _build_live_migrate_task(self, context, instance, destination,
                                  block_migration, disk_over_commit, migration):
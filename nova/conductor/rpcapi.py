@@ -270,6 +270,7 @@ class ComputeTaskAPI(object):
     1.9 - Converted requested_networks to NetworkRequestList object
     1.10 - Made migrate_server() and build_instances() send flavor objects
     1.11 - Added clean_shutdown to migrate_server()
+    1.12 - Added drain_host
 
     """
 
@@ -304,6 +305,13 @@ class ComputeTaskAPI(object):
         cctxt = self.client.prepare(version=version)
         return cctxt.call(context, 'migrate_server', **kw)
 
+    def drain_host(self, context, host, block_migration, disk_over_commit,
+                   order=None):
+        cctxt = self.client.prepare(version='1.12')
+        cctxt.cast(context, 'drain_host', host=host,
+                   block_migration=block_migration,
+                   disk_over_commit=disk_over_commit, order=order)
+
     def build_instances(self, context, instances, image, filter_properties,
             admin_password, injected_files, requested_networks,
             security_groups, block_device_mapping, legacy_bdm=True):
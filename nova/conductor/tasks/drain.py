@@ -0,0 +1,223 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from eventlet import greenthread
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+from nova.compute import instance_actions
+from nova.compute import task_states
+from nova.compute import utils as compute_utils
+from nova.compute import vm_states
+from nova import exception
+from nova.i18n import _LI
+from nova.i18n import _LW
+from nova import objects
+
+LOG = logging.getLogger(__name__)
+
+ORDER_SMALLEST = 'smallest'
+ORDER_PRIORITY = 'priority'
+ORDERS = (ORDER_SMALLEST, ORDER_PRIORITY)
+
+# Instance metadata key holding the drain priority of an instance
+PRIORITY_KEY = 'drain_priority'
+
+# Seconds between two checks of the status of a running migration
+MIGRATION_POLL_INTERVAL = 5
+
+MIGRATION_DONE = ('completed', 'failed', 'error')
+
+drain_opts = [
+    cfg.IntOpt('drain_host_max_concurrent_migrations',
+               default=2,
+               help='Maximum number of live migrations run at the same time '
+                    'when draining a host of its instances.'),
+    cfg.StrOpt('drain_host_order',
+               default=ORDER_SMALLEST,
+               choices=ORDERS,
+               help='Order in which the instances of a host are migrated '
+                    'when draining it, when the request does not give one. '
+                    '"smallest" migrates the instances with the least '
+                    'memory, then disk, first. "priority" migrates first '
+                    'the instances with the highest integer in their '
+                    '"%s" metadata item, and the smallest first among those '
+                    'with the same one.' % PRIORITY_KEY),
+    cfg.IntOpt('drain_host_migration_timeout',
+               default=3600,
+               help='Seconds after which a drain stops waiting for one of '
+                    'its live migrations to end, counts it as failed and '
+                    'starts the next one. 0 means wait until it ends.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(drain_opts)
+
+
+def _size_key(instance):
+    return (instance.memory_mb or 0,
+            (instance.root_gb or 0) + (instance.ephemeral_gb or 0))
+
+
+def _priority(instance):
+    try:
+        return int(instance.metadata.get(PRIORITY_KEY, 0))
+    except ValueError:
+        return 0
+
+
+def sort_instances(instances, order):
+    """Returns the instances in the order they are migrated in."""
+    if order == ORDER_PRIORITY:
+        return sorted(instances,
+                      key=lambda i: (-_priority(i),) + _size_key(i))
+    return sorted(instances, key=_size_key)
+
+
+class HostDrainTask(object):
+    """Live-migrates all the instances off a host.
+
+    At most drain_host_max_concurrent_migrations migrations run at a time,
+    each of them to a destination picked by the scheduler.  An instance
+    that cannot be migrated is skipped and the drain goes on with the next
+    one.  The compute service of the host is expected to be disabled with
+    HOST_DRAINING as reason, which is replaced by HOST_DRAINED at the end.
+    """
+
+    def __init__(self, context, host, block_migration, disk_over_commit,
+                 order, live_migrate):
+        self.context = context
+        self.host = host
+        self.block_migration = block_migration
+        self.disk_over_commit = disk_over_commit
+        self.order = order or CONF.drain_host_order
+        # Callable starting the live migration of an instance, returning
+        # its migration record: ComputeTaskManager._live_migrate
+        self.live_migrate = live_migrate
+        self.stats = {'instances': 0, 'migrated': 0, 'failed': 0,
+                      'skipped': 0}
+
+    def execute(self):
+        instances = objects.InstanceList.get_by_host(
+            self.context, self.host, expected_attrs=['metadata'])
+        instances = sort_instances(instances, self.order)
+        self.stats['instances'] = len(instances)
+        LOG.info(_LI("Draining %(count)d instances off host %(host)s, "
+                     "%(order)s first, %(concurrency)d at a time"),
+                 {'count': len(instances), 'host': self.host,
+                  'order': self.order,
+                  'concurrency': CONF.drain_host_max_concurrent_migrations})
+
+        start = timeutils.utcnow()
+        pool = eventlet.GreenPool(
+            max(CONF.drain_host_max_concurrent_migrations, 1))
+        try:
+            for instance in instances:
+                pool.spawn_n(self._drain_instance, instance)
+            pool.waitall()
+        finally:
+            self._mark_drained()
+        self.stats['elapsed'] = timeutils.delta_seconds(start,
+                                                        timeutils.utcnow())
+        LOG.info(_LI("Drain of host %(host)s done in %(elapsed).1f sec: "
+                     "%(migrated)d of %(instances)d instances migrated, "
+                     "%(failed)d failed, %(skipped)d skipped"),
+                 dict(self.stats, host=self.host))
+        return self.stats
+
+    def _drain_instance(self, instance):
+        if (instance.vm_state not in (vm_states.ACTIVE, vm_states.PAUSED) or
+                instance.task_state is not None):
+            LOG.info(_LI("Not draining instance in vm_state %(vm_state)s "
+                         "and task_state %(task_state)s"),
+                     {'vm_state': instance.vm_state,
+                      'task_state': instance.task_state}, instance=instance)
+            self.stats['skipped'] += 1
+            return
+
+        try:
+            instance.task_state = task_states.MIGRATING
+            instance.save(expected_task_state=[None])
+        except (exception.InstanceNotFound,
+                exception.UnexpectedTaskStateError) as e:
+            LOG.info(_LI("Not draining instance: %s"), e, instance=instance)
+            self.stats['skipped'] += 1
+            return
+        objects.InstanceAction.action_start(
+            self.context, instance.uuid, instance_actions.LIVE_MIGRATION,
+            want_result=False)
+
+        try:
+            migration = self.live_migrate(self.context, instance,
+                                          {'host': None},
+                                          self.block_migration,
+                                          self.disk_over_commit)
+        except Exception as e:
+            LOG.warn(_LW("Skipping instance, its live migration off host "
+                         "%(host)s failed: %(error)s"),
+                     {'host': self.host, 'error': e}, instance=instance)
+            self.stats['failed'] += 1
+            return
+
+        status = self._wait_for_migration(instance, migration)
+        if status == 'completed':
+            LOG.info(_LI("Instance migrated to host %s"),
+                     migration.dest_compute, instance=instance)
+            self.stats['migrated'] += 1
+        else:
+            LOG.warn(_LW("Skipping instance, its live migration to host "
+                         "%(dest)s ended with status %(status)s"),
+                     {'dest': migration.dest_compute, 'status': status},
+                     instance=instance)
+            self.stats['failed'] += 1
+
+    def _wait_for_migration(self, instance, migration):
+        """Waits for the compute host to end the migration, returning its
+        last status.
+
+        A compute service restarted in the middle of a migration leaves
+        its record running, so the wait also ends when the instance is no
+        longer being migrated off the host.
+        """
+        timeout = CONF.drain_host_migration_timeout
+        start = timeutils.utcnow()
+        while migration.status not in MIGRATION_DONE:
+            if timeout and timeutils.is_older_than(start, timeout):
+                return 'timed out while %s' % migration.status
+            greenthread.sleep(MIGRATION_POLL_INTERVAL)
+            migration = objects.Migration.get_by_id(self.context,
+                                                    migration.id)
+            if migration.status in MIGRATION_DONE:
+                break
+            try:
+                instance = objects.Instance.get_by_uuid(self.context,
+                                                        instance.uuid)
+            except exception.InstanceNotFound:
+                return 'instance deleted while %s' % migration.status
+            if instance.host != self.host:
+                return 'completed'
+            if instance.task_state != task_states.MIGRATING:
+                return ('task state %s while %s' %
+                        (instance.task_state, migration.status))
+        return migration.status
+
+    def _mark_drained(self):
+        try:
+            service = objects.Service.get_by_compute_host(self.context,
+                                                          self.host)
+        except exception.ComputeHostNotFound:
+            return
+        if service.disabled_reason == compute_utils.HOST_DRAINING:
+            service.disabled_reason = compute_utils.HOST_DRAINED
+            service.save()
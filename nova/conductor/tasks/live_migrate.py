@@ -29,8 +29,19 @@ migrate_opt = cfg.IntOpt('migrate_max_retries',
              'If == -1, try until out of hosts. '
              'If == 0, only try once, no retries.')
 
+migrate_candidates_opt = cfg.IntOpt('migrate_destination_candidates',
+        default=1,
+        help='Number of ranked destinations to ask the scheduler for when '
+             'live-migrating an instance without a destination. The '
+             'pre-checks of all of them run concurrently and the best '
+             'ranked one that passes is used, so that a destination is '
+             'usually found with a single scheduling pass. Each candidate '
+             'checked counts against migrate_max_retries. If == 1, the '
+             'scheduler is asked again for every host tried.')
+
 CONF = cfg.CONF
 CONF.register_opt(migrate_opt)
+CONF.register_opt(migrate_candidates_opt)
 
 
 class LiveMigrationTask(base.TaskBase):
@@ -141,9 +152,43 @@ class LiveMigrationTask(base.TaskBase):
             raise exception.DestinationHypervisorTooOld()
 
     def _call_livem_checks_on_host(self, destination):
-        self.migrate_data = self.compute_rpcapi.\
-            check_can_live_migrate_destination(self.context, self.instance,
-                destination, self.block_migration, self.disk_over_commit)
+        self.migrate_data = self._check_can_live_migrate_destination(
+            destination)
+
+    def _check_can_live_migrate_destination(self, destination):
+        return self.compute_rpcapi.check_can_live_migrate_destination(
+            self.context, self.instance, destination, self.block_migration,
+            self.disk_over_commit)
+
+    def _check_candidate(self, host):
+        """Returns the migrate_data for the host, and the reason it cannot
+        be used if it fails the pre-checks.
+        """
+        try:
+            self._check_compatible_with_source_hypervisor(host)
+            return self._check_can_live_migrate_destination(host), None
+        except (exception.Invalid, exception.MigrationPreCheckError) as e:
+            return None, e
+
+    def _check_candidates(self, hosts, attempted_hosts):
+        """Run the pre-checks of the candidate hosts concurrently.
+
+        Returns the best ranked host passing them, having set its
+        migrate_data, or None. The hosts failing them before it are added
+        to attempted_hosts.
+        """
+        checks = [utils.spawn(self._check_candidate, host) for host in hosts]
+        for host, check in zip(hosts, checks):
+            migrate_data, e = check.wait()
+            if e is not None:
+                LOG.debug("Skipping host: %(host)s because: %(e)s",
+                    {"host": host, "e": e})
+                attempted_hosts.append(host)
+                continue
+            # NOTE: the checks of lower ranked hosts are left to finish on
+            # their own, their results are simply not used.
+            self.migrate_data = migrate_data
+            return host
 
     def _find_destination(self):
         # TODO(johngarbutt) this retry loop should be shared
@@ -156,11 +201,20 @@ class LiveMigrationTask(base.TaskBase):
         host = None
         while host is None:
             self._check_not_over_max_retries(attempted_hosts)
+            num_candidates = self._get_num_candidates(attempted_hosts)
             filter_properties = {'ignore_hosts': attempted_hosts}
+            if num_candidates > 1:
+                filter_properties['num_candidates'] = num_candidates
             scheduler_utils.setup_instance_group(self.context, request_spec,
                                                  filter_properties)
-            host = self.scheduler_client.select_destinations(self.context,
-                            request_spec, filter_properties)[0]['host']
+            dests = self.scheduler_client.select_destinations(self.context,
+                            request_spec, filter_properties)
+            hosts = self._get_candidate_hosts(dests, attempted_hosts)
+            if len(hosts) > 1:
+                host = self._check_candidates(hosts, attempted_hosts)
+                continue
+
+            host = hosts[0]
             try:
                 self._check_compatible_with_source_hypervisor(host)
                 self._call_livem_checks_on_host(host)
@@ -171,6 +225,23 @@ class LiveMigrationTask(base.TaskBase):
                 host = None
         return host
 
+    def _get_num_candidates(self, attempted_hosts):
+        num_candidates = max(CONF.migrate_destination_candidates, 1)
+        if CONF.migrate_max_retries == -1:
+            return num_candidates
+        # Do not check more hosts than the retries left allow
+        retries_left = CONF.migrate_max_retries - len(attempted_hosts) + 2
+        return max(min(num_candidates, retries_left), 1)
+
+    def _get_candidate_hosts(self, dests, attempted_hosts):
+        hosts = []
+        for dest in dests[:self._get_num_candidates(attempted_hosts)]:
+            if (dest['host'] not in hosts and
+                    dest['host'] not in attempted_hosts):
+                hosts.append(dest['host'])
+        # A scheduler not knowing about num_candidates returns a single host
+        return hosts or [dests[0]['host']]
+
     def _check_not_over_max_retries(self, attempted_hosts):
         if CONF.migrate_max_retries == -1:
             return
@@ -153,6 +153,16 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_update_if(context, service_id, values, expected):
+    """Set the given properties on a service if it still has the expected
+    ones, in a single conditional update.
+
+    Returns the updated service, or None if one of the properties in
+    expected did not match.
+    """
+    return IMPL.service_update_if(context, service_id, values, expected)
+
+
 ###################
 
 
@@ -1119,6 +1129,39 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
                                      user_id=user_id)
 
 
+def quota_reserve_optimistic(context, resources, quotas, user_quotas, deltas,
+                             expire, until_refresh, max_age, project_id=None,
+                             user_id=None, max_retries=3):
+    """Check quotas and create reservations without locking the project.
+
+    Returns None if the usage records first need to be created or
+    refreshed, or if every attempt lost a race with a concurrent
+    reservation, in which case the caller should use quota_reserve().
+    """
+    return IMPL.quota_reserve_optimistic(context, resources, quotas,
+                                         user_quotas, deltas, expire,
+                                         until_refresh, max_age,
+                                         project_id=project_id,
+                                         user_id=user_id,
+                                         max_retries=max_retries)
+
+
+def reservation_commit_optimistic(context, reservations, project_id=None,
+                                  user_id=None):
+    """Commit quota reservations without locking the project."""
+    return IMPL.reservation_commit_optimistic(context, reservations,
+                                              project_id=project_id,
+                                              user_id=user_id)
+
+
+def reservation_rollback_optimistic(context, reservations, project_id=None,
+                                    user_id=None):
+    """Roll back quota reservations without locking the project."""
+    return IMPL.reservation_rollback_optimistic(context, reservations,
+                                                project_id=project_id,
+                                                user_id=user_id)
+
+
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     """Destroy all quotas associated with a given project and user."""
     return IMPL.quota_destroy_all_by_project_and_user(context,
@@ -1191,6 +1234,13 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                                                          use_slave)
 
 
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    """Get all block device mappings belonging to a list of instances."""
+    return IMPL.block_device_mapping_get_all_by_instance_uuids(
+        context, instance_uuids, use_slave)
+
+
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
     """Get block device mapping for a given volume."""
@@ -1679,6 +1729,11 @@ def s3_image_get_by_uuid(context, image_uuid):
     return IMPL.s3_image_get_by_uuid(context, image_uuid)
 
 
+def s3_image_get_by_uuids(context, image_uuids):
+    """Find the local s3 images represented by the provided uuids."""
+    return IMPL.s3_image_get_by_uuids(context, image_uuids)
+
+
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid."""
     return IMPL.s3_image_create(context, image_uuid)
@@ -1836,6 +1891,10 @@ def ec2_instance_get_by_uuid(context, instance_uuid):
     return IMPL.ec2_instance_get_by_uuid(context, instance_uuid)
 
 
+def ec2_instance_get_by_uuids(context, instance_uuids):
+    return IMPL.ec2_instance_get_by_uuids(context, instance_uuids)
+
+
 def ec2_instance_get_by_id(context, instance_id):
     return IMPL.ec2_instance_get_by_id(context, instance_id)
 
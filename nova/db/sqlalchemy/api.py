@@ -21,8 +21,10 @@ import collections
 import copy
 import datetime
 import functools
+import random
 import sys
 import threading
+import time
 import uuid
 
 from oslo_config import cfg
@@ -547,6 +549,19 @@ def service_update(context, service_id, values):
     return service_ref
 
 
+def service_update_if(context, service_id, values, expected):
+    session = get_session()
+    with session.begin():
+        query = model_query(context, models.Service, session=session,
+                            read_deleted="no").\
+                    filter_by(id=service_id)
+        for key, value in expected.items():
+            query = query.filter(getattr(models.Service, key) == value)
+        if not query.update(values, synchronize_session=False):
+            return None
+        return _service_get(context, service_id, session=session)
+
+
 ###################
 
 def compute_node_get(context, compute_id):
@@ -3316,6 +3331,11 @@ def _get_project_user_quota_usages(context, session, project_id,
                    filter_by(project_id=project_id).\
                    with_lockmode('update').\
                    all()
+    return _sum_quota_usages(rows, user_id)
+
+
+def _sum_quota_usages(rows, user_id):
+    """Split QuotaUsage rows into project totals and the user's rows."""
     proj_result = dict()
     user_result = dict()
     # Get the total count of in_use,reserved
@@ -3452,6 +3472,36 @@ def _calculate_overquota(project_quotas, user_quotas, deltas,
     return overs
 
 
+def _raise_over_quota(project_quotas, user_quotas, deltas, overs,
+                      project_usages, user_usages):
+    if project_quotas == user_quotas:
+        usages = project_usages
+    else:
+        # NOTE(mriedem): user_usages is a dict of resource keys to
+        # QuotaUsage sqlalchemy dict-like objects and doen't log well
+        # so convert the user_usages values to something useful for
+        # logging. Remove this if we ever change how
+        # _get_project_user_quota_usages returns the user_usages values.
+        user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
+                               total=v['total'])
+                  for k, v in user_usages.items()}
+        usages = user_usages
+    usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
+              for k, v in usages.items()}
+    LOG.debug('Raise OverQuota exception because: '
+              'project_quotas: %(project_quotas)s, '
+              'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
+              'overs: %(overs)s, project_usages: %(project_usages)s, '
+              'user_usages: %(user_usages)s',
+              {'project_quotas': project_quotas,
+               'user_quotas': user_quotas,
+               'overs': overs, 'deltas': deltas,
+               'project_usages': project_usages,
+               'user_usages': user_usages})
+    raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                              usages=usages)
+
+
 @require_context
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
@@ -3572,32 +3622,8 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                         "resources: %s"), unders)
 
     if overs:
-        if project_quotas == user_quotas:
-            usages = project_usages
-        else:
-            # NOTE(mriedem): user_usages is a dict of resource keys to
-            # QuotaUsage sqlalchemy dict-like objects and doen't log well
-            # so convert the user_usages values to something useful for
-            # logging. Remove this if we ever change how
-            # _get_project_user_quota_usages returns the user_usages values.
-            user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
-                                   total=v['total'])
-                      for k, v in user_usages.items()}
-            usages = user_usages
-        usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
-                  for k, v in usages.items()}
-        LOG.debug('Raise OverQuota exception because: '
-                  'project_quotas: %(project_quotas)s, '
-                  'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
-                  'overs: %(overs)s, project_usages: %(project_usages)s, '
-                  'user_usages: %(user_usages)s',
-                  {'project_quotas': project_quotas,
-                   'user_quotas': user_quotas,
-                   'overs': overs, 'deltas': deltas,
-                   'project_usages': project_usages,
-                   'user_usages': user_usages})
-        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
-                                  usages=usages)
+        _raise_over_quota(project_quotas, user_quotas, deltas, overs,
+                          project_usages, user_usages)
 
     return reservations
 
@@ -3646,6 +3672,157 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
         reservation_query.soft_delete(synchronize_session=False)
 
 
+###################
+
+
+# NOTE: The *_optimistic variants below never take SELECT ... FOR UPDATE
+# locks on the project's quota_usages rows.  Usage rows are only modified
+# with relative UPDATEs ("reserved = reserved + delta") on the caller's own
+# rows, and a reservation is validated by re-reading the committed totals
+# *after* the increment: of two racing reservations, the one whose read
+# comes last always sees both increments, so the quota cannot be exceeded.
+# Creating missing usage rows and refreshing stale ones still go through
+# the locking quota_reserve() above.
+
+def _quota_usage_refresh_due(quota_usage, max_age):
+    """Side-effect free version of _is_quota_refresh_needed()."""
+    if quota_usage.in_use < 0:
+        return True
+    if quota_usage.until_refresh is not None:
+        return quota_usage.until_refresh - 1 <= 0
+    return bool(max_age and (timeutils.utcnow() -
+                             quota_usage.updated_at).seconds >= max_age)
+
+
+def _quota_usages_unlocked(context, project_id, user_id):
+    rows = model_query(context, models.QuotaUsage, read_deleted="no").\
+                   filter_by(project_id=project_id).\
+                   all()
+    return _sum_quota_usages(rows, user_id)
+
+
+def _reservations_settle(context, reservations, commit):
+    session = get_session()
+    with session.begin():
+        rows = model_query(context, models.Reservation, read_deleted="no",
+                           session=session).\
+                       filter(models.Reservation.uuid.in_(reservations)).\
+                       all()
+        for reservation in sorted(rows, key=lambda r: r.usage_id):
+            # Claim the reservation first so that a concurrent commit,
+            # rollback or expire can only apply it once.
+            claimed = model_query(context, models.Reservation,
+                                  read_deleted="no", session=session).\
+                              filter_by(id=reservation.id).\
+                              soft_delete(synchronize_session=False)
+            if not claimed:
+                continue
+
+            values = {}
+            if reservation.delta >= 0:
+                values['reserved'] = (models.QuotaUsage.reserved -
+                                      reservation.delta)
+            if commit:
+                values['in_use'] = (models.QuotaUsage.in_use +
+                                    reservation.delta)
+            if values:
+                model_query(context, models.QuotaUsage, session=session).\
+                        filter_by(id=reservation.usage_id).\
+                        update(values, synchronize_session=False)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def quota_reserve_optimistic(context, resources, project_quotas, user_quotas,
+                             deltas, expire, until_refresh, max_age,
+                             project_id=None, user_id=None, max_retries=3):
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    for attempt in range(max_retries + 1):
+        project_usages, user_usages = _quota_usages_unlocked(
+                context, project_id, user_id)
+
+        if any(res not in user_usages or
+               _quota_usage_refresh_due(user_usages[res], max_age)
+               for res in deltas):
+            # Let the locking path create or sync the usage rows.
+            return None
+
+        overs = _calculate_overquota(project_quotas, user_quotas, deltas,
+                                     project_usages, user_usages)
+        if overs:
+            _raise_over_quota(project_quotas, user_quotas, deltas, overs,
+                              project_usages, user_usages)
+
+        reservations = []
+        session = get_session()
+        with session.begin():
+            # Always touch rows in the same order to avoid deadlocks
+            # between concurrent requests of the same user.
+            for res in sorted(deltas):
+                delta = deltas[res]
+                usage = user_usages[res]
+                values = {}
+                if delta > 0:
+                    values['reserved'] = models.QuotaUsage.reserved + delta
+                if usage.until_refresh is not None:
+                    values['until_refresh'] = (
+                        models.QuotaUsage.until_refresh - 1)
+                if values:
+                    model_query(context, models.QuotaUsage,
+                                session=session).\
+                            filter_by(id=usage.id).\
+                            update(values, synchronize_session=False)
+                reservation = _reservation_create(str(uuid.uuid4()), usage,
+                                                  project_id, user_id, res,
+                                                  delta, expire,
+                                                  session=session)
+                reservations.append(reservation.uuid)
+
+        # Validate against the committed totals, which now include our own
+        # increments; a zero delta makes _calculate_overquota() check
+        # "limit < total".
+        increments = {res: 0 for res, delta in deltas.items() if delta > 0}
+        if not increments:
+            return reservations
+        project_usages, user_usages = _quota_usages_unlocked(
+                context, project_id, user_id)
+        overs = _calculate_overquota(project_quotas, user_quotas, increments,
+                                     project_usages, user_usages)
+        if not overs:
+            return reservations
+
+        # Lost a race with a concurrent reservation: back out and retry.
+        reservation_rollback_optimistic(context, reservations)
+        LOG.debug('Optimistic reservation of %(overs)s for project '
+                  '%(project_id)s conflicted, attempt %(attempt)d',
+                  {'overs': overs, 'project_id': project_id,
+                   'attempt': attempt + 1})
+        if attempt < max_retries:
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+    # The request may well fit once the concurrent ones are settled, let
+    # the locking path decide.
+    return None
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def reservation_commit_optimistic(context, reservations, project_id=None,
+                                  user_id=None):
+    _reservations_settle(context, reservations, commit=True)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def reservation_rollback_optimistic(context, reservations, project_id=None,
+                                    user_id=None):
+    _reservations_settle(context, reservations, commit=False)
+
+
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     session = get_session()
     with session.begin():
@@ -3701,12 +3878,20 @@ def reservation_expire(context):
                                         session=session, read_deleted="no").\
                             filter(models.Reservation.expire < current_time)
 
-        for reservation in reservation_query.join(models.QuotaUsage).all():
-            if reservation.delta >= 0:
-                reservation.usage.reserved -= reservation.delta
-                session.add(reservation.usage)
-
-        reservation_query.soft_delete(synchronize_session=False)
+        for reservation in reservation_query.all():
+            # Claim the reservation like _reservations_settle() does, so
+            # that one a concurrent commit or rollback settled is not
+            # released again.
+            claimed = model_query(context, models.Reservation,
+                                  read_deleted="no", session=session).\
+                              filter_by(id=reservation.id).\
+                              soft_delete(synchronize_session=False)
+            if claimed and reservation.delta >= 0:
+                model_query(context, models.QuotaUsage, session=session).\
+                        filter_by(id=reservation.usage_id).\
+                        update({'reserved': (models.QuotaUsage.reserved -
+                                             reservation.delta)},
+                               synchronize_session=False)
 
 
 ###################
@@ -3898,6 +4083,17 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                  all()
 
 
+@require_context
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    if not instance_uuids:
+        return []
+    return _block_device_mapping_get_query(context, use_slave=use_slave).\
+                 filter(models.BlockDeviceMapping.instance_uuid.in_(
+                     instance_uuids)).\
+                 all()
+
+
 @require_context
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
@@ -5299,6 +5495,15 @@ def s3_image_get_by_uuid(context, image_uuid):
     return result
 
 
+def s3_image_get_by_uuids(context, image_uuids):
+    """Find the local s3 images represented by the provided uuids."""
+    if not image_uuids:
+        return []
+    return model_query(context, models.S3Image, read_deleted="yes").\
+                 filter(models.S3Image.uuid.in_(image_uuids)).\
+                 all()
+
+
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid."""
     try:
@@ -5802,6 +6007,16 @@ def ec2_instance_get_by_uuid(context, instance_uuid):
     return result
 
 
+@require_context
+def ec2_instance_get_by_uuids(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return _ec2_instance_get_query(context).\
+                    filter(models.InstanceIdMapping.uuid.in_(
+                        instance_uuids)).\
+                    all()
+
+
 @require_context
 def ec2_instance_get_by_id(context, instance_id):
     result = _ec2_instance_get_query(context).\
@@ -457,6 +457,10 @@ class ComputeServiceInUse(NovaException):
     msg_fmt = _("Compute service of %(host)s is still in use.")
 
 
+class HostDrainInProgress(Invalid):
+    msg_fmt = _("Host %(host)s is already being drained of its instances.")
+
+
 class UnableToMigrateToSelf(Invalid):
     msg_fmt = _("Unable to migrate instance (%(instance_id)s) "
                 "to current host (%(host)s).")
@@ -21,9 +21,12 @@ import calendar
 import inspect
 import os
 import re
+import tempfile
 import time
 
+from eventlet import greenthread
 import netaddr
+from oslo_concurrency import lockutils
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -79,6 +82,19 @@ linux_net_opts = [
                help='Traffic to this range will always be snatted to the '
                     'fallback ip, even if it would normally be bridged out '
                     'of the node. Can be specified multiple times.'),
+    cfg.BoolOpt('dnsmasq_incremental_updates',
+                default=False,
+                help='Keep the contents of the dnsmasq hosts and options '
+                     'files of each network in memory, only rewrite them '
+                     '(atomically) when an entry changed and reload a '
+                     'running dnsmasq at most once per '
+                     'dnsmasq_reload_interval.'),
+    cfg.FloatOpt('dnsmasq_reload_interval',
+                 default=1.0,
+                 help='Minimum number of seconds between two reloads '
+                      '(SIGHUP) of the same dnsmasq when '
+                      'dnsmasq_incremental_updates is set.  Changes made in '
+                      'between are picked up by a single reload.'),
     cfg.StrOpt('dnsmasq_config_file',
                default='',
                help='Override the default dnsmasq settings with this file'),
@@ -1046,10 +1062,115 @@ def update_dhcp(context, dev, network_ref):
     fixedips = objects.FixedIPList.get_by_network(context,
                                                   network_ref,
                                                   host=host)
+    if CONF.dnsmasq_incremental_updates:
+        _update_dhcp_incremental(context, dev, network_ref, fixedips)
+        return
     write_to_file(conffile, get_dhcp_hosts(context, network_ref, fixedips))
     restart_dhcp(context, dev, network_ref, fixedips)
 
 
+# NOTE: State for CONF.dnsmasq_incremental_updates.  The last contents
+#       written to each dnsmasq file, keyed by (dev, kind), and the time of
+#       the last reload and any reload waiting to be sent, keyed by dev.
+_dnsmasq_files = {}
+_dnsmasq_last_reload = {}
+_dnsmasq_pending_reloads = {}
+
+
+def _update_dhcp_incremental(context, dev, network_ref, fixedips):
+    """Update the dnsmasq of a network with as little work as possible.
+
+    The hosts and options files are only rewritten if their contents
+    changed since they were last written, and a running dnsmasq is told
+    to reload them through _schedule_dnsmasq_reload(), which coalesces
+    bursts of updates into a single SIGHUP.  The iptables rules dnsmasq
+    needs are added either way.  If dnsmasq isn't running, it
+    is started with restart_dhcp() as usual.
+    """
+    conffile = _dhcp_file(dev, 'conf')
+    hosts = get_dhcp_hosts(context, network_ref, fixedips)
+    opts = get_dhcp_opts(context, network_ref, fixedips)
+    with lockutils.lock('dnsmasq-%s' % dev):
+        pid = _dnsmasq_pid_for(dev)
+        if not pid or not is_pid_cmdline_correct(pid,
+                                                  conffile.split('/')[-1]):
+            _write_dnsmasq_file(dev, 'conf', hosts)
+            _write_dnsmasq_file(dev, 'opts', opts)
+            restart_dhcp(context, dev, network_ref, fixedips)
+            return
+        changed = _write_dnsmasq_file(dev, 'conf', hosts)
+        changed = _write_dnsmasq_file(dev, 'opts', opts) or changed
+    # Like restart_dhcp(), make sure the rules are in place on every
+    # update: they are gone if nova-network restarted while dnsmasq kept
+    # running.
+    _add_dhcp_mangle_rule(dev)
+    _add_dnsmasq_accept_rules(dev)
+    if changed:
+        _schedule_dnsmasq_reload(dev)
+
+
+def _write_dnsmasq_file(dev, kind, data):
+    """Atomically replace a dnsmasq file if its contents changed.
+
+    Returns True if the file was written.
+    """
+    if _dnsmasq_files.get((dev, kind)) == data:
+        return False
+    path = _dhcp_file(dev, kind)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                    prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        # Make sure dnsmasq can actually read it (it setuid()s to "nobody")
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except Exception:
+        with excutils.save_and_reraise_exception():
+            _dnsmasq_files.pop((dev, kind), None)
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    _dnsmasq_files[(dev, kind)] = data
+    return True
+
+
+def _schedule_dnsmasq_reload(dev):
+    """Send a running dnsmasq a SIGHUP, at most once per
+    CONF.dnsmasq_reload_interval.  A reload already waiting to be sent
+    picks up any change made before it goes out.
+    """
+    if dev in _dnsmasq_pending_reloads:
+        return
+    delay = max(0, _dnsmasq_last_reload.get(dev, 0) +
+                CONF.dnsmasq_reload_interval - time.time())
+    _dnsmasq_pending_reloads[dev] = greenthread.spawn_after(
+        delay, _reload_dnsmasq, dev)
+
+
+def _reload_dnsmasq(dev):
+    _dnsmasq_pending_reloads.pop(dev, None)
+    _dnsmasq_last_reload[dev] = time.time()
+    pid = _dnsmasq_pid_for(dev)
+    conffile = _dhcp_file(dev, 'conf')
+    if not pid or not is_pid_cmdline_correct(pid, conffile.split('/')[-1]):
+        LOG.debug('dnsmasq for %s is not running, skipping reload', dev)
+        return
+    try:
+        _execute('kill', '-HUP', pid, run_as_root=True)
+    except Exception as exc:
+        LOG.error(_LE('kill -HUP dnsmasq threw %s'), exc)
+
+
+def _forget_dnsmasq(dev):
+    """Drop the incremental update state of a dnsmasq."""
+    for kind in ('conf', 'opts'):
+        _dnsmasq_files.pop((dev, kind), None)
+    _dnsmasq_last_reload.pop(dev, None)
+    pending = _dnsmasq_pending_reloads.pop(dev, None)
+    if pending is not None:
+        pending.cancel()
+
+
 def update_dns(context, dev, network_ref):
     hostsfile = _dhcp_file(dev, 'hosts')
     host = None
@@ -1065,6 +1186,7 @@ def update_dns(context, dev, network_ref):
 def update_dhcp_hostfile_with_text(dev, hosts_text):
     conffile = _dhcp_file(dev, 'conf')
     write_to_file(conffile, hosts_text)
+    _dnsmasq_files.pop((dev, 'conf'), None)
 
 
 def kill_dhcp(dev):
@@ -1076,6 +1198,7 @@ def kill_dhcp(dev):
             _execute('kill', '-9', pid, run_as_root=True)
         else:
             LOG.debug('Pid %d is stale, skip killing dnsmasq', pid)
+    _forget_dnsmasq(dev)
     _remove_dnsmasq_accept_rules(dev)
     _remove_dhcp_mangle_rule(dev)
 
@@ -19,6 +19,7 @@ the system.
 """
 
 import datetime
+import weakref
 
 from oslo_config import cfg
 from oslo_context import context as common_context
@@ -62,6 +63,12 @@ notify_opts = [
 CONF = cfg.CONF
 CONF.register_opts(notify_opts)
 
+# Per request context memo of the parts of an instance payload which do not
+# change while the instance bounces through its states, keyed by
+# (instance uuid, image_ref, instance_type_id).  Entries go away together
+# with the context they were built for.
+_STATIC_INFO_CACHE = weakref.WeakKeyDictionary()
+
 
 def notify_decorator(name, fn):
     """Decorator for notify which is used from utils.monkey_patch().
@@ -115,8 +122,8 @@ def send_update(context, old_instance, new_instance, service="compute",
     in that instance
     """
 
-    if not CONF.notify_on_state_change:
-        # skip all this if updates are disabled
+    if not CONF.notify_on_state_change or not rpc.notifications_enabled():
+        # skip all this if updates are disabled or would just be dropped
         return
 
     update_with_state_change = False
@@ -167,8 +174,8 @@ def send_update_with_states(context, instance, old_vm_state, new_vm_state,
     are any, in the instance
     """
 
-    if not CONF.notify_on_state_change:
-        # skip all this if updates are disabled
+    if not CONF.notify_on_state_change or not rpc.notifications_enabled():
+        # skip all this if updates are disabled or would just be dropped
         return
 
     fire_update = True
@@ -350,6 +357,35 @@ def image_meta(system_metadata):
     return image_meta
 
 
+def _build_static_instance_info(instance):
+    image_ref_url = glance.generate_image_url(instance.image_ref)
+
+    instance_type = instance.get_flavor()
+    instance_type_name = instance_type.get('name', '')
+    instance_flavorid = instance_type.get('flavorid', '')
+    return image_ref_url, instance_type_name, instance_flavorid
+
+
+def _static_instance_info(context, instance):
+    """Return the image URL and flavor name/id for an instance.
+
+    A single request usually sends several notifications for the same
+    instance (e.g. every task_state transition during a build), so the
+    result is memoized on the request context.
+    """
+    try:
+        cache = _STATIC_INFO_CACHE.setdefault(context, {})
+    except TypeError:
+        # No context, or one that cannot be weakly referenced.
+        return _build_static_instance_info(instance)
+
+    key = (instance.uuid, instance.image_ref, instance.instance_type_id)
+    info = cache.get(key)
+    if info is None:
+        info = cache[key] = _build_static_instance_info(instance)
+    return info
+
+
 def info_from_instance(context, instance, network_info,
                 system_metadata, **kw):
     """Get detailed instance information for an instance which is common to all
@@ -379,11 +415,8 @@ def info_from_instance(context, instance, network_info,
         else:
             return str(s) if s else ''
 
-    image_ref_url = glance.generate_image_url(instance.image_ref)
-
-    instance_type = instance.get_flavor()
-    instance_type_name = instance_type.get('name', '')
-    instance_flavorid = instance_type.get('flavorid', '')
+    image_ref_url, instance_type_name, instance_flavorid = (
+        _static_instance_info(context, instance))
 
     instance_info = dict(
         # Owner properties
@@ -261,7 +261,8 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
     # Version 1.12: BlockDeviceMapping <= version 1.11
     # Version 1.13: BlockDeviceMapping <= version 1.12
     # Version 1.14: BlockDeviceMapping <= version 1.13
-    VERSION = '1.14'
+    # Version 1.15: Added get_by_instance_uuids
+    VERSION = '1.15'
 
     fields = {
         'objects': fields.ListOfObjectsField('BlockDeviceMapping'),
@@ -271,7 +272,8 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
                     ('1.3', '1.2'), ('1.4', '1.3'), ('1.5', '1.4'),
                     ('1.6', '1.5'), ('1.7', '1.6'), ('1.8', '1.7'),
                     ('1.9', '1.8'), ('1.10', '1.9'), ('1.11', '1.10'),
-                    ('1.12', '1.11'), ('1.13', '1.12'), ('1.14', '1.13')],
+                    ('1.12', '1.11'), ('1.13', '1.12'), ('1.14', '1.13'),
+                    ('1.15', '1.13')],
     }
 
     @base.remotable_classmethod
@@ -281,6 +283,13 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(
                 context, cls(), objects.BlockDeviceMapping, db_bdms or [])
 
+    @base.remotable_classmethod
+    def get_by_instance_uuids(cls, context, instance_uuids, use_slave=False):
+        db_bdms = db.block_device_mapping_get_all_by_instance_uuids(
+                context, instance_uuids, use_slave=use_slave)
+        return base.obj_make_list(
+                context, cls(), objects.BlockDeviceMapping, db_bdms or [])
+
     def root_bdm(self):
         try:
             return next(bdm_obj for bdm_obj in self if bdm_obj.is_root)
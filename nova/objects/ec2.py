@@ -60,6 +60,25 @@ class EC2InstanceMapping(base.NovaPersistentObject, base.NovaObject,
             return cls._from_db_object(context, cls(), db_imap)
 
 
+@base.NovaObjectRegistry.register
+class EC2InstanceMappingList(base.ObjectListBase, base.NovaObject):
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+
+    fields = {
+        'objects': fields.ListOfObjectsField('EC2InstanceMapping'),
+    }
+    obj_relationships = {
+        'objects': [('1.0', '1.0')],
+    }
+
+    @base.remotable_classmethod
+    def get_by_uuids(cls, context, instance_uuids):
+        db_imaps = db.ec2_instance_get_by_uuids(context, instance_uuids)
+        return base.obj_make_list(context, cls(context), EC2InstanceMapping,
+                                  db_imaps)
+
+
 # TODO(berrange): Remove NovaObjectDictCompat
 @base.NovaObjectRegistry.register
 class EC2VolumeMapping(base.NovaPersistentObject, base.NovaObject,
@@ -183,6 +202,25 @@ class S3ImageMapping(base.NovaPersistentObject, base.NovaObject,
             return cls._from_db_object(context, cls(context), db_s3imap)
 
 
+@base.NovaObjectRegistry.register
+class S3ImageMappingList(base.ObjectListBase, base.NovaObject):
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+
+    fields = {
+        'objects': fields.ListOfObjectsField('S3ImageMapping'),
+    }
+    obj_relationships = {
+        'objects': [('1.0', '1.0')],
+    }
+
+    @base.remotable_classmethod
+    def get_by_uuids(cls, context, s3_image_uuids):
+        db_s3imaps = db.s3_image_get_by_uuids(context, s3_image_uuids)
+        return base.obj_make_list(context, cls(context), S3ImageMapping,
+                                  db_s3imaps)
+
+
 @base.NovaObjectRegistry.register
 class EC2Ids(base.NovaObject):
     # Version 1.0: Initial version
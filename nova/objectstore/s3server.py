@@ -34,17 +34,21 @@ S3 client with this module::
 
 import bisect
 import datetime
+import hashlib
 import os
 import os.path
+import tempfile
 import urllib
 
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_log import versionutils
+from oslo_utils import excutils
 from oslo_utils import fileutils
 import routes
 import six
 import webob
+import webob.static
 
 from nova.i18n import _LW
 from nova import paths
@@ -65,11 +69,19 @@ s3_opts = [
     cfg.IntOpt('s3_listen_port',
                default=3333,
                help='Port for S3 API to listen'),
+    cfg.IntOpt('s3_chunk_size',
+               default=64 * 1024,
+               help='Size in bytes of the chunks objects are read and '
+                    'written in'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(s3_opts)
 
+# Objects being uploaded are written under this prefix and renamed into
+# place when complete; bucket listings skip them.
+_PARTIAL_PREFIX = '.s3-partial-'
+
 
 def get_wsgi_server():
     return wsgi.Server("S3 Objectstore",
@@ -256,6 +268,8 @@ class BucketHandler(BaseRequestHandler):
         object_names = []
         for root, dirs, files in os.walk(path):
             for file_name in files:
+                if file_name.startswith(_PARTIAL_PREFIX):
+                    continue
                 object_names.append(os.path.join(root, file_name))
         skip = len(path) + 1
         for i in range(self.application.bucket_depth):
@@ -332,6 +346,28 @@ class BucketHandler(BaseRequestHandler):
         self.finish()
 
 
+class _ObjectFileIter(webob.static.FileIter):
+    """Chunked, range aware iterator over an object file.
+
+    webob uses app_iter_range to answer Range requests without reading the
+    skipped part of the file; close() makes sure the file is released even
+    when the body is never iterated.
+    """
+
+    def __init__(self, file, block_size):
+        super(_ObjectFileIter, self).__init__(file)
+        self.block_size = block_size
+
+    def app_iter_range(self, seek=None, limit=None, block_size=None):
+        return super(_ObjectFileIter, self).app_iter_range(
+            seek, limit, block_size or self.block_size)
+
+    __iter__ = app_iter_range
+
+    def close(self):
+        self.file.close()
+
+
 class ObjectHandler(BaseRequestHandler):
     def get(self, bucket, object_name):
         object_name = urllib.unquote(object_name)
@@ -344,11 +380,26 @@ class ObjectHandler(BaseRequestHandler):
         self.set_header("Content-Type", "application/unknown")
         self.set_header("Last-Modified", datetime.datetime.utcfromtimestamp(
             info.st_mtime))
-        object_file = open(path, "r")
-        try:
-            self.finish(object_file.read())
-        finally:
-            object_file.close()
+        self.set_header("Accept-Ranges", "bytes")
+        object_file = open(path, "rb")
+        file_wrapper = self.request.environ.get('wsgi.file_wrapper')
+        if file_wrapper and self.request.range is None:
+            # Let the server send the file itself (sendfile or similar)
+            # when it offers to; ranges still go through webob below.
+            self.response.app_iter = file_wrapper(object_file,
+                                                  CONF.s3_chunk_size)
+        else:
+            self.response.app_iter = _ObjectFileIter(object_file,
+                                                     CONF.s3_chunk_size)
+        # NOTE: assigning app_iter resets the length, so set it afterwards.
+        self.response.content_length = info.st_size
+        # Turns a Range request into a 206 (or 416) response served from
+        # app_iter_range.
+        self.response.conditional_response = True
+
+    def head(self, bucket, object_name):
+        # webob drops the body of HEAD responses without iterating it.
+        self.get(bucket, object_name)
 
     def put(self, bucket, object_name):
         object_name = urllib.unquote(object_name)
@@ -364,11 +415,27 @@ class ObjectHandler(BaseRequestHandler):
             return
         directory = os.path.dirname(path)
         fileutils.ensure_tree(directory)
-        object_file = open(path, "w")
-        object_file.write(self.request.body)
-        object_file.close()
-        self.set_header('ETag',
-                        '"%s"' % utils.get_hash_str(self.request.body))
+        # Stream the body into a temporary file next to the object, hashing
+        # as we go, and only rename it into place once it is complete so
+        # that readers never see a partial object.
+        fd, tmp_path = tempfile.mkstemp(dir=directory,
+                                        prefix=_PARTIAL_PREFIX)
+        try:
+            os.fchmod(fd, 0o644)
+            md5 = hashlib.md5()
+            with os.fdopen(fd, 'wb') as object_file:
+                body_file = self.request.body_file
+                while True:
+                    chunk = body_file.read(CONF.s3_chunk_size)
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    object_file.write(chunk)
+            os.rename(tmp_path, path)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                fileutils.delete_if_exists(tmp_path)
+        self.set_header('ETag', '"%s"' % md5.hexdigest())
         self.finish()
 
     def delete(self, bucket, object_name):
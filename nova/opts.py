@@ -22,6 +22,7 @@ import nova.cmd.serialproxy
 import nova.cmd.spicehtml5proxy
 import nova.conductor.api
 import nova.conductor.rpcapi
+import nova.conductor.tasks.drain
 import nova.conductor.tasks.live_migrate
 import nova.console.manager
 import nova.console.rpcapi
@@ -67,7 +68,9 @@ def list_opts():
     return [
         ('DEFAULT',
          itertools.chain(
+             nova.conductor.tasks.drain.drain_opts,
              [nova.conductor.tasks.live_migrate.migrate_opt],
+             [nova.conductor.tasks.live_migrate.migrate_candidates_opt],
              [nova.consoleauth.consoleauth_topic_opt],
              [nova.db.base.db_driver_opt],
              [nova.ipv6.api.ipv6_backend_opt],
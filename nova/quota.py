@@ -96,6 +96,12 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
                help='Default driver to use for quota checks'),
+    cfg.IntOpt('quota_optimistic_retries',
+               default=3,
+               help='Number of times OptimisticDbQuotaDriver retries a '
+                    'reservation which lost a race with a concurrent one '
+                    'before falling back to the locking DbQuotaDriver '
+                    'reservation'),
     ]
 
 CONF = cfg.CONF
@@ -572,6 +578,11 @@ class DbQuotaDriver(object):
                   {'project_id': project_id, 'user_id': user_id,
                    'quotas': quotas})
 
+        return self._reserve(context, resources, quotas, user_quotas,
+                             deltas, expire, project_id, user_id)
+
+    def _reserve(self, context, resources, quotas, user_quotas, deltas,
+                 expire, project_id, user_id):
         # NOTE(Vek): Most of the work here has to be done in the DB
         #            API, because we have to do it in a transaction,
         #            which means access to the session.  Since the
@@ -690,6 +701,62 @@ class DbQuotaDriver(object):
         db.reservation_expire(context)
 
 
+class OptimisticDbQuotaDriver(DbQuotaDriver):
+    """Database quota driver which avoids project-wide row locks.
+
+    DbQuotaDriver serializes every reservation, commit and rollback of a
+    project on SELECT ... FOR UPDATE locks over all of the project's quota
+    usage records, so one large tenant booting many instances at once
+    queues all API workers behind each other.  This driver instead applies
+    relative updates to the requesting user's usage records and validates
+    the result afterwards, backing out and retrying a bounded number of
+    times if a concurrent reservation pushed the project over quota.
+
+    Usage records which have to be created or refreshed, and reservations
+    which kept losing races, are still handled by the locking DbQuotaDriver
+    code path.
+    """
+
+    def _reserve(self, context, resources, quotas, user_quotas, deltas,
+                 expire, project_id, user_id):
+        reservations = db.quota_reserve_optimistic(
+            context, resources, quotas, user_quotas, deltas, expire,
+            CONF.until_refresh, CONF.max_age,
+            project_id=project_id, user_id=user_id,
+            max_retries=CONF.quota_optimistic_retries)
+        if reservations is None:
+            reservations = super(OptimisticDbQuotaDriver, self)._reserve(
+                context, resources, quotas, user_quotas, deltas, expire,
+                project_id, user_id)
+        return reservations
+
+    def commit(self, context, reservations, project_id=None, user_id=None):
+        """Commit reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, the reservations identify their usage
+                           records.
+        :param user_id: Unused, the reservations identify their usage
+                        records.
+        """
+        db.reservation_commit_optimistic(context, reservations)
+
+    def rollback(self, context, reservations, project_id=None, user_id=None):
+        """Roll back reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, the reservations identify their usage
+                           records.
+        :param user_id: Unused, the reservations identify their usage
+                        records.
+        """
+        db.reservation_rollback_optimistic(context, reservations)
+
+
 class NoopQuotaDriver(object):
     """Driver that turns quotas calls into no-ops and pretends that quotas
     for all resources are unlimited.  This can be used if you do not
@@ -23,6 +23,7 @@ __all__ = [
     'get_client',
     'get_server',
     'get_notifier',
+    'notifications_enabled',
     'TRANSPORT_ALIASES',
 ]
 
@@ -140,6 +141,20 @@ def get_server(target, endpoints, serializer=None):
                                     serializer=serializer)
 
 
+def notifications_enabled():
+    """Return whether the configured notifier will emit anything at all.
+
+    With no notification_driver configured, or only the 'noop' driver,
+    oslo.messaging silently drops every notification, so callers that
+    build expensive payloads can check this first and skip the work.
+    """
+    if NOTIFIER is None:
+        # Not initialized yet, and notification_driver is only registered
+        # by the first Notifier; assume it sends.
+        return True
+    return any(driver != 'noop' for driver in CONF.notification_driver)
+
+
 def get_notifier(service, host=None, publisher_id=None):
     assert NOTIFIER is not None
     if not publisher_id:
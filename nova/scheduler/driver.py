@@ -52,9 +52,10 @@ class Scheduler(object):
         """Return the list of hosts that have a running service for topic."""
 
         services = db.service_get_all_by_topic(context, topic)
+        up_hosts = self.servicegroup_api.get_up_services(topic, services)
         return [service['host']
                 for service in services
-                if self.servicegroup_api.service_is_up(service)]
+                if service['host'] in up_hosts]
 
     def select_destinations(self, context, request_spec, filter_properties):
         """Must override select_destinations method.
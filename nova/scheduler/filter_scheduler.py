@@ -59,7 +59,12 @@ class FilterScheduler(driver.Scheduler):
         self.notifier = rpc.get_notifier('scheduler')
 
     def select_destinations(self, context, request_spec, filter_properties):
-        """Selects a filtered set of hosts and nodes."""
+        """Selects a filtered set of hosts and nodes.
+
+        When a single instance is requested and filter_properties holds
+        num_candidates, up to that many hosts are returned, the selected one
+        first and then the other hosts that passed the filters by weight.
+        """
         self.notifier.info(context, 'scheduler.select_destinations.start',
                            dict(request_spec=request_spec))
 
@@ -108,6 +113,7 @@ class FilterScheduler(driver.Scheduler):
         instance_type = request_spec.get("instance_type", None)
 
         update_group_hosts = filter_properties.get('group_updated', False)
+        num_candidates = filter_properties.get('num_candidates', 1)
 
         config_options = self._get_configuration_options()
 
@@ -153,6 +159,14 @@ class FilterScheduler(driver.Scheduler):
                 weighed_hosts[0:scheduler_host_subset_size])
             LOG.debug("Selected host: %(host)s", {'host': chosen_host})
             selected_hosts.append(chosen_host)
+            if num_instances == 1 and num_candidates > 1:
+                # The caller asked for alternates to the chosen host, ranked
+                # by weight, in case it turns out to be unsuitable.  Only one
+                # of them will be used, so only the chosen host consumes the
+                # resources below.
+                alternates = [host for host in weighed_hosts
+                              if host is not chosen_host]
+                selected_hosts.extend(alternates[:num_candidates - 1])
 
             # Now consume the resources so the filter/weights
             # will change for the next instance.
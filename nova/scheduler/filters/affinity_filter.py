@@ -17,6 +17,7 @@
 
 import netaddr
 from oslo_log import log as logging
+import six
 
 from nova.scheduler import filters
 from nova.scheduler.filters import utils
@@ -24,12 +25,36 @@ from nova.scheduler.filters import utils
 LOG = logging.getLogger(__name__)
 
 
+def _hinted_uuids(filter_properties, hint):
+    scheduler_hints = filter_properties.get('scheduler_hints') or {}
+    uuids = scheduler_hints.get(hint, [])
+    if isinstance(uuids, six.string_types):
+        uuids = [uuids]
+    return uuids
+
+
 class DifferentHostFilter(filters.BaseHostFilter):
     '''Schedule the instance on a different host from a set of instances.'''
 
     # The hosts the instances are running on doesn't change within a request
     run_filter_once_per_request = True
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts having none of the instances.
+
+        If the hosts share an instance index, the hosts of the instances
+        are taken from it rather than looked for in every host.
+        """
+        host_states = list(filter_obj_list)
+        index = utils.instance_index(host_states)
+        affinity_uuids = _hinted_uuids(filter_properties, 'different_host')
+        if index is None or not affinity_uuids:
+            return super(DifferentHostFilter, self).filter_all(
+                host_states, filter_properties)
+        hosts = index.hosts_of_instances(affinity_uuids)
+        return (host_state for host_state in host_states
+                if host_state.host not in hosts)
+
     def host_passes(self, host_state, filter_properties):
         scheduler_hints = filter_properties.get('scheduler_hints') or {}
 
@@ -49,6 +74,22 @@ class SameHostFilter(filters.BaseHostFilter):
     # The hosts the instances are running on doesn't change within a request
     run_filter_once_per_request = True
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts having one of the instances, or no instance.
+
+        If the hosts share an instance index, the hosts of the instances
+        are taken from it rather than looked for in every host.
+        """
+        host_states = list(filter_obj_list)
+        index = utils.instance_index(host_states)
+        affinity_uuids = _hinted_uuids(filter_properties, 'same_host')
+        if index is None or not affinity_uuids:
+            return super(SameHostFilter, self).filter_all(
+                host_states, filter_properties)
+        hosts = index.hosts_of_instances(affinity_uuids)
+        return (host_state for host_state in host_states
+                if host_state.host in hosts or not host_state.instances)
+
     def host_passes(self, host_state, filter_properties):
         scheduler_hints = filter_properties.get('scheduler_hints') or {}
 
@@ -87,6 +128,18 @@ class _GroupAntiAffinityFilter(filters.BaseHostFilter):
     """Schedule the instance on a different host from a set of group
     hosts.
     """
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts not in the group, looked up in a set."""
+        policies = filter_properties.get('group_policies', [])
+        group_hosts = filter_properties.get('group_hosts') or []
+        if self.policy_name not in policies or not group_hosts:
+            return filter_obj_list
+        LOG.debug("Group anti affinity: filtering out hosts in "
+                  "%(configured)s", {'configured': group_hosts})
+        group_hosts = set(group_hosts)
+        return (host_state for host_state in filter_obj_list
+                if host_state.host not in group_hosts)
+
     def host_passes(self, host_state, filter_properties):
         # Only invoke the filter is 'anti-affinity' is configured
         policies = filter_properties.get('group_policies', [])
@@ -113,6 +166,18 @@ class ServerGroupAntiAffinityFilter(_GroupAntiAffinityFilter):
 class _GroupAffinityFilter(filters.BaseHostFilter):
     """Schedule the instance on to host from a set of group hosts.
     """
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts in the group, looked up in a set."""
+        policies = filter_properties.get('group_policies', [])
+        group_hosts = filter_properties.get('group_hosts', [])
+        if self.policy_name not in policies or not group_hosts:
+            return filter_obj_list
+        LOG.debug("Group affinity: keeping hosts in %(configured)s",
+                  {'configured': group_hosts})
+        group_hosts = set(group_hosts)
+        return (host_state for host_state in filter_obj_list
+                if host_state.host in group_hosts)
+
     def host_passes(self, host_state, filter_properties):
         # Only invoke the filter is 'affinity' is configured
         policies = filter_properties.get('group_policies', [])
@@ -40,6 +40,41 @@ class AggregateImagePropertiesIsolation(filters.BaseHostFilter):
     # Aggregate data and instance type does not change within a request
     run_filter_once_per_request = True
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts whose aggregates allow the image properties.
+
+        If the hosts share an aggregate index, the hosts having a
+        conflicting value for one of the image properties are taken from it
+        rather than looked up host by host.
+        """
+        host_states = list(filter_obj_list)
+        index = utils.aggregate_index(host_states)
+        if index is None:
+            return super(AggregateImagePropertiesIsolation, self).filter_all(
+                host_states, filter_properties)
+        return self._filter_indexed(host_states, index, filter_properties)
+
+    def _filter_indexed(self, host_states, index, filter_properties):
+        cfg_namespace = CONF.aggregate_image_properties_isolation_namespace
+        cfg_separator = CONF.aggregate_image_properties_isolation_separator
+
+        spec = filter_properties.get('request_spec', {})
+        image_props = spec.get('image', {}).get('properties', {})
+        excluded = set()
+        for key, prop in six.iteritems(image_props):
+            if (not prop or cfg_namespace and
+                    not key.startswith(cfg_namespace + cfg_separator)):
+                continue
+            excluded |= (index.hosts_with_key(key) -
+                         index.hosts_with_value(key, prop))
+
+        for host_state in host_states:
+            if host_state.host in excluded:
+                LOG.debug("%(host_state)s fails image aggregate properties "
+                          "requirements.", {'host_state': host_state})
+            else:
+                yield host_state
+
     def host_passes(self, host_state, filter_properties):
         """Checks a host in an aggregate that metadata key/value match
         with image properties.
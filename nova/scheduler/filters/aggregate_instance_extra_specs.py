@@ -27,12 +27,70 @@ LOG = logging.getLogger(__name__)
 _SCOPE = 'aggregate_instance_extra_specs'
 
 
+def _aggregate_specs(extra_specs):
+    """Yield the (key, requirement) of the extra specs aggregates must match.
+
+    Those are the unscoped extra specs and the ones of the
+    aggregate_instance_extra_specs scope, whose scope is dropped.
+    """
+    for key, req in six.iteritems(extra_specs):
+        scope = key.split(':', 1)
+        if len(scope) > 1:
+            if scope[0] != _SCOPE:
+                continue
+            else:
+                del scope[0]
+        yield scope[0], req
+
+
+def _is_literal(req):
+    """Whether a requirement only matches a value equal to it."""
+    words = req.split()
+    op = words[0] if words else None
+    return op != '<or>' and op not in extra_specs_ops.op_methods
+
+
 class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
     """AggregateInstanceExtraSpecsFilter works with InstanceType records."""
 
     # Aggregate data and instance type does not change within a request
     run_filter_once_per_request = True
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts whose aggregates match the extra specs.
+
+        If the hosts share an aggregate index, the hosts lacking a key of
+        the extra specs, or an exact value required, are pruned with it
+        before the remaining ones are checked host by host.
+        """
+        host_states = list(filter_obj_list)
+        index = utils.aggregate_index(host_states)
+        instance_type = filter_properties.get('instance_type')
+        if index is None or 'extra_specs' not in instance_type:
+            return super(AggregateInstanceExtraSpecsFilter, self).filter_all(
+                host_states, filter_properties)
+        return self._filter_indexed(host_states, index, filter_properties)
+
+    def _filter_indexed(self, host_states, index, filter_properties):
+        extra_specs = filter_properties['instance_type']['extra_specs']
+        candidates = None
+        for key, req in _aggregate_specs(extra_specs):
+            if _is_literal(req):
+                hosts = index.hosts_with_value(key, req)
+            else:
+                hosts = index.hosts_with_key(key)
+            if candidates is None:
+                candidates = set(hosts)
+            else:
+                candidates &= hosts
+
+        for host_state in host_states:
+            if candidates is not None and host_state.host not in candidates:
+                LOG.debug("%(host_state)s fails instance_type extra_specs "
+                          "requirements.", {'host_state': host_state})
+            elif self.host_passes(host_state, filter_properties):
+                yield host_state
+
     def host_passes(self, host_state, filter_properties):
         """Return a list of hosts that can create instance_type
 
@@ -45,15 +103,7 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
 
         metadata = utils.aggregate_metadata_get_by_host(host_state)
 
-        for key, req in six.iteritems(instance_type['extra_specs']):
-            # Either not scope format, or aggregate_instance_extra_specs scope
-            scope = key.split(':', 1)
-            if len(scope) > 1:
-                if scope[0] != _SCOPE:
-                    continue
-                else:
-                    del scope[0]
-            key = scope[0]
+        for key, req in _aggregate_specs(instance_type['extra_specs']):
             aggregate_vals = metadata.get(key, None)
             if not aggregate_vals:
                 LOG.debug("%(host_state)s fails instance_type extra_specs "
@@ -28,6 +28,35 @@ class AggregateMultiTenancyIsolation(filters.BaseHostFilter):
     # Aggregate data and tenant do not change within a request
     run_filter_once_per_request = True
 
+    @staticmethod
+    def _requested_tenant(filter_properties):
+        spec = filter_properties.get('request_spec', {})
+        props = spec.get('instance_properties', {})
+        return props.get('project_id')
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts the tenant may use.
+
+        If the hosts share an aggregate index, the isolated hosts and those
+        of the tenant are taken from it rather than looked up host by host.
+        """
+        host_states = list(filter_obj_list)
+        index = utils.aggregate_index(host_states)
+        if index is None:
+            return super(AggregateMultiTenancyIsolation, self).filter_all(
+                host_states, filter_properties)
+        return self._filter_indexed(host_states, index,
+                                    self._requested_tenant(filter_properties))
+
+    def _filter_indexed(self, host_states, index, tenant_id):
+        isolated = index.hosts_with_key('filter_tenant_id')
+        allowed = index.hosts_with_value('filter_tenant_id', tenant_id)
+        for host_state in host_states:
+            if host_state.host in isolated and host_state.host not in allowed:
+                LOG.debug("%s fails tenant id on aggregate", host_state)
+            else:
+                yield host_state
+
     def host_passes(self, host_state, filter_properties):
         """If a host is in an aggregate that has the metadata key
         "filter_tenant_id" it can only create instances from that tenant(s).
@@ -36,9 +65,7 @@ class AggregateMultiTenancyIsolation(filters.BaseHostFilter):
         If a host doesn't belong to an aggregate with the metadata key
         "filter_tenant_id" it can create instances from all tenants.
         """
-        spec = filter_properties.get('request_spec', {})
-        props = spec.get('instance_properties', {})
-        tenant_id = props.get('project_id')
+        tenant_id = self._requested_tenant(filter_properties)
 
         metadata = utils.aggregate_metadata_get_by_host(host_state,
                                                         key="filter_tenant_id")
@@ -36,10 +36,49 @@ class AvailabilityZoneFilter(filters.BaseHostFilter):
     # Availability zones do not change within a request
     run_filter_once_per_request = True
 
-    def host_passes(self, host_state, filter_properties):
+    @staticmethod
+    def _requested_zone(filter_properties):
         spec = filter_properties.get('request_spec', {})
         props = spec.get('instance_properties', {})
-        availability_zone = props.get('availability_zone')
+        return props.get('availability_zone')
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts in the requested availability zone.
+
+        If the hosts share an aggregate index, the hosts of the zone are
+        taken from it at once rather than looked up host by host.
+        """
+        host_states = list(filter_obj_list)
+        index = utils.aggregate_index(host_states)
+        availability_zone = self._requested_zone(filter_properties)
+        if index is None or not availability_zone:
+            return super(AvailabilityZoneFilter, self).filter_all(
+                host_states, filter_properties)
+        return self._filter_indexed(host_states, index, availability_zone)
+
+    def _filter_indexed(self, host_states, index, availability_zone):
+        in_zone = index.hosts_with_value('availability_zone',
+                                         availability_zone)
+        if availability_zone == CONF.default_availability_zone:
+            # Hosts in no zone are in the default one
+            zoned = index.hosts_with_key('availability_zone')
+        else:
+            zoned = None
+        for host_state in host_states:
+            host = host_state.host
+            if host in in_zone or (zoned is not None and host not in zoned):
+                yield host_state
+                continue
+            host_az = index.host_metadata(host).get(
+                'availability_zone', CONF.default_availability_zone)
+            LOG.debug("Availability Zone '%(az)s' requested. "
+                      "%(host_state)s has AZs: %(host_az)s",
+                      {'host_state': host_state,
+                       'az': availability_zone,
+                       'host_az': host_az})
+
+    def host_passes(self, host_state, filter_properties):
+        availability_zone = self._requested_zone(filter_properties)
 
         if not availability_zone:
             return True
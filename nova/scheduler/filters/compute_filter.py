@@ -21,6 +21,7 @@ from nova.scheduler import filters
 from nova import servicegroup
 
 CONF = cfg.CONF
+CONF.import_opt('compute_topic', 'nova.compute.rpcapi')
 
 LOG = logging.getLogger(__name__)
 
@@ -34,17 +35,43 @@ class ComputeFilter(filters.BaseHostFilter):
     # Host state does not change within a request
     run_filter_once_per_request = True
 
-    def host_passes(self, host_state, filter_properties):
-        """Returns True for only active compute nodes."""
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield only active compute nodes.
+
+        The service status of all the hosts is fetched from the
+        servicegroup API at once rather than once per host.
+        """
+        host_states = list(filter_obj_list)
+        services = [host_state.service for host_state in host_states
+                    if not host_state.service['disabled']]
+        up_hosts = self.servicegroup_api.get_up_services(CONF.compute_topic,
+                                                         services)
+        for host_state in host_states:
+            service = host_state.service
+            if self._service_enabled(host_state):
+                if service['host'] in up_hosts:
+                    yield host_state
+                else:
+                    self._log_not_heard_from(host_state)
+
+    def _service_enabled(self, host_state):
         service = host_state.service
         if service['disabled']:
             LOG.debug("%(host_state)s is disabled, reason: %(reason)s",
                       {'host_state': host_state,
                        'reason': service.get('disabled_reason')})
             return False
-        else:
-            if not self.servicegroup_api.service_is_up(service):
-                LOG.warning(_LW("%(host_state)s has not been heard from in a "
-                                "while"), {'host_state': host_state})
-                return False
+        return True
+
+    def _log_not_heard_from(self, host_state):
+        LOG.warning(_LW("%(host_state)s has not been heard from in a "
+                        "while"), {'host_state': host_state})
+
+    def host_passes(self, host_state, filter_properties):
+        """Returns True for only active compute nodes."""
+        if not self._service_enabled(host_state):
+            return False
+        if not self.servicegroup_api.service_is_up(host_state.service):
+            self._log_not_heard_from(host_state)
+            return False
         return True
@@ -14,6 +14,8 @@
 #    under the License.
 
 
+import functools
+import numbers
 import operator
 
 from oslo_serialization import jsonutils
@@ -88,11 +90,14 @@ class JsonFilter(filters.BaseHostFilter):
         'and': _and,
     }
 
-    def _parse_string(self, string, host_state):
+    def _compile_string(self, string):
         """Strings prefixed with $ are capability lookups in the
         form '$variable' where 'variable' is an attribute in the
         HostState class.  If $variable is a dictionary, you may
         use: $variable.dictkey
+
+        Returns a function looking the variable up in a host state, or the
+        string itself if it is not a variable.
         """
         if not string:
             return None
@@ -100,51 +105,214 @@ class JsonFilter(filters.BaseHostFilter):
             return string
 
         path = string[1:].split(".")
-        obj = getattr(host_state, path[0], None)
-        if obj is None:
-            return None
-        for item in path[1:]:
-            obj = obj.get(item, None)
-            if obj is None:
-                return None
-        return obj
-
-    def _process_filter(self, query, host_state):
-        """Recursively parse the query structure."""
+        attr, keys = path[0], path[1:]
+
+        def lookup(host_state):
+            obj = getattr(host_state, attr, None)
+            for key in keys:
+                if obj is None:
+                    return None
+                obj = obj.get(key, None)
+            return obj
+        return lookup
+
+    def _compile(self, query):
+        """Compile the query structure.
+
+        Returns a function evaluating the query for a host state, or the
+        result of the query if it does not look anything up.  The parts
+        of the query not depending on the host are evaluated once.
+        """
         if not query:
             return True
         cmd = query[0]
         method = self.commands[cmd]
-        cooked_args = []
+        args = []
         for arg in query[1:]:
             if isinstance(arg, list):
-                arg = self._process_filter(arg, host_state)
+                arg = self._compile(arg)
             elif isinstance(arg, six.string_types):
-                arg = self._parse_string(arg, host_state)
+                arg = self._compile_string(arg)
             if arg is not None:
+                args.append(arg)
+        if not any(callable(arg) for arg in args):
+            return method(self, args)
+
+        def evaluate(host_state):
+            cooked_args = []
+            for arg in args:
+                if callable(arg):
+                    arg = arg(host_state)
+                    if arg is None:
+                        continue
                 cooked_args.append(arg)
-        result = method(self, cooked_args)
-        return result
+            return method(self, cooked_args)
+        return evaluate
+
+    def _compile_columns(self, query):
+        """Compile the query structure for evaluation over all hosts.
+
+        Returns a function taking a list of host states and returning the
+        result of the query for each of them, evaluating every part of the
+        query once for all the hosts.  This is only possible for queries
+        looking up top level HostState attributes, so None is returned for
+        other queries, and the function returns None if one of the
+        attributes is not a number on every host.
+        """
+        if not query:
+            return lambda host_states: [True] * len(host_states)
+        cmd = query[0]
+        method = self.commands[cmd]
+        column_method = _column_commands.get(cmd)
+        fetchers = []
+        for arg in query[1:]:
+            if isinstance(arg, list):
+                fetch = self._compile_columns(arg)
+                if fetch is None:
+                    return None
+            elif isinstance(arg, six.string_types) and arg.startswith("$"):
+                if "." in arg:
+                    return None
+                fetch = functools.partial(_numeric_column, arg[1:])
+            elif arg is None or (isinstance(arg, six.string_types) and
+                                 not arg):
+                continue
+            else:
+                fetch = functools.partial(_constant_column, arg)
+            fetchers.append(fetch)
+
+        def evaluate(host_states):
+            columns = []
+            for fetch in fetchers:
+                column = fetch(host_states)
+                if column is None:
+                    return None
+                columns.append(column)
+            if column_method:
+                return column_method(columns, len(host_states))
+            if not columns:
+                return [method(self, []) for host_state in host_states]
+            return [method(self, list(row)) for row in zip(*columns)]
+        return evaluate
+
+    @staticmethod
+    def _get_query(filter_properties):
+        try:
+            return filter_properties['scheduler_hints']['query']
+        except KeyError:
+            return None
+
+    @staticmethod
+    def _result_passes(result):
+        if isinstance(result, list):
+            # If any succeeded, include the host
+            result = any(result)
+        return bool(result)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts that fulfill the requirements specified in the
+        query.
+
+        The query is compiled once for all the hosts, and evaluated over
+        columns of the attributes of all hosts at once when it only
+        compares numeric attributes.
+        """
+        query = self._get_query(filter_properties)
+        if not query:
+            return filter_obj_list
+
+        # NOTE(comstud): Not checking capabilities or service for
+        # enabled/disabled so that a provided json filter can decide
+
+        query = jsonutils.loads(query)
+        host_states = list(filter_obj_list)
+        results = None
+        evaluate_columns = self._compile_columns(query)
+        if evaluate_columns is not None:
+            results = evaluate_columns(host_states)
+        if results is None:
+            evaluate = self._compile(query)
+            if callable(evaluate):
+                results = [evaluate(host_state) for host_state in host_states]
+            else:
+                results = [evaluate] * len(host_states)
+        return (host_state for host_state, result in zip(host_states, results)
+                if self._result_passes(result))
 
     def host_passes(self, host_state, filter_properties):
         """Return a list of hosts that can fulfill the requirements
         specified in the query.
         """
-        try:
-            query = filter_properties['scheduler_hints']['query']
-        except KeyError:
-            query = None
+        query = self._get_query(filter_properties)
         if not query:
             return True
 
         # NOTE(comstud): Not checking capabilities or service for
         # enabled/disabled so that a provided json filter can decide
 
-        result = self._process_filter(jsonutils.loads(query), host_state)
-        if isinstance(result, list):
-            # If any succeeded, include the host
-            result = any(result)
-        if result:
-            # Filter it out.
-            return True
-        return False
+        evaluate = self._compile(jsonutils.loads(query))
+        if callable(evaluate):
+            result = evaluate(host_state)
+        else:
+            result = evaluate
+        return self._result_passes(result)
+
+
+def _numeric_column(attr, host_states):
+    column = [getattr(host_state, attr, None) for host_state in host_states]
+    if all(isinstance(value, numbers.Number) for value in column):
+        return column
+    return None
+
+
+def _constant_column(value, host_states):
+    return [value] * len(host_states)
+
+
+def _compare_columns(op, columns, count):
+    """First term is op all the other terms, for each host."""
+    if len(columns) < 2:
+        return [False] * count
+    first = columns[0]
+    results = [True] * count
+    for column in columns[1:]:
+        results = [result and op(a, b)
+                   for result, a, b in zip(results, first, column)]
+    return results
+
+
+def _in_columns(columns, count):
+    if len(columns) < 2:
+        return [False] * count
+    return [row[0] in row[1:] for row in zip(*columns)]
+
+
+def _not_columns(columns, count):
+    if not columns:
+        return [[] for i in range(count)]
+    return [[not arg for arg in row] for row in zip(*columns)]
+
+
+def _or_columns(columns, count):
+    if not columns:
+        return [False] * count
+    return [any(row) for row in zip(*columns)]
+
+
+def _and_columns(columns, count):
+    if not columns:
+        return [True] * count
+    return [all(row) for row in zip(*columns)]
+
+
+_column_commands = {
+    '=': functools.partial(_compare_columns, operator.eq),
+    '<': functools.partial(_compare_columns, operator.lt),
+    '>': functools.partial(_compare_columns, operator.gt),
+    'in': _in_columns,
+    '<=': functools.partial(_compare_columns, operator.le),
+    '>=': functools.partial(_compare_columns, operator.ge),
+    'not': _not_columns,
+    'or': _or_columns,
+    'and': _and_columns,
+}
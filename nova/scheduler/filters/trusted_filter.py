@@ -37,6 +37,11 @@ the config file will look something like:
 Details on the specific parameters can be found in the file
 ``trust_attest.py``.
 
+By default, an expired trust level is refreshed, along with the levels of
+all the other hosts, within the scheduling request needing it.  With
+``attestation_refresh_interval`` set, a background thread refreshes the
+trust levels before they expire and the filter only reads the cache.
+
 Details on setting up and using an Attestation Service can be found at
 the Open Attestation project at:
 
@@ -46,12 +51,15 @@ the Open Attestation project at:
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from oslo_service import loopingcall
 from oslo_utils import timeutils
 import requests
 
 from nova import context
+from nova.i18n import _LE, _LW
 from nova import objects
 from nova.scheduler import filters
+from nova import utils
 
 LOG = logging.getLogger(__name__)
 
@@ -73,7 +81,21 @@ trusted_opts = [
                help='Attestation status cache valid period length'),
     cfg.BoolOpt('attestation_insecure_ssl',
                 default=False,
-                help='Disable SSL cert verification for Attestation service')
+                help='Disable SSL cert verification for Attestation service'),
+    cfg.IntOpt('attestation_refresh_interval',
+               default=0,
+               help='Interval in seconds at which the trust levels about to '
+                    'expire are refreshed, in bulk, by a background thread. '
+                    'Scheduling requests then only read the cached trust '
+                    'levels. 0 refreshes the expired trust levels within '
+                    'the scheduling requests instead. Should be shorter '
+                    'than attestation_auth_timeout.'),
+    cfg.IntOpt('attestation_stale_timeout',
+               default=0,
+               help='When refreshing in the background, how many seconds '
+                    'after its expiry a trust level is still used while it '
+                    'is being revalidated. Older trust levels are '
+                    'considered unknown, so the hosts are not trusted.'),
 ]
 
 CONF = cfg.CONF
@@ -167,6 +189,12 @@ class ComputeAttestationCache(object):
     def __init__(self):
         self.attestservice = AttestationService()
         self.compute_nodes = {}
+        # Latency of the OAT service polls
+        self.stats = {'polls': 0, 'failures': 0, 'hosts': 0,
+                      'last_latency': None, 'max_latency': 0.0,
+                      'total_latency': 0.0}
+        self._refreshing = False
+        self._refresher = None
         admin = context.get_admin_context()
 
         # Fetch compute node list to initialize the compute_nodes,
@@ -177,6 +205,12 @@ class ComputeAttestationCache(object):
             host = compute.hypervisor_hostname
             self._init_cache_entry(host)
 
+        interval = CONF.trusted_computing.attestation_refresh_interval
+        if interval > 0:
+            self._refresher = loopingcall.FixedIntervalLoopingCall(
+                self._refresh_expiring)
+            self._refresher.start(interval=interval, initial_delay=0)
+
     def _cache_valid(self, host):
         cachevalid = False
         if host in self.compute_nodes:
@@ -221,19 +255,83 @@ class ComputeAttestationCache(object):
 
         self.compute_nodes[host] = entry
 
+    def _poll(self, hosts):
+        """Attests hosts, recording the latency of the OAT service."""
+        timer = timeutils.StopWatch()
+        timer.start()
+        states = self.attestservice.do_attestation(hosts)
+        latency = timer.elapsed()
+
+        self.stats['polls'] += 1
+        self.stats['hosts'] += len(hosts)
+        self.stats['last_latency'] = latency
+        self.stats['max_latency'] = max(self.stats['max_latency'], latency)
+        self.stats['total_latency'] += latency
+        if states is None:
+            self.stats['failures'] += 1
+            LOG.warning(_LW("Attestation of %(count)d hosts failed after "
+                            "%(latency).3fs"),
+                        {'count': len(hosts), 'latency': latency})
+        else:
+            LOG.debug("Attested %(count)d hosts in %(latency).3fs",
+                      {'count': len(hosts), 'latency': latency})
+        return states
+
     def _update_cache(self):
         self._invalidate_caches()
-        states = self.attestservice.do_attestation(
-            list(self.compute_nodes.keys()))
+        states = self._poll(list(self.compute_nodes.keys()))
         if states is None:
             return
         for state in states:
             self._update_cache_entry(state)
 
+    def _refresh_expiring(self):
+        """Re-attests the hosts whose trust level expires before the next
+        refresh, unless a refresh is already running.
+        """
+        if self._refreshing:
+            return
+        self._refreshing = True
+        self._refresh()
+
+    def _refresh(self):
+        try:
+            horizon = (CONF.trusted_computing.attestation_auth_timeout -
+                       CONF.trusted_computing.attestation_refresh_interval)
+            hosts = [host for host, entry in self.compute_nodes.items()
+                     if timeutils.is_older_than(entry['vtime'], horizon)]
+            count = self.attestservice.request_count
+            for i in range(0, len(hosts), count):
+                # Levels are kept when the poll fails, to be used until
+                # they are too stale
+                for state in self._poll(hosts[i:i + count]) or []:
+                    self._update_cache_entry(state)
+        except Exception:
+            LOG.exception(_LE("Failed to refresh the attestation of the "
+                              "hosts"))
+        finally:
+            self._refreshing = False
+
+    def _get_cached_attestation(self, host):
+        # Expired levels are revalidated in the background, and used in
+        # the meantime unless they are too stale
+        if not self._cache_valid(host) and not self._refreshing:
+            self._refreshing = True
+            utils.spawn_n(self._refresh)
+        entry = self.compute_nodes[host]
+        if timeutils.is_older_than(
+                entry['vtime'],
+                CONF.trusted_computing.attestation_auth_timeout +
+                CONF.trusted_computing.attestation_stale_timeout):
+            return 'unknown'
+        return entry['trust_lvl']
+
     def get_host_attestation(self, host):
         """Check host's trust level."""
         if host not in self.compute_nodes:
             self._init_cache_entry(host)
+        if self._refresher is not None:
+            return self._get_cached_attestation(host)
         if not self._cache_valid(host):
             self._update_cache()
         level = self.compute_nodes.get(host).get('trust_lvl')
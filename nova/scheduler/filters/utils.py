@@ -24,8 +24,42 @@ from nova.i18n import _LI
 LOG = logging.getLogger(__name__)
 
 
+def _shared_index(host_states, name):
+    index = None
+    for host_state in host_states:
+        host_index = getattr(host_state, name, None)
+        if host_index is None or (index is not None and
+                                  host_index is not index):
+            return None
+        index = host_index
+    return index
+
+
+def aggregate_index(host_states):
+    """Returns the aggregate metadata index shared by a list of host states.
+
+    None is returned if the host states were not set up by the same
+    HostManager, in which case the filters have to look at the aggregates
+    of each host.
+    """
+    return _shared_index(host_states, 'aggregate_index')
+
+
+def instance_index(host_states):
+    """Returns the instance host index shared by a list of host states.
+
+    None is returned if the host states were not set up by the same
+    HostManager, in which case the filters have to look at the instances
+    of each host.
+    """
+    return _shared_index(host_states, 'instance_index')
+
+
 def aggregate_values_from_key(host_state, key_name):
     """Returns a set of values based on a metadata key for a specific host."""
+    index = getattr(host_state, 'aggregate_index', None)
+    if index is not None:
+        return index.host_values(host_state.host, key_name)
     aggrlist = host_state.aggregates
     return {aggr.metadata[key_name]
               for aggr in aggrlist
@@ -37,6 +71,9 @@ def aggregate_metadata_get_by_host(host_state, key=None):
     """Returns a dict of all metadata based on a metadata key for a specific
     host. If the key is not provided, returns a dict of all metadata.
     """
+    index = getattr(host_state, 'aggregate_index', None)
+    if index is not None:
+        return index.host_metadata(host_state.host, key=key)
     aggrlist = host_state.aggregates
     metadata = collections.defaultdict(set)
     for aggr in aggrlist:
@@ -75,6 +112,9 @@ def instance_uuids_overlap(host_state, uuids):
     """
     if isinstance(uuids, six.string_types):
         uuids = [uuids]
+    index = getattr(host_state, 'instance_index', None)
+    if index is not None:
+        return host_state.host in index.hosts_of_instances(uuids)
     set_uuids = set(uuids)
     # host_state.instances is a dict whose keys are the instance uuids
     host_uuids = set(host_state.instances.keys())
@@ -88,6 +128,10 @@ def other_types_on_host(host_state, instance_type_id):
     Returns True if there are any instances in the host_state whose
     instance_type_id is different than the supplied instance_type_id value.
     """
+    index = getattr(host_state, 'instance_index', None)
+    if index is not None:
+        return bool(index.instance_types(host_state.host) -
+                    set([instance_type_id]))
     host_instances = host_state.instances.values()
     host_types = set([inst.instance_type_id for inst in host_instances])
     inst_set = set([instance_type_id])
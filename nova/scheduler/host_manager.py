@@ -154,9 +154,17 @@ class HostState(object):
         # List of aggregates the host belongs to
         self.aggregates = []
 
+        # Precomputed aggregate metadata of all hosts, kept in sync with
+        # self.aggregates by the HostManager
+        self.aggregate_index = None
+
         # Instances on this host
         self.instances = {}
 
+        # Hosts of the instances of all hosts, kept in sync with
+        # self.instances by the HostManager
+        self.instance_index = None
+
         self.updated = None
         if compute:
             self.update_from_compute_node(compute)
@@ -306,6 +314,189 @@ class HostState(object):
                  self.num_io_ops, self.num_instances))
 
 
+class AggregateMetadataIndex(object):
+    """Aggregate metadata of the hosts, precomputed for the filters.
+
+    For each host the metadata of its aggregates is merged into sets of
+    values, and for each metadata key and value the hosts having it are
+    recorded, so that filters can read a host's metadata or select the hosts
+    matching a key/value with set operations instead of walking every
+    host's aggregates on every request.  Comma separated values are split
+    once, when an aggregate is added or updated.
+    """
+
+    def __init__(self):
+        # Aggregate ID -> (set of hosts, metadata dict, metadata dict of
+        # split values) for every aggregate known
+        self._aggregates = {}
+        # Host -> set of the IDs of the aggregates it belongs to
+        self._host_aggregates = collections.defaultdict(set)
+        # Host -> metadata of all its aggregates, as key -> set of the
+        # split values
+        self._host_metadata = {}
+        # Host -> metadata of all its aggregates, as key -> set of the raw
+        # values
+        self._host_raw_metadata = {}
+        # Key -> set of the hosts in an aggregate with that key
+        self._key_hosts = collections.defaultdict(set)
+        # Key -> split value -> set of the hosts in an aggregate with it
+        self._value_hosts = collections.defaultdict(
+            lambda: collections.defaultdict(set))
+
+    def update_aggregate(self, aggregate):
+        old = self._aggregates.get(aggregate.id)
+        hosts = set(aggregate.hosts)
+        if aggregate.obj_attr_is_set('metadata'):
+            metadata = dict(aggregate.metadata)
+        else:
+            metadata = {}
+        split = {key: frozenset(x.strip() for x in value.split(','))
+                 for key, value in six.iteritems(metadata)}
+        self._aggregates[aggregate.id] = (hosts, metadata, split)
+        for host in hosts:
+            self._host_aggregates[host].add(aggregate.id)
+        affected = set(hosts)
+        if old:
+            for host in old[0] - hosts:
+                self._host_aggregates[host].discard(aggregate.id)
+            affected |= old[0]
+        self._reindex_hosts(affected)
+
+    def delete_aggregate(self, aggregate):
+        old = self._aggregates.pop(aggregate.id, None)
+        affected = set(aggregate.hosts)
+        if old:
+            affected |= old[0]
+        for host in affected:
+            self._host_aggregates[host].discard(aggregate.id)
+        self._reindex_hosts(affected)
+
+    def _reindex_hosts(self, hosts):
+        for host in hosts:
+            for key, values in six.iteritems(
+                    self._host_metadata.pop(host, {})):
+                self._key_hosts[key].discard(host)
+                for value in values:
+                    self._value_hosts[key][value].discard(host)
+            self._host_raw_metadata.pop(host, None)
+
+            agg_ids = self._host_aggregates.get(host)
+            if not agg_ids:
+                self._host_aggregates.pop(host, None)
+                continue
+            metadata = collections.defaultdict(set)
+            raw_metadata = collections.defaultdict(set)
+            for agg_id in agg_ids:
+                _hosts, raw, split = self._aggregates[agg_id]
+                for key, values in six.iteritems(split):
+                    metadata[key].update(values)
+                    raw_metadata[key].add(raw[key])
+            self._host_metadata[host] = dict(metadata)
+            self._host_raw_metadata[host] = dict(raw_metadata)
+            for key, values in six.iteritems(metadata):
+                self._key_hosts[key].add(host)
+                for value in values:
+                    self._value_hosts[key][value].add(host)
+
+    def host_metadata(self, host, key=None):
+        """Returns the metadata of the aggregates a host belongs to.
+
+        The metadata is a dict of sets of split values.  If key is given,
+        only the aggregates having that key are taken into account.  The
+        returned sets must not be modified.
+        """
+        if key is None:
+            return self._host_metadata.get(host, {})
+        metadata = collections.defaultdict(set)
+        for agg_id in self._host_aggregates.get(host, ()):
+            split = self._aggregates[agg_id][2]
+            if key in split:
+                for k, values in six.iteritems(split):
+                    metadata[k].update(values)
+        return metadata
+
+    def host_values(self, host, key):
+        """Returns the set of raw values of a key for a host."""
+        return set(self._host_raw_metadata.get(host, {}).get(key, ()))
+
+    def hosts_with_key(self, key):
+        """Returns the hosts in an aggregate having the key."""
+        return self._key_hosts.get(key, frozenset())
+
+    def hosts_with_value(self, key, value):
+        """Returns the hosts in an aggregate having the key set to a list of
+        values including value.
+        """
+        if key not in self._value_hosts:
+            return frozenset()
+        return self._value_hosts[key].get(value, frozenset())
+
+
+class InstanceHostIndex(object):
+    """Hosts of the instances known to the HostManager, and their types.
+
+    Kept in step with the instances of the host states, so that filters can
+    find the hosts of a set of instances, or the instance types on a host,
+    without walking the instances of every host.
+    """
+
+    def __init__(self):
+        # Instance UUID -> set of the hosts it is on; an instance being
+        # migrated can be on two hosts until the source one forgets it
+        self._instance_hosts = collections.defaultdict(set)
+        # Host -> instance_type_id of its instances, keyed by their UUID
+        self._host_instances = {}
+        # Host -> Counter of the instance_type_id of its instances
+        self._host_types = {}
+
+    def set_host_instances(self, host, instances):
+        """Replaces the instances of a host."""
+        for instance_uuid in list(self._host_instances.get(host, ())):
+            self.remove_instance(host, instance_uuid)
+        self.add_instances(host, instances)
+
+    def add_instances(self, host, instances):
+        """Adds instances to a host, or updates them if already there."""
+        host_instances = self._host_instances.setdefault(host, {})
+        host_types = self._host_types.setdefault(host,
+                                                 collections.Counter())
+        for instance in instances:
+            self.remove_instance(host, instance.uuid)
+            if instance.obj_attr_is_set('instance_type_id'):
+                type_id = instance.instance_type_id
+            else:
+                type_id = None
+            host_instances[instance.uuid] = type_id
+            host_types[type_id] += 1
+            self._instance_hosts[instance.uuid].add(host)
+
+    def remove_instance(self, host, instance_uuid):
+        """Removes an instance from a host, if it is there."""
+        host_instances = self._host_instances.get(host)
+        if not host_instances or instance_uuid not in host_instances:
+            return
+        type_id = host_instances.pop(instance_uuid)
+        host_types = self._host_types[host]
+        host_types[type_id] -= 1
+        if not host_types[type_id]:
+            del host_types[type_id]
+        hosts = self._instance_hosts[instance_uuid]
+        hosts.discard(host)
+        if not hosts:
+            del self._instance_hosts[instance_uuid]
+
+    def hosts_of_instances(self, instance_uuids):
+        """Returns the set of hosts having any of the instances."""
+        hosts = set()
+        for instance_uuid in instance_uuids:
+            hosts.update(self._instance_hosts.get(instance_uuid, ()))
+        return hosts
+
+    def instance_types(self, host):
+        """Returns the instance_type_ids of the instances on a host."""
+        return set(self._host_types.get(host, ()))
+
+
 class HostManager(object):
     """Base HostManager class."""
 
@@ -330,10 +521,14 @@ class HostManager(object):
         # Dict of set of aggregate IDs keyed by the name of the host belonging
         # to those aggregates
         self.host_aggregates_map = collections.defaultdict(set)
+        # Aggregate metadata by host, and hosts by aggregate metadata
+        self.aggregate_index = AggregateMetadataIndex()
         self._init_aggregates()
         self.tracks_instance_changes = CONF.scheduler_tracks_instance_changes
         # Dict of instances and status, keyed by host
         self._instance_info = {}
+        # Hosts of the instances, as seen by the host states
+        self.instance_index = InstanceHostIndex()
         if self.tracks_instance_changes:
             self._init_instance_info()
 
@@ -347,6 +542,7 @@ class HostManager(object):
             self.aggs_by_id[agg.id] = agg
             for host in agg.hosts:
                 self.host_aggregates_map[host].add(agg.id)
+            self.aggregate_index.update_aggregate(agg)
 
     def update_aggregates(self, aggregates):
         """Updates internal HostManager information about aggregates."""
@@ -366,6 +562,7 @@ class HostManager(object):
             if (aggregate.id in self.host_aggregates_map[host]
                     and host not in aggregate.hosts):
                 self.host_aggregates_map[host].remove(aggregate.id)
+        self.aggregate_index.update_aggregate(aggregate)
 
     def delete_aggregate(self, aggregate):
         """Deletes internal HostManager information about a specific aggregate.
@@ -375,6 +572,7 @@ class HostManager(object):
         for host in aggregate.hosts:
             if aggregate.id in self.host_aggregates_map[host]:
                 self.host_aggregates_map[host].remove(aggregate.id)
+        self.aggregate_index.delete_aggregate(aggregate)
 
     def _init_instance_info(self):
         """Creates the initial view of instances for all hosts.
@@ -389,6 +587,7 @@ class HostManager(object):
             context = context_module.get_admin_context()
             LOG.debug("START:_async_init_instance_info")
             self._instance_info = {}
+            self.instance_index = InstanceHostIndex()
             compute_nodes = objects.ComputeNodeList.get_all(context).objects
             LOG.debug("Total number of compute nodes: %s", len(compute_nodes))
             # Break the queries into batches of 10 to reduce the total number
@@ -414,6 +613,7 @@ class HostManager(object):
                                                      "updated": False}
                     inst_dict = self._instance_info[host]
                     inst_dict["instances"][instance.uuid] = instance
+                    self.instance_index.add_instances(host, [instance])
                 # Call sleep() to cooperatively yield
                 time.sleep(0)
             LOG.debug("END:_async_init_instance_info")
@@ -562,6 +762,7 @@ class HostManager(object):
             host_state.aggregates = [self.aggs_by_id[agg_id] for agg_id in
                                      self.host_aggregates_map[
                                          host_state.host]]
+            host_state.aggregate_index = self.aggregate_index
             host_state.update_service(dict(service))
             self._add_instance_info(context, compute, host_state)
             seen_nodes.add(state_key)
@@ -595,7 +796,10 @@ class HostManager(object):
             inst_list = objects.InstanceList.get_by_host(context, host_name)
             inst_dict = {instance.uuid: instance
                          for instance in inst_list.objects}
+            self.instance_index.set_host_instances(host_name,
+                                                   inst_list.objects)
         host_state.instances = inst_dict
+        host_state.instance_index = self.instance_index
 
     def _recreate_instance_info(self, context, host_name):
         """Get the InstanceList for the specified host, and store it in the
@@ -606,6 +810,7 @@ class HostManager(object):
         host_info = self._instance_info[host_name] = {}
         host_info["instances"] = inst_dict
         host_info["updated"] = False
+        self.instance_index.set_host_instances(host_name, instances)
 
     @utils.synchronized(HOST_INSTANCE_SEMAPHORE)
     def update_instance_info(self, context, host_name, instance_info):
@@ -621,6 +826,8 @@ class HostManager(object):
             for instance in instance_info.objects:
                 # Overwrite the entry (if any) with the new info.
                 inst_dict[instance.uuid] = instance
+            self.instance_index.add_instances(host_name,
+                                              instance_info.objects)
             host_info["updated"] = True
         else:
             instances = instance_info.objects
@@ -630,6 +837,7 @@ class HostManager(object):
                 host_info["instances"] = {instance.uuid: instance
                                           for instance in instances}
                 host_info["updated"] = True
+                self.instance_index.set_host_instances(host_name, instances)
             else:
                 self._recreate_instance_info(context, host_name)
                 LOG.info(_LI("Received an update from an unknown host '%s'. "
@@ -647,6 +855,7 @@ class HostManager(object):
             inst_dict = host_info["instances"]
             # Remove the existing Instance object, if any
             inst_dict.pop(instance_uuid, None)
+            self.instance_index.remove_instance(host_name, instance_uuid)
             host_info["updated"] = True
         else:
             self._recreate_instance_info(context, host_name)
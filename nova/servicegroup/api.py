@@ -20,7 +20,9 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import importutils
 
+from nova import context
 from nova.i18n import _, _LW
+from nova import objects
 
 LOG = logging.getLogger(__name__)
 
@@ -93,6 +95,28 @@ class API(object):
 
         return self._driver.is_up(member)
 
+    def get_up_services(self, group_id, services=None):
+        """Return the hosts of the given group whose service is up.
+
+        This answers the question service_is_up() answers for a whole
+        group at once, so that the driver can use a single round trip to
+        its backend instead of one per service.
+
+        :param group_id: the group ID/name (the service topic)
+        :param services: the service records of the group, if the caller
+                         already has them.  If omitted, they are loaded
+                         with a single query.
+        :returns: a set of host names
+        """
+        if services is None:
+            services = objects.ServiceList.get_by_topic(
+                context.get_admin_context(), group_id)
+        services = [service for service in services
+                    if not service.get('forced_down')]
+        if not services:
+            return set()
+        return self._driver.get_up_services(group_id, services)
+
     def get_all(self, group_id):
         """Returns ALL members of the given group."""
         LOG.debug('Returns ALL members of the [%s] '
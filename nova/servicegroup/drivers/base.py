@@ -27,3 +27,15 @@ class Driver(object):
     def is_up(self, member):
         """Check whether the given member is up."""
         raise NotImplementedError()
+
+    def get_up_services(self, group_id, services):
+        """Return the set of hosts of the given services that are up.
+
+        Drivers should override this when they can answer for the whole
+        group with fewer round trips than calling is_up() per service.
+
+        :param group_id: the group ID/name of the services
+        :param services: the service records to check
+        """
+        return set(service['host'] for service in services
+                   if self.is_up(service))
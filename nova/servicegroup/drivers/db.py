@@ -57,6 +57,20 @@ class DbDriver(base.Driver):
         """Moved from nova.utils
         Check whether a service is up based on last heartbeat.
         """
+        return self._is_up(service_ref, timeutils.utcnow())
+
+    def get_up_services(self, group_id, services):
+        """Return the set of hosts of the given services that are up.
+
+        The heartbeats are part of the service records, so this doesn't
+        need any further DB access, and all of them are compared against
+        the same point in time.
+        """
+        now = timeutils.utcnow()
+        return set(service['host'] for service in services
+                   if self._is_up(service, now))
+
+    def _is_up(self, service_ref, now):
         # Keep checking 'updated_at' if 'last_seen_up' isn't set.
         # Should be able to use only 'last_seen_up' in the M release
         last_heartbeat = (service_ref.get('last_seen_up') or
@@ -71,7 +85,7 @@ class DbDriver(base.Driver):
             # below does not (and will fail)
             last_heartbeat = last_heartbeat.replace(tzinfo=None)
         # Timestamps in DB are UTC.
-        elapsed = timeutils.delta_seconds(last_heartbeat, timeutils.utcnow())
+        elapsed = timeutils.delta_seconds(last_heartbeat, now)
         is_up = abs(elapsed) <= self.service_down_time
         if not is_up:
             LOG.debug('Seems service is down. Last heartbeat was %(lhb)s. '
@@ -69,6 +69,23 @@ class MemcachedDriver(base.Driver):
 
         return is_up
 
+    def get_up_services(self, group_id, services):
+        """Return the set of hosts of the given services that are up.
+
+        All of the heartbeat keys are fetched with a single get_multi()
+        round trip to memcached.
+        """
+        hosts_by_key = {str("%(topic)s:%(host)s" % service): service['host']
+                        for service in services}
+        get_multi = getattr(self.mc, 'get_multi', None)
+        if get_multi is not None:
+            heartbeats = get_multi(list(hosts_by_key))
+        else:
+            # NOTE: The in-process fake memcache client has no get_multi().
+            heartbeats = {key: self.mc.get(key) for key in hosts_by_key}
+        return set(host for key, host in hosts_by_key.items()
+                   if heartbeats.get(key) is not None)
+
     def _report_state(self, service):
         """Update the state of this service in the datastore."""
         try:
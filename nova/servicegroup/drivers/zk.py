@@ -140,6 +140,16 @@ class ZooKeeperDriver(base.Driver):
         all_members = self._get_all(group_id)
         return member_id in all_members
 
+    def get_up_services(self, group_id, services):
+        """Return the set of hosts of the given services that are up.
+
+        The whole group is answered from one snapshot of the membership
+        that the group's monitor keeps watching.
+        """
+        all_members = set(self._get_all(group_id))
+        return set(service['host'] for service in services
+                   if service['host'] in all_members)
+
     def _get_all(self, group_id):
         """Return all members in a list, or a ServiceGroupUnavailable
         exception.
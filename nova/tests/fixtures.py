@@ -242,6 +242,10 @@ class RPCFixture(fixtures.Fixture):
         self.messaging_conf = messaging_conffixture.ConfFixture(CONF)
         self.messaging_conf.transport_driver = 'fake'
         self.useFixture(self.messaging_conf)
+        # NOTE: With no driver, rpc.notifications_enabled() tells the
+        #       callers not to bother building notifications at all.
+        CONF.set_override('notification_driver', ['test'])
+        self.addCleanup(CONF.clear_override, 'notification_driver')
         rpc.init(CONF)
 
 
@@ -480,6 +480,14 @@
             "namespace": "http://docs.openstack.org/compute/ext/fake_xml",
             "updated": "2014-12-03T00:00:00Z"
         },
+        {
+            "alias": "os-host-drain",
+            "description": "Admin-only live migration of all instances off a host.",
+            "links": [],
+            "name": "HostDrain",
+            "namespace": "http://docs.openstack.org/compute/ext/fake_xml",
+            "updated": "2014-12-03T00:00:00Z"
+        },
         {
             "alias": "os-hosts",
             "description": "Admin-only host administration.",
@@ -0,0 +1,9 @@
+{
+    "host_drain": {
+        "failed": [],
+        "host": "%(host_name)s",
+        "instances": 0,
+        "migrating": [],
+        "status": null
+    }
+}
\ No newline at end of file
@@ -0,0 +1,8 @@
+{
+    "host_drain": {
+        "host": "%(host_name)s",
+        "block_migration": false,
+        "disk_over_commit": false,
+        "order": "smallest"
+    }
+}
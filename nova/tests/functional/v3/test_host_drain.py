@@ -0,0 +1,43 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_config import cfg
+
+from nova.tests.functional.v3 import api_sample_base
+
+CONF = cfg.CONF
+CONF.import_opt('osapi_compute_extension',
+                'nova.api.openstack.compute.extensions')
+
+
+class HostDrainSampleJsonTest(api_sample_base.ApiSampleTestBaseV3):
+    ADMIN_API = True
+    extension_name = "os-host-drain"
+    request_api_version = '2.11'
+    # NOTE(gmann): microversion tests do not need to run for v2 API
+    # so defining scenarios only for v2.11 which will run the original tests
+    # by appending '(v2_11)' in test_id.
+    scenarios = [('v2_11', {})]
+    _api_version = 'v2'
+
+    def test_host_drain_post(self):
+        subs = {'host_name': self.compute.host}
+        response = self._do_post('os-host-drain', 'host-drain-post-req',
+                                 subs, api_version=self.request_api_version)
+        subs.update(self._get_regexes())
+        self._verify_response('host-drain-post-resp', subs, response, 202)
+
+    def test_host_drain_get(self):
+        response = self._do_get('os-host-drain/%s' % self.compute.host,
+                                api_version=self.request_api_version)
+        subs = self._get_regexes()
+        self._verify_response('host-drain-get-resp', subs, response, 200)
@@ -977,6 +977,69 @@ class CloudTestCase(test.TestCase):
         db.service_destroy(self.context, comp1['id'])
         db.service_destroy(self.context, comp2['id'])
 
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    @mock.patch.object(objects.BlockDeviceMappingList, 'get_by_instance_uuid')
+    @mock.patch.object(ec2utils, 'glance_id_to_id')
+    @mock.patch.object(ec2utils, 'get_int_id_from_instance_uuid')
+    def test_describe_instances_prefetches(self, mock_int_id, mock_glance_id,
+                                           mock_get_bdms, mock_get_inst):
+        self._stub_instance_get_with_fixed_ips('get_all')
+        image_uuid = 'cedef40a-ed67-4d10-800e-17455edce175'
+        kernel_uuid = 'f8aa7d3c-7a6c-4b3c-9c8e-5fbd5d1c3a41'
+        s3imap = objects.S3ImageMapping(self.context, uuid=image_uuid)
+        s3imap.create()
+        kernel_map = objects.S3ImageMapping(self.context, uuid=kernel_uuid)
+        kernel_map.create()
+        instances = []
+        for i in range(3):
+            inst = objects.Instance(context=self.context,
+                                    reservation_id='a',
+                                    image_ref=image_uuid,
+                                    kernel_id=kernel_uuid,
+                                    instance_type_id=1,
+                                    host='host1',
+                                    vm_state='active',
+                                    system_metadata={
+                                        'EC2_client_token': 'token-%d' % i},
+                                    flavor=flavors.get_flavor(1))
+            inst.create()
+            imap = objects.EC2InstanceMapping(self.context, uuid=inst.uuid)
+            imap.create()
+            instances.append((inst, imap))
+        db.block_device_mapping_create(
+            self.context, {'instance_uuid': instances[0][0].uuid,
+                           'device_name': '/dev/sdb1',
+                           'source_type': 'volume',
+                           'destination_type': 'volume',
+                           'volume_id': '0c0e3cfb-6ed1-4f3f-8e3a-0f9c2c4a3e52',
+                           'delete_on_termination': True}, legacy=False)
+        self.stubs.Set(self.cloud.volume_api, 'get',
+                       lambda ctxt, volume_id: {'status': 'in-use',
+                                                'attach_status': 'attached',
+                                                'attach_time': ''})
+
+        result = self.cloud.describe_instances(self.context)
+
+        formatted = {i['clientToken']: i for i in
+                     result['reservationSet'][0]['instancesSet']}
+        self.assertEqual(3, len(formatted))
+        for i, (inst, imap) in enumerate(instances):
+            item = formatted['token-%d' % i]
+            self.assertEqual(ec2utils.id_to_ec2_id(imap.id),
+                             item['instanceId'])
+            self.assertEqual(ec2utils.image_ec2_id(s3imap.id),
+                             item['imageId'])
+            self.assertEqual(ec2utils.image_ec2_id(kernel_map.id, 'aki'),
+                             item['kernelId'])
+        self.assertEqual('/dev/sdb1',
+                         formatted['token-0']['blockDeviceMapping'][0][
+                             'deviceName'])
+        self.assertNotIn('blockDeviceMapping', formatted['token-1'])
+        self.assertFalse(mock_int_id.called)
+        self.assertFalse(mock_glance_id.called)
+        self.assertFalse(mock_get_bdms.called)
+        self.assertFalse(mock_get_inst.called)
+
     def test_describe_instances_all_invalid(self):
         # Makes sure describe_instances works and filters results.
         self.flags(use_ipv6=True)
@@ -59,3 +59,26 @@ class EC2UtilsTestCase(test.TestCase):
         s3imap_id = ec2utils.glance_id_to_id(self.ctxt, 'fake-uuid')
         s3imap = objects.S3ImageMapping.get_by_id(self.ctxt, s3imap_id)
         self.assertEqual('fake-uuid', s3imap.uuid)
+
+    def test_glance_ids_to_ids(self):
+        s3imap = objects.S3ImageMapping(self.ctxt, uuid='fake-uuid')
+        s3imap.create()
+        image_ids = ec2utils.glance_ids_to_ids(
+            self.ctxt, ['fake-uuid', 'fake-uuid-2', None, ''])
+        self.assertEqual(set(['fake-uuid', 'fake-uuid-2']), set(image_ids))
+        self.assertEqual(s3imap.id, image_ids['fake-uuid'])
+        s3imap = objects.S3ImageMapping.get_by_id(self.ctxt,
+                                                  image_ids['fake-uuid-2'])
+        self.assertEqual('fake-uuid-2', s3imap.uuid)
+
+    def test_get_int_ids_from_instance_uuids(self):
+        imap = objects.EC2InstanceMapping(self.ctxt, uuid='fake-uuid')
+        imap.create()
+        int_ids = ec2utils.get_int_ids_from_instance_uuids(
+            self.ctxt, ['fake-uuid', 'fake-uuid-2'])
+        self.assertEqual(imap.id, int_ids['fake-uuid'])
+        imap = objects.EC2InstanceMapping.get_by_id(self.ctxt,
+                                                    int_ids['fake-uuid-2'])
+        self.assertEqual('fake-uuid-2', imap.uuid)
+        self.assertEqual({}, ec2utils.get_int_ids_from_instance_uuids(
+            self.ctxt, []))
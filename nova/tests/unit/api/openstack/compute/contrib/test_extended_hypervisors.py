@@ -64,6 +64,9 @@ class ExtendedHypervisorsTestV21(test.NoDBTestCase):
         self.controller = hypervisors_v21.HypervisorsController()
         self.controller.servicegroup_api.service_is_up = mock.MagicMock(
             return_value=True)
+        self.controller.servicegroup_api.get_up_services = mock.MagicMock(
+            side_effect=lambda group_id, services: set(
+                service['host'] for service in services))
 
     def _get_request(self):
         return fakes.HTTPRequest.blank('/v2/fake/os-hypervisors/detail',
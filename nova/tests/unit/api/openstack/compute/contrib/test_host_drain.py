@@ -0,0 +1,137 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import webob.exc
+
+from nova.api.openstack import api_version_request as api_version
+from nova.api.openstack.compute.plugins.v3 import host_drain
+from nova.compute import api as compute_api
+from nova import exception
+from nova import test
+from nova.tests.unit.api.openstack import fakes
+
+
+PROGRESS = {'host': 'host1', 'status': 'draining', 'instances': 2,
+            'migrating': ['uuid1'], 'failed': []}
+
+
+class HostDrainTestV211(test.NoDBTestCase):
+    wsgi_api_version = '2.11'
+
+    def setUp(self):
+        super(HostDrainTestV211, self).setUp()
+        self.controller = host_drain.HostDrainController()
+        self.req = fakes.HTTPRequest.blank('', version=self.wsgi_api_version,
+                                           use_admin_context=True)
+
+    def _create(self, **kwargs):
+        body = {'host_drain': dict({'host': 'host1'}, **kwargs)}
+        return self.controller.create(self.req, body=body)
+
+    @mock.patch.object(compute_api.HostAPI, 'drain_host',
+                       return_value=PROGRESS)
+    def test_create(self, mock_drain):
+        res = self._create(block_migration=True, disk_over_commit='False',
+                           order='priority')
+
+        self.assertEqual({'host_drain': PROGRESS}, res)
+        mock_drain.assert_called_once_with(self.req.environ['nova.context'],
+                                           'host1', True, False,
+                                           order='priority')
+
+    @mock.patch.object(compute_api.HostAPI, 'drain_host',
+                       return_value=PROGRESS)
+    def test_create_defaults(self, mock_drain):
+        self._create()
+
+        mock_drain.assert_called_once_with(self.req.environ['nova.context'],
+                                           'host1', False, False, order=None)
+
+    def test_create_invalid_order(self):
+        self.assertRaises(exception.ValidationError, self._create,
+                          order='largest')
+
+    def test_create_unknown_parameter(self):
+        self.assertRaises(exception.ValidationError, self._create,
+                          concurrency=10)
+
+    def _test_create_raises(self, error, expected):
+        with mock.patch.object(self.controller.api, 'drain_host',
+                               side_effect=error):
+            self.assertRaises(expected, self._create)
+
+    def test_create_host_not_found(self):
+        self._test_create_raises(exception.ComputeHostNotFound(host='host1'),
+                                 webob.exc.HTTPNotFound)
+
+    def test_create_service_unavailable(self):
+        self._test_create_raises(
+            exception.ComputeServiceUnavailable(host='host1'),
+            webob.exc.HTTPBadRequest)
+
+    def test_create_in_progress(self):
+        self._test_create_raises(exception.HostDrainInProgress(host='host1'),
+                                 webob.exc.HTTPConflict)
+
+    def test_create_not_implemented(self):
+        self._test_create_raises(NotImplementedError(),
+                                 webob.exc.HTTPNotImplemented)
+
+    @mock.patch.object(compute_api.HostAPI, 'get_host_drain',
+                       return_value=PROGRESS)
+    def test_show(self, mock_get):
+        res = self.controller.show(self.req, 'host1')
+
+        self.assertEqual({'host_drain': PROGRESS}, res)
+        mock_get.assert_called_once_with(self.req.environ['nova.context'],
+                                         'host1')
+
+    @mock.patch.object(compute_api.HostAPI, 'get_host_drain',
+                       side_effect=exception.ComputeHostNotFound(host='x'))
+    def test_show_host_not_found(self, mock_get):
+        self.assertRaises(webob.exc.HTTPNotFound, self.controller.show,
+                          self.req, 'x')
+
+    def test_create_old_version(self):
+        self.req.api_version_request = api_version.APIVersionRequest('2.10')
+        self.assertRaises(exception.VersionNotFoundForAPIMethod,
+                          self._create)
+
+    def test_show_old_version(self):
+        self.req.api_version_request = api_version.APIVersionRequest('2.10')
+        self.assertRaises(exception.VersionNotFoundForAPIMethod,
+                          self.controller.show, self.req, 'host1')
+
+
+class HostDrainPolicyEnforcementV211(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HostDrainPolicyEnforcementV211, self).setUp()
+        self.controller = host_drain.HostDrainController()
+        self.req = fakes.HTTPRequest.blank('', version='2.11')
+        self.rule_name = "os_compute_api:os-host-drain"
+        self.policy.set_rules({self.rule_name: "project_id:non_fake"})
+
+    def _assert_policy_failed(self, func, *args, **kwargs):
+        exc = self.assertRaises(exception.PolicyNotAuthorized,
+                                func, *args, **kwargs)
+        self.assertEqual(
+            "Policy doesn't allow %s to be performed." % self.rule_name,
+            exc.format_message())
+
+    def test_create_policy_failed(self):
+        self._assert_policy_failed(self.controller.create, self.req,
+                                   body={'host_drain': {'host': 'host1'}})
+
+    def test_show_policy_failed(self):
+        self._assert_policy_failed(self.controller.show, self.req, 'host1')
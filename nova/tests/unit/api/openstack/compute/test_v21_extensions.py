@@ -13,8 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+
+import fixtures
 import mock
 from oslo_config import cfg
+from oslo_serialization import jsonutils
 import stevedore
 import webob.exc
 
@@ -22,8 +26,10 @@ from nova.api import openstack
 from nova.api.openstack import compute
 from nova.api.openstack.compute import plugins
 from nova.api.openstack import extensions
+from nova.api.openstack import wsgi
 from nova import exception
 from nova import test
+from nova.tests.unit.api.openstack import fakes
 
 CONF = cfg.CONF
 
@@ -210,3 +216,99 @@ class ExtensionLoadingTestCase(test.NoDBTestCase):
             raise exception.PolicyNotAuthorized(action="foo")
 
         self.assertRaises(exception.PolicyNotAuthorized, fake_func)
+
+
+class LazyExtensionLoadingTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(LazyExtensionLoadingTestCase, self).setUp()
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        self.cache_file = os.path.join(tempdir, 'routes.json')
+        self.flags(route_cache_file=self.cache_file, group='osapi_v3')
+
+    def _lazy_app(self):
+        self.flags(lazy_load_extensions=True, group='osapi_v3')
+        with mock.patch.object(stevedore.enabled,
+                               'EnabledExtensionManager') as mock_mgr:
+            app = compute.APIRouterV21()
+        self.assertFalse(mock_mgr.called)
+        return app
+
+    def test_route_cache_written(self):
+        app = compute.APIRouterV21()
+        with open(self.cache_file) as f:
+            cache = jsonutils.load(f)
+        names = [info['alias'] for info in cache['extensions']]
+        self.assertEqual(sorted(app._loaded_extension_info.extensions),
+                         sorted(names))
+        servers = [info for info in cache['extensions']
+                   if info['alias'] == 'servers'][0]
+        self.assertEqual('servers', servers['resources'][0]['collection'])
+        self.assertFalse(servers['eager'])
+
+    def test_lazy_load_matches_eager(self):
+        eager_app = compute.APIRouterV21()
+        app = self._lazy_app()
+
+        self.assertEqual(sorted(eager_app._loaded_extension_info.extensions),
+                         sorted(app._loaded_extension_info.extensions))
+        self.assertNotIn('servers', app.resources)
+        # Extensions with custom routes are loaded on startup.
+        self.assertIn('metadata', app.resources)
+
+        # os-volumes_boot inherits from servers, so both get loaded.
+        resource = app._get_lazy_resource('os-volumes_boot')
+        self.assertIsInstance(resource, wsgi.ResourceV21)
+        self.assertIn('servers', app.resources)
+        for collection in ('servers', 'os-volumes_boot'):
+            eager_resource = eager_app.resources[collection]
+            lazy_resource = app.resources[collection]
+            self.assertEqual(sorted(eager_resource.wsgi_actions),
+                             sorted(lazy_resource.wsgi_actions))
+            self.assertEqual(sorted(eager_resource.wsgi_extensions),
+                             sorted(lazy_resource.wsgi_extensions))
+            self.assertEqual(
+                sorted(eager_resource.wsgi_action_extensions),
+                sorted(lazy_resource.wsgi_action_extensions))
+        self.assertNotIn('os-keypairs', app.resources)
+
+    def test_lazy_load_on_request(self):
+        compute.APIRouterV21()
+        app = self._lazy_app()
+        fakes.stub_out_key_pair_funcs(self.stubs)
+
+        req = webob.Request.blank('/v2.1/fake/os-keypairs')
+        res = req.get_response(fakes.wsgi_app_v21(inner_app_v21=app))
+        self.assertEqual(200, res.status_int)
+        self.assertEqual('key', jsonutils.loads(res.body)[
+            'keypairs'][0]['keypair']['name'])
+        self.assertIn('os-keypairs', app.resources)
+
+    def test_lazy_load_stale_cache(self):
+        compute.APIRouterV21()
+        with open(self.cache_file) as f:
+            cache = jsonutils.load(f)
+        cache['fingerprint'] = 'stale'
+        with open(self.cache_file, 'w') as f:
+            jsonutils.dump(cache, f)
+
+        self.flags(lazy_load_extensions=True, group='osapi_v3')
+        app = compute.APIRouterV21()
+        self.assertIn('servers', app.resources)
+        with open(self.cache_file) as f:
+            self.assertNotEqual('stale', jsonutils.load(f)['fingerprint'])
+
+    def test_lazy_load_missing_cache(self):
+        self.flags(lazy_load_extensions=True, group='osapi_v3')
+        app = compute.APIRouterV21()
+        self.assertIn('servers', app.resources)
+        self.assertTrue(os.path.exists(self.cache_file))
+
+    def test_lazy_resource_loads_once(self):
+        router = mock.Mock()
+        lazy = openstack._LazyResource(router, 'servers')
+        lazy('environ', 'start_response')
+        lazy('environ', 'start_response')
+        router._get_lazy_resource.assert_called_once_with('servers')
+        router._get_lazy_resource.return_value.assert_called_with(
+            'environ', 'start_response')
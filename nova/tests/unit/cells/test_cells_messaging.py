@@ -1648,6 +1648,109 @@ class CellsBroadcastMethodsTestCase(test.TestCase):
         self.src_msg_runner.bw_usage_update_at_top(self.ctxt,
                                                    fake_bw_update_info)
 
+    def test_coalesced_instance_update_at_top(self):
+        self.flags(broadcast_coalesce_window=60, group='cells')
+        uuid1 = uuidutils.generate_uuid()
+        uuid2 = uuidutils.generate_uuid()
+        info_cache = objects.InstanceInfoCache(instance_uuid=uuid1)
+        saved = {}
+
+        def fake_save(instance, **kwargs):
+            saved[instance.uuid] = instance
+
+        with mock.patch.object(objects.Instance, 'save',
+                               side_effect=fake_save, autospec=True):
+            self.src_msg_runner.instance_update_at_top(
+                self.ctxt, objects.Instance(uuid=uuid1, host='host1'))
+            self.src_msg_runner.instance_update_at_top(
+                self.ctxt, objects.Instance(uuid=uuid2, host='host2'))
+            self.src_msg_runner.instance_update_at_top(
+                self.ctxt, objects.Instance(uuid=uuid1, host='host3',
+                                            info_cache=info_cache))
+            self.assertEqual({}, saved)
+            self.src_msg_runner.flush_coalesced_broadcasts()
+
+        self.assertEqual(2, len(saved))
+        self.assertEqual('host3', saved[uuid1].host)
+        self.assertEqual(uuid1, saved[uuid1].info_cache.instance_uuid)
+        self.assertEqual('host2', saved[uuid2].host)
+        stats = self.src_msg_runner.get_coalesced_broadcast_stats()
+        self.assertEqual(3, stats['updates_received'])
+        self.assertEqual(2, stats['updates_sent'])
+        self.assertEqual(1, stats['messages_sent'])
+        self.assertEqual(0, stats['pending'])
+        self.assertEqual(3.0, stats['compression_ratio'])
+
+    def test_coalesced_merges_partial_instance_updates(self):
+        self.flags(broadcast_coalesce_window=60, group='cells')
+        uuid1 = uuidutils.generate_uuid()
+        info_cache = objects.InstanceInfoCache(instance_uuid=uuid1)
+        saved = []
+
+        def fake_save(instance, **kwargs):
+            saved.append(instance)
+
+        with mock.patch.object(objects.Instance, 'save',
+                               side_effect=fake_save, autospec=True):
+            self.src_msg_runner.instance_update_at_top(
+                self.ctxt, objects.Instance(uuid=uuid1, host='host1',
+                                            vm_state=vm_states.ACTIVE))
+            self.src_msg_runner.instance_update_at_top(
+                self.ctxt, objects.Instance(uuid=uuid1,
+                                            info_cache=info_cache))
+            self.src_msg_runner.flush_coalesced_broadcasts()
+
+        self.assertEqual(1, len(saved))
+        self.assertEqual('host1', saved[0].host)
+        self.assertEqual(vm_states.ACTIVE, saved[0].vm_state)
+        self.assertIn('host', saved[0].obj_what_changed())
+
+    def test_coalesced_destroy_supersedes_update(self):
+        self.flags(broadcast_coalesce_window=60, group='cells')
+        instance = objects.Instance(uuid=uuidutils.generate_uuid())
+
+        with contextlib.nested(
+                mock.patch.object(objects.Instance, 'save'),
+                mock.patch.object(objects.Instance, 'destroy')) as (
+                mock_save, mock_destroy):
+            self.src_msg_runner.instance_update_at_top(self.ctxt, instance)
+            self.src_msg_runner.instance_destroy_at_top(self.ctxt, instance)
+            self.src_msg_runner.flush_coalesced_broadcasts()
+            self.assertFalse(mock_save.called)
+            mock_destroy.assert_called_once_with()
+
+    def test_coalesced_bw_usage_update_at_top(self):
+        self.flags(broadcast_coalesce_window=60, group='cells')
+        bw_info = {'uuid': 'fake_uuid',
+                   'mac': 'fake_mac',
+                   'start_period': 'fake_start_period',
+                   'bw_in': 1,
+                   'bw_out': 2,
+                   'last_ctr_in': 3,
+                   'last_ctr_out': 4,
+                   'last_refreshed': None}
+        newer_bw_info = dict(bw_info, bw_in=10, bw_out=20)
+
+        with mock.patch.object(self.tgt_db_inst,
+                               'bw_usage_update') as mock_update:
+            self.src_msg_runner.bw_usage_update_at_top(self.ctxt, bw_info)
+            self.src_msg_runner.bw_usage_update_at_top(self.ctxt,
+                                                       newer_bw_info)
+            self.src_msg_runner.flush_coalesced_broadcasts()
+            mock_update.assert_called_once_with(self.ctxt, **newer_bw_info)
+
+    def test_coalesced_flushes_at_max_batch(self):
+        self.flags(broadcast_coalesce_window=60,
+                   broadcast_coalesce_max_batch=2, group='cells')
+
+        with mock.patch.object(objects.Instance, 'destroy') as mock_destroy:
+            self.src_msg_runner.instance_destroy_at_top(
+                self.ctxt, objects.Instance(uuid=uuidutils.generate_uuid()))
+            self.assertFalse(mock_destroy.called)
+            self.src_msg_runner.instance_destroy_at_top(
+                self.ctxt, objects.Instance(uuid=uuidutils.generate_uuid()))
+            self.assertEqual(2, mock_destroy.call_count)
+
     def test_sync_instances(self):
         # Reset this, as this is a broadcast down.
         self._setup_attrs(up=False)
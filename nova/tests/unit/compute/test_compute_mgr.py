@@ -110,6 +110,34 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             event_pwr_state=power_state.SHUTDOWN,
             current_pwr_state=power_state.RUNNING)
 
+    @mock.patch.object(manager.ComputeManager, '_get_power_state')
+    @mock.patch.object(manager.ComputeManager, '_sync_instance_power_state')
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    def test_handle_lifecycle_events(self, mock_get, mock_get_filters,
+                                     mock_sync, mock_get_power_state):
+        instances = [fake_instance.fake_instance_obj(self.context)
+                     for _ in range(3)]
+        mock_get_filters.return_value = instances[:2]
+        mock_get_power_state.return_value = power_state.RUNNING
+        # The first instance fails, the second must still be handled and
+        # the third is no longer in the database.
+        mock_sync.side_effect = [test.TestingException(), None]
+        events = [virtevent.LifecycleEvent(instance.uuid,
+                                           virtevent.EVENT_LIFECYCLE_STARTED)
+                  for instance in instances]
+
+        self.compute.handle_events(virtevent.LifecycleEventBatch(events))
+
+        mock_get_filters.assert_called_once_with(
+            mock.ANY, {'uuid': [i.uuid for i in instances]},
+            expected_attrs=[])
+        self.assertFalse(mock_get.called)
+        self.assertEqual(
+            [mock.call(mock.ANY, instances[0], power_state.RUNNING),
+             mock.call(mock.ANY, instances[1], power_state.RUNNING)],
+            mock_sync.call_args_list)
+
     def test_delete_instance_info_cache_delete_ordering(self):
         call_tracker = mock.Mock()
         call_tracker.clear_events_for_instance.return_value = None
@@ -3192,6 +3220,14 @@ class ComputeManagerBuildInstanceTestCase(test.NoDBTestCase):
                     self.instance, self.block_device_mapping,
                     self.requested_networks, try_deallocate_networks=True)
 
+            timings = self.compute.timings.get_stats()
+            for name in ('build.networks', 'build.block_device'):
+                self.assertEqual(1, timings[name]['count'])
+                self.assertEqual(0, timings[name]['failures'])
+            for name in ('build.spawn', 'build.total'):
+                self.assertEqual(1, timings[name]['count'])
+                self.assertEqual(1, timings[name]['failures'])
+
     @mock.patch('nova.utils.spawn_n')
     def test_reschedule_on_resources_unavailable(self, mock_spawn):
         mock_spawn.side_effect = lambda f, *a, **k: f(*a, **k)
@@ -22,6 +22,8 @@ from oslo_serialization import jsonutils
 
 from nova.cells import utils as cells_utils
 from nova import compute
+from nova.compute import task_states
+from nova.compute import utils as compute_utils
 from nova import context
 from nova import exception
 from nova import objects
@@ -297,6 +299,134 @@ class ComputeHostAPITestCase(test.TestCase):
                                                         'fake-host')
         self.assertEqual(['fake-responses'], result)
 
+    def _drain_service(self, disabled_reason=None):
+        service = objects.Service(id=1, host='fake-host', disabled=False,
+                                  disabled_reason=disabled_reason)
+        service.obj_reset_changes()
+        service.save = mock.Mock()
+        return service
+
+    @mock.patch.object(objects.MigrationList, 'get_by_filters',
+                       return_value=[])
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    @mock.patch.object(objects.Service, 'get_by_compute_host')
+    def test_drain_host(self, mock_service, mock_instances, mock_migrations):
+        service = self._drain_service()
+        mock_service.return_value = service
+        mock_instances.return_value = [objects.Instance(uuid='fake-uuid',
+                                                        task_state=None)]
+        self.host_api._compute_task_api = mock.Mock()
+        fake_notifier.NOTIFICATIONS = []
+
+        with test.nested(
+            mock.patch.object(self.host_api.servicegroup_api,
+                              'service_is_up', return_value=True),
+            mock.patch.object(self.host_api.db, 'service_update_if',
+                              return_value={'id': 1})
+        ) as (_service_is_up, mock_update_if):
+            result = self.host_api.drain_host(self.ctxt, 'fake-host', True,
+                                              False, order='priority')
+
+        mock_update_if.assert_called_once_with(
+            self.ctxt, 1, {'disabled': True,
+                           'disabled_reason': compute_utils.HOST_DRAINING},
+            {'disabled_reason': None})
+        self.assertTrue(service.disabled)
+        self.assertEqual(compute_utils.HOST_DRAINING,
+                         service.disabled_reason)
+        self.assertFalse(service.obj_what_changed())
+        self.host_api.compute_task_api.drain_host.assert_called_once_with(
+            self.ctxt, 'fake-host', True, False, order='priority')
+        self.assertEqual({'host': 'fake-host', 'status': 'draining',
+                          'instances': 1, 'migrating': [], 'failed': []},
+                         result)
+        self.assertEqual(1, len(fake_notifier.NOTIFICATIONS))
+        self.assertEqual('HostAPI.drain.start',
+                         fake_notifier.NOTIFICATIONS[0].event_type)
+
+    @mock.patch.object(objects.Service, 'get_by_compute_host')
+    def test_drain_host_in_progress(self, mock_service):
+        service = self._drain_service(compute_utils.HOST_DRAINING)
+        mock_service.return_value = service
+        self.host_api._compute_task_api = mock.Mock()
+
+        with mock.patch.object(self.host_api.servicegroup_api,
+                               'service_is_up', return_value=True):
+            self.assertRaises(exception.HostDrainInProgress,
+                              self.host_api.drain_host, self.ctxt,
+                              'fake-host', False, False)
+        self.assertFalse(service.save.called)
+        self.assertFalse(self.host_api.compute_task_api.drain_host.called)
+
+    @mock.patch.object(objects.Service, 'get_by_compute_host')
+    def test_drain_host_lost_race(self, mock_service):
+        # Another request started a drain since the service was read
+        mock_service.return_value = self._drain_service()
+        self.host_api._compute_task_api = mock.Mock()
+
+        with test.nested(
+            mock.patch.object(self.host_api.servicegroup_api,
+                              'service_is_up', return_value=True),
+            mock.patch.object(self.host_api.db, 'service_update_if',
+                              return_value=None)
+        ):
+            self.assertRaises(exception.HostDrainInProgress,
+                              self.host_api.drain_host, self.ctxt,
+                              'fake-host', False, False)
+        self.assertFalse(self.host_api.compute_task_api.drain_host.called)
+
+    @mock.patch.object(objects.Service, 'get_by_compute_host')
+    def test_drain_host_service_down(self, mock_service):
+        mock_service.return_value = self._drain_service()
+
+        with mock.patch.object(self.host_api.servicegroup_api,
+                               'service_is_up', return_value=False):
+            self.assertRaises(exception.ComputeServiceUnavailable,
+                              self.host_api.drain_host, self.ctxt,
+                              'fake-host', False, False)
+
+    @mock.patch.object(objects.MigrationList, 'get_by_filters')
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    @mock.patch.object(objects.Service, 'get_by_compute_host')
+    def test_get_host_drain(self, mock_service, mock_instances,
+                            mock_migrations):
+        mock_service.return_value = self._drain_service(
+            compute_utils.HOST_DRAINED)
+        mock_instances.return_value = [
+            objects.Instance(uuid='migrating',
+                             task_state=task_states.MIGRATING),
+            objects.Instance(uuid='failed', task_state=None),
+            objects.Instance(uuid='back', task_state=None),
+            objects.Instance(uuid='untouched', task_state=None)]
+        mock_migrations.return_value = [
+            objects.Migration(id=2, instance_uuid='failed', status='error'),
+            objects.Migration(id=1, instance_uuid='failed',
+                              status='completed'),
+            objects.Migration(id=3, instance_uuid='back', status='failed'),
+            objects.Migration(id=4, instance_uuid='back',
+                              status='completed')]
+
+        result = self.host_api.get_host_drain(self.ctxt, 'fake-host')
+
+        self.assertEqual({'host': 'fake-host', 'status': 'drained',
+                          'instances': 4, 'migrating': ['migrating'],
+                          'failed': ['failed']}, result)
+        mock_migrations.assert_called_once_with(
+            self.ctxt, {'source_compute': 'fake-host',
+                        'migration_type': 'live-migration'})
+
+    @mock.patch.object(objects.MigrationList, 'get_by_filters',
+                       return_value=[])
+    @mock.patch.object(objects.InstanceList, 'get_by_host', return_value=[])
+    @mock.patch.object(objects.Service, 'get_by_compute_host')
+    def test_get_host_drain_not_drained(self, mock_service, mock_instances,
+                                        mock_migrations):
+        mock_service.return_value = self._drain_service('maintenance')
+
+        result = self.host_api.get_host_drain(self.ctxt, 'fake-host')
+
+        self.assertIsNone(result['status'])
+
     def test_task_log_get_all(self):
         self.mox.StubOutWithMock(self.host_api.db, 'task_log_get_all')
 
@@ -473,6 +603,30 @@ class ComputeHostAPICellsTestCase(ComputeHostAPITestCase):
         # _assert_host_exists which is a no-op in the cells api
         pass
 
+    def test_drain_host(self):
+        self.assertRaises(NotImplementedError, self.host_api.drain_host,
+                          self.ctxt, 'fake-host', False, False)
+
+    def test_drain_host_in_progress(self):
+        # Draining hosts is not supported with cells
+        pass
+
+    def test_drain_host_lost_race(self):
+        # Draining hosts is not supported with cells
+        pass
+
+    def test_drain_host_service_down(self):
+        # Draining hosts is not supported with cells
+        pass
+
+    def test_get_host_drain(self):
+        self.assertRaises(NotImplementedError, self.host_api.get_host_drain,
+                          self.ctxt, 'fake-host')
+
+    def test_get_host_drain_not_drained(self):
+        # Draining hosts is not supported with cells
+        pass
+
     def test_get_host_uptime(self):
         self.mox.StubOutWithMock(self.host_api.cells_rpcapi,
                                  'get_host_uptime')
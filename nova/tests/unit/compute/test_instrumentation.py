@@ -0,0 +1,109 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for compute manager timing instrumentation."""
+
+import os
+
+import fixtures
+import mock
+from oslo_serialization import jsonutils
+
+from nova.compute import instrumentation
+from nova import test
+from nova.tests.unit import fake_notifier
+
+
+class HistogramTestCase(test.NoDBTestCase):
+    def test_add(self):
+        histogram = instrumentation.Histogram()
+        for duration in (0.005, 0.3, 0.4, 4000):
+            histogram.add(duration)
+        histogram.add(1.5, failed=True)
+
+        stats = histogram.to_dict()
+        self.assertEqual(5, stats['count'])
+        self.assertEqual(1, stats['failures'])
+        self.assertEqual(0.005, stats['min'])
+        self.assertEqual(4000, stats['max'])
+        self.assertEqual(1, stats['buckets']['0.01'])
+        self.assertEqual(2, stats['buckets']['0.5'])
+        self.assertEqual(1, stats['buckets']['2'])
+        self.assertEqual(1, stats['buckets']['+Inf'])
+
+    def test_empty(self):
+        stats = instrumentation.Histogram().to_dict()
+        self.assertEqual(0, stats['count'])
+        self.assertIsNone(stats['mean'])
+
+
+class TimingRecorderTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(TimingRecorderTestCase, self).setUp()
+        self.recorder = instrumentation.TimingRecorder('fake-host')
+
+    def test_span(self):
+        with self.recorder.span('build.spawn'):
+            pass
+        self.assertRaises(test.TestingException, self._failing_span)
+
+        stats = self.recorder.get_stats()['build.spawn']
+        self.assertEqual(2, stats['count'])
+        self.assertEqual(1, stats['failures'])
+
+    def _failing_span(self):
+        with self.recorder.span('build.spawn'):
+            raise test.TestingException()
+
+    def test_timed(self):
+        class Manager(object):
+            timings = self.recorder
+
+            @instrumentation.timed('periodic.task')
+            def task(self, context):
+                return context
+
+        self.assertEqual('ctxt', Manager().task('ctxt'))
+        self.assertEqual('task', Manager.task.__name__)
+        stats = self.recorder.get_stats()
+        self.assertEqual(1, stats['periodic.task']['count'])
+
+    def test_notifications(self):
+        fake_notifier.stub_notifier(self.stubs)
+        self.addCleanup(fake_notifier.reset)
+
+        self.recorder.record('build.networks', 1.0)
+        self.assertEqual(0, len(fake_notifier.NOTIFICATIONS))
+
+        self.flags(compute_timing_notifications=True)
+        instance = mock.Mock(uuid='fake-uuid')
+        self.recorder.record('build.networks', 2.0, instance=instance)
+        self.assertEqual(1, len(fake_notifier.NOTIFICATIONS))
+        msg = fake_notifier.NOTIFICATIONS[0]
+        self.assertEqual('compute.timing', msg.event_type)
+        self.assertEqual('compute.fake-host', msg.publisher_id)
+        self.assertEqual({'name': 'build.networks', 'duration': 2.0,
+                          'failed': False, 'host': 'fake-host',
+                          'instance_id': 'fake-uuid'}, msg.payload)
+
+    def test_dump(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'timings.json')
+        self.recorder.record('periodic._sync_power_states', 0.2)
+        self.recorder.dump(path)
+
+        with open(path) as f:
+            data = jsonutils.loads(f.read())
+        self.assertEqual('fake-host', data['host'])
+        self.assertEqual(
+            1, data['timings']['periodic._sync_power_states']['count'])
+        self.assertEqual(['timings.json'], os.listdir(os.path.dirname(path)))
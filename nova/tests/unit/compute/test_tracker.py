@@ -956,16 +956,59 @@ class TestUpdateComputeNode(BaseTestCase):
         self.assertFalse(self.rt.disabled)
         self.assertFalse(service_mock.called)
 
-        # The above call to _update() will populate the
-        # RT.old_resources collection with the resources. Here, we check that
-        # if we call _update() again with the same resources, that
-        # the scheduler client won't be called again to update those
-        # (unchanged) resources for the compute node
+        # The above call to _update() will record the reported fields in
+        # RT._reported_fields. Here, we check that if we call _update() again
+        # with the same resources, that the scheduler client won't be called
+        # again to update those (unchanged) resources for the compute node
         self.sched_client_mock.reset_mock()
         urs_mock = self.sched_client_mock.update_resource_stats
         self.rt._update(mock.sentinel.ctx)
         self.assertFalse(urs_mock.called)
 
+    def _reported_changes(self):
+        changes = []
+
+        def fake_urs(compute_node):
+            changes.append(compute_node.obj_what_changed())
+            compute_node.obj_reset_changes(recursive=True)
+
+        self.sched_client_mock.update_resource_stats.side_effect = fake_urs
+        return changes
+
+    def test_update_only_saves_changed_fields(self):
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt.compute_node.pci_device_pools = objects.PciDevicePoolList()
+        changes = self._reported_changes()
+        self.rt._update(mock.sentinel.ctx)
+        self.assertEqual(1, len(changes))
+
+        # Re-assigning the same values (as every claim does) is no change
+        self.rt.compute_node.memory_mb_used = (
+            self.rt.compute_node.memory_mb_used)
+        self.rt.compute_node.pci_device_pools = objects.PciDevicePoolList()
+        self.rt._update(mock.sentinel.ctx)
+        self.assertEqual(1, len(changes))
+        self.assertEqual(set(), self.rt.compute_node.obj_what_changed())
+
+        self.rt.compute_node.memory_mb_used += 128
+        self.rt.compute_node.vcpus_used = self.rt.compute_node.vcpus_used
+        self.rt._update(mock.sentinel.ctx)
+        self.assertEqual([set(['memory_mb_used'])], changes[1:])
+
+    def test_update_failed_report_is_retried(self):
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        urs_mock = self.sched_client_mock.update_resource_stats
+        urs_mock.side_effect = test.TestingException
+        self.assertRaises(test.TestingException,
+                          self.rt._update, mock.sentinel.ctx)
+
+        urs_mock.reset_mock()
+        urs_mock.side_effect = None
+        self.rt._update(mock.sentinel.ctx)
+        self.assertTrue(urs_mock.called)
+
     @mock.patch('nova.objects.Service.get_by_compute_host')
     def test_existing_compute_node_updated_new_resources(self, service_mock):
         self._setup_rt()
@@ -0,0 +1,222 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from nova.compute import instance_actions
+from nova.compute import task_states
+from nova.compute import utils as compute_utils
+from nova.compute import vm_states
+from nova.conductor.tasks import drain
+from nova import exception
+from nova import objects
+from nova import test
+
+
+def _instance(uuid, memory_mb, root_gb=1, priority=None,
+              vm_state=vm_states.ACTIVE, task_state=None):
+    instance = objects.Instance(uuid=uuid, host='host', memory_mb=memory_mb,
+                                root_gb=root_gb, ephemeral_gb=0,
+                                vm_state=vm_state, task_state=task_state,
+                                metadata={})
+    if priority is not None:
+        instance.metadata[drain.PRIORITY_KEY] = priority
+    instance.save = mock.Mock()
+    return instance
+
+
+class SortInstancesTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(SortInstancesTestCase, self).setUp()
+        self.instances = [_instance('big', 4096),
+                          _instance('small-disk', 512, root_gb=1),
+                          _instance('big-disk', 512, root_gb=20),
+                          _instance('urgent', 8192, priority='10'),
+                          _instance('bogus', 256, priority='high')]
+
+    def _uuids(self, order):
+        return [i.uuid for i in drain.sort_instances(self.instances, order)]
+
+    def test_smallest(self):
+        self.assertEqual(['bogus', 'small-disk', 'big-disk', 'big', 'urgent'],
+                         self._uuids(drain.ORDER_SMALLEST))
+
+    def test_priority(self):
+        self.assertEqual(['urgent', 'bogus', 'small-disk', 'big-disk', 'big'],
+                         self._uuids(drain.ORDER_PRIORITY))
+
+
+class HostDrainTaskTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(HostDrainTaskTestCase, self).setUp()
+        self.context = 'context'
+        self.live_migrate = mock.Mock(side_effect=self._live_migrate)
+        self.task = drain.HostDrainTask(self.context, 'host', True, False,
+                                        None, self.live_migrate)
+        # Final status of the migration of each instance, the migration
+        # is 'running' when first looked up
+        self.results = {}
+        self.migrations = {}
+        self.running = set()
+        self.max_running = 0
+        # Host and task state of the instances being migrated, when they
+        # are not still on the host and migrating
+        self.instance_states = {}
+
+        self.flags(drain_host_max_concurrent_migrations=2)
+        self.service = objects.Service(
+            host='host', disabled=True,
+            disabled_reason=compute_utils.HOST_DRAINING)
+        self.service.save = mock.Mock()
+        for patcher in (
+                mock.patch.object(drain, 'MIGRATION_POLL_INTERVAL', 0),
+                mock.patch.object(objects.InstanceAction, 'action_start'),
+                mock.patch.object(objects.Migration, 'get_by_id',
+                                  side_effect=self._get_migration),
+                mock.patch.object(objects.Instance, 'get_by_uuid',
+                                  side_effect=self._get_instance),
+                mock.patch.object(objects.Service, 'get_by_compute_host',
+                                  return_value=self.service)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _live_migrate(self, context, instance, scheduler_hint,
+                      block_migration, disk_over_commit):
+        result = self.results[instance.uuid]
+        if isinstance(result, Exception):
+            raise result
+        migration = objects.Migration(id=len(self.migrations),
+                                      instance_uuid=instance.uuid,
+                                      dest_compute='dest',
+                                      status='pre-migrating')
+        self.migrations[migration.id] = migration
+        self.running.add(instance.uuid)
+        self.max_running = max(self.max_running, len(self.running))
+        return migration
+
+    def _get_migration(self, context, migration_id):
+        migration = self.migrations[migration_id]
+        if migration.status == 'pre-migrating':
+            migration.status = 'running'
+        else:
+            migration.status = self.results[migration.instance_uuid]
+            self.running.discard(migration.instance_uuid)
+        return migration
+
+    def _get_instance(self, context, uuid):
+        state = self.instance_states.get(uuid,
+                                         ('host', task_states.MIGRATING))
+        if isinstance(state, Exception):
+            raise state
+        return objects.Instance(uuid=uuid, host=state[0],
+                                task_state=state[1])
+
+    def _execute(self, instances):
+        with mock.patch.object(objects.InstanceList, 'get_by_host',
+                               return_value=instances) as get_by_host:
+            stats = self.task.execute()
+        get_by_host.assert_called_once_with(self.context, 'host',
+                                            expected_attrs=['metadata'])
+        return stats
+
+    def test_execute(self):
+        instances = [_instance('uuid%d' % i, 512 * (5 - i))
+                     for i in range(5)]
+        self.results = {i.uuid: 'completed' for i in instances}
+
+        stats = self._execute(instances)
+
+        self.assertEqual(5, stats['instances'])
+        self.assertEqual(5, stats['migrated'])
+        self.assertEqual(0, stats['failed'])
+        self.assertEqual(0, stats['skipped'])
+        self.assertEqual(2, self.max_running)
+        # The smallest instances are migrated first
+        self.assertEqual(['uuid4', 'uuid3', 'uuid2', 'uuid1', 'uuid0'],
+                         [c[0][1].uuid
+                          for c in self.live_migrate.call_args_list])
+        self.live_migrate.assert_any_call(self.context, instances[0],
+                                          {'host': None}, True, False)
+        for instance in instances:
+            self.assertEqual(task_states.MIGRATING, instance.task_state)
+            instance.save.assert_called_once_with(expected_task_state=[None])
+        objects.InstanceAction.action_start.assert_any_call(
+            self.context, 'uuid0', instance_actions.LIVE_MIGRATION,
+            want_result=False)
+        self.assertEqual(compute_utils.HOST_DRAINED,
+                         self.service.disabled_reason)
+        self.service.save.assert_called_once_with()
+
+    def test_execute_concurrency(self):
+        self.flags(drain_host_max_concurrent_migrations=1)
+        instances = [_instance('uuid%d' % i, 512) for i in range(3)]
+        self.results = {i.uuid: 'completed' for i in instances}
+
+        self._execute(instances)
+
+        self.assertEqual(1, self.max_running)
+
+    def test_execute_skips_failures(self):
+        instances = [_instance('precheck', 512),
+                     _instance('rollback', 1024),
+                     _instance('stopped', 2048, vm_state=vm_states.STOPPED),
+                     _instance('busy', 2048,
+                               task_state=task_states.REBOOTING),
+                     _instance('raced', 4096),
+                     _instance('ok', 8192)]
+        instances[4].save.side_effect = exception.UnexpectedTaskStateError(
+            expected=None, actual=task_states.DELETING)
+        self.results = {'precheck': exception.NoValidHost(reason=''),
+                        'rollback': 'error',
+                        'ok': 'completed'}
+
+        stats = self._execute(instances)
+
+        self.assertEqual({'instances': 6, 'migrated': 1, 'failed': 2,
+                          'skipped': 3},
+                         {k: v for k, v in stats.items() if k != 'elapsed'})
+        self.assertEqual(['precheck', 'rollback', 'ok'],
+                         [c[0][1].uuid
+                          for c in self.live_migrate.call_args_list])
+        self.assertEqual(compute_utils.HOST_DRAINED,
+                         self.service.disabled_reason)
+
+    def test_execute_migration_timeout(self):
+        self.flags(drain_host_migration_timeout=1)
+        instances = [_instance('stuck', 512)]
+        self.results = {'stuck': 'running'}
+
+        with mock.patch.object(drain.timeutils, 'is_older_than',
+                               return_value=True):
+            stats = self._execute(instances)
+
+        self.assertEqual(1, stats['failed'])
+        self.assertFalse(objects.Migration.get_by_id.called)
+
+    def test_execute_migration_left_running(self):
+        # The compute services restarted in the middle of the migrations
+        # and left their records running.
+        instances = [_instance('rolled-back', 512),
+                     _instance('moved', 1024),
+                     _instance('deleted', 2048)]
+        self.results = {i.uuid: 'running' for i in instances}
+        self.instance_states = {
+            'rolled-back': ('host', None),
+            'moved': ('dest', None),
+            'deleted': exception.InstanceNotFound(instance_id='deleted')}
+
+        stats = self._execute(instances)
+
+        self.assertEqual(1, stats['migrated'])
+        self.assertEqual(2, stats['failed'])
+        self.assertEqual(compute_utils.HOST_DRAINED,
+                         self.service.disabled_reason)
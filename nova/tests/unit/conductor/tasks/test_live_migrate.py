@@ -445,3 +445,86 @@ class LiveMigrationTaskTestCase(test.NoDBTestCase):
 
         self.mox.ReplayAll()
         self.assertRaises(exception.NoValidHost, self.task._find_destination)
+
+    def _test_find_destination_candidates(self, checks, dests, attempts=1):
+        self.flags(migrate_destination_candidates=3)
+        filter_properties = []
+
+        def fake_select_destinations(context, request_spec, props):
+            filter_properties.append(
+                dict(props, ignore_hosts=props['ignore_hosts'][:]))
+            return dests.pop(0)
+
+        def fake_check_candidate(host):
+            result = checks[host]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        with test.nested(
+            mock.patch.object(utils, 'get_image_from_system_metadata'),
+            mock.patch.object(scheduler_utils, 'build_request_spec',
+                              return_value={}),
+            mock.patch.object(scheduler_utils, 'setup_instance_group'),
+            mock.patch.object(self.task.scheduler_client,
+                              'select_destinations',
+                              side_effect=fake_select_destinations),
+            mock.patch.object(self.task,
+                              '_check_compatible_with_source_hypervisor'),
+            mock.patch.object(self.task,
+                              '_check_can_live_migrate_destination',
+                              side_effect=fake_check_candidate),
+        ) as (mock_image, mock_spec, mock_group, mock_select, mock_compat,
+              mock_livem):
+            host = self.task._find_destination()
+        self.assertEqual(attempts, mock_select.call_count)
+        return host, filter_properties
+
+    def test_find_destination_candidates(self):
+        checks = {'host1': exception.MigrationPreCheckError(reason=''),
+                  'host2': 'data2',
+                  'host3': 'data3'}
+        dests = [[{'host': 'host1'}, {'host': 'host2'}, {'host': 'host3'}]]
+
+        host, filter_properties = self._test_find_destination_candidates(
+            checks, dests)
+
+        self.assertEqual('host2', host)
+        self.assertEqual('data2', self.task.migrate_data)
+        self.assertEqual([{'ignore_hosts': [self.instance_host],
+                           'num_candidates': 3}], filter_properties)
+
+    def test_find_destination_candidates_all_fail(self):
+        checks = {'host1': exception.InvalidHypervisorType(),
+                  'host2': exception.MigrationPreCheckError(reason=''),
+                  'host3': 'data3'}
+        dests = [[{'host': 'host1'}, {'host': 'host2'}],
+                 [{'host': 'host3'}]]
+
+        host, filter_properties = self._test_find_destination_candidates(
+            checks, dests, attempts=2)
+
+        self.assertEqual('host3', host)
+        self.assertEqual('data3', self.task.migrate_data)
+        self.assertEqual([self.instance_host, 'host1', 'host2'],
+                         filter_properties[1]['ignore_hosts'])
+
+    def test_find_destination_candidates_limited_by_max_retries(self):
+        self.flags(migrate_max_retries=1)
+        checks = {'host1': exception.InvalidHypervisorType(),
+                  'host2': exception.InvalidHypervisorType(),
+                  'host3': 'data3'}
+        dests = [[{'host': 'host1'}, {'host': 'host2'}, {'host': 'host3'}]]
+
+        self.assertRaises(exception.MaxRetriesExceeded,
+                          self._test_find_destination_candidates,
+                          checks, dests)
+
+    def test_find_destination_candidates_unexpected_error(self):
+        checks = {'host1': test.TestingException(),
+                  'host2': 'data2'}
+        dests = [[{'host': 'host1'}, {'host': 'host2'}]]
+
+        self.assertRaises(test.TestingException,
+                          self._test_find_destination_candidates,
+                          checks, dests)
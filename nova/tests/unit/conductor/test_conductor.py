@@ -35,6 +35,7 @@ from nova import conductor
 from nova.conductor import api as conductor_api
 from nova.conductor import manager as conductor_manager
 from nova.conductor import rpcapi as conductor_rpcapi
+from nova.conductor.tasks import drain
 from nova.conductor.tasks import live_migrate
 from nova.conductor.tasks import migrate
 from nova import context
@@ -1500,6 +1501,16 @@ class ConductorTaskTestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
         self.conductor = conductor_manager.ComputeTaskManager()
         self.conductor_manager = self.conductor
 
+    @mock.patch.object(drain, 'HostDrainTask')
+    def test_drain_host(self, mock_task):
+        self.conductor.drain_host(self.context, 'host', True, False,
+                                  order='priority')
+
+        mock_task.assert_called_once_with(
+            self.context, 'host', True, False, 'priority',
+            self.conductor._live_migrate)
+        mock_task.return_value.execute.assert_called_once_with()
+
     def test_migrate_server_fails_with_rebuild(self):
         self.assertRaises(NotImplementedError, self.conductor.migrate_server,
             self.context, None, None, True, True, None, None, None)
@@ -2034,6 +2045,17 @@ class ConductorTaskRPCAPITestCase(_BaseTaskTestCase,
         service_manager = self.conductor_service.manager
         self.conductor_manager = service_manager.compute_task_mgr
 
+    def test_drain_host(self):
+        with mock.patch.object(self.conductor.client,
+                               'prepare') as mock_prepare:
+            self.conductor.drain_host(self.context, 'host', True, False,
+                                      order='priority')
+
+        mock_prepare.assert_called_once_with(version='1.12')
+        mock_prepare.return_value.cast.assert_called_once_with(
+            self.context, 'drain_host', host='host', block_migration=True,
+            disk_over_commit=False, order='priority')
+
 
 class ConductorTaskAPITestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
     """Compute task API Tests."""
@@ -2052,3 +2074,16 @@ class ConductorLocalComputeTaskAPITestCase(ConductorTaskAPITestCase):
         super(ConductorLocalComputeTaskAPITestCase, self).setUp()
         self.conductor = conductor_api.LocalComputeTaskAPI()
         self.conductor_manager = self.conductor._manager._target
+
+    @mock.patch('nova.utils.spawn_n')
+    @mock.patch.object(drain, 'HostDrainTask')
+    def test_drain_host(self, mock_task, mock_spawn):
+        mock_spawn.side_effect = lambda f, *a, **k: f(*a, **k)
+
+        self.conductor.drain_host(self.context, 'host', True, False,
+                                  order='priority')
+
+        mock_task.assert_called_once_with(
+            self.context, 'host', True, False, 'priority',
+            self.conductor_manager._live_migrate)
+        mock_task.return_value.execute.assert_called_once_with()
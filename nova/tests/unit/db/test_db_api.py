@@ -2871,6 +2871,23 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         for key, value in new_values.items():
             self.assertEqual(value, updated_service[key])
 
+    def test_service_update_if(self):
+        service = self._create_service({'disabled_reason': 'reason'})
+        values = {'disabled': True, 'disabled_reason': 'new reason'}
+
+        self.assertIsNone(db.service_update_if(
+            self.ctxt, service['id'], values,
+            {'disabled_reason': 'other reason'}))
+        self.assertFalse(db.service_get(self.ctxt, service['id'])['disabled'])
+
+        updated = db.service_update_if(self.ctxt, service['id'], values,
+                                       {'disabled_reason': 'reason'})
+        self.assertTrue(updated['disabled'])
+        self.assertEqual('new reason', updated['disabled_reason'])
+        # The reason it expected is gone, a second update loses.
+        self.assertIsNone(db.service_update_if(
+            self.ctxt, service['id'], values, {'disabled_reason': 'reason'}))
+
     def test_service_update_not_found_exception(self):
         self.assertRaises(exception.ServiceNotFound,
                           db.service_update, self.ctxt, 100500, {})
@@ -5617,6 +5634,22 @@ class BlockDeviceMappingTestCase(test.TestCase):
         bmd = db.block_device_mapping_get_all_by_instance(self.ctxt, uuid2)
         self.assertEqual(len(bmd), 2)
 
+    def test_block_device_mapping_get_all_by_instance_uuids(self):
+        uuid1 = self.instance['uuid']
+        uuid2 = db.instance_create(self.ctxt, {})['uuid']
+        uuid3 = db.instance_create(self.ctxt, {})['uuid']
+
+        self._create_bdm({'instance_uuid': uuid1, 'device_name': '/dev/vda'})
+        self._create_bdm({'instance_uuid': uuid2, 'device_name': '/dev/vdb'})
+        self._create_bdm({'instance_uuid': uuid3, 'device_name': '/dev/vdc'})
+
+        bdms = db.block_device_mapping_get_all_by_instance_uuids(
+            self.ctxt, [uuid1, uuid2])
+        self.assertEqual(['/dev/vda', '/dev/vdb'],
+                         sorted(bdm['device_name'] for bdm in bdms))
+        self.assertEqual([], db.block_device_mapping_get_all_by_instance_uuids(
+            self.ctxt, []))
+
     def test_block_device_mapping_destroy(self):
         bdm = self._create_bdm({})
         db.block_device_mapping_destroy(self.ctxt, bdm['id'])
@@ -6471,6 +6504,83 @@ class QuotaTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertRaises(exception.QuotaExists, db.quota_create, self.ctxt,
                           'project1', 'resource1', 42)
 
+    def _setup_optimistic(self, until_refresh=None):
+        for user_id in ('u1', 'u2'):
+            sqlalchemy_api._quota_usage_create('p1', user_id, 'resource0', 1,
+                                               0, until_refresh)
+        self.quotas = {'resource0': 5}
+        self.user_quotas = {'resource0': 4}
+
+    def _reserve_optimistic(self, delta, **kwargs):
+        return db.quota_reserve_optimistic(
+            self.ctxt, {}, self.quotas, self.user_quotas,
+            {'resource0': delta}, timeutils.utcnow(), None, None,
+            project_id='p1', user_id='u1', **kwargs)
+
+    def _get_usage(self):
+        return db.quota_usage_get(self.ctxt, 'p1', 'resource0', 'u1')
+
+    def test_quota_reserve_optimistic(self):
+        self._setup_optimistic()
+        reservations = self._reserve_optimistic(2)
+        self.assertEqual(1, len(reservations))
+        self.assertEqual(2, _reservation_get(self.ctxt,
+                                             reservations[0]).delta)
+        self.assertEqual(2, self._get_usage().reserved)
+
+        # 1 + 2 + 1 in use or reserved in the project, limit is 5
+        self.assertRaises(exception.OverQuota, self._reserve_optimistic, 2)
+        self.assertEqual(2, self._get_usage().reserved)
+
+    def test_quota_reserve_optimistic_needs_refresh(self):
+        db.quota_create(self.ctxt, 'p1', 'resource0', 5)
+        self.quotas = self.user_quotas = {'resource0': 5}
+        # No usage record yet
+        self.assertIsNone(self._reserve_optimistic(1))
+
+        sqlalchemy_api._quota_usage_create('p1', 'u1', 'resource0', 1, 0, 2)
+        reservations = self._reserve_optimistic(1)
+        self.assertEqual(1, self._get_usage().until_refresh)
+        # The next reservation would bring until_refresh to 0
+        self.assertIsNone(self._reserve_optimistic(1))
+        db.reservation_rollback_optimistic(self.ctxt, reservations)
+
+    def test_quota_reserve_optimistic_lost_race(self):
+        self._setup_optimistic()
+        with mock.patch.object(sqlalchemy_api, '_calculate_overquota',
+                               side_effect=[[], ['resource0']]):
+            # Left to the locking path rather than refused
+            self.assertIsNone(self._reserve_optimistic(2, max_retries=0))
+        usage = self._get_usage()
+        self.assertEqual(0, usage.reserved)
+        self.assertEqual(1, usage.in_use)
+        self.assertEqual(0, len(
+            sqlalchemy_api.model_query(self.ctxt, models.Reservation).all()))
+
+    def test_reservation_commit_optimistic(self):
+        self._setup_optimistic()
+        reservations = self._reserve_optimistic(2)
+        db.reservation_commit_optimistic(self.ctxt, reservations)
+        self.assertRaises(exception.ReservationNotFound,
+                          _reservation_get, self.ctxt, reservations[0])
+        usage = self._get_usage()
+        self.assertEqual(0, usage.reserved)
+        self.assertEqual(3, usage.in_use)
+
+        # Committing twice must not count the reservation twice
+        db.reservation_commit_optimistic(self.ctxt, reservations)
+        self.assertEqual(3, self._get_usage().in_use)
+
+    def test_reservation_rollback_optimistic(self):
+        self._setup_optimistic()
+        reservations = self._reserve_optimistic(2)
+        db.reservation_rollback_optimistic(self.ctxt, reservations)
+        self.assertRaises(exception.ReservationNotFound,
+                          _reservation_get, self.ctxt, reservations[0])
+        usage = self._get_usage()
+        self.assertEqual(0, usage.reserved)
+        self.assertEqual(1, usage.in_use)
+
 
 class QuotaReserveNoDbTestCase(test.NoDBTestCase):
     """Tests quota reserve/refresh operations using mock."""
@@ -6683,6 +6793,13 @@ class S3ImageTestCase(test.TestCase):
             self.assertTrue(uuidutils.is_uuid_like(ref.uuid))
             self.assertEqual(uuid, ref.uuid)
 
+    def test_s3_image_get_by_uuids(self):
+        refs = db.s3_image_get_by_uuids(self.ctxt, self.values[:2] +
+                                        [uuidutils.generate_uuid()])
+        self.assertEqual(sorted(self.values[:2]),
+                         sorted(ref.uuid for ref in refs))
+        self.assertEqual([], db.s3_image_get_by_uuids(self.ctxt, []))
+
     def test_s3_image_get(self):
         self.assertEqual(sorted(self.values),
                          sorted([db.s3_image_get(self.ctxt, ref.id).uuid
@@ -7626,6 +7743,16 @@ class Ec2TestCase(test.TestCase):
         inst2 = db.ec2_instance_get_by_uuid(self.ctxt, 'fake-uuid')
         self.assertEqual(inst['id'], inst2['id'])
 
+    def test_ec2_instance_get_by_uuids(self):
+        inst = db.ec2_instance_create(self.ctxt, 'fake-uuid')
+        inst2 = db.ec2_instance_create(self.ctxt, 'fake-uuid2')
+        db.ec2_instance_create(self.ctxt, 'fake-uuid3')
+        insts = db.ec2_instance_get_by_uuids(
+            self.ctxt, ['fake-uuid', 'fake-uuid2', 'uuid-not-present'])
+        self.assertEqual(sorted([inst['id'], inst2['id']]),
+                         sorted(i['id'] for i in insts))
+        self.assertEqual([], db.ec2_instance_get_by_uuids(self.ctxt, []))
+
     def test_ec2_instance_get_by_id(self):
         inst = db.ec2_instance_create(self.ctxt, 'fake-uuid')
         inst2 = db.ec2_instance_get_by_id(self.ctxt, inst['id'])
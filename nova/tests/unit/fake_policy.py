@@ -248,6 +248,7 @@ policy_data = """
     "compute_extension:hide_server_addresses": "",
     "os_compute_api:os-hide-server-addresses": "",
     "compute_extension:hosts": "",
+    "os_compute_api:os-host-drain": "rule:admin_api",
     "os_compute_api:os-hosts": "rule:admin_api",
     "compute_extension:hypervisors": "rule:admin_api",
     "os_compute_api:os-hypervisors": "rule:admin_api",
@@ -19,6 +19,7 @@ import datetime
 import os
 import time
 
+import fixtures
 import mock
 from mox3 import mox
 from oslo_concurrency import processutils
@@ -485,6 +486,103 @@ class LinuxNetworkTestCase(test.NoDBTestCase):
 
         self.driver.update_dhcp(self.context, "eth0", networks[0])
 
+    def _setup_incremental_dhcp(self, dnsmasq_pid=123):
+        self.flags(use_single_default_gateway=True,
+                   dnsmasq_incremental_updates=True,
+                   networks_path=self.useFixture(fixtures.TempDir()).path)
+        for state in (linux_net._dnsmasq_files,
+                      linux_net._dnsmasq_last_reload,
+                      linux_net._dnsmasq_pending_reloads):
+            self.addCleanup(state.clear)
+        self.stubs.Set(linux_net, '_dnsmasq_pid_for',
+                       lambda *a, **kw: dnsmasq_pid)
+        self.stubs.Set(linux_net, 'is_pid_cmdline_correct',
+                       lambda *a, **kw: True)
+
+    @mock.patch.object(linux_net, 'restart_dhcp')
+    @mock.patch('eventlet.greenthread.spawn_after')
+    def test_update_dhcp_incremental(self, mock_spawn_after,
+                                     mock_restart_dhcp):
+        self._setup_incremental_dhcp()
+        conffile = linux_net._dhcp_file('eth0', 'conf')
+        optsfile = linux_net._dhcp_file('eth0', 'opts')
+
+        self.driver.update_dhcp(self.context, 'eth0', networks[0])
+
+        fixedips = self._get_fixedips(networks[0])
+        with open(conffile) as f:
+            self.assertEqual(self.driver.get_dhcp_hosts(
+                self.context, networks[0], fixedips), f.read())
+        with open(optsfile) as f:
+            self.assertEqual(self.driver.get_dhcp_opts(
+                self.context, networks[0], fixedips), f.read())
+        mock_spawn_after.assert_called_once_with(
+            0, linux_net._reload_dnsmasq, 'eth0')
+        self.assertFalse(mock_restart_dhcp.called)
+
+        # Nothing changed, so nothing is written and no reload is sent.
+        mock_spawn_after.reset_mock()
+        linux_net._dnsmasq_pending_reloads.clear()
+        mtime = os.stat(conffile).st_mtime
+        with mock.patch.object(linux_net, 'write_to_file') as mock_write:
+            self.driver.update_dhcp(self.context, 'eth0', networks[0])
+            self.assertFalse(mock_write.called)
+        self.assertEqual(mtime, os.stat(conffile).st_mtime)
+        self.assertFalse(mock_spawn_after.called)
+
+    @mock.patch.object(linux_net, '_add_dnsmasq_accept_rules')
+    @mock.patch.object(linux_net, '_add_dhcp_mangle_rule')
+    @mock.patch('eventlet.greenthread.spawn_after')
+    def test_update_dhcp_incremental_running_adds_rules(
+            self, mock_spawn_after, mock_mangle, mock_accept):
+        self._setup_incremental_dhcp()
+
+        self.driver.update_dhcp(self.context, 'eth0', networks[0])
+        mock_mangle.assert_called_once_with('eth0')
+        mock_accept.assert_called_once_with('eth0')
+
+        # The rules are reapplied even when the files did not change, as
+        # they are lost when nova-network restarts with dnsmasq running.
+        self.driver.update_dhcp(self.context, 'eth0', networks[0])
+        self.assertEqual(2, mock_mangle.call_count)
+        self.assertEqual(2, mock_accept.call_count)
+        self.assertEqual(1, mock_spawn_after.call_count)
+
+    @mock.patch('eventlet.greenthread.spawn_after')
+    def test_update_dhcp_incremental_coalesces_reloads(self,
+                                                       mock_spawn_after):
+        self._setup_incremental_dhcp()
+        self.flags(dnsmasq_reload_interval=10)
+
+        self.driver.update_dhcp(self.context, 'eth0', networks[0])
+        # A second network's entries land in the same device's files
+        # while the first reload is still pending.
+        self.driver.update_dhcp(self.context, 'eth0', networks[1])
+        self.assertEqual(1, mock_spawn_after.call_count)
+
+        # Once the reload went out, the next one waits for the interval.
+        with mock.patch.object(linux_net, '_execute') as mock_execute:
+            linux_net._reload_dnsmasq('eth0')
+            mock_execute.assert_called_once_with('kill', '-HUP', 123,
+                                                 run_as_root=True)
+        self.driver.update_dhcp(self.context, 'eth0', networks[0])
+        self.assertEqual(2, mock_spawn_after.call_count)
+        delay = mock_spawn_after.call_args[0][0]
+        self.assertTrue(9 < delay <= 10)
+
+    @mock.patch.object(linux_net, 'restart_dhcp')
+    @mock.patch('eventlet.greenthread.spawn_after')
+    def test_update_dhcp_incremental_not_running(self, mock_spawn_after,
+                                                 mock_restart_dhcp):
+        self._setup_incremental_dhcp(dnsmasq_pid=None)
+
+        self.driver.update_dhcp(self.context, 'eth0', networks[0])
+
+        mock_restart_dhcp.assert_called_once_with(
+            self.context, 'eth0', networks[0], mock.ANY)
+        self.assertFalse(mock_spawn_after.called)
+        self.assertTrue(os.path.exists(linux_net._dhcp_file('eth0', 'conf')))
+
     def _get_fixedips(self, network, host=None):
         return objects.FixedIPList.get_by_network(self.context,
                                                   network,
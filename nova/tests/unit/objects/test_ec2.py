@@ -61,6 +61,16 @@ class _TestEC2InstanceMapping(object):
             imap = ec2_obj.EC2InstanceMapping.get_by_id(self.context, 1)
             self._compare(self, fake_map, imap)
 
+    def test_list_get_by_uuids(self):
+        with mock.patch.object(db, 'ec2_instance_get_by_uuids') as get:
+            get.return_value = [fake_map]
+            imaps = ec2_obj.EC2InstanceMappingList.get_by_uuids(
+                self.context, ['fake-uuid-2', 'fake-uuid-3'])
+            get.assert_called_once_with(self.context,
+                                        ['fake-uuid-2', 'fake-uuid-3'])
+            self.assertEqual(1, len(imaps))
+            self._compare(self, fake_map, imaps[0])
+
 
 class TestEC2InstanceMapping(test_objects._LocalTest, _TestEC2InstanceMapping):
     pass
@@ -184,6 +194,16 @@ class _TestS3ImageMapping(object):
             s3imap = ec2_obj.S3ImageMapping.get_by_id(self.context, 1)
             self._compare(self, fake_map, s3imap)
 
+    def test_list_get_by_uuids(self):
+        with mock.patch.object(db, 's3_image_get_by_uuids') as get:
+            get.return_value = [fake_map]
+            s3imaps = ec2_obj.S3ImageMappingList.get_by_uuids(
+                self.context, ['fake-uuid-2', 'fake-uuid-3'])
+            get.assert_called_once_with(self.context,
+                                        ['fake-uuid-2', 'fake-uuid-3'])
+            self.assertEqual(1, len(s3imaps))
+            self._compare(self, fake_map, s3imaps[0])
+
 
 class TestS3ImageMapping(test_objects._LocalTest, _TestS3ImageMapping):
     pass
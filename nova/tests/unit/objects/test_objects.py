@@ -1093,7 +1093,7 @@ object_data = {
     'BandwidthUsage': '1.2-c6e4c779c7f40f2407e3d70022e3cd1c',
     'BandwidthUsageList': '1.2-5fe7475ada6fe62413cbfcc06ec70746',
     'BlockDeviceMapping': '1.13-d44d8d694619e79c172a99b3c1d6261d',
-    'BlockDeviceMappingList': '1.14-6fa262c059dad1d519b9fe05b9e4f404',
+    'BlockDeviceMappingList': '1.15-1e568eecb91d06d4112db9fd656de235',
     'CellMapping': '1.0-7f1a7e85a22bbb7559fc730ab658b9bd',
     'ComputeNode': '1.12-71784d2e6f2814ab467d4e0f69286843',
     'ComputeNodeList': '1.12-3b6f4f5ade621c40e70cb116db237844',
@@ -1101,6 +1101,7 @@ object_data = {
     'DNSDomainList': '1.0-4ee0d9efdfd681fed822da88376e04d2',
     'EC2Ids': '1.0-474ee1094c7ec16f8ce657595d8c49d9',
     'EC2InstanceMapping': '1.0-a4556eb5c5e94c045fe84f49cf71644f',
+    'EC2InstanceMappingList': '1.0-5ede533590a21ecc0ee07d8f37fd5506',
     'EC2SnapshotMapping': '1.0-47e7ddabe1af966dce0cfd0ed6cd7cd1',
     'EC2VolumeMapping': '1.0-5b713751d6f97bad620f3378a521020d',
     'FixedIP': '1.11-b5818a33996228fc146f096d1403742c',
@@ -1152,6 +1153,7 @@ object_data = {
     'Quotas': '1.2-1fe4cd50593aaf5d36a6dc5ab3f98fb3',
     'QuotasNoOp': '1.2-e041ddeb7dc8188ca71706f78aad41c1',
     'S3ImageMapping': '1.0-7dd7366a890d82660ed121de9092276e',
+    'S3ImageMappingList': '1.0-85ce3613108802d0636f2cf6f80478b3',
     'SecurityGroup': '1.1-0e1b9ba42fe85c13c1437f8b74bdb976',
     'SecurityGroupList': '1.0-dc8bbea01ba09a2edb6e5233eae85cbc',
     'SecurityGroupRule': '1.1-ae1da17b79970012e8536f88cb3c6b29',
@@ -1179,6 +1181,7 @@ object_relationships = {
     'ComputeNode': {'HVSpec': '1.1', 'PciDevicePoolList': '1.1'},
     'ComputeNodeList': {'ComputeNode': '1.12'},
     'DNSDomainList': {'DNSDomain': '1.0'},
+    'EC2InstanceMappingList': {'EC2InstanceMapping': '1.0'},
     'FixedIP': {'Instance': '1.21', 'Network': '1.2',
                 'VirtualInterface': '1.0',
                 'FloatingIPList': '1.8'},
@@ -1217,6 +1220,7 @@ object_relationships = {
     'NUMATopology': {'NUMACell': '1.2'},
     'PciDeviceList': {'PciDevice': '1.3'},
     'PciDevicePoolList': {'PciDevicePool': '1.1'},
+    'S3ImageMappingList': {'S3ImageMapping': '1.0'},
     'SecurityGroupList': {'SecurityGroup': '1.1'},
     'SecurityGroupRule': {'SecurityGroup': '1.1'},
     'SecurityGroupRuleList': {'SecurityGroupRule': '1.1'},
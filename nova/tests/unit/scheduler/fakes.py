@@ -92,3 +92,36 @@ class FakeHostState(host_manager.HostState):
             self.instances = {}
         for (key, val) in six.iteritems(attribute_dict):
             setattr(self, key, val)
+
+
+def host_states_with_aggregates(hosts, aggregates, indexed=True):
+    """Returns FakeHostStates of hosts belonging to aggregates.
+
+    If indexed, the host states share an aggregate index, as they do when
+    set up by the HostManager.
+    """
+    index = None
+    if indexed:
+        index = host_manager.AggregateMetadataIndex()
+        for aggregate in aggregates:
+            index.update_aggregate(aggregate)
+    return [FakeHostState(host, 'node', {
+                'aggregates': [agg for agg in aggregates if host in agg.hosts],
+                'aggregate_index': index})
+            for host in hosts]
+
+
+def host_states_with_instances(instances_by_host, indexed=True):
+    """Returns FakeHostStates of the hosts with the instances given by host.
+
+    If indexed, the host states share an instance index, as they do when
+    set up by the HostManager.
+    """
+    index = None
+    if indexed:
+        index = host_manager.InstanceHostIndex()
+        for host, instances in sorted(instances_by_host.items()):
+            index.set_host_instances(host, instances)
+    return [FakeHostState(host, 'node', {'instance_index': index},
+                          instances=instances)
+            for host, instances in sorted(instances_by_host.items())]
@@ -105,6 +105,44 @@ class TestSameHostFilter(test.NoDBTestCase):
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
 
 
+class TestAffinityFiltersIndexed(test.NoDBTestCase):
+
+    def _filter(self, filt_cls, filter_properties):
+        instances_by_host = {
+            'host1': [objects.Instance(uuid='aaa', instance_type_id=1)],
+            'host2': [objects.Instance(uuid='bbb', instance_type_id=1),
+                      objects.Instance(uuid='ccc', instance_type_id=2)],
+            'host3': [],
+        }
+        results = []
+        for indexed in (True, False):
+            host_states = fakes.host_states_with_instances(
+                instances_by_host, indexed=indexed)
+            results.append([host_state.host for host_state in
+                            filt_cls.filter_all(host_states,
+                                                filter_properties)])
+        self.assertEqual(results[0], results[1])
+        return results[0]
+
+    def test_different_host(self):
+        filt_cls = affinity_filter.DifferentHostFilter()
+        for hint, hosts in ((['aaa'], ['host2', 'host3']),
+                            ('ccc', ['host1', 'host3']),
+                            (['aaa', 'ccc', 'zzz'], ['host3']),
+                            ([], ['host1', 'host2', 'host3'])):
+            self.assertEqual(hosts, self._filter(
+                filt_cls, {'scheduler_hints': {'different_host': hint}}))
+
+    def test_same_host(self):
+        filt_cls = affinity_filter.SameHostFilter()
+        for hint, hosts in ((['aaa'], ['host1', 'host3']),
+                            ('ccc', ['host2', 'host3']),
+                            (['zzz'], ['host3']),
+                            (None, ['host1', 'host2', 'host3'])):
+            self.assertEqual(hosts, self._filter(
+                filt_cls, {'scheduler_hints': {'same_host': hint}}))
+
+
 class TestSimpleCIDRAffinityFilter(test.NoDBTestCase):
 
     def setUp(self):
@@ -203,3 +241,24 @@ class TestGroupAffinityFilter(test.NoDBTestCase):
     def test_group_affinity_filter_fails(self):
         self._test_group_affinity_filter_fails(
                 affinity_filter.ServerGroupAffinityFilter(), 'affinity')
+
+    def test_group_filters_filter_all(self):
+        host_states = [fakes.FakeHostState('host%d' % i, 'node', {})
+                       for i in range(1, 4)]
+
+        def _filter(filt_cls, filter_properties):
+            return [host_state.host for host_state in
+                    filt_cls.filter_all(host_states, filter_properties)]
+
+        affinity = affinity_filter.ServerGroupAffinityFilter()
+        anti_affinity = affinity_filter.ServerGroupAntiAffinityFilter()
+        group = {'group_hosts': ['host1', 'host3']}
+        self.assertEqual(['host1', 'host3'], _filter(
+            affinity, dict(group, group_policies=['affinity'])))
+        self.assertEqual(['host2'], _filter(
+            anti_affinity, dict(group, group_policies=['anti-affinity'])))
+        self.assertEqual(['host1', 'host2', 'host3'], _filter(
+            affinity, dict(group, group_policies=['anti-affinity'])))
+        self.assertEqual(['host1', 'host2', 'host3'], _filter(
+            anti_affinity, {'group_policies': ['anti-affinity'],
+                            'group_hosts': []}))
@@ -12,6 +12,7 @@
 
 import mock
 
+from nova import objects
 from nova.scheduler.filters import aggregate_image_properties_isolation as aipi
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -105,3 +106,44 @@ class TestAggImagePropsIsolationFilter(test.NoDBTestCase):
                                                     'foo2': 'bar3'}}}}
         host = fakes.FakeHostState('host1', 'compute', {})
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+
+
+class TestAggImagePropsIsolationFilterIndexed(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestAggImagePropsIsolationFilterIndexed, self).setUp()
+        self.filt_cls = aipi.AggregateImagePropertiesIsolation()
+        self.aggregates = [
+            objects.Aggregate(id=1, hosts=['host1', 'host2'],
+                              metadata={'os.distro': 'ubuntu, debian',
+                                        'arch': 'x86_64'}),
+            objects.Aggregate(id=2, hosts=['host2', 'host3'],
+                              metadata={'os.distro': 'fedora'}),
+            objects.Aggregate(id=3, hosts=['host4'],
+                              metadata={'arch': 'aarch64'}),
+        ]
+        self.hosts = ['host1', 'host2', 'host3', 'host4', 'host5']
+
+    def _assert_passes(self, image_props, passes):
+        filter_properties = {'request_spec': {
+            'image': {'properties': image_props}}}
+        for indexed in (True, False):
+            host_states = fakes.host_states_with_aggregates(
+                self.hosts, self.aggregates, indexed=indexed)
+            self.assertEqual(passes, [
+                host_state.host for host_state in
+                self.filt_cls.filter_all(host_states, filter_properties)])
+
+    def test_filter_all(self):
+        self._assert_passes({'os.distro': 'debian'},
+                            ['host1', 'host2', 'host4', 'host5'])
+        self._assert_passes({'os.distro': 'fedora', 'arch': 'x86_64'},
+                            ['host2', 'host3', 'host5'])
+        self._assert_passes({'arch': 'aarch64', 'other': 'foo'},
+                            ['host3', 'host4', 'host5'])
+        self._assert_passes({'arch': None}, self.hosts)
+
+    def test_filter_all_namespace(self):
+        self.flags(aggregate_image_properties_isolation_namespace='os')
+        self._assert_passes({'os.distro': 'fedora', 'arch': 'aarch64'},
+                            ['host2', 'host3', 'host4', 'host5'])
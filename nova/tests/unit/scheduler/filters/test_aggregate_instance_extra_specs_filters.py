@@ -12,6 +12,7 @@
 
 import mock
 
+from nova import objects
 from nova.scheduler.filters import aggregate_instance_extra_specs as agg_specs
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -82,3 +83,45 @@ class TestAggregateInstanceExtraSpecsFilter(test.NoDBTestCase):
             'trust:trusted_host': 'true'
         }
         self._do_test_aggregate_filter_extra_specs(especs, passes=False)
+
+
+class TestAggregateInstanceExtraSpecsFilterIndexed(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestAggregateInstanceExtraSpecsFilterIndexed, self).setUp()
+        self.filt_cls = agg_specs.AggregateInstanceExtraSpecsFilter()
+        self.aggregates = [
+            objects.Aggregate(id=1, hosts=['host1', 'host2'],
+                              metadata={'ssd': 'true', 'cpus': '8'}),
+            objects.Aggregate(id=2, hosts=['host2', 'host3'],
+                              metadata={'ssd': 'false', 'gpu': 'k80, m60'}),
+            objects.Aggregate(id=3, hosts=['host4'],
+                              metadata={'cpus': '16'}),
+        ]
+        self.hosts = ['host1', 'host2', 'host3', 'host4', 'host5']
+
+    def _assert_passes(self, extra_specs, passes):
+        filter_properties = {'instance_type': {'memory_mb': 1024,
+                                               'extra_specs': extra_specs}}
+        for indexed in (True, False):
+            host_states = fakes.host_states_with_aggregates(
+                self.hosts, self.aggregates, indexed=indexed)
+            self.assertEqual(passes, [
+                host_state.host for host_state in
+                self.filt_cls.filter_all(host_states, filter_properties)])
+
+    def test_filter_all_literal(self):
+        self._assert_passes({'ssd': 'true'}, ['host1', 'host2'])
+        self._assert_passes({'aggregate_instance_extra_specs:gpu': 'm60',
+                             'trust:trusted_host': 'true'},
+                            ['host2', 'host3'])
+        self._assert_passes({'ssd': 'true', 'gpu': 'k80'}, ['host2'])
+        self._assert_passes({'ssd': 'maybe'}, [])
+
+    def test_filter_all_operators(self):
+        self._assert_passes({'cpus': '>= 10'}, ['host4'])
+        self._assert_passes({'gpu': '<or> p100 <or> k80'},
+                            ['host2', 'host3'])
+
+    def test_filter_all_no_extra_specs(self):
+        self._assert_passes({}, self.hosts)
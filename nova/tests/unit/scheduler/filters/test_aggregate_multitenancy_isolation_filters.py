@@ -12,6 +12,7 @@
 
 import mock
 
+from nova import objects
 from nova.scheduler.filters import aggregate_multitenancy_isolation as ami
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -72,3 +73,29 @@ class TestAggregateMultitenancyIsolationFilter(test.NoDBTestCase):
                                      'project_id': 'my_tenantid'}}}
         host = fakes.FakeHostState('host1', 'compute', {})
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+
+
+class TestAggregateMultitenancyIsolationFilterIndexed(test.NoDBTestCase):
+
+    def test_filter_all(self):
+        filt_cls = ami.AggregateMultiTenancyIsolation()
+        aggregates = [
+            objects.Aggregate(id=1, hosts=['host1', 'host2'],
+                              metadata={'filter_tenant_id': 'tenant1'}),
+            objects.Aggregate(id=2, hosts=['host2', 'host3'],
+                              metadata={'filter_tenant_id': 'tenant2,t3'}),
+            objects.Aggregate(id=3, hosts=['host4'],
+                              metadata={'foo': 'tenant1'}),
+        ]
+        hosts = ['host1', 'host2', 'host3', 'host4']
+        for tenant, passes in (('tenant1', ['host1', 'host2', 'host4']),
+                               ('t3', ['host2', 'host3', 'host4']),
+                               ('other', ['host4'])):
+            filter_properties = {'request_spec': {
+                'instance_properties': {'project_id': tenant}}}
+            for indexed in (True, False):
+                host_states = fakes.host_states_with_aggregates(
+                    hosts, aggregates, indexed=indexed)
+                self.assertEqual(passes, [
+                    host_state.host for host_state in
+                    filt_cls.filter_all(host_states, filter_properties)])
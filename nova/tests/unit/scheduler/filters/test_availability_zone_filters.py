@@ -12,6 +12,7 @@
 
 import mock
 
+from nova import objects
 from nova.scheduler.filters import availability_zone_filter
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -52,3 +53,41 @@ class TestAvailabilityZoneFilter(test.NoDBTestCase):
         request = self._make_zone_request('bad')
         host = fakes.FakeHostState('host1', 'node1', {})
         self.assertFalse(self.filt_cls.host_passes(host, request))
+
+
+class TestAvailabilityZoneFilterIndexed(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestAvailabilityZoneFilterIndexed, self).setUp()
+        self.filt_cls = availability_zone_filter.AvailabilityZoneFilter()
+        self.aggregates = [
+            objects.Aggregate(id=1, hosts=['host1', 'host2'],
+                              metadata={'availability_zone': 'az1'}),
+            objects.Aggregate(id=2, hosts=['host2', 'host3'],
+                              metadata={'availability_zone': 'az2, az3'}),
+            objects.Aggregate(id=3, hosts=['host4'],
+                              metadata={'other': 'az1'}),
+        ]
+        self.hosts = ['host1', 'host2', 'host3', 'host4', 'host5']
+
+    def _filter(self, zone, indexed=True):
+        host_states = fakes.host_states_with_aggregates(
+            self.hosts, self.aggregates, indexed=indexed)
+        request = TestAvailabilityZoneFilter._make_zone_request(zone)
+        return [host_state.host for host_state in
+                self.filt_cls.filter_all(host_states, request)]
+
+    def test_filter_all(self):
+        self.flags(default_availability_zone='nova')
+        for zone, hosts in (('az1', ['host1', 'host2']),
+                            ('az3', ['host2', 'host3']),
+                            ('nova', ['host4', 'host5']),
+                            ('bad', []),
+                            (None, self.hosts)):
+            self.assertEqual(hosts, self._filter(zone))
+            self.assertEqual(hosts, self._filter(zone, indexed=False))
+
+    def test_filter_all_default_zone_set_on_aggregate(self):
+        self.flags(default_availability_zone='az2')
+        self.assertEqual(['host2', 'host3', 'host4', 'host5'],
+                         self._filter('az2'))
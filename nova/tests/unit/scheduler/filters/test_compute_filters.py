@@ -48,3 +48,21 @@ class TestComputeFilter(test.NoDBTestCase):
         service_up_mock.return_value = False
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
         service_up_mock.assert_called_once_with(service)
+
+    @mock.patch('nova.servicegroup.API.get_up_services')
+    def test_compute_filter_filter_all(self, get_up_mock, service_up_mock):
+        filt_cls = compute_filter.ComputeFilter()
+        filter_properties = {'instance_type': {'memory_mb': 1024}}
+        disabled = {'disabled': True, 'host': 'host1'}
+        up = {'disabled': False, 'host': 'host2'}
+        down = {'disabled': False, 'host': 'host3'}
+        hosts = [fakes.FakeHostState(service['host'], 'node',
+                                     {'service': service})
+                 for service in (disabled, up, down)]
+        get_up_mock.return_value = set(['host2'])
+
+        result = list(filt_cls.filter_all(hosts, filter_properties))
+
+        self.assertEqual([hosts[1]], result)
+        get_up_mock.assert_called_once_with('compute', [up, down])
+        self.assertFalse(service_up_mock.called)
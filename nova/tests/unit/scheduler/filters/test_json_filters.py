@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
 from oslo_serialization import jsonutils
 
 from nova.scheduler.filters import json_filter
@@ -287,3 +288,62 @@ class TestJsonFilter(test.NoDBTestCase):
             },
         }
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+
+    def _filter_all(self, hosts, raw, columns=False):
+        filter_properties = {'scheduler_hints': {
+            'query': jsonutils.dumps(raw)}}
+        passes = [host.host for host in hosts
+                  if self.filt_cls.host_passes(host, filter_properties)]
+        # Queries evaluated over columns are not compiled for single hosts
+        with mock.patch.object(self.filt_cls, '_compile',
+                               side_effect=self.filt_cls._compile) as compile:
+            self.assertEqual(passes, [
+                host.host for host in
+                self.filt_cls.filter_all(hosts, filter_properties)])
+        self.assertEqual(not columns, compile.called)
+        return passes
+
+    def _hosts(self):
+        return [fakes.FakeHostState('host%d' % i, 'node', {
+                    'free_ram_mb': 512 * i,
+                    'num_instances': 4 - i,
+                    'capabilities': {'opt1': 'match' if i % 2 else 'no'}})
+                for i in range(4)]
+
+    def test_json_filter_filter_all_columns(self):
+        hosts = self._hosts()
+        self.assertEqual(['host2', 'host3'], self._filter_all(
+            hosts, ['>=', '$free_ram_mb', 1024], columns=True))
+        self.assertEqual(['host0', 'host3'], self._filter_all(
+            hosts, ['or', ['<', '$free_ram_mb', 512],
+                          ['<=', '$num_instances', 1, 2]], columns=True))
+        self.assertEqual(['host0', 'host2', 'host3'], self._filter_all(
+            hosts, ['not', ['=', '$num_instances', 3]], columns=True))
+        self.assertEqual(['host1', 'host2'], self._filter_all(
+            hosts, ['and', ['in', '$free_ram_mb', 512, 1024],
+                           ['>', '$num_instances', '', None, 1],
+                           ['>', 2, 1]], columns=True))
+        self.assertEqual([], self._filter_all(
+            hosts, ['and', ['>', '$free_ram_mb'], True], columns=True))
+        self.assertEqual(['host0', 'host1', 'host2', 'host3'],
+                         self._filter_all(hosts, [], columns=True))
+        self.assertEqual(['host0', 'host1', 'host2', 'host3'],
+                         self._filter_all(hosts, ['not', True, False],
+                                          columns=True))
+
+    def test_json_filter_filter_all_compiled(self):
+        hosts = self._hosts()
+        hosts[1].free_ram_mb = None
+        self.assertEqual(['host2', 'host3'], self._filter_all(
+            hosts, ['>=', '$free_ram_mb', 1024]))
+        self.assertEqual(['host1', 'host3'], self._filter_all(
+            hosts, ['=', '$capabilities.opt1', 'match']))
+        self.assertEqual(['host0', 'host1'], self._filter_all(
+            hosts, ['and', ['in', '$host', 'host1', 'host0'],
+                           ['>=', '$num_instances', '$........', 3]]))
+
+    def test_json_filter_filter_all_unknown_operator_raises(self):
+        filter_properties = {'scheduler_hints': {
+            'query': jsonutils.dumps(['!=', '$free_ram_mb', 2])}}
+        self.assertRaises(KeyError, self.filt_cls.filter_all,
+                          self._hosts(), filter_properties)
@@ -19,6 +19,7 @@ import requests
 from nova import objects
 from nova.scheduler.filters import trusted_filter
 from nova import test
+from nova.tests import fixtures as nova_fixtures
 from nova.tests.unit.scheduler import fakes
 
 CONF = cfg.CONF
@@ -266,3 +267,129 @@ class TestTrustedFilter(test.NoDBTestCase):
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
         self.assertFalse(self.filt_cls.host_passes(bad_host,
                                                    filter_properties))
+
+
+class FakeAttestationServer(object):
+    """Stands in for an OAT service, answering the PollHosts requests made
+    through requests.
+    """
+
+    def __init__(self, levels):
+        self.levels = levels
+        self.polls = []
+        self.available = True
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        assert method == 'POST' and url.endswith('/PollHosts')
+        hosts = jsonutils.loads(data)['hosts']
+        self.polls.append(sorted(hosts))
+        if not self.available:
+            raise requests.exceptions.ConnectionError()
+        body = {'hosts': [{'host_name': host,
+                           'trust_lvl': self.levels.get(host, 'unknown'),
+                           'vtime': timeutils.isotime()}
+                          for host in hosts]}
+        return mock.Mock(status_code=requests.codes.OK,
+                         text=jsonutils.dumps(body))
+
+
+class TestTrustedFilterBackgroundRefresh(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestTrustedFilterBackgroundRefresh, self).setUp()
+        self.useFixture(nova_fixtures.SpawnIsSynchronousFixture())
+        self.flags(attestation_auth_timeout=60,
+                   attestation_refresh_interval=20,
+                   attestation_stale_timeout=30,
+                   group='trusted_computing')
+        self.server = FakeAttestationServer({'node1': 'trusted',
+                                             'node2': 'untrusted'})
+        self.stub_out_request = mock.patch.object(requests, 'request',
+                                                  self.server.request)
+        self.stub_out_request.start()
+        self.addCleanup(self.stub_out_request.stop)
+        timeutils.set_time_override(timeutils.utcnow())
+        self.addCleanup(timeutils.clear_time_override)
+
+        fake_compute_nodes = [
+            objects.ComputeNode(hypervisor_hostname='node1'),
+            objects.ComputeNode(hypervisor_hostname='node2'),
+        ]
+        with test.nested(
+                mock.patch('nova.objects.ComputeNodeList.get_all',
+                           return_value=fake_compute_nodes),
+                mock.patch.object(trusted_filter.loopingcall,
+                                  'FixedIntervalLoopingCall')
+        ) as (mock_get_all, self.mock_looping):
+            self.filt_cls = trusted_filter.TrustedFilter()
+        self.cache = self.filt_cls.compute_attestation.caches
+        self.filter_properties = {
+            'context': mock.sentinel.ctx,
+            'instance_type': {'memory_mb': 1024, 'extra_specs': {
+                'trust:trusted_host': 'trusted'}}}
+
+    def _passes(self, nodename):
+        host = fakes.FakeHostState('host', nodename, {})
+        return self.filt_cls.host_passes(host, self.filter_properties)
+
+    def test_refresher_started(self):
+        self.mock_looping.assert_called_once_with(self.cache._refresh_expiring)
+        self.mock_looping.return_value.start.assert_called_once_with(
+            interval=20, initial_delay=0)
+
+    def test_bulk_refresh(self):
+        self.cache._refresh_expiring()
+        self.assertEqual([['node1', 'node2']], self.server.polls)
+        self.assertTrue(self._passes('node1'))
+        self.assertFalse(self._passes('node2'))
+
+        # Only the levels expiring before the next refresh are refreshed
+        timeutils.advance_time_seconds(30)
+        self.cache._refresh_expiring()
+        self.assertEqual(1, len(self.server.polls))
+        timeutils.advance_time_seconds(15)
+        self.cache._refresh_expiring()
+        self.assertEqual(2, len(self.server.polls))
+
+        # Filtering does not poll the OAT service
+        self.assertTrue(self._passes('node1'))
+        self.assertEqual(2, len(self.server.polls))
+        self.assertEqual({'polls': 2, 'failures': 0, 'hosts': 4},
+                         {key: self.cache.stats[key]
+                          for key in ('polls', 'failures', 'hosts')})
+        self.assertIsNotNone(self.cache.stats['last_latency'])
+
+    def test_bulk_refresh_in_batches(self):
+        self.cache.attestservice.request_count = 1
+        self.cache._refresh_expiring()
+        self.assertEqual([['node1'], ['node2']], self.server.polls)
+
+    def test_stale_while_revalidate(self):
+        self.cache._refresh_expiring()
+        self.server.available = False
+
+        # Expired, but still within the stale timeout: the cached level is
+        # used and revalidated in the background
+        timeutils.advance_time_seconds(70)
+        self.assertTrue(self._passes('node1'))
+        self.assertEqual(2, len(self.server.polls))
+        self.assertEqual(1, self.cache.stats['failures'])
+
+        # Too stale to be trusted any more
+        timeutils.advance_time_seconds(30)
+        self.assertFalse(self._passes('node1'))
+
+        self.server.available = True
+        self.assertTrue(self._passes('node1'))
+
+    def test_unknown_host_attested_in_background(self):
+        self.server.levels['node3'] = 'trusted'
+        self.cache._refresh_expiring()
+        self.assertTrue(self._passes('node3'))
+        self.assertEqual(['node3'], self.server.polls[-1])
+
+    def test_refresh_already_running(self):
+        self.cache._refreshing = True
+        self.cache._refresh_expiring()
+        self.assertFalse(self._passes('node1'))
+        self.assertEqual([], self.server.polls)
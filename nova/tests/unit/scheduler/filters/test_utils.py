@@ -88,6 +88,34 @@ class TestUtils(test.NoDBTestCase):
 
         self.assertEqual({}, metadata)
 
+    def test_aggregate_helpers_use_index(self):
+        host_states = fakes.host_states_with_aggregates(
+            ['fake-host'], _AGGREGATE_FIXTURES)
+        host_state = host_states[0]
+        host_state.aggregates = []
+
+        self.assertEqual(set(['1', '3', '6,7']),
+                         utils.aggregate_values_from_key(host_state, 'k1'))
+        metadata = utils.aggregate_metadata_get_by_host(host_state)
+        self.assertEqual(set(['1', '3', '7', '6']), metadata['k1'])
+        self.assertEqual(set(['9', '8', '2', '4']), metadata['k2'])
+        self.assertEqual({}, utils.aggregate_metadata_get_by_host(host_state,
+                                                                  'k3'))
+
+    def test_aggregate_index(self):
+        host_states = fakes.host_states_with_aggregates(
+            ['fake-host', 'other-host'], _AGGREGATE_FIXTURES)
+        self.assertIs(host_states[0].aggregate_index,
+                      utils.aggregate_index(host_states))
+
+        other = fakes.host_states_with_aggregates(
+            ['fake-host'], _AGGREGATE_FIXTURES)
+        self.assertIsNone(utils.aggregate_index(host_states + other))
+        unindexed = fakes.host_states_with_aggregates(
+            ['fake-host'], _AGGREGATE_FIXTURES, indexed=False)
+        self.assertIsNone(utils.aggregate_index(host_states + unindexed))
+        self.assertIsNone(utils.aggregate_index([]))
+
     def test_validate_num_values(self):
         f = utils.validate_num_values
 
@@ -108,6 +136,21 @@ class TestUtils(test.NoDBTestCase):
         self.assertTrue(utils.instance_uuids_overlap(host_state, ['aa']))
         self.assertFalse(utils.instance_uuids_overlap(host_state, ['zz']))
 
+    def test_instance_helpers_use_index(self):
+        host_states = fakes.host_states_with_instances({
+            'host1': [objects.Instance(uuid='aa', instance_type_id=1)],
+            'host2': [objects.Instance(uuid='bb', instance_type_id=2)]})
+        for host_state in host_states:
+            host_state.instances = {}
+
+        self.assertTrue(utils.instance_uuids_overlap(host_states[0], 'aa'))
+        self.assertFalse(utils.instance_uuids_overlap(host_states[0],
+                                                      ['bb', 'zz']))
+        self.assertFalse(utils.other_types_on_host(host_states[0], 1))
+        self.assertTrue(utils.other_types_on_host(host_states[1], 1))
+        self.assertIs(host_states[0].instance_index,
+                      utils.instance_index(host_states))
+
     def test_other_types_on_host(self):
         inst1 = objects.Instance(uuid='aa', instance_type_id=1)
         host_state = fakes.FakeHostState('host1', 'node1', {})
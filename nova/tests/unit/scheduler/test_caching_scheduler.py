@@ -128,6 +128,7 @@ class CachingSchedulerTestCase(test_scheduler.SchedulerTestCase):
             'node_%s' % index)
         host_state.free_ram_mb = 50000
         host_state.service = {
+            "host": 'host_%s' % index,
             "disabled": False,
             "updated_at": timeutils.utcnow(),
             "created_at": timeutils.utcnow(),
@@ -286,6 +286,31 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertEqual(host, selected_hosts[0])
         self.assertEqual(node, selected_nodes[0])
 
+    @mock.patch.object(host_manager.HostManager, 'get_weighed_hosts')
+    @mock.patch.object(host_manager.HostManager, 'get_filtered_hosts')
+    @mock.patch.object(filter_scheduler.FilterScheduler,
+                       '_get_all_host_states')
+    def test_schedule_num_candidates(self, mock_get_all, mock_filtered,
+                                     mock_weighed):
+        host_states = [mock.Mock(), mock.Mock(), mock.Mock()]
+        weighed_hosts = [weights.WeighedHost(host_state, weight)
+                         for host_state, weight in zip(host_states, [3, 2, 1])]
+        mock_get_all.return_value = host_states
+        mock_filtered.return_value = host_states
+        mock_weighed.return_value = weighed_hosts
+        request_spec = {'instance_properties': {'vcpus': 1},
+                        'num_instances': 1}
+
+        selected = self.driver._schedule(self.context, request_spec,
+                                         {'num_candidates': 2})
+
+        # The best host, then the next best as an alternate which does not
+        # consume the instance
+        self.assertEqual(weighed_hosts[:2], selected)
+        host_states[0].consume_from_instance.assert_called_once_with(
+            {'vcpus': 1})
+        self.assertFalse(host_states[1].consume_from_instance.called)
+
     @mock.patch.object(filter_scheduler.FilterScheduler, '_schedule')
     def test_select_destinations_notifications(self, mock_schedule):
         mock_schedule.return_value = [mock.Mock()]
@@ -176,6 +176,50 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual({'fake-host': set([])},
                          self.host_manager.host_aggregates_map)
 
+    def test_aggregate_index(self):
+        agg1 = objects.Aggregate(id=1, hosts=['host1', 'host2'],
+                                 metadata={'k1': 'a, b', 'k2': 'c'})
+        agg2 = objects.Aggregate(id=2, hosts=['host2'],
+                                 metadata={'k1': 'd'})
+        self.host_manager.update_aggregates([agg1, agg2])
+        index = self.host_manager.aggregate_index
+        self.assertEqual({'k1': set(['a', 'b']), 'k2': set(['c'])},
+                         index.host_metadata('host1'))
+        self.assertEqual({'k1': set(['a', 'b', 'd']), 'k2': set(['c'])},
+                         index.host_metadata('host2'))
+        self.assertEqual({}, index.host_metadata('host3'))
+        self.assertEqual(set(['a, b', 'd']), index.host_values('host2', 'k1'))
+        self.assertEqual(set(['host1', 'host2']), index.hosts_with_key('k1'))
+        self.assertEqual(set(['host1', 'host2']),
+                         index.hosts_with_value('k1', 'b'))
+        self.assertEqual(set(['host2']), index.hosts_with_value('k1', 'd'))
+        self.assertEqual(set(), index.hosts_with_value('k3', 'a'))
+
+        # Moving host2 out of the first aggregate and changing its metadata
+        agg1.hosts = ['host1']
+        agg1.metadata = {'k2': 'e'}
+        self.host_manager.update_aggregates([agg1])
+        self.assertEqual({'k2': set(['e'])}, index.host_metadata('host1'))
+        self.assertEqual({'k1': set(['d'])}, index.host_metadata('host2'))
+        self.assertEqual(set(['host2']), index.hosts_with_key('k1'))
+        self.assertEqual(set(), index.hosts_with_value('k2', 'c'))
+        self.assertEqual(set(['host1']), index.hosts_with_value('k2', 'e'))
+
+        self.host_manager.delete_aggregate(agg2)
+        self.assertEqual({}, index.host_metadata('host2'))
+        self.assertEqual(set(), index.hosts_with_key('k1'))
+
+    def test_aggregate_index_host_metadata_with_key(self):
+        agg1 = objects.Aggregate(id=1, hosts=['host1'],
+                                 metadata={'k1': 'a', 'k2': 'b'})
+        agg2 = objects.Aggregate(id=2, hosts=['host1'],
+                                 metadata={'k2': 'c'})
+        self.host_manager.update_aggregates([agg1, agg2])
+        index = self.host_manager.aggregate_index
+        self.assertEqual({'k1': set(['a']), 'k2': set(['b'])},
+                         index.host_metadata('host1', key='k1'))
+        self.assertEqual({}, index.host_metadata('host1', key='k3'))
+
     def test_choose_host_filters_not_found(self):
         self.assertRaises(exception.SchedulerHostFilterNotFound,
                           self.host_manager._choose_host_filters,
@@ -395,6 +439,8 @@ class HostManagerTestCase(test.NoDBTestCase):
             state_key = (host, node)
             self.assertEqual(host_states_map[state_key].service,
                     obj_base.obj_to_primitive(fakes.get_service_by_host(host)))
+            self.assertIs(self.host_manager.aggregate_index,
+                          host_states_map[state_key].aggregate_index)
         self.assertEqual(host_states_map[('host1', 'node1')].free_ram_mb,
                          512)
         # 511GB
@@ -526,6 +572,9 @@ class HostManagerTestCase(test.NoDBTestCase):
         mock_get_by_host.assert_called_once_with(context, cn1.host)
         self.assertTrue(host_state.instances)
         self.assertEqual(host_state.instances['uuid1'], inst1)
+        self.assertIs(hm.instance_index, host_state.instance_index)
+        self.assertEqual(set(['host1']),
+                         hm.instance_index.hosts_of_instances(['uuid1']))
 
     @mock.patch('nova.objects.InstanceList.get_by_host')
     def test_recreate_instance_info(self, mock_get_by_host):
@@ -673,6 +722,49 @@ class HostManagerTestCase(test.NoDBTestCase):
                 'fake_context', host_name)
         self.assertFalse(new_info['updated'])
 
+    @mock.patch('nova.objects.InstanceList.get_by_host')
+    def test_instance_index(self, mock_get_by_host):
+        index = self.host_manager.instance_index
+
+        def _inst(uuid, host, type_id):
+            return fake_instance.fake_instance_obj(
+                'fake_context', uuid=uuid, host=host, instance_type_id=type_id)
+
+        self.host_manager.update_instance_info(
+            'fake_context', 'host1', objects.InstanceList(
+                objects=[_inst('aaa', 'host1', 1), _inst('bbb', 'host1', 1)]))
+        mock_get_by_host.return_value = objects.InstanceList(
+            objects=[_inst('ccc', 'host2', 2)])
+        self.host_manager.delete_instance_info('fake_context', 'host2', 'ccc')
+        self.assertEqual(set(['host1']),
+                         index.hosts_of_instances(['aaa', 'zzz']))
+        self.assertEqual(set(['host1', 'host2']),
+                         index.hosts_of_instances(['aaa', 'ccc']))
+        self.assertEqual(set([1]), index.instance_types('host1'))
+        self.assertEqual(set([2]), index.instance_types('host2'))
+
+        # A resized instance changes type, a migrated one is on both hosts
+        # until the source host reports it gone
+        self.host_manager.update_instance_info(
+            'fake_context', 'host1', objects.InstanceList(
+                objects=[_inst('bbb', 'host1', 3)]))
+        self.host_manager.update_instance_info(
+            'fake_context', 'host2', objects.InstanceList(
+                objects=[_inst('aaa', 'host2', 1)]))
+        self.assertEqual(set([1, 3]), index.instance_types('host1'))
+        self.assertEqual(set([1, 2]), index.instance_types('host2'))
+        self.assertEqual(set(['host1', 'host2']),
+                         index.hosts_of_instances(['aaa']))
+        self.host_manager.delete_instance_info('fake_context', 'host1', 'aaa')
+        self.assertEqual(set(['host2']), index.hosts_of_instances(['aaa']))
+        self.assertEqual(set([3]), index.instance_types('host1'))
+
+        # Recreating the instances of a host replaces them in the index
+        mock_get_by_host.return_value = objects.InstanceList(objects=[])
+        self.host_manager.sync_instance_info('fake_context', 'host1', ['xxx'])
+        self.assertEqual(set(), index.hosts_of_instances(['bbb']))
+        self.assertEqual(set(), index.instance_types('host1'))
+
 
 class HostManagerChangedNodesTestCase(test.NoDBTestCase):
     """Test case for HostManager class."""
@@ -142,12 +142,12 @@ class SchedulerTestCase(test.NoDBTestCase):
         services = [service1, service2]
 
         self.mox.StubOutWithMock(db, 'service_get_all_by_topic')
-        self.mox.StubOutWithMock(servicegroup.API, 'service_is_up')
+        self.mox.StubOutWithMock(servicegroup.API, 'get_up_services')
 
         db.service_get_all_by_topic(self.context,
                 self.topic).AndReturn(services)
-        self.servicegroup_api.service_is_up(service1).AndReturn(False)
-        self.servicegroup_api.service_is_up(service2).AndReturn(True)
+        self.servicegroup_api.get_up_services(
+            self.topic, services).AndReturn(set(['host2']))
 
         self.mox.ReplayAll()
         result = self.driver.hosts_up(self.context, self.topic)
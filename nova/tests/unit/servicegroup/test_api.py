@@ -69,3 +69,43 @@ class ServiceGroupApiTestCase(test.NoDBTestCase):
             driver = self.servicegroup_api._driver
             result = self.servicegroup_api.service_is_up(member)
             self.assertIs(result, False)
+
+    def test_get_up_services(self):
+        services = [{"host": "fake-host1", "topic": "compute",
+                     "forced_down": False},
+                    {"host": "fake-host2", "topic": "compute",
+                     "forced_down": True}]
+        driver = self.servicegroup_api._driver
+        driver.get_up_services = mock.MagicMock(
+            return_value=set(["fake-host1"]))
+
+        result = self.servicegroup_api.get_up_services("compute", services)
+
+        self.assertEqual(set(["fake-host1"]), result)
+        driver.get_up_services.assert_called_once_with("compute",
+                                                       services[:1])
+
+    @mock.patch('nova.objects.ServiceList.get_by_topic')
+    def test_get_up_services_loads_group(self, get_by_topic):
+        services = [{"host": "fake-host1", "topic": "compute"}]
+        get_by_topic.return_value = services
+        driver = self.servicegroup_api._driver
+        driver.get_up_services = mock.MagicMock(
+            return_value=set(["fake-host1"]))
+
+        result = self.servicegroup_api.get_up_services("compute")
+
+        self.assertEqual(set(["fake-host1"]), result)
+        get_by_topic.assert_called_once_with(mock.ANY, "compute")
+        driver.get_up_services.assert_called_once_with("compute", services)
+
+    def test_get_up_services_all_forced_down(self):
+        services = [{"host": "fake-host1", "topic": "compute",
+                     "forced_down": True}]
+        driver = self.servicegroup_api._driver
+        driver.get_up_services = mock.MagicMock()
+
+        result = self.servicegroup_api.get_up_services("compute", services)
+
+        self.assertEqual(set(), result)
+        self.assertFalse(driver.get_up_services.called)
@@ -67,6 +67,28 @@ class DBServiceGroupTestCase(test.NoDBTestCase):
         result = self.servicegroup_api.service_is_up(service_ref)
         self.assertFalse(result)
 
+    @mock.patch('oslo_utils.timeutils.utcnow')
+    def test_get_up_services(self, now_mock):
+        fts_func = datetime.datetime.fromtimestamp
+        fake_now = 1000
+        now_mock.return_value = fts_func(fake_now)
+        up_time = fts_func(fake_now - self.down_time + 1)
+        down_time = fts_func(fake_now - self.down_time - 3)
+        services = [
+            {'host': 'host1', 'topic': 'compute', 'last_seen_up': up_time,
+             'updated_at': up_time, 'created_at': up_time},
+            {'host': 'host2', 'topic': 'compute', 'last_seen_up': down_time,
+             'updated_at': down_time, 'created_at': down_time},
+            {'host': 'host3', 'topic': 'compute', 'last_seen_up': None,
+             'updated_at': up_time.strftime('%Y-%m-%dT%H:%M:%S.%f'),
+             'created_at': down_time},
+        ]
+
+        result = self.servicegroup_api.get_up_services('compute', services)
+
+        self.assertEqual(set(['host1', 'host3']), result)
+        now_mock.assert_called_once_with()
+
     def test_join(self):
         service = mock.MagicMock(report_interval=1)
 
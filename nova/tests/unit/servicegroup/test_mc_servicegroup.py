@@ -46,6 +46,21 @@ class MemcachedServiceGroupTestCase(test.NoDBTestCase):
         self.assertTrue(self.servicegroup_api.service_is_up(service_ref))
         self.mc_client.get.assert_called_once_with('compute:fake-host')
 
+    def test_get_up_services(self):
+        services = [{'host': 'fake-host1', 'topic': 'compute'},
+                    {'host': 'fake-host2', 'topic': 'compute'}]
+        self.mc_client.get_multi.return_value = {
+            'compute:fake-host1': 'heartbeat'}
+
+        result = self.servicegroup_api.get_up_services('compute', services)
+
+        self.assertEqual(set(['fake-host1']), result)
+        self.mc_client.get_multi.assert_called_once_with(mock.ANY)
+        self.assertEqual(
+            set(['compute:fake-host1', 'compute:fake-host2']),
+            set(self.mc_client.get_multi.call_args[0][0]))
+        self.assertFalse(self.mc_client.get.called)
+
     def test_join(self):
         service = mock.MagicMock(report_interval=1)
 
@@ -99,3 +99,15 @@ class ZKServiceGroupTestCase(test.NoDBTestCase):
         mem_mock.assert_called_once_with(self.zk_sess,
                                          '/fake-topic',
                                          'fake-host')
+
+    def test_get_up_services(self):
+        self._setup_sg_api()
+        driver = self.servicegroup_api._driver
+        services = [{'topic': 'fake-topic', 'host': 'fake-host1'},
+                    {'topic': 'fake-topic', 'host': 'fake-host2'}]
+        with mock.patch.object(driver, '_get_all',
+                               return_value=['fake-host2']) as get_all:
+            result = self.servicegroup_api.get_up_services('fake-topic',
+                                                           services)
+        self.assertEqual(set(['fake-host2']), result)
+        get_all.assert_called_once_with('fake-topic')
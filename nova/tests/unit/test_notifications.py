@@ -31,6 +31,7 @@ from nova.network import api as network_api
 from nova import notifications
 from nova import objects
 from nova.objects import base as obj_base
+from nova import rpc
 from nova import test
 from nova.tests.unit import fake_network
 from nova.tests.unit import fake_notifier
@@ -203,6 +204,51 @@ class NotificationsTestCase(test.TestCase):
         notifications.send_update(self.context, old, self.instance)
         self.assertEqual(0, len(fake_notifier.NOTIFICATIONS))
 
+    @mock.patch.object(notifications, 'info_from_instance')
+    @mock.patch('nova.rpc.notifications_enabled', return_value=False)
+    def test_noop_notifier_skips_payload(self, mock_enabled, mock_info):
+        old = copy.copy(self.instance)
+        self.instance.vm_state = vm_states.ACTIVE
+
+        notifications.send_update(self.context, old, self.instance)
+        notifications.send_update_with_states(self.context, self.instance,
+                vm_states.BUILDING, vm_states.ACTIVE, None, None)
+
+        self.assertFalse(mock_info.called)
+        self.assertEqual(0, len(fake_notifier.NOTIFICATIONS))
+
+    def test_static_info_memoized_per_context(self):
+        with mock.patch('nova.image.glance.generate_image_url',
+                        return_value='http://img/1') as mock_url:
+            notifications.info_from_instance(self.context, self.instance,
+                                             None, None)
+            info = notifications.info_from_instance(self.context,
+                                                    self.instance, None, None)
+            self.assertEqual(1, mock_url.call_count)
+            self.assertEqual('http://img/1', info['image_ref_url'])
+            self.assertEqual('m1.tiny', info['instance_type'])
+
+            # A new image means a new entry, as does a new context.
+            self.instance.image_ref = 2
+            notifications.info_from_instance(self.context, self.instance,
+                                             None, None)
+            self.assertEqual(2, mock_url.call_count)
+            notifications.info_from_instance(self.context.elevated(),
+                                             self.instance, None, None)
+            self.assertEqual(3, mock_url.call_count)
+
+    def test_notifications_enabled(self):
+        self.assertTrue(rpc.notifications_enabled())
+        for drivers, expected in (([], False), (['noop'], False),
+                                  (['noop', 'messaging'], True)):
+            self.flags(notification_driver=drivers)
+            self.assertEqual(expected, rpc.notifications_enabled())
+
+    def test_notifications_enabled_not_initialized(self):
+        self.flags(notification_driver=[])
+        with mock.patch.object(rpc, 'NOTIFIER', None):
+            self.assertTrue(rpc.notifications_enabled())
+
     def test_task_notif(self):
 
         # test config disable of just the task state notifications
@@ -18,6 +18,7 @@
 Unittets for S3 objectstore clone.
 """
 
+import hashlib
 import os
 import shutil
 import tempfile
@@ -25,7 +26,9 @@ import tempfile
 import boto
 from boto import exception as boto_exception
 from boto.s3 import connection as s3
+import mock
 from oslo_config import cfg
+import webob
 
 from nova.objectstore import s3server
 from nova import test
@@ -149,7 +152,93 @@ class S3APITestCase(test.NoDBTestCase):
                           bucket.get_all_keys,
                           maxkeys=0)
 
+    def test_object_streamed_in_chunks(self):
+        self.flags(s3_chunk_size=1000)
+        contents = os.urandom(10 * 1000 + 17)
+        bucket = self.conn.create_bucket('testbucket')
+        key = bucket.new_key('image.part.0')
+        key.set_contents_from_string(contents)
+
+        self.assertEqual('"%s"' % hashlib.md5(contents).hexdigest(),
+                         key.etag)
+        key = bucket.get_key('image.part.0')
+        self.assertEqual(len(contents), key.size)
+        self.assertEqual(contents, key.get_contents_as_string())
+        self.assertEqual([], [n for n in os.listdir(
+            os.path.join(CONF.buckets_path, 'testbucket'))
+            if n.startswith(s3server._PARTIAL_PREFIX)])
+
+    def test_object_range(self):
+        contents = b'0123456789'
+        bucket = self.conn.create_bucket('testbucket')
+        bucket.new_key('somekey').set_contents_from_string(contents)
+        key = bucket.get_key('somekey')
+
+        self.assertEqual(b'2345', key.get_contents_as_string(
+            headers={'Range': 'bytes=2-5'}))
+        self.assertEqual(b'789', key.get_contents_as_string(
+            headers={'Range': 'bytes=-3'}))
+        self.assertRaises(boto_exception.S3ResponseError,
+                          key.get_contents_as_string,
+                          headers={'Range': 'bytes=20-30'})
+
+    def test_partial_uploads_not_listed(self):
+        bucket = self.conn.create_bucket('testbucket')
+        bucket.new_key('somekey').set_contents_from_string('data')
+        open(os.path.join(CONF.buckets_path, 'testbucket',
+                          s3server._PARTIAL_PREFIX + 'abc'), 'w').close()
+        self.assertEqual(['somekey'],
+                         [k.name for k in bucket.get_all_keys()])
+
     def tearDown(self):
         """Tear down test server."""
         self.server.stop()
         super(S3APITestCase, self).tearDown()
+
+
+class S3ObjectHandlerTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(S3ObjectHandlerTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp(prefix='test_oss-')
+        self.addCleanup(shutil.rmtree, self.directory)
+        os.mkdir(os.path.join(self.directory, 'bucket'))
+        self.app = s3server.S3Application(self.directory)
+
+    def _request(self, path, **kwargs):
+        return webob.Request.blank(path, **kwargs).get_response(self.app)
+
+    def test_put_failure_leaves_no_object(self):
+        body_file = mock.Mock()
+        body_file.read.side_effect = [b'some data', IOError()]
+        request = webob.Request.blank('/bucket/key', method='PUT')
+        request.content_length = 100
+        request.body_file = body_file
+
+        self.assertRaises(IOError, request.get_response, self.app)
+        self.assertEqual([], os.listdir(os.path.join(self.directory,
+                                                     'bucket')))
+
+    def test_get_uses_file_wrapper(self):
+        with open(os.path.join(self.directory, 'bucket', 'key'), 'wb') as f:
+            f.write(b'data')
+        file_wrapper = mock.Mock(return_value=[b'data'])
+
+        response = self._request('/bucket/key',
+                                 environ={'wsgi.file_wrapper': file_wrapper})
+
+        self.assertEqual(b'data', response.body)
+        self.assertEqual(1, file_wrapper.call_count)
+
+    def test_get_range_ignores_file_wrapper(self):
+        with open(os.path.join(self.directory, 'bucket', 'key'), 'wb') as f:
+            f.write(b'0123456789')
+        file_wrapper = mock.Mock()
+
+        response = self._request('/bucket/key',
+                                 environ={'wsgi.file_wrapper': file_wrapper},
+                                 headers={'Range': 'bytes=3-4'})
+
+        self.assertEqual(206, response.status_int)
+        self.assertEqual(b'34', response.body)
+        self.assertEqual('bytes 3-4/10', response.headers['Content-Range'])
+        self.assertFalse(file_wrapper.called)
@@ -16,6 +16,7 @@
 
 import datetime
 
+import mock
 from oslo_config import cfg
 from oslo_utils import timeutils
 from six.moves import range
@@ -2782,6 +2783,51 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         self.compare_reservation(result, reservations_list)
 
 
+class OptimisticDbQuotaDriverTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(OptimisticDbQuotaDriverTestCase, self).setUp()
+        self.driver = quota.OptimisticDbQuotaDriver()
+        self.context = FakeContext('test_project', 'test_class')
+        self.expire = timeutils.utcnow()
+
+    def _reserve(self):
+        return self.driver._reserve(self.context, {}, {'instances': 10},
+                                    {'instances': 5}, {'instances': 2},
+                                    self.expire, 'test_project', 'fake_user')
+
+    @mock.patch.object(db, 'quota_reserve')
+    @mock.patch.object(db, 'quota_reserve_optimistic',
+                       return_value=['resv-1'])
+    def test_reserve(self, mock_optimistic, mock_locked):
+        self.flags(quota_optimistic_retries=5)
+        self.assertEqual(['resv-1'], self._reserve())
+        mock_optimistic.assert_called_once_with(
+            self.context, {}, {'instances': 10}, {'instances': 5},
+            {'instances': 2}, self.expire, 0, 0, project_id='test_project',
+            user_id='fake_user', max_retries=5)
+        self.assertFalse(mock_locked.called)
+
+    @mock.patch.object(db, 'quota_reserve', return_value=['resv-1'])
+    @mock.patch.object(db, 'quota_reserve_optimistic', return_value=None)
+    def test_reserve_falls_back_to_locking(self, mock_optimistic,
+                                           mock_locked):
+        self.assertEqual(['resv-1'], self._reserve())
+        mock_locked.assert_called_once_with(
+            self.context, {}, {'instances': 10}, {'instances': 5},
+            {'instances': 2}, self.expire, 0, 0, project_id='test_project',
+            user_id='fake_user')
+
+    @mock.patch.object(db, 'reservation_commit_optimistic')
+    def test_commit(self, mock_commit):
+        self.driver.commit(self.context, ['resv-1'])
+        mock_commit.assert_called_once_with(self.context, ['resv-1'])
+
+    @mock.patch.object(db, 'reservation_rollback_optimistic')
+    def test_rollback(self, mock_rollback):
+        self.driver.rollback(self.context, ['resv-1'])
+        mock_rollback.assert_called_once_with(self.context, ['resv-1'])
+
+
 class NoopQuotaDriverTestCase(test.TestCase):
     def setUp(self):
         super(NoopQuotaDriverTestCase, self).setUp()
@@ -22,6 +22,8 @@ EVENT_TRACE = 0x4
 class GuestFS(object):
     SUPPORT_CLOSE_ON_EXIT = True
     SUPPORT_RETURN_DICT = True
+    VERSION = (1, 28, 1)
+    BACKEND = 'libvirt'
 
     def __init__(self, **kwargs):
         if not self.SUPPORT_CLOSE_ON_EXIT and 'close_on_exit' in kwargs:
@@ -42,6 +44,7 @@ class GuestFS(object):
         self.trace_enabled = False
         self.verbose_enabled = False
         self.event_callback = None
+        self.vgs_active = False
 
     def launch(self):
         self.running = True
@@ -60,13 +63,48 @@ class GuestFS(object):
     def add_drive_opts(self, file, *args, **kwargs):
         if file == "/some/fail/file":
             raise RuntimeError("%s: No such file or directory", file)
+        if self.running and self.BACKEND != 'libvirt':
+            raise RuntimeError("add_drive_opts: the current backend does "
+                               "not support hotplugging drives")
 
         self.drives.append((file, kwargs))
 
+    def list_disk_labels(self):
+        labels = [(kwargs['label'], '/dev/sd%s' % chr(ord('a') + i))
+                  for i, (file, kwargs) in enumerate(self.drives)
+                  if 'label' in kwargs]
+        if self._python_return_dict:
+            return dict(labels)
+        return labels
+
+    def remove_drive(self, label):
+        if self.vgs_active:
+            raise RuntimeError("remove_drive: device is busy")
+        self.drives = [(file, kwargs) for (file, kwargs) in self.drives
+                       if kwargs.get('label') != label]
+
+    def umount_all(self):
+        self.mounts = []
+        self.root_mounted = False
+
+    def vg_activate_all(self, activate):
+        self.vgs_active = activate
+
+    def version(self):
+        version = [('major', self.VERSION[0]), ('minor', self.VERSION[1]),
+                   ('release', self.VERSION[2]), ('extra', '')]
+        if self._python_return_dict:
+            return dict(version)
+        return version
+
+    def get_backend(self):
+        return self.BACKEND
+
     def add_drive(self, file, format=None, *args, **kwargs):
         self.add_drive_opts(file, format=None, *args, **kwargs)
 
     def inspect_os(self):
+        self.vgs_active = True
         return ["/dev/guestvgf/lv_root"]
 
     def inspect_get_mountpoints(self, dev):
@@ -28,6 +28,10 @@ class VirtDiskVFSGuestFSTest(test.NoDBTestCase):
         self.useFixture(
                 fixtures.MonkeyPatch('nova.virt.disk.vfs.guestfs.guestfs',
                                      fakeguestfs))
+        self.useFixture(
+                fixtures.MonkeyPatch(
+                    'nova.virt.disk.vfs.guestfs.APPLIANCE_POOL',
+                    vfsimpl.AppliancePool()))
 
         self.qcowfile = imgmodel.LocalFileImage("/dummy.qcow2",
                                                 imgmodel.FORMAT_QCOW2)
@@ -310,3 +314,128 @@ class VirtDiskVFSGuestFSTest(test.NoDBTestCase):
         vfs = vfsimpl.VFSGuestFS(self.qcowfile)
         vfs.setup(mount=False)
         self.assertFalse(setup_os.called)
+
+    @mock.patch('nova.utils.spawn_n')
+    def test_appliance_pool_reuse(self, mock_spawn):
+        self.flags(appliance_pool_size=1, group='guestfs')
+        pool = vfsimpl.APPLIANCE_POOL
+
+        vfs = vfsimpl.VFSGuestFS(self.qcowfile, partition=1)
+        vfs.setup()
+        handle = vfs.handle
+        self.assertTrue(handle.running)
+        self.assertEqual([("/dummy.qcow2", {"format": "qcow2",
+                                            "label": "nova0"})],
+                         handle.drives)
+        self.assertEqual("/dev/sda1", handle.mounts[0][1])
+        # The pool is topped up in the background.
+        mock_spawn.assert_called_once_with(pool._launch_idle)
+
+        vfs.teardown()
+        self.assertIsNone(vfs.handle)
+        self.assertFalse(handle.closed)
+        self.assertEqual([], handle.drives)
+        self.assertEqual([], handle.mounts)
+        self.assertEqual([handle], pool._idle)
+
+        vfs = vfsimpl.VFSGuestFS(self.rawfile, partition=None)
+        vfs.setup()
+        self.assertIs(handle, vfs.handle)
+        self.assertEqual([("/dummy.img", {"format": "raw",
+                                          "label": "nova1"})],
+                         handle.drives)
+        self.assertEqual("ext3", vfs.get_image_fs())
+        vfs.teardown()
+        self.assertEqual([handle], pool._idle)
+
+    @mock.patch('nova.utils.spawn_n')
+    def test_appliance_pool_refill(self, mock_spawn):
+        self.flags(appliance_pool_size=2, group='guestfs')
+        pool = vfsimpl.APPLIANCE_POOL
+
+        pool.acquire()
+        self.assertEqual(2, mock_spawn.call_count)
+        self.assertEqual(2, pool._launching)
+
+        pool._launch_idle()
+        pool._launch_idle()
+        self.assertEqual(0, pool._launching)
+        self.assertEqual(2, len(pool._idle))
+        self.assertTrue(all(h.running for h in pool._idle))
+
+        # Already full, nothing more to launch.
+        pool._refill()
+        self.assertEqual(2, mock_spawn.call_count)
+
+    @mock.patch('nova.utils.spawn_n')
+    def test_appliance_pool_deactivates_vgs(self, mock_spawn):
+        self.flags(appliance_pool_size=1, group='guestfs')
+        vfs = vfsimpl.VFSGuestFS(self.qcowfile, partition=-1)
+        vfs.setup()
+        handle = vfs.handle
+        # Inspection activated the volume groups of the image.
+        self.assertTrue(handle.vgs_active)
+
+        vfs.teardown()
+        self.assertFalse(handle.vgs_active)
+        self.assertEqual([], handle.drives)
+        self.assertEqual([handle], vfsimpl.APPLIANCE_POOL._idle)
+
+    @mock.patch('nova.utils.spawn_n')
+    def test_appliance_pool_detach_failure_closes(self, mock_spawn):
+        self.flags(appliance_pool_size=1, group='guestfs')
+        vfs = vfsimpl.VFSGuestFS(self.qcowfile, partition=-1)
+        vfs.setup()
+        handle = vfs.handle
+
+        with mock.patch.object(handle, 'remove_drive',
+                               side_effect=RuntimeError('busy')):
+            vfs.teardown()
+
+        self.assertTrue(handle.closed)
+        self.assertEqual([], vfsimpl.APPLIANCE_POOL._idle)
+
+    def _test_appliance_pool_no_hotplug(self):
+        self.flags(appliance_pool_size=1, group='guestfs')
+        pool = vfsimpl.APPLIANCE_POOL
+
+        vfs = vfsimpl.VFSGuestFS(self.qcowfile, partition=-1)
+        vfs.setup()
+
+        self.assertTrue(pool.disabled)
+        self.assertFalse(pool.enabled)
+        self.assertIsNone(vfs.label)
+        self.assertEqual([("/dummy.qcow2", {"format": "qcow2"})],
+                         vfs.handle.drives)
+        handle = vfs.handle
+        vfs.teardown()
+        self.assertTrue(handle.closed)
+
+    @mock.patch('nova.utils.spawn_n')
+    def test_appliance_pool_no_hotplug_backend(self, mock_spawn):
+        self.stubs.Set(fakeguestfs.GuestFS, 'BACKEND', 'direct')
+        self._test_appliance_pool_no_hotplug()
+        self.assertFalse(mock_spawn.called)
+
+    @mock.patch('nova.utils.spawn_n')
+    def test_appliance_pool_no_hotplug_version(self, mock_spawn):
+        self.stubs.Set(fakeguestfs.GuestFS, 'VERSION', (1, 18, 2))
+        self._test_appliance_pool_no_hotplug()
+        self.assertFalse(mock_spawn.called)
+
+    def test_hotplug_unsupported(self):
+        handle = fakeguestfs.GuestFS(python_return_dict=True)
+        self.assertIsNone(vfsimpl._hotplug_unsupported(handle))
+        handle.VERSION = (1, 19, 48)
+        self.assertIn('1.19.48', vfsimpl._hotplug_unsupported(handle))
+
+    @mock.patch('nova.utils.spawn_n')
+    def test_appliance_pool_bad_image(self, mock_spawn):
+        self.flags(appliance_pool_size=1, group='guestfs')
+        image = imgmodel.LocalFileImage("/some/fail/file",
+                                        imgmodel.FORMAT_RAW)
+        vfs = vfsimpl.VFSGuestFS(image, partition=-1)
+
+        self.assertRaises(exception.NovaException, vfs.setup)
+        self.assertFalse(vfsimpl.APPLIANCE_POOL.disabled)
+        self.assertIsNone(vfs.handle)
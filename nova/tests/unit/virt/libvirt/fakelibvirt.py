@@ -93,6 +93,7 @@ VIR_MIGRATE_PEER2PEER = 2
 VIR_MIGRATE_TUNNELLED = 4
 VIR_MIGRATE_UNDEFINE_SOURCE = 16
 VIR_MIGRATE_NON_SHARED_INC = 128
+VIR_MIGRATE_AUTO_CONVERGE = 8192
 
 VIR_NODE_CPU_STATS_ALL_CPUS = -1
 
@@ -418,6 +419,8 @@ class Domain(object):
         self._has_saved_state = False
         self._snapshots = {}
         self._id = self._connection._id_counter
+        self._migration_downtime = None
+        self._job_aborted = False
 
     def _parse_definition(self, xml):
         try:
@@ -753,6 +756,12 @@ class Domain(object):
     def blockCommit(self, disk, base, top, flags):
         return 0
 
+    def migrateSetMaxDowntime(self, downtime, flags=0):
+        self._migration_downtime = downtime
+
+    def abortJob(self):
+        self._job_aborted = True
+
     def jobInfo(self):
         return []
 
@@ -18,6 +18,7 @@ import copy
 import datetime
 import errno
 import glob
+import itertools
 import os
 import random
 import re
@@ -91,6 +92,8 @@ from nova.virt.libvirt import firewall
 from nova.virt.libvirt import guest as libvirt_guest
 from nova.virt.libvirt import host
 from nova.virt.libvirt import imagebackend
+from nova.virt.libvirt import migration as libvirt_migration
+from nova.virt.libvirt import peercache
 from nova.virt.libvirt.storage import lvm
 from nova.virt.libvirt.storage import rbd_utils
 from nova.virt.libvirt import utils as libvirt_utils
@@ -99,6 +102,7 @@ from nova.virt.libvirt.volume import volume as volume_drivers
 libvirt_driver.libvirt = fakelibvirt
 host.libvirt = fakelibvirt
 libvirt_guest.libvirt = fakelibvirt
+libvirt_migration.libvirt = fakelibvirt
 
 
 CONF = cfg.CONF
@@ -635,6 +639,16 @@ class LibvirtConnTestCase(test.NoDBTestCase):
         drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
         drvr.init_host("dummyhost")
 
+    @mock.patch.object(peercache, 'get_cache')
+    def test_init_host_peer_image_cache(self, mock_get_cache):
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        drvr.init_host("dummyhost")
+        self.assertFalse(mock_get_cache.called)
+
+        self.flags(image_peer_cache_enabled=True, group='libvirt')
+        drvr.init_host("dummyhost")
+        mock_get_cache.return_value.start_server.assert_called_once_with()
+
     @mock.patch.object(host.Host, "has_min_version")
     def test_min_version_start_abort(self, mock_version):
         mock_version.return_value = False
@@ -6247,6 +6261,94 @@ class LibvirtConnTestCase(test.NoDBTestCase):
 
         self._test_live_migration_monitoring(domain_info_records, False)
 
+    @mock.patch.object(fakelibvirt.Domain, "abortJob")
+    def test_live_migration_monitor_progress_timeout(self, mock_abort):
+        # The migration does not progress, so it gets aborted
+        self.flags(live_migration_progress_timeout=150,
+                   live_migration_completion_timeout=0,
+                   group='libvirt')
+        domain_info_records = [
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_NONE),
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+                data_remaining=100),
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+                data_remaining=100),
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+                data_remaining=100),
+            "thread-finish",
+            "domain-stop",
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_CANCELLED),
+        ]
+        domain_info_records.reverse()
+
+        with mock.patch.object(libvirt_driver, "time") as mock_time:
+            mock_time.time.side_effect = itertools.count(0, 100)
+            self._test_live_migration_monitoring(domain_info_records, False)
+
+        mock_abort.assert_called_once_with()
+
+    @mock.patch.object(fakelibvirt.Domain, "resume")
+    @mock.patch.object(fakelibvirt.Domain, "suspend")
+    @mock.patch.object(fakelibvirt.Domain, "abortJob")
+    def test_live_migration_monitor_pause_then_abort(self, mock_abort,
+                                                     mock_suspend,
+                                                     mock_resume):
+        # The migration does not progress even once the guest is paused,
+        # so it gets aborted and the guest resumed
+        self.flags(live_migration_progress_timeout=150,
+                   live_migration_completion_timeout=0,
+                   live_migration_stalled_action='pause',
+                   group='libvirt')
+        domain_info_records = [
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_NONE),
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+                data_remaining=100),
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+                data_remaining=100),
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+                data_remaining=100),
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+                data_remaining=100),
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+                data_remaining=100),
+            "thread-finish",
+            host.DomainJobInfo(
+                type=fakelibvirt.VIR_DOMAIN_JOB_CANCELLED),
+        ]
+        domain_info_records.reverse()
+
+        with mock.patch.object(libvirt_driver, "time") as mock_time:
+            mock_time.time.side_effect = itertools.count(0, 100)
+            self._test_live_migration_monitoring(domain_info_records, False)
+
+        mock_suspend.assert_called_once_with()
+        mock_abort.assert_called_once_with()
+        mock_resume.assert_called_once_with()
+
+    def test_live_migration_data_gb(self):
+        instance = objects.Instance(**self.test_instance)
+        instance.flavor.memory_mb = 4096
+        instance.flavor.root_gb = 10
+        instance.flavor.ephemeral_gb = 20
+        self.assertEqual(4, libvirt_driver.LibvirtDriver.
+                         _live_migration_data_gb(instance, False))
+        self.assertEqual(34, libvirt_driver.LibvirtDriver.
+                         _live_migration_data_gb(instance, True))
+        instance.flavor.memory_mb = 512
+        self.assertEqual(2, libvirt_driver.LibvirtDriver.
+                         _live_migration_data_gb(instance, False))
+
     @mock.patch.object(utils, "spawn")
     @mock.patch.object(libvirt_driver.LibvirtDriver, "_live_migration_monitor")
     @mock.patch.object(host.Host, "get_domain")
@@ -242,6 +242,113 @@ class HostTestCase(test.NoDBTestCase):
         gt_mock.cancel.assert_called_once_with()
         self.assertNotIn(uuid, hostimpl._events_delayed.keys())
 
+    @mock.patch.object(greenthread, 'spawn_after')
+    def test_event_coalesce_latest_event_wins(self, spawn_after_mock):
+        got_events = []
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=got_events.append,
+                             lifecycle_event_batch_window=1)
+        uuid1 = "cef19ce0-0ca2-11df-855d-b19fbce37686"
+        uuid2 = "4a2c26c2-4d5d-4b33-b0f7-1ec3aa5bd2e9"
+        for domain_uuid, transition in (
+                (uuid1, event.EVENT_LIFECYCLE_STOPPED),
+                (uuid2, event.EVENT_LIFECYCLE_PAUSED),
+                (uuid1, event.EVENT_LIFECYCLE_STARTED),
+                (uuid2, event.EVENT_LIFECYCLE_RESUMED)):
+            hostimpl._event_emit_delayed(
+                event.LifecycleEvent(domain_uuid, transition))
+
+        # One flusher for the whole window, not one greenthread per event.
+        spawn_after_mock.assert_called_once_with(1, hostimpl._flush_events)
+        self.assertEqual({}, hostimpl._events_delayed)
+
+        hostimpl._flush_events()
+
+        self.assertEqual(1, len(got_events))
+        self.assertIsInstance(got_events[0], event.LifecycleEventBatch)
+        self.assertEqual(
+            [(uuid1, event.EVENT_LIFECYCLE_STARTED),
+             (uuid2, event.EVENT_LIFECYCLE_RESUMED)],
+            [(e.uuid, e.transition) for e in got_events[0].get_events()])
+        self.assertEqual({}, hostimpl._events_pending)
+        self.assertIsNone(hostimpl._event_flusher)
+
+    @mock.patch.object(greenthread, 'spawn_after')
+    @mock.patch('time.time')
+    def test_event_coalesce_delays_stopped(self, mock_time,
+                                           spawn_after_mock):
+        got_events = []
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=got_events.append,
+                             lifecycle_event_batch_window=1)
+        uuid1 = "cef19ce0-0ca2-11df-855d-b19fbce37686"
+        uuid2 = "4a2c26c2-4d5d-4b33-b0f7-1ec3aa5bd2e9"
+        mock_time.return_value = 100
+        stopped = event.LifecycleEvent(uuid1, event.EVENT_LIFECYCLE_STOPPED)
+        started = event.LifecycleEvent(uuid2, event.EVENT_LIFECYCLE_STARTED)
+        hostimpl._event_emit_delayed(stopped)
+        hostimpl._event_emit_delayed(started)
+
+        mock_time.return_value = 101
+        hostimpl._flush_events()
+
+        # The STOPPED event waits for the lifecycle delay, the flusher is
+        # re-armed for when it is due.
+        self.assertEqual([[started]], [b.get_events() for b in got_events])
+        spawn_after_mock.assert_called_with(14, hostimpl._flush_events)
+
+        mock_time.return_value = 115
+        hostimpl._flush_events()
+
+        self.assertEqual([[started], [stopped]],
+                         [b.get_events() for b in got_events])
+        self.assertEqual({}, hostimpl._events_pending)
+
+    @mock.patch.object(greenthread, 'spawn_after')
+    @mock.patch('time.time')
+    def test_event_coalesce_reschedules_earlier(self, mock_time,
+                                                spawn_after_mock):
+        got_events = []
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=got_events.append,
+                             lifecycle_event_batch_window=1)
+        uuid1 = "cef19ce0-0ca2-11df-855d-b19fbce37686"
+        uuid2 = "4a2c26c2-4d5d-4b33-b0f7-1ec3aa5bd2e9"
+        mock_time.return_value = 100
+        stopped = event.LifecycleEvent(uuid1, event.EVENT_LIFECYCLE_STOPPED)
+        hostimpl._event_emit_delayed(stopped)
+        mock_time.return_value = 101
+        hostimpl._flush_events()
+        spawn_after_mock.assert_called_with(14, hostimpl._flush_events)
+        delayed_flusher = hostimpl._event_flusher
+
+        # A new event is not held back until the STOPPED event is due.
+        mock_time.return_value = 102
+        started = event.LifecycleEvent(uuid2, event.EVENT_LIFECYCLE_STARTED)
+        hostimpl._event_emit_delayed(started)
+
+        delayed_flusher.cancel.assert_called_once_with()
+        spawn_after_mock.assert_called_with(1, hostimpl._flush_events)
+        self.assertEqual(103, hostimpl._event_flush_due)
+
+        mock_time.return_value = 103
+        hostimpl._flush_events()
+
+        self.assertEqual([[started]], [b.get_events() for b in got_events])
+        spawn_after_mock.assert_called_with(12, hostimpl._flush_events)
+        self.assertEqual(115, hostimpl._event_flush_due)
+
+    @mock.patch.object(greenthread, 'spawn_after')
+    def test_event_coalesce_disabled(self, spawn_after_mock):
+        got_events = []
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=got_events.append)
+        ev = event.LifecycleEvent("cef19ce0-0ca2-11df-855d-b19fbce37686",
+                                  event.EVENT_LIFECYCLE_STARTED)
+        hostimpl._event_emit_delayed(ev)
+        self.assertEqual([ev], got_events)
+        self.assertFalse(spawn_after_mock.called)
+
     @mock.patch.object(fakelibvirt.virConnect, "domainEventRegisterAny")
     @mock.patch.object(host.Host, "_connect")
     def test_get_connection_serial(self, mock_conn, mock_event):
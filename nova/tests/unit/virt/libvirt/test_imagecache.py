@@ -17,8 +17,10 @@
 import contextlib
 import hashlib
 import os
+import struct
 import time
 
+import fixtures
 import mock
 from oslo_concurrency import processutils
 from oslo_config import cfg
@@ -36,6 +38,7 @@ from nova import test
 from nova.tests.unit import fake_instance
 from nova import utils
 from nova.virt.libvirt import imagecache
+from nova.virt.libvirt import peercache
 from nova.virt.libvirt import utils as libvirt_utils
 
 CONF = cfg.CONF
@@ -197,12 +200,12 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
                              'e97222e91fc4241f49a7f520d1dcf446751129b3_sm')
 
         image_cache_manager = imagecache.ImageCacheManager()
-        image_cache_manager.unexplained_images = [found]
+        image_cache_manager.unexplained_images = set([found])
         image_cache_manager.instance_names = self.stock_instance_names
 
         inuse_images = image_cache_manager._list_backing_images()
 
-        self.assertEqual(inuse_images, [found])
+        self.assertEqual(inuse_images, set([found]))
         self.assertEqual(len(image_cache_manager.unexplained_images), 0)
 
     def test_list_backing_images_resized(self):
@@ -221,12 +224,12 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
                              '10737418240')
 
         image_cache_manager = imagecache.ImageCacheManager()
-        image_cache_manager.unexplained_images = [found]
+        image_cache_manager.unexplained_images = set([found])
         image_cache_manager.instance_names = self.stock_instance_names
 
         inuse_images = image_cache_manager._list_backing_images()
 
-        self.assertEqual(inuse_images, [found])
+        self.assertEqual(inuse_images, set([found]))
         self.assertEqual(len(image_cache_manager.unexplained_images), 0)
 
     def test_list_backing_images_instancename(self):
@@ -242,12 +245,12 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
                              'e97222e91fc4241f49a7f520d1dcf446751129b3_sm')
 
         image_cache_manager = imagecache.ImageCacheManager()
-        image_cache_manager.unexplained_images = [found]
+        image_cache_manager.unexplained_images = set([found])
         image_cache_manager.instance_names = self.stock_instance_names
 
         inuse_images = image_cache_manager._list_backing_images()
 
-        self.assertEqual(inuse_images, [found])
+        self.assertEqual(inuse_images, set([found]))
         self.assertEqual(len(image_cache_manager.unexplained_images), 0)
 
     def test_list_backing_images_disk_notexist(self):
@@ -262,7 +265,7 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
         self.stubs.Set(libvirt_utils, 'get_disk_backing_file', fake_get_disk)
 
         image_cache_manager = imagecache.ImageCacheManager()
-        image_cache_manager.unexplained_images = []
+        image_cache_manager.unexplained_images = set()
         image_cache_manager.instance_names = self.stock_instance_names
 
         self.assertRaises(processutils.ProcessExecutionError,
@@ -391,7 +394,7 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
     def test_remove_base_file_original(self):
         with self._make_base_file() as fname:
             image_cache_manager = imagecache.ImageCacheManager()
-            image_cache_manager.originals = [fname]
+            image_cache_manager.originals = set([fname])
             image_cache_manager._remove_base_file(fname)
             info_fname = imagecache.get_info_filename(fname)
 
@@ -454,13 +457,13 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             os.utime(fname, (-1, time.time() - 3601))
 
             image_cache_manager = imagecache.ImageCacheManager()
-            image_cache_manager.unexplained_images = [fname]
+            image_cache_manager.unexplained_images = set([fname])
             image_cache_manager._handle_base_image(img, fname)
 
-            self.assertEqual(image_cache_manager.unexplained_images, [])
+            self.assertEqual(image_cache_manager.unexplained_images, set())
             self.assertEqual(image_cache_manager.removable_base_files,
-                             [fname])
-            self.assertEqual(image_cache_manager.corrupt_base_files, [])
+                             set([fname]))
+            self.assertEqual(image_cache_manager.corrupt_base_files, set())
 
     def test_handle_base_image_used(self):
         self.stubs.Set(libvirt_utils, 'chown', lambda x, y: None)
@@ -470,13 +473,13 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             os.utime(fname, (-1, time.time() - 3601))
 
             image_cache_manager = imagecache.ImageCacheManager()
-            image_cache_manager.unexplained_images = [fname]
+            image_cache_manager.unexplained_images = set([fname])
             image_cache_manager.used_images = {'123': (1, 0, ['banana-42'])}
             image_cache_manager._handle_base_image(img, fname)
 
-            self.assertEqual(image_cache_manager.unexplained_images, [])
-            self.assertEqual(image_cache_manager.removable_base_files, [])
-            self.assertEqual(image_cache_manager.corrupt_base_files, [])
+            self.assertEqual(image_cache_manager.unexplained_images, set())
+            self.assertEqual(image_cache_manager.removable_base_files, set())
+            self.assertEqual(image_cache_manager.corrupt_base_files, set())
 
     def test_handle_base_image_used_remotely(self):
         self.stubs.Set(libvirt_utils, 'chown', lambda x, y: None)
@@ -486,13 +489,13 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             os.utime(fname, (-1, time.time() - 3601))
 
             image_cache_manager = imagecache.ImageCacheManager()
-            image_cache_manager.unexplained_images = [fname]
+            image_cache_manager.unexplained_images = set([fname])
             image_cache_manager.used_images = {'123': (0, 1, ['banana-42'])}
             image_cache_manager._handle_base_image(img, fname)
 
-            self.assertEqual(image_cache_manager.unexplained_images, [])
-            self.assertEqual(image_cache_manager.removable_base_files, [])
-            self.assertEqual(image_cache_manager.corrupt_base_files, [])
+            self.assertEqual(image_cache_manager.unexplained_images, set())
+            self.assertEqual(image_cache_manager.removable_base_files, set())
+            self.assertEqual(image_cache_manager.corrupt_base_files, set())
 
     def test_handle_base_image_absent(self):
         img = '123'
@@ -502,9 +505,9 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             image_cache_manager.used_images = {'123': (1, 0, ['banana-42'])}
             image_cache_manager._handle_base_image(img, None)
 
-            self.assertEqual(image_cache_manager.unexplained_images, [])
-            self.assertEqual(image_cache_manager.removable_base_files, [])
-            self.assertEqual(image_cache_manager.corrupt_base_files, [])
+            self.assertEqual(image_cache_manager.unexplained_images, set())
+            self.assertEqual(image_cache_manager.removable_base_files, set())
+            self.assertEqual(image_cache_manager.corrupt_base_files, set())
             self.assertNotEqual(stream.getvalue().find('an absent base file'),
                                 -1)
 
@@ -520,13 +523,13 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             fname = os.path.join(tmpdir, 'aaa')
 
             image_cache_manager = imagecache.ImageCacheManager()
-            image_cache_manager.unexplained_images = [fname]
+            image_cache_manager.unexplained_images = set([fname])
             image_cache_manager.used_images = {'123': (1, 0, ['banana-42'])}
             image_cache_manager._handle_base_image(img, fname)
 
-            self.assertEqual(image_cache_manager.unexplained_images, [])
-            self.assertEqual(image_cache_manager.removable_base_files, [])
-            self.assertEqual(image_cache_manager.corrupt_base_files, [])
+            self.assertEqual(image_cache_manager.unexplained_images, set())
+            self.assertEqual(image_cache_manager.removable_base_files, set())
+            self.assertEqual(image_cache_manager.corrupt_base_files, set())
 
     def test_handle_base_image_checksum_fails(self):
         self.flags(checksum_base_images=True, group='libvirt')
@@ -543,14 +546,14 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
                 f.write(jsonutils.dumps(d))
 
             image_cache_manager = imagecache.ImageCacheManager()
-            image_cache_manager.unexplained_images = [fname]
+            image_cache_manager.unexplained_images = set([fname])
             image_cache_manager.used_images = {'123': (1, 0, ['banana-42'])}
             image_cache_manager._handle_base_image(img, fname)
 
-            self.assertEqual(image_cache_manager.unexplained_images, [])
-            self.assertEqual(image_cache_manager.removable_base_files, [])
+            self.assertEqual(image_cache_manager.unexplained_images, set())
+            self.assertEqual(image_cache_manager.removable_base_files, set())
             self.assertEqual(image_cache_manager.corrupt_base_files,
-                             [fname])
+                             set([fname]))
 
     def test_verify_base_images(self):
         hashed_1 = '356a192b7913b04c54574d18c28d46e6395428ab'
@@ -718,18 +721,17 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
         image_cache_manager.update(ctxt, all_instances)
 
         # Verify
+        # Every resized copy of an image in use is kept.
         active = [fq_path(hashed_1), fq_path('%s_5368709120' % hashed_1),
+                  fq_path('%s_10737418240' % hashed_1),
                   fq_path(hashed_21), fq_path(hashed_22)]
-        for act in active:
-            self.assertIn(act, image_cache_manager.active_base_files)
-        self.assertEqual(len(image_cache_manager.active_base_files),
-                         len(active))
+        self.assertEqual(set(active), image_cache_manager.active_base_files)
 
-        for rem in [fq_path('e97222e91fc4241f49a7f520d1dcf446751129b3_sm'),
-                    fq_path('e09c675c2d1cfac32dae3c2d83689c8c94bc693b_sm'),
-                    fq_path(hashed_42),
-                    fq_path('%s_10737418240' % hashed_1)]:
-            self.assertIn(rem, image_cache_manager.removable_base_files)
+        self.assertEqual(
+            set([fq_path('e97222e91fc4241f49a7f520d1dcf446751129b3_sm'),
+                 fq_path('e09c675c2d1cfac32dae3c2d83689c8c94bc693b_sm'),
+                 fq_path(hashed_42)]),
+            image_cache_manager.removable_base_files)
 
         # Ensure there are no "corrupt" images as well
         self.assertEqual(len(image_cache_manager.corrupt_base_files), 0)
@@ -739,6 +741,18 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
         image_cache_manager = imagecache.ImageCacheManager()
         image_cache_manager.update(None, [])
 
+    @mock.patch.object(peercache, 'get_cache')
+    def test_update_prunes_peer_cache(self, mock_get_cache):
+        self.flags(image_peer_cache_enabled=True, group='libvirt')
+        self.flags(remove_unused_original_minimum_age_seconds=600)
+        image_cache_manager = imagecache.ImageCacheManager()
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            os.mkdir(os.path.join(tmpdir, '_base'))
+            image_cache_manager.update(None, [])
+
+        mock_get_cache.return_value.prune.assert_called_once_with(600)
+
     def test_is_valid_info_file(self):
         hashed = 'e97222e91fc4241f49a7f520d1dcf446751129b3'
 
@@ -997,3 +1011,124 @@ class VerifyChecksumTestCase(test.NoDBTestCase):
             # Checksum requests for a file with no checksum now have the
             # side effect of creating the checksum
             self.assertTrue(os.path.exists(info_fname))
+
+
+class IncrementalImageCacheTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(IncrementalImageCacheTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.state_file = os.path.join(self.tmpdir, 'state.json')
+        self.flags(instances_path=self.tmpdir)
+        self.flags(checksum_base_images=True,
+                   image_cache_incremental=True,
+                   image_cache_state_file=self.state_file,
+                   image_info_filename_pattern=('$instances_path/'
+                                                '%(image)s.info'),
+                   group='libvirt')
+        self.fname = os.path.join(self.tmpdir, 'aaa')
+        with open(self.fname, 'w') as f:
+            f.write('data')
+
+    def _write_qcow2(self, path, backing_file=None):
+        with open(path, 'wb') as f:
+            if backing_file:
+                f.write(struct.pack('>4sIQI', b'QFI\xfb', 2, 512,
+                                    len(backing_file)))
+                f.seek(512)
+                f.write(backing_file.encode('utf-8'))
+            else:
+                f.write(struct.pack('>4sIQI', b'QFI\xfb', 2, 0, 0))
+
+    def test_read_qcow2_backing_file(self):
+        path = os.path.join(self.tmpdir, 'disk')
+        self._write_qcow2(path, '/var/lib/nova/instances/_base/abc_10')
+        self.assertEqual((True, 'abc_10'),
+                         imagecache._read_qcow2_backing_file(path))
+
+        self._write_qcow2(path)
+        self.assertEqual((True, None),
+                         imagecache._read_qcow2_backing_file(path))
+
+        self.assertEqual((False, None),
+                         imagecache._read_qcow2_backing_file(self.fname))
+
+    @mock.patch.object(libvirt_utils, 'get_disk_backing_file')
+    def test_list_backing_images_reads_qcow2_header(self, mock_backing):
+        os.mkdir(os.path.join(self.tmpdir, 'instance-1'))
+        self._write_qcow2(os.path.join(self.tmpdir, 'instance-1', 'disk'),
+                          '/somewhere/_base/abc_10')
+        os.mkdir(os.path.join(self.tmpdir, 'instance-2'))
+        with open(os.path.join(self.tmpdir, 'instance-2', 'disk'), 'w') as f:
+            f.write('raw data')
+        mock_backing.return_value = None
+
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager.instance_names = set(['instance-1',
+                                                  'instance-2'])
+        inuse_images = image_cache_manager._list_backing_images()
+
+        expected = os.path.join(self.tmpdir,
+                                CONF.image_cache_subdirectory_name, 'abc_10')
+        self.assertEqual(set([expected]), inuse_images)
+        self.assertEqual(set(['instance-1']),
+                         image_cache_manager.base_file_users[expected])
+        # Only the disk which is not qcow2 needs qemu-img.
+        mock_backing.assert_called_once_with(
+            os.path.join(self.tmpdir, 'instance-2', 'disk'))
+
+    def test_verify_checksum_only_rehashes_changed_files(self):
+        # Checksum again on every pass unless the file is unchanged.
+        self.flags(checksum_interval_seconds=0, group='libvirt')
+        image_cache_manager = imagecache.ImageCacheManager()
+        # No checksum stored yet, one is generated and recorded.
+        self.assertIsNone(image_cache_manager._verify_checksum('aaa',
+                                                               self.fname))
+
+        with mock.patch.object(imagecache, '_hash_file',
+                               wraps=imagecache._hash_file) as mock_hash:
+            self.assertTrue(image_cache_manager._verify_checksum(
+                'aaa', self.fname))
+            self.assertFalse(mock_hash.called)
+
+            # State survives a restart.
+            image_cache_manager._save_base_file_state()
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.assertTrue(image_cache_manager._verify_checksum(
+                'aaa', self.fname))
+            self.assertFalse(mock_hash.called)
+
+            with open(self.fname, 'a') as f:
+                f.write('more data')
+            self.assertFalse(image_cache_manager._verify_checksum(
+                'aaa', self.fname))
+            mock_hash.assert_called_once_with(self.fname)
+
+    def test_verify_checksum_honours_interval(self):
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager._verify_checksum('aaa', self.fname)
+        # A changed file is not checksummed again before
+        # checksum_interval_seconds elapsed, as without records.
+        with open(self.fname, 'a') as f:
+            f.write('more data')
+
+        with mock.patch.object(imagecache, '_hash_file') as mock_hash:
+            self.assertTrue(image_cache_manager._verify_checksum(
+                'aaa', self.fname))
+            self.assertFalse(mock_hash.called)
+
+    def test_save_state_records_users(self):
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager._verify_checksum('aaa', self.fname)
+        image_cache_manager.base_file_users[self.fname].update(
+            ['instance-2', 'instance-1'])
+        image_cache_manager._base_file_state['/gone'] = {'sha1': 'abc'}
+        image_cache_manager._save_base_file_state()
+
+        with open(self.state_file) as f:
+            state = jsonutils.loads(f.read())
+        self.assertEqual([self.fname], list(state['base_files']))
+        record = state['base_files'][self.fname]
+        self.assertEqual(['instance-1', 'instance-2'], record['users'])
+        self.assertEqual(os.stat(self.fname).st_ino, record['inode'])
+        self.assertEqual(imagecache._hash_file(self.fname), record['sha1'])
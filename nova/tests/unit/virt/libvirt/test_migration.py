@@ -0,0 +1,166 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from nova import test
+from nova.tests.unit.virt.libvirt import fakelibvirt
+from nova.virt.libvirt import host
+from nova.virt.libvirt import migration
+
+host.libvirt = fakelibvirt
+migration.libvirt = fakelibvirt
+
+
+def _job_info(data_remaining, data_total=1000):
+    return host.DomainJobInfo(type=fakelibvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+                              data_remaining=data_remaining,
+                              data_total=data_total)
+
+
+class DowntimeStepsTestCase(test.NoDBTestCase):
+
+    def test_downtime_steps(self):
+        steps = list(migration.downtime_steps(3.0, 400, 10, 30))
+        self.assertEqual([(0, 37), (90, 38), (180, 39), (270, 42),
+                          (360, 46), (450, 55), (540, 70), (630, 98),
+                          (720, 148), (810, 238), (900, 400)], steps)
+
+    def test_downtime_steps_minimums(self):
+        steps = list(migration.downtime_steps(2, 10, 0, 75))
+        self.assertEqual([(0, 51), (150, 100)], steps)
+
+
+class ConvergenceControllerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(ConvergenceControllerTestCase, self).setUp()
+        self.conn = fakelibvirt.Connection('qemu:///system')
+        self.dom = fakelibvirt.Domain(self.conn, '<domain/>', True)
+        self.instance = {'uuid': 'fake-uuid'}
+
+    def _controller(self, completion_timeout=800, progress_timeout=150,
+                    stalled_action=migration.STALLED_ABORT):
+        return migration.ConvergenceController(
+            self.instance, self.dom, 2, 500, 2, 75, completion_timeout,
+            progress_timeout, stalled_action)
+
+    def test_downtime_raised_on_schedule(self):
+        controller = self._controller()
+
+        controller.update(_job_info(900), 0)
+        self.assertEqual(167, self.dom._migration_downtime)
+        controller.update(_job_info(800), 149)
+        self.assertEqual(167, self.dom._migration_downtime)
+        controller.update(_job_info(700), 150)
+        self.assertEqual(184, self.dom._migration_downtime)
+        # A late update skips to the last step it reached
+        controller.update(_job_info(600), 1000)
+        self.assertEqual(500, self.dom._migration_downtime)
+        self.assertEqual(500, controller.downtime)
+        self.assertFalse(self.dom._job_aborted)
+
+    def test_downtime_error_is_not_fatal(self):
+        controller = self._controller()
+        error = fakelibvirt.make_libvirtError(
+            fakelibvirt.libvirtError, 'unsupported',
+            error_code=fakelibvirt.VIR_ERR_INTERNAL_ERROR)
+
+        with mock.patch.object(self.dom, 'migrateSetMaxDowntime',
+                               side_effect=error):
+            controller.update(_job_info(900), 0)
+
+        self.assertIsNone(controller.downtime)
+        self.assertIsNone(controller.aborted)
+
+    def test_progress_timeout_aborts(self):
+        controller = self._controller()
+
+        controller.update(_job_info(500), 0)
+        # Dirtied memory sends data_remaining up, it is not progress
+        controller.update(_job_info(600), 100)
+        controller.update(_job_info(400), 120)
+        controller.update(_job_info(450), 270)
+        self.assertFalse(self.dom._job_aborted)
+        controller.update(_job_info(450), 271)
+        self.assertTrue(self.dom._job_aborted)
+        self.assertEqual('no progress', controller.aborted)
+
+    def test_progress_timeout_pauses(self):
+        controller = self._controller(
+            stalled_action=migration.STALLED_PAUSE)
+
+        controller.update(_job_info(500), 0)
+        controller.update(_job_info(500), 151)
+        self.assertTrue(controller.paused)
+        self.assertEqual(fakelibvirt.VIR_DOMAIN_PAUSED, self.dom._state)
+        self.assertFalse(self.dom._job_aborted)
+
+        # Still stuck once paused
+        controller.update(_job_info(500), 302)
+        self.assertTrue(self.dom._job_aborted)
+
+    def test_resume_after_pause(self):
+        controller = self._controller(
+            stalled_action=migration.STALLED_PAUSE)
+        controller.resume()
+        self.assertEqual(fakelibvirt.VIR_DOMAIN_RUNNING, self.dom._state)
+
+        controller.update(_job_info(500), 0)
+        controller.update(_job_info(500), 151)
+        controller.update(_job_info(500), 302)
+        self.assertEqual('no progress', controller.aborted)
+        self.assertEqual(fakelibvirt.VIR_DOMAIN_PAUSED, self.dom._state)
+
+        controller.resume()
+        self.assertFalse(controller.paused)
+        self.assertEqual(fakelibvirt.VIR_DOMAIN_RUNNING, self.dom._state)
+
+    def test_completion_timeout_aborts(self):
+        controller = self._controller(completion_timeout=10,
+                                      progress_timeout=0)
+
+        controller.update(_job_info(500), 0)
+        controller.update(_job_info(400), 20)
+        self.assertFalse(self.dom._job_aborted)
+        controller.update(_job_info(300), 21)
+        self.assertTrue(self.dom._job_aborted)
+        self.assertEqual('completion timeout', controller.aborted)
+
+    def test_timeouts_disabled(self):
+        controller = self._controller(completion_timeout=0,
+                                      progress_timeout=0)
+
+        controller.update(_job_info(500), 0)
+        controller.update(_job_info(500), 100000)
+        self.assertFalse(self.dom._job_aborted)
+
+    def test_samples(self):
+        controller = self._controller()
+
+        for elapsed in range(0, 12):
+            controller.update(_job_info(1000 - elapsed), elapsed)
+
+        self.assertEqual([(0, 1000, 1000, None), (5, 995, 1000, 167),
+                          (10, 990, 1000, 167)], controller.samples)
+
+    @mock.patch.object(migration.LOG, 'info')
+    def test_log_summary(self, mock_info):
+        controller = self._controller()
+        controller.update(_job_info(500), 0)
+
+        controller.log_summary('completed', 12)
+
+        args = mock_info.call_args[0][1]
+        self.assertEqual('completed', args['result'])
+        self.assertEqual(167, args['downtime'])
+        self.assertFalse(args['paused'])
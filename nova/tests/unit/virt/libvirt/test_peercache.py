@@ -0,0 +1,264 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import os
+import socket
+import time
+
+import eventlet
+import fixtures
+import mock
+from oslo_serialization import jsonutils
+import webob
+
+from nova import test
+from nova.virt import images
+from nova.virt.libvirt import peercache
+
+DATA = {'image1': 'first image data' * 1000,
+        'image2': 'second image data',
+        'image1-copy': 'first image data' * 1000}
+
+
+def _checksum(data):
+    return hashlib.md5(data).hexdigest()
+
+
+class PeerImageCacheTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(PeerImageCacheTestCase, self).setUp()
+        self.flags(image_peer_cache_listen='127.0.0.1',
+                   image_peer_cache_port=0, image_peer_cache_timeout=1,
+                   image_peer_cache_inflight_wait=5, group='libvirt')
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.glance_fetches = []
+        for patcher in (
+                mock.patch.object(images, 'get_info',
+                                  side_effect=self._get_info),
+                mock.patch.object(images, 'fetch',
+                                  side_effect=self._glance_fetch)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _get_info(self, context, image_href):
+        return {'id': image_href, 'checksum': _checksum(DATA[image_href])}
+
+    def _glance_fetch(self, context, image_href, path, user_id, project_id,
+                      max_size=0):
+        self.glance_fetches.append(image_href)
+        with open(path, 'wb') as f:
+            f.write(DATA[image_href])
+
+    def _cache(self, name, peers=(), serve=False):
+        cache = peercache.PeerImageCache(
+            cache_dir=os.path.join(self.tmpdir, name, 'by-checksum'),
+            peers=list(peers))
+        if serve:
+            server = cache.start_server()
+            self.addCleanup(cache.stop_server)
+            cache.address = '127.0.0.1:%d' % server.port
+        return cache
+
+    def _fetch(self, cache, image_href, name='node'):
+        path = os.path.join(self.tmpdir, '%s-%s.part' % (name, image_href))
+        cache.fetch('ctxt', image_href, path, 'user', 'project')
+        with open(path, 'rb') as f:
+            self.assertEqual(DATA[image_href], f.read())
+        return path
+
+    def test_ranked_peers(self):
+        self.flags(image_peer_cache_port=8779, group='libvirt')
+        self.flags(my_ip='10.0.0.1')
+        peers = ['10.0.0.%d:8779' % i for i in range(1, 6)]
+        cache = peercache.PeerImageCache(cache_dir=self.tmpdir, peers=peers)
+
+        self.assertEqual(sorted(peers[1:]), sorted(cache.peers))
+        ranked = cache.ranked_peers('a' * 32)
+        # Every compute node asks the peers in the same order
+        self.assertEqual(ranked, peercache.PeerImageCache(
+            cache_dir=self.tmpdir, peers=peers[1:]).ranked_peers('a' * 32))
+        self.assertNotEqual(
+            [cache.ranked_peers('%032x' % i)[0] for i in range(20)],
+            [ranked[0]] * 20)
+
+    def test_fetch_from_glance(self):
+        cache = self._cache('node')
+
+        path = self._fetch(cache, 'image1')
+
+        self.assertEqual(['image1'], self.glance_fetches)
+        cached = os.path.join(cache.cache_dir, _checksum(DATA['image1']))
+        self.assertTrue(os.path.samefile(path, cached))
+        self.assertEqual(1, cache.get_stats()['glance'])
+        self.assertEqual(0.0, cache.get_stats()['hit_ratio'])
+
+    def test_fetch_local(self):
+        cache = self._cache('node')
+        self._fetch(cache, 'image1')
+        cached = os.path.join(cache.cache_dir, _checksum(DATA['image1']))
+        os.utime(cached, (1000, 1000))
+        self._fetch(cache, 'image1-copy')
+
+        self.assertEqual(['image1'], self.glance_fetches)
+        # The use is recorded aside, the image cache manager checks the
+        # modification time of the base file the image is a link of.
+        self.assertEqual(1000, os.path.getmtime(cached))
+        self.assertTrue(os.path.exists(cached + peercache.USED_SUFFIX))
+        stats = cache.get_stats()
+        self.assertEqual(1, stats['local'])
+        self.assertEqual(2, stats['fetches'])
+        self.assertEqual(0.5, stats['hit_ratio'])
+
+    def test_fetch_no_checksum(self):
+        cache = self._cache('node')
+        images.get_info.side_effect = None
+        images.get_info.return_value = {'id': 'image1', 'checksum': None}
+
+        self._fetch(cache, 'image1')
+
+        self.assertEqual(['image1'], self.glance_fetches)
+        self.assertEqual([], os.listdir(cache.cache_dir)
+                         if os.path.exists(cache.cache_dir) else [])
+        self.assertEqual(0, cache.get_stats()['fetches'])
+
+    def test_fetch_from_peer(self):
+        peer1 = self._cache('peer1', serve=True)
+        peer2 = self._cache('peer2', serve=True)
+        self._fetch(peer2, 'image1', name='peer2')
+        cache = self._cache('node', peers=[peer1.address, peer2.address])
+
+        path = self._fetch(cache, 'image1')
+
+        self.assertEqual(['image1'], self.glance_fetches)
+        self.assertEqual(1, peer2.stats['served'])
+        stats = cache.get_stats()
+        self.assertEqual(1, stats['peer'])
+        self.assertEqual(1.0, stats['hit_ratio'])
+        # The image is then served by this compute node as well
+        cached = os.path.join(cache.cache_dir, _checksum(DATA['image1']))
+        self.assertTrue(os.path.samefile(path, cached))
+
+    def test_fetch_peer_miss(self):
+        peer = self._cache('peer', serve=True)
+        cache = self._cache('node', peers=[peer.address])
+
+        self._fetch(cache, 'image2')
+
+        self.assertEqual(['image2'], self.glance_fetches)
+        self.assertEqual({'glance': 1, 'peer': 0, 'peer_errors': 0},
+                         {k: cache.stats[k]
+                          for k in ('glance', 'peer', 'peer_errors')})
+
+    def test_fetch_peer_bad_checksum(self):
+        peer = self._cache('peer', serve=True)
+        os.makedirs(peer.cache_dir)
+        with open(os.path.join(peer.cache_dir,
+                               _checksum(DATA['image2'])), 'wb') as f:
+            f.write('corrupted')
+        cache = self._cache('node', peers=[peer.address])
+
+        self._fetch(cache, 'image2')
+
+        self.assertEqual(['image2'], self.glance_fetches)
+        self.assertEqual(1, cache.stats['peer_errors'])
+        self.assertEqual(1, cache.stats['glance'])
+
+    def test_fetch_peer_down(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        address = '127.0.0.1:%d' % sock.getsockname()[1]
+        sock.close()
+        cache = self._cache('node', peers=[address])
+
+        self._fetch(cache, 'image2')
+
+        self.assertEqual(['image2'], self.glance_fetches)
+        self.assertEqual(1, cache.stats['peer_errors'])
+
+    def test_serve_waits_for_inflight_fetch(self):
+        peer = self._cache('peer', serve=True)
+        cache = self._cache('node', peers=[peer.address])
+        started = eventlet.event.Event()
+        release = eventlet.event.Event()
+
+        def slow_glance_fetch(*args, **kwargs):
+            started.send()
+            release.wait()
+            self._glance_fetch(*args, **kwargs)
+
+        images.fetch.side_effect = slow_glance_fetch
+        first = eventlet.spawn(self._fetch, peer, 'image1', 'peer')
+        started.wait()
+        second = eventlet.spawn(self._fetch, cache, 'image1')
+        eventlet.sleep(0.1)
+        release.send()
+        first.wait()
+        second.wait()
+
+        # The node waited for its peer rather than going to Glance too
+        self.assertEqual(['image1'], self.glance_fetches)
+        self.assertEqual(1, cache.stats['peer'])
+
+    def test_app(self):
+        cache = self._cache('node')
+        self._fetch(cache, 'image2')
+
+        res = webob.Request.blank(
+            '/images/%s' % _checksum(DATA['image2'])).get_response(cache.app)
+        self.assertEqual(200, res.status_int)
+        self.assertEqual(DATA['image2'], res.body)
+
+        res = webob.Request.blank('/stats').get_response(cache.app)
+        self.assertEqual(1, jsonutils.loads(res.body)['served'])
+
+        for path in ('/images/%s' % _checksum(DATA['image1']),
+                     '/images/../../etc/passwd', '/images/'):
+            res = webob.Request.blank(path).get_response(cache.app)
+            self.assertEqual(404, res.status_int)
+
+        res = webob.Request.blank('/stats', method='PUT').get_response(
+            cache.app)
+        self.assertEqual(405, res.status_int)
+
+    def test_prune(self):
+        cache = self._cache('node')
+        self._fetch(cache, 'image1')
+        self._fetch(cache, 'image2')
+        old = os.path.join(cache.cache_dir, _checksum(DATA['image1']))
+        os.utime(old + peercache.USED_SUFFIX,
+                 (time.time() - 3600, time.time() - 3600))
+        recent = os.path.join(cache.cache_dir, _checksum(DATA['image2']))
+        os.utime(recent, (time.time() - 3600, time.time() - 3600))
+
+        cache.prune(600)
+
+        self.assertFalse(os.path.exists(old))
+        self.assertFalse(os.path.exists(old + peercache.USED_SUFFIX))
+        self.assertTrue(os.path.exists(recent))
+        self.assertTrue(os.path.exists(recent + peercache.USED_SUFFIX))
+
+    def test_prune_no_cache(self):
+        self._cache('node').prune(600)
+
+    @mock.patch.object(peercache.wsgi, 'Server')
+    def test_start_server_listens_on_my_ip(self, mock_server):
+        self.flags(my_ip='10.0.0.1')
+        self.flags(image_peer_cache_listen=None, image_peer_cache_port=8779,
+                   group='libvirt')
+        cache = self._cache('node')
+
+        cache.start_server()
+
+        mock_server.assert_called_once_with(
+            'peer_image_cache', mock.ANY, host='10.0.0.1', port=8779)
+        mock_server.return_value.start.assert_called_once_with()
@@ -31,6 +31,7 @@ from nova import utils
 from nova.virt.disk import api as disk
 from nova.virt import images
 from nova.virt.libvirt import config as vconfig
+from nova.virt.libvirt import peercache
 from nova.virt.libvirt import utils as libvirt_utils
 
 CONF = cfg.CONF
@@ -604,7 +605,17 @@ disk size: 4.4M
                                   user_id, project_id)
         mock_images.assert_called_once_with(
             context, image_id, target, user_id, project_id,
-            max_size=0)
+            max_size=0, download=None)
+
+    @mock.patch('nova.virt.images.fetch_to_raw')
+    def test_fetch_image_peer_cache(self, mock_images):
+        self.flags(image_peer_cache_enabled=True, group='libvirt')
+        with mock.patch.object(peercache, '_CACHE') as cache:
+            libvirt_utils.fetch_image('ctxt', '/tmp/targetfile', '4',
+                                      'fake', 'fake')
+        mock_images.assert_called_once_with(
+            'ctxt', '4', '/tmp/targetfile', 'fake', 'fake', max_size=0,
+            download=cache.fetch)
 
     def test_fetch_raw_image(self):
 
@@ -12,9 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+
+import fixtures
+import mock
 from oslo_utils import strutils
 
 from nova import test
+from nova import utils
 from nova.virt import configdrive
 
 
@@ -28,3 +33,37 @@ class ConfigDriveTestCase(test.NoDBTestCase):
         for value in (strutils.FALSE_STRINGS + ('foo',)):
             self.flags(force_config_drive=value)
             self.assertFalse(configdrive.required_by({}))
+
+
+class ConfigDriveBuilderTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ConfigDriveBuilderTestCase, self).setUp()
+        self.builder = configdrive.ConfigDriveBuilder()
+        self.builder.mdfiles = [
+            ('openstack/latest/meta_data.json', '{"uuid": "fake"}'),
+            ('ec2/latest/meta-data.json', '{}'),
+        ]
+
+    @mock.patch.object(utils, 'execute')
+    def test_make_drive_iso9660_external(self, mock_execute):
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'disk.config')
+            self.builder.make_drive(path)
+        self.assertEqual(1, mock_execute.call_count)
+        args = mock_execute.call_args[0]
+        self.assertEqual(('genisoimage', '-o', path), args[:3])
+
+    @mock.patch.object(utils, 'execute')
+    @mock.patch.object(utils, 'tempdir')
+    def test_make_drive_iso9660_builtin(self, mock_tempdir, mock_execute):
+        self.flags(config_drive_iso_writer='builtin')
+        with fixtures.TempDir() as tmp:
+            path = os.path.join(tmp.path, 'disk.config')
+            self.builder.make_drive(path)
+            with open(path, 'rb') as f:
+                image = f.read()
+        self.assertFalse(mock_execute.called)
+        self.assertFalse(mock_tempdir.called)
+        self.assertEqual(b'CD001', image[16 * 2048 + 1:16 * 2048 + 6])
+        self.assertIn(b'{"uuid": "fake"}', image)
+        self.assertIn(self.builder._publisher().encode('ascii'), image)
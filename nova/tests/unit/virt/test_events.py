@@ -34,3 +34,6 @@ class TestEvents(test.NoDBTestCase):
         e = event.LifecycleEvent(uuid, lifecycle, timestamp=t)
         self.assertEqual(str(e), "<LifecycleEvent: %s, %s => Resumed>" %
                          (t, uuid))
+
+        e = event.LifecycleEventBatch([e], timestamp=t)
+        self.assertEqual(str(e), "<LifecycleEventBatch: %s, 1 events>" % t)
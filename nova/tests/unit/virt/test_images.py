@@ -43,3 +43,63 @@ class QemuTestCase(test.NoDBTestCase):
         image_info = images.qemu_img_info('/fake/path')
         self.assertTrue(image_info)
         self.assertTrue(str(image_info))
+
+    @mock.patch.object(utils, 'execute')
+    def test_convert_image_defaults(self, mock_execute):
+        images.convert_image('/src', '/dst', 'raw')
+        mock_execute.assert_called_once_with(
+            'qemu-img', 'convert', '-O', 'raw', '/src', '/dst',
+            run_as_root=False)
+
+    @mock.patch.object(utils, 'execute')
+    def test_convert_image_tuned(self, mock_execute):
+        images.convert_image('/src', '/dst', 'raw', run_as_root=True,
+                             cache_mode='none', coroutines=8)
+        mock_execute.assert_called_once_with(
+            'qemu-img', 'convert', '-t', 'none', '-m', '8', '-W',
+            '-O', 'raw', '/src', '/dst', run_as_root=True)
+
+    @mock.patch.object(images.LOG, 'info')
+    @mock.patch.object(os, 'rename')
+    @mock.patch.object(os, 'unlink')
+    @mock.patch.object(images, 'convert_image')
+    @mock.patch.object(images, 'qemu_img_info')
+    @mock.patch.object(images, 'fetch')
+    def test_fetch_to_raw_convert_options(self, mock_fetch, mock_info,
+                                          mock_convert, mock_unlink,
+                                          mock_rename, mock_log):
+        self.flags(image_convert_cache_mode='none',
+                   image_convert_coroutines=4)
+        mock_info.side_effect = [
+            mock.Mock(file_format='qcow2', backing_file=None,
+                      virtual_size=1),
+            mock.Mock(file_format='raw')]
+
+        images.fetch_to_raw('ctxt', 'image', '/base/image', 'user',
+                            'project')
+
+        mock_convert.assert_called_once_with(
+            '/base/image.part', '/base/image.converted', 'raw',
+            cache_mode='none', coroutines=4)
+        mock_rename.assert_called_once_with('/base/image.converted',
+                                            '/base/image')
+        timings = mock_log.call_args[0][1]['timings']
+        self.assertEqual(['fetch', 'inspect', 'convert', 'verify'],
+                         [t.split()[0] for t in timings.split(', ')])
+
+    @mock.patch.object(os, 'rename')
+    @mock.patch.object(images, 'qemu_img_info',
+                       return_value=mock.Mock(file_format='raw',
+                                              backing_file=None,
+                                              virtual_size=1))
+    @mock.patch.object(images, 'fetch')
+    def test_fetch_to_raw_download(self, mock_fetch, mock_info, mock_rename):
+        download = mock.Mock()
+
+        images.fetch_to_raw('ctxt', 'image', '/base/image', 'user',
+                            'project', download=download)
+
+        download.assert_called_once_with('ctxt', 'image', '/base/image.part',
+                                         'user', 'project', max_size=0)
+        self.assertFalse(mock_fetch.called)
+        mock_rename.assert_called_once_with('/base/image.part', '/base/image')
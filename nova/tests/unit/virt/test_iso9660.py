@@ -0,0 +1,185 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import struct
+
+import six
+
+from nova import test
+from nova.virt import iso9660
+
+SECTOR = iso9660.SECTOR_SIZE
+
+
+def _records(image, extent, length):
+    """Yield the directory records of an extent, skipping sector padding."""
+    data = image[extent * SECTOR:extent * SECTOR + length]
+    offset = 0
+    while offset < len(data):
+        record_len = six.indexbytes(data, offset)
+        if record_len == 0:
+            offset = (offset // SECTOR + 1) * SECTOR
+            continue
+        yield data[offset:offset + record_len]
+        offset += record_len
+
+
+def _parse_record(record):
+    extent = struct.unpack('<I', record[2:6])[0]
+    length = struct.unpack('<I', record[10:14])[0]
+    is_dir = bool(six.indexbytes(record, 25) & 0x02)
+    name_len = six.indexbytes(record, 32)
+    identifier = record[33:33 + name_len]
+    system_use = record[33 + name_len + (0 if name_len % 2 else 1):]
+    return identifier, extent, length, is_dir, system_use
+
+
+def _susp_entries(system_use):
+    entries = {}
+    offset = 0
+    while offset + 4 <= len(system_use):
+        signature = system_use[offset:offset + 2]
+        length = six.indexbytes(system_use, offset + 2)
+        if length == 0:
+            break
+        entries[signature] = system_use[offset:offset + length]
+        offset += length
+    return entries
+
+
+def _read_tree(image, descriptor_sector, joliet=False):
+    """Return {path: data} for every file reachable from a descriptor."""
+    descriptor = image[descriptor_sector * SECTOR:
+                       (descriptor_sector + 1) * SECTOR]
+    _, root_extent, root_length, _, _ = _parse_record(descriptor[156:190])
+    files = {}
+
+    def _walk(extent, length, prefix):
+        for record in _records(image, extent, length):
+            identifier, child_extent, child_length, is_dir, system_use = (
+                _parse_record(record))
+            if identifier in (b'\x00', b'\x01'):
+                continue
+            if joliet:
+                name = identifier.decode('utf-16-be')
+            else:
+                name = _susp_entries(system_use)[b'NM'][5:].decode('utf-8')
+            if not is_dir:
+                name = name.split(';')[0] if joliet else name
+            path = prefix + name
+            if is_dir:
+                _walk(child_extent, child_length, path + '/')
+            else:
+                files[path] = image[child_extent * SECTOR:
+                                    child_extent * SECTOR + child_length]
+
+    _walk(root_extent, root_length, '')
+    return files
+
+
+class ISO9660WriterTestCase(test.NoDBTestCase):
+    FILES = {
+        'ec2/latest/meta-data.json': b'{"hostname": "foo"}',
+        'openstack/latest/meta_data.json': b'{"uuid": "fake"}',
+        'openstack/latest/user_data': b'',
+        'openstack/content/0000': b'x' * (SECTOR * 2 + 17),
+    }
+
+    def _build(self, files=None, **kwargs):
+        writer = iso9660.ISO9660Writer('config-2', timestamp=0, **kwargs)
+        for path, data in sorted((files or self.FILES).items()):
+            writer.add_file(path, data)
+        out = six.BytesIO()
+        size = writer.write(out)
+        image = out.getvalue()
+        self.assertEqual(size, len(image))
+        self.assertEqual(0, len(image) % SECTOR)
+        return image
+
+    def test_volume_descriptors(self):
+        image = self._build(publisher='OpenStack Nova')
+        pvd = image[16 * SECTOR:17 * SECTOR]
+        svd = image[17 * SECTOR:18 * SECTOR]
+        terminator = image[18 * SECTOR:19 * SECTOR]
+        self.assertEqual(b'\x01CD001\x01', pvd[:7])
+        self.assertEqual(b'config-2'.ljust(32), pvd[40:72])
+        self.assertEqual(b'OpenStack Nova'.ljust(128), pvd[318:446])
+        self.assertEqual(len(image) // SECTOR,
+                         struct.unpack('<I', pvd[80:84])[0])
+        self.assertEqual(b'\x02CD001\x01', svd[:7])
+        self.assertEqual(b'%/E', svd[88:91])
+        self.assertEqual(u'config-2'.ljust(16).encode('utf-16-be'),
+                         svd[40:72])
+        self.assertEqual(b'\xffCD001\x01', terminator[:7])
+
+    def test_rock_ridge_tree(self):
+        image = self._build()
+        self.assertEqual(self.FILES, _read_tree(image, 16))
+
+    def test_joliet_tree(self):
+        image = self._build()
+        self.assertEqual(self.FILES, _read_tree(image, 17, joliet=True))
+
+    def test_root_announces_rock_ridge(self):
+        image = self._build()
+        pvd = image[16 * SECTOR:17 * SECTOR]
+        _, extent, length, _, _ = _parse_record(pvd[156:190])
+        dot = next(_records(image, extent, length))
+        system_use = _parse_record(dot)[4]
+        self.assertEqual(b'SP', system_use[:2])
+        self.assertIn(b'ER', _susp_entries(system_use))
+        self.assertIn(b'RRIP_1991A', _susp_entries(system_use)[b'ER'])
+
+    def test_large_directory_spans_sectors(self):
+        files = {'openstack/content/%04x' % i: ('data%d' % i).encode('ascii')
+                 for i in range(300)}
+        image = self._build(files)
+        self.assertEqual(files, _read_tree(image, 16))
+        self.assertEqual(files, _read_tree(image, 17, joliet=True))
+
+    def test_primary_name_collisions(self):
+        files = {'a/meta-data': b'1', 'a/meta_data': b'2'}
+        image = self._build(files)
+        self.assertEqual(files, _read_tree(image, 16))
+        pvd = image[16 * SECTOR:17 * SECTOR]
+        _, extent, length, _, _ = _parse_record(pvd[156:190])
+        names = set()
+        for record in _records(image, extent, length):
+            identifier, child_extent, child_length, is_dir, _ = (
+                _parse_record(record))
+            if identifier == b'a':
+                names = set(_parse_record(r)[0] for r in
+                            _records(image, child_extent, child_length))
+        self.assertEqual(set([b'\x00', b'\x01', b'meta_data;1',
+                              b'meta_data_1;1']), names)
+
+    def test_unicode_data(self):
+        image = self._build({'openstack/latest/user_data': u'caf\xe9'})
+        self.assertEqual({'openstack/latest/user_data': b'caf\xc3\xa9'},
+                         _read_tree(image, 16))
+
+    def test_replace_file(self):
+        writer = iso9660.ISO9660Writer('config-2')
+        writer.add_file('a/b', b'old')
+        writer.add_file('a/b', b'new')
+        out = six.BytesIO()
+        writer.write(out)
+        self.assertEqual({'a/b': b'new'}, _read_tree(out.getvalue(), 16))
+
+    def test_invalid_paths(self):
+        writer = iso9660.ISO9660Writer('config-2')
+        writer.add_file('a/b', b'data')
+        self.assertRaises(ValueError, writer.add_file, '', b'')
+        self.assertRaises(ValueError, writer.add_file, 'a/../b', b'')
+        self.assertRaises(ValueError, writer.add_file, 'x' * 65, b'')
+        self.assertRaises(ValueError, writer.add_file, 'a/b/c', b'')
+        self.assertRaises(ValueError, writer.add_file, 'a', b'')
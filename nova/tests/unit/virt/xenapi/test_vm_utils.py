@@ -14,6 +14,7 @@
 #    under the License.
 
 import contextlib
+import os
 import uuid
 
 from eventlet import greenthread
@@ -597,6 +598,92 @@ class ResizeHelpersTestCase(VMUtilsTestBase):
         self.assertEqual((2, 20, 10, "", "bob", ""), partitions[1])
 
 
+class SparseCopyTestCase(VMUtilsTestBase):
+    def setUp(self):
+        super(SparseCopyTestCase, self).setUp()
+        self.tempdir = self.useFixture(fixtures.TempDir()).path
+        self.src = os.path.join(self.tempdir, 'src')
+        self.dst = os.path.join(self.tempdir, 'dst')
+        # Stands for the freshly created VDI the partition is copied to
+        open(self.dst, 'wb').close()
+        self.flags(sparse_copy=True, group='xenserver')
+
+    def _make_source(self, size, extents):
+        with open(self.src, 'wb') as f:
+            f.truncate(size)
+            for offset, data in extents:
+                f.seek(offset)
+                f.write(data)
+        with open(self.src, 'rb') as f:
+            return f.read()
+
+    def _dest_blocks(self):
+        return os.stat(self.dst).st_blocks * 512
+
+    def _test_sparse_copy(self, seek_data=True):
+        size = 8 * units.Mi
+        expected = self._make_source(size, [
+            (0, b'a' * 1000),
+            (3 * units.Mi + 4096, b'\0' * units.Mi),
+            (5 * units.Mi - 10, b'b' * 8192),
+            (size - 4096, b'c' * 4096)])
+        if not seek_data:
+            self.stubs.Set(vm_utils, 'SEEK_DATA', None)
+
+        vm_utils._sparse_copy(self.src, self.dst, size)
+
+        with open(self.dst, 'rb') as f:
+            self.assertEqual(expected, f.read())
+        # Only the blocks holding data get written
+        self.assertLess(self._dest_blocks(), units.Mi)
+
+    def test_sparse_copy(self):
+        self._test_sparse_copy()
+
+    def test_sparse_copy_without_seek_data(self):
+        self._test_sparse_copy(seek_data=False)
+
+    def test_sparse_copy_across_segments(self):
+        self.stubs.Set(vm_utils, 'SPARSE_COPY_SEGMENT_SIZE', units.Mi)
+        self.stubs.Set(vm_utils, 'SPARSE_COPY_BUFFER_SIZE', 64 * units.Ki)
+        self._test_sparse_copy()
+
+    def test_sparse_copy_short_source(self):
+        expected = self._make_source(units.Mi, [(0, b'a' * 4096),
+                                                (units.Mi - 1, b'b')])
+
+        vm_utils._sparse_copy(self.src, self.dst, 2 * units.Mi)
+
+        with open(self.dst, 'rb') as f:
+            self.assertEqual(expected, f.read())
+
+    def test_write_nonzero_blocks(self):
+        zero_block = b'\0' * 4
+        data = b'ab\0\0' + b'\0' * 8 + b'cdef' + b'\0' * 4 + b'gh'
+        fd = os.open(self.dst, os.O_RDWR | os.O_CREAT)
+        self.addCleanup(os.close, fd)
+        self.mox.StubOutWithMock(vm_utils, '_write_at')
+        vm_utils._write_at(fd, 100, mox.Func(
+            lambda buf: buf.tobytes() == b'ab\0\0'))
+        vm_utils._write_at(fd, 112, mox.Func(
+            lambda buf: buf.tobytes() == b'cdef'))
+        vm_utils._write_at(fd, 120, mox.Func(
+            lambda buf: buf.tobytes() == b'gh'))
+        self.mox.ReplayAll()
+
+        self.assertEqual(10, vm_utils._write_nonzero_blocks(
+            fd, 100, data, zero_block))
+        self.assertEqual(0, vm_utils._write_nonzero_blocks(
+            fd, 100, b'\0' * 16, zero_block))
+
+    def test_data_extent_unsupported(self):
+        fd = os.open(self.dst, os.O_RDWR | os.O_CREAT)
+        self.addCleanup(os.close, fd)
+        error = OSError(22, 'Invalid argument')
+        with mock.patch.object(os, 'lseek', side_effect=error):
+            self.assertEqual((10, 20), vm_utils._data_extent(fd, 10, 20))
+
+
 class CheckVDISizeTestCase(VMUtilsTestBase):
     def setUp(self):
         super(CheckVDISizeTestCase, self).setUp()
@@ -1815,6 +1902,101 @@ class VDIAttachedHere(VMUtilsTestBase):
         mock_execute.assert_called_with('sync', run_as_root=True)
 
 
+class WaitForVHDCoalesceEventsTestCase(VMUtilsTestBase):
+    def setUp(self):
+        super(WaitForVHDCoalesceEventsTestCase, self).setUp()
+        fake.reset()
+        self.xenapi = fake.SessionBase('test_url')
+        self.xenapi.xenapi_request('login_with_password', ('root', 'pass'))
+        self.session = _get_fake_session()
+        self.session.XenAPI.Failure = fake.Failure
+        self.session.call_xenapi.side_effect = (
+            lambda method, *args: self.xenapi.xenapi_request(method, args))
+
+        self.sr_ref = fake.create_sr()
+        self.vdi_ref = fake.create_vdi('leaf', self.sr_ref,
+                                       sm_config={'vhd-parent': 'snapshot'})
+        self.chain = [fake.get_record('VDI', self.vdi_ref)['uuid'],
+                      'parent', 'base']
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.instance = {"uuid": "fake"}
+
+    def _coalesce(self, *args):
+        # What the storage manager does once the new parent is coalesced
+        self.xenapi.xenapi_request('VDI.set_sm_config',
+                                   (self.vdi_ref, {'vhd-parent': 'parent'}))
+
+    @mock.patch.object(vm_utils, '_scan_sr')
+    @mock.patch.object(greenthread, 'sleep')
+    def test_wait_for_vhd_coalesce_event(self, mock_sleep, mock_scan_sr):
+        mock_sleep.side_effect = self._coalesce
+
+        stats = vm_utils._wait_for_vhd_coalesce(
+            self.session, self.instance, self.sr_ref, self.vdi_ref,
+            self.chain)
+
+        # The change was picked up from the event, without a rescan
+        self.assertEqual('events', stats['method'])
+        self.assertEqual(1, stats['events'])
+        self.assertEqual(1, stats['scans'])
+        self.assertEqual(1, mock_scan_sr.call_count)
+        mock_sleep.assert_called_once_with(0.5)
+        self.session.call_xenapi.assert_any_call(
+            'event.from', ['VDI/%s' % self.vdi_ref], mock.ANY, 0.5)
+
+    @mock.patch.object(vm_utils, '_scan_sr')
+    @mock.patch.object(greenthread, 'sleep')
+    def test_wait_for_vhd_coalesce_event_timeout(self, mock_sleep,
+                                                 mock_scan_sr):
+        # No event comes in time, so the SR is rescanned and the next wait
+        # is longer
+        waits = []
+
+        def fake_sleep(secs):
+            waits.append(secs)
+            if len(waits) == 2:
+                self._coalesce()
+        mock_sleep.side_effect = fake_sleep
+
+        stats = vm_utils._wait_for_vhd_coalesce(
+            self.session, self.instance, self.sr_ref, self.vdi_ref,
+            self.chain)
+
+        self.assertEqual('events', stats['method'])
+        self.assertEqual(1, stats['events'])
+        self.assertEqual(2, stats['scans'])
+        self.assertEqual([0.5, 1.0], waits)
+
+    @mock.patch.object(vm_utils, '_scan_sr')
+    @mock.patch.object(greenthread, 'sleep')
+    def test_wait_for_vhd_coalesce_event_unsupported(self, mock_sleep,
+                                                     mock_scan_sr):
+        mock_sleep.side_effect = self._coalesce
+        error = fake.Failure(['MESSAGE_METHOD_UNKNOWN', 'event.from'])
+
+        with mock.patch.object(fake.SessionBase, 'event_from',
+                               side_effect=error, create=True):
+            stats = vm_utils._wait_for_vhd_coalesce(
+                self.session, self.instance, self.sr_ref, self.vdi_ref,
+                self.chain)
+
+        self.assertEqual('polling', stats['method'])
+        self.assertEqual(2, stats['scans'])
+        mock_sleep.assert_called_once_with(0.5)
+
+    def test_wait_for_vhd_coalesce_no_coalesce(self):
+        self.xenapi.xenapi_request('VDI.set_sm_config',
+                                   (self.vdi_ref, {'vhd-parent': 'parent'}))
+
+        stats = vm_utils._wait_for_vhd_coalesce(
+            self.session, self.instance, self.sr_ref, self.vdi_ref,
+            self.chain)
+
+        self.assertEqual(1, stats['scans'])
+        self.assertEqual(0, stats['duration'])
+
+
 class SnapshotAttachedHereTestCase(VMUtilsTestBase):
     @mock.patch.object(vm_utils, '_snapshot_attached_here_impl')
     def test_snapshot_attached_here(self, mock_impl):
@@ -1903,37 +2085,46 @@ class SnapshotAttachedHereTestCase(VMUtilsTestBase):
         self.assertTrue(mock_count.called)
 
     @mock.patch.object(greenthread, 'sleep')
+    @mock.patch.object(vm_utils, '_vdi_event_token', return_value=None)
     @mock.patch.object(vm_utils, '_get_vhd_parent_uuid')
     @mock.patch.object(vm_utils, '_count_children')
     @mock.patch.object(vm_utils, '_scan_sr')
     def test_wait_for_vhd_coalesce_raises(self, mock_scan_sr,
-            mock_count, mock_get_vhd_parent_uuid, mock_sleep):
+            mock_count, mock_get_vhd_parent_uuid, mock_token, mock_sleep):
         mock_count.return_value = 1
         instance = {"uuid": "fake"}
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        mock_sleep.side_effect = timeutils.advance_time_seconds
 
         self.assertRaises(exception.NovaException,
                 vm_utils._wait_for_vhd_coalesce, "session", instance,
                 "sr_ref", "vdi_ref", ["uuid1", "uuid2"])
 
         self.assertTrue(mock_count.called)
-        self.assertEqual(20, mock_sleep.call_count)
-        self.assertEqual(20, mock_scan_sr.call_count)
+        waits = [c[0][0] for c in mock_sleep.call_args_list]
+        self.assertEqual([0.5, 1, 2, 4, 5, 5], waits[:6])
+        self.assertEqual(100, sum(waits))
+        self.assertEqual(len(waits) + 1, mock_scan_sr.call_count)
 
     @mock.patch.object(greenthread, 'sleep')
+    @mock.patch.object(vm_utils, '_vdi_event_token', return_value=None)
     @mock.patch.object(vm_utils, '_get_vhd_parent_uuid')
     @mock.patch.object(vm_utils, '_count_children')
     @mock.patch.object(vm_utils, '_scan_sr')
     def test_wait_for_vhd_coalesce_success(self, mock_scan_sr,
-            mock_count, mock_get_vhd_parent_uuid, mock_sleep):
+            mock_count, mock_get_vhd_parent_uuid, mock_token, mock_sleep):
         mock_count.return_value = 1
         instance = {"uuid": "fake"}
         mock_get_vhd_parent_uuid.side_effect = ["bad", "uuid2"]
 
-        vm_utils._wait_for_vhd_coalesce("session", instance,
+        stats = vm_utils._wait_for_vhd_coalesce("session", instance,
                 "sr_ref", "vdi_ref", ["uuid1", "uuid2"])
 
         self.assertEqual(1, mock_sleep.call_count)
         self.assertEqual(2, mock_scan_sr.call_count)
+        self.assertEqual('polling', stats['method'])
+        self.assertEqual(2, stats['scans'])
 
     @mock.patch.object(vm_utils, '_get_all_vdis_in_sr')
     def test_count_children(self, mock_get_all_vdis_in_sr):
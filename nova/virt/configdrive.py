@@ -28,6 +28,7 @@ from nova import exception
 from nova.i18n import _LW
 from nova import utils
 from nova import version
+from nova.virt import iso9660
 
 LOG = logging.getLogger(__name__)
 
@@ -46,7 +47,14 @@ configdrive_opts = [
     cfg.StrOpt('mkisofs_cmd',
                default='genisoimage',
                help='Name and optionally path of the tool used for '
-                    'ISO image creation')
+                    'ISO image creation'),
+    cfg.StrOpt('config_drive_iso_writer',
+               default='external',
+               choices=('external', 'builtin'),
+               help='How iso9660 config drives are built. "external" writes '
+                    'the metadata to a temporary directory and runs '
+                    'mkisofs_cmd on it, "builtin" writes the image directly '
+                    'from memory without a helper process.'),
     ]
 
 CONF = cfg.CONF
@@ -95,12 +103,16 @@ class ConfigDriveBuilder(object):
         for data in self.mdfiles:
             self._add_file(basedir, data[0], data[1])
 
-    def _make_iso9660(self, path, tmpdir):
-        publisher = "%(product)s %(version)s" % {
+    @staticmethod
+    def _publisher():
+        return "%(product)s %(version)s" % {
             'product': version.product_string(),
             'version': version.version_string_with_package()
             }
 
+    def _make_iso9660(self, path, tmpdir):
+        publisher = self._publisher()
+
         utils.execute(CONF.mkisofs_cmd,
                       '-o', path,
                       '-ldots',
@@ -117,6 +129,16 @@ class ConfigDriveBuilder(object):
                       attempts=1,
                       run_as_root=False)
 
+    def _make_iso9660_builtin(self, path):
+        writer = iso9660.ISO9660Writer('config-2',
+                                       publisher=self._publisher())
+        for (filepath, data) in self.mdfiles:
+            writer.add_file(filepath, data)
+        # NOTE: path may be a block device, in which case 'wb' just opens it
+        # for writing.
+        with open(path, 'wb') as f:
+            writer.write(f)
+
     def _make_vfat(self, path, tmpdir):
         # NOTE(mikal): This is a little horrible, but I couldn't find an
         # equivalent to genisoimage for vfat filesystems.
@@ -157,6 +179,11 @@ class ConfigDriveBuilder(object):
 
         :raises ProcessExecuteError if a helper process has failed.
         """
+        if (CONF.config_drive_format == 'iso9660' and
+                CONF.config_drive_iso_writer == 'builtin'):
+            self._make_iso9660_builtin(path)
+            return
+
         with utils.tempdir() as tmpdir:
             self._write_md_files(tmpdir)
 
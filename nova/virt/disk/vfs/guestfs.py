@@ -12,6 +12,9 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import itertools
+import threading
+
 from eventlet import tpool
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -21,6 +24,7 @@ import six
 from nova import exception
 from nova.i18n import _
 from nova.i18n import _LW
+from nova import utils
 from nova.virt.disk.vfs import api as vfs
 from nova.virt.image import model as imgmodel
 
@@ -33,12 +37,26 @@ forceTCG = False
 guestfs_opts = [
     cfg.BoolOpt('debug',
                 default=False,
-                help='Enable guestfs debug')
+                help='Enable guestfs debug'),
+    cfg.IntOpt('appliance_pool_size',
+               default=0,
+               help='Number of launched libguestfs appliances to keep idle '
+                    'for reuse. Images are hot-plugged into a pooled '
+                    'appliance instead of booting a new one for every '
+                    'file injection or filesystem check. A pooled '
+                    'appliance is reused, one image at a time, for the '
+                    'images of different instances and tenants. This '
+                    'requires the libvirt backend of libguestfs 1.20 or '
+                    'later. Zero launches a new appliance for every '
+                    'image.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(guestfs_opts, group='guestfs')
 
+# Drive hot-plugging and labels were added in libguestfs 1.19.49
+HOTPLUG_MIN_VERSION = (1, 20)
+
 
 def force_tcg(force=True):
     """Prevent libguestfs trying to use KVM acceleration
@@ -51,6 +69,187 @@ def force_tcg(force=True):
     forceTCG = force
 
 
+def _configure_debug(handle):
+    """Configures a guestfs handle to be verbose."""
+    def log_callback(ev, eh, buf, array):
+        if ev == guestfs.EVENT_APPLIANCE:
+            buf = buf.rstrip()
+        LOG.debug("event=%(event)s eh=%(eh)d buf='%(buf)s' "
+                  "array=%(array)s", {
+                      "event": guestfs.event_to_string(ev),
+                      "eh": eh, "buf": buf, "array": array})
+
+    events = (guestfs.EVENT_APPLIANCE | guestfs.EVENT_LIBRARY
+              | guestfs.EVENT_WARNING | guestfs.EVENT_TRACE)
+
+    handle.set_trace(True)  # just traces libguestfs API calls
+    handle.set_verbose(True)
+    handle.set_event_callback(log_callback, events)
+
+
+def _new_handle():
+    """Create a guestfs handle, not launched yet."""
+    try:
+        handle = tpool.Proxy(
+            guestfs.GuestFS(python_return_dict=False,
+                            close_on_exit=False))
+    except TypeError as e:
+        if ('close_on_exit' in six.text_type(e) or
+            'python_return_dict' in six.text_type(e)):
+            # NOTE(russellb) In case we're not using a version of
+            # libguestfs new enough to support parameters close_on_exit
+            # and python_return_dict which were added in libguestfs 1.20.
+            handle = tpool.Proxy(guestfs.GuestFS())
+        else:
+            raise
+
+    if CONF.guestfs.debug:
+        _configure_debug(handle)
+
+    try:
+        if forceTCG:
+            handle.set_backend_settings("force_tcg")
+    except AttributeError as ex:
+        # set_backend_settings method doesn't exist in older
+        # libguestfs versions, so nothing we can do but ignore
+        LOG.warning(_LW("Unable to force TCG mode, "
+                        "libguestfs too old? %s"), ex)
+
+    return handle
+
+
+def _close_handle(handle):
+    try:
+        handle.shutdown()
+    except AttributeError:
+        # Older libguestfs versions haven't an explicit shutdown
+        pass
+    except RuntimeError as e:
+        LOG.warning(_LW("Failed to shutdown appliance %s"), e)
+
+    try:
+        handle.close()
+    except AttributeError:
+        # Older libguestfs versions haven't an explicit close
+        pass
+    except RuntimeError as e:
+        LOG.warning(_LW("Failed to close guest handle %s"), e)
+
+
+def _hotplug_unsupported(handle):
+    """Return why a launched appliance cannot hot-plug drives, or None."""
+    # Depending on python_return_dict, hashes come back as a list of
+    # pairs or as a dict.
+    version = dict(handle.version())
+    if (version['major'], version['minor']) < HOTPLUG_MIN_VERSION:
+        return ("libguestfs %(major)d.%(minor)d.%(release)d is too old to "
+                "hot-plug drives" % version)
+    try:
+        backend = handle.get_backend()
+    except AttributeError:
+        # Called the attach method before libguestfs 1.21.38
+        backend = handle.get_attach_method()
+    if not backend.startswith('libvirt'):
+        return ("the %s backend of libguestfs cannot hot-plug drives" %
+                backend)
+    return None
+
+
+class AppliancePool(object):
+    """Launched libguestfs appliances kept around for reuse.
+
+    Booting the appliance is by far the most expensive part of
+    accessing an image with libguestfs.  Pooled appliances are launched
+    without any drive; each image is hot-plugged under a unique label
+    and removed again when the VFS is torn down.  An appliance is only
+    returned to the pool when that detach succeeded, anything else
+    closes it.  Idle appliances are replenished in the background.
+    """
+
+    def __init__(self):
+        self._idle = []
+        self._launching = 0
+        self._lock = threading.Lock()
+        self._labels = itertools.count()
+        self._hotplug_checked = False
+        self.disabled = False
+
+    @property
+    def size(self):
+        return 0 if self.disabled else CONF.guestfs.appliance_pool_size
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def next_label(self):
+        return 'nova%d' % next(self._labels)
+
+    def acquire(self):
+        """Return a launched appliance with no drive attached.
+
+        Returns None, after disabling the pool, if the appliance does not
+        support hot-plugging drives.
+        """
+        with self._lock:
+            handle = self._idle.pop() if self._idle else None
+        if handle is None:
+            LOG.debug("No idle libguestfs appliance, launching one")
+            handle = _new_handle()
+            handle.launch()
+        if not self._hotplug_checked:
+            reason = _hotplug_unsupported(handle)
+            if reason:
+                _close_handle(handle)
+                self.disable(reason)
+                return None
+            self._hotplug_checked = True
+        self._refill()
+        return handle
+
+    def release(self, handle):
+        """Take back an appliance whose drives have all been removed."""
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(handle)
+                return
+        _close_handle(handle)
+
+    def disable(self, reason):
+        LOG.warning(_LW("Disabling the libguestfs appliance pool: %s"),
+                    reason)
+        self.disabled = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for handle in idle:
+            _close_handle(handle)
+
+    def _refill(self):
+        with self._lock:
+            missing = self.size - len(self._idle) - self._launching
+            if missing <= 0:
+                return
+            self._launching += missing
+        for _i in range(missing):
+            utils.spawn_n(self._launch_idle)
+
+    def _launch_idle(self):
+        try:
+            handle = _new_handle()
+            handle.launch()
+        except Exception as e:
+            LOG.warning(_LW("Failed to launch a libguestfs appliance for "
+                            "the pool: %s"), e)
+            return
+        finally:
+            with self._lock:
+                self._launching -= 1
+        self.release(handle)
+
+
+APPLIANCE_POOL = AppliancePool()
+
+
 class VFSGuestFS(vfs.VFS):
 
     """This class implements a VFS module that uses the libguestfs APIs
@@ -77,6 +276,9 @@ class VFSGuestFS(vfs.VFS):
 
         self.handle = None
         self.mount = False
+        # Set when the image is hot-plugged into a pooled appliance.
+        self.label = None
+        self.device = "/dev/sda"
 
     def inspect_capabilities(self):
         """Determines whether guestfs is well configured."""
@@ -96,20 +298,7 @@ class VFSGuestFS(vfs.VFS):
             LOG.warning(_LW("Please consider to execute setup before trying "
                             "to configure debug log message."))
         else:
-            def log_callback(ev, eh, buf, array):
-                if ev == guestfs.EVENT_APPLIANCE:
-                    buf = buf.rstrip()
-                LOG.debug("event=%(event)s eh=%(eh)d buf='%(buf)s' "
-                          "array=%(array)s", {
-                              "event": guestfs.event_to_string(ev),
-                              "eh": eh, "buf": buf, "array": array})
-
-            events = (guestfs.EVENT_APPLIANCE | guestfs.EVENT_LIBRARY
-                      | guestfs.EVENT_WARNING | guestfs.EVENT_TRACE)
-
-            self.handle.set_trace(True)  # just traces libguestfs API calls
-            self.handle.set_verbose(True)
-            self.handle.set_event_callback(log_callback, events)
+            _configure_debug(self.handle)
 
     def setup_os(self):
         if self.partition == -1:
@@ -122,9 +311,10 @@ class VFSGuestFS(vfs.VFS):
                   {'image': self.image, 'part': str(self.partition)})
 
         if self.partition:
-            self.handle.mount_options("", "/dev/sda%d" % self.partition, "/")
+            self.handle.mount_options(
+                "", "%s%d" % (self.device, self.partition), "/")
         else:
-            self.handle.mount_options("", "/dev/sda", "/")
+            self.handle.mount_options("", self.device, "/")
 
     def setup_os_inspect(self):
         LOG.debug("Inspecting guest OS image %s", self.image)
@@ -171,53 +361,49 @@ class VFSGuestFS(vfs.VFS):
                 else:
                     raise exception.NovaException(msg)
 
+    def _add_drive(self, **kwargs):
+        if isinstance(self.image, imgmodel.LocalImage):
+            self.handle.add_drive_opts(self.image.path,
+                                       format=self.image.format,
+                                       **kwargs)
+        elif isinstance(self.image, imgmodel.RBDImage):
+            self.handle.add_drive_opts("%s/%s" % (self.image.pool,
+                                                  self.image.name),
+                                       protocol="rbd",
+                                       format=imgmodel.FORMAT_RAW,
+                                       server=self.image.servers,
+                                       username=self.image.user,
+                                       secret=self.image.password,
+                                       **kwargs)
+        else:
+            raise exception.UnsupportedImageModel(
+                self.image.__class__.__name__)
+
+    def _setup_pooled(self):
+        """Hot-plug the image into a pooled appliance.
+
+        Returns False, after disabling the pool, if the appliance does not
+        support hot-plugging drives.
+        """
+        self.handle = APPLIANCE_POOL.acquire()
+        if self.handle is None:
+            return False
+        label = APPLIANCE_POOL.next_label()
+        self._add_drive(label=label)
+        self.label = label
+        # Depending on python_return_dict, hashes come back as a list of
+        # pairs or as a dict.
+        self.device = dict(self.handle.list_disk_labels())[label]
+        return True
+
     def setup(self, mount=True):
         LOG.debug("Setting up appliance for %(image)s",
                   {'image': self.image})
         try:
-            self.handle = tpool.Proxy(
-                guestfs.GuestFS(python_return_dict=False,
-                                close_on_exit=False))
-        except TypeError as e:
-            if ('close_on_exit' in six.text_type(e) or
-                'python_return_dict' in six.text_type(e)):
-                # NOTE(russellb) In case we're not using a version of
-                # libguestfs new enough to support parameters close_on_exit
-                # and python_return_dict which were added in libguestfs 1.20.
-                self.handle = tpool.Proxy(guestfs.GuestFS())
-            else:
-                raise
-
-        if CONF.guestfs.debug:
-            self.configure_debug()
-
-        try:
-            if forceTCG:
-                self.handle.set_backend_settings("force_tcg")
-        except AttributeError as ex:
-            # set_backend_settings method doesn't exist in older
-            # libguestfs versions, so nothing we can do but ignore
-            LOG.warning(_LW("Unable to force TCG mode, "
-                            "libguestfs too old? %s"), ex)
-            pass
-
-        try:
-            if isinstance(self.image, imgmodel.LocalImage):
-                self.handle.add_drive_opts(self.image.path,
-                                           format=self.image.format)
-            elif isinstance(self.image, imgmodel.RBDImage):
-                self.handle.add_drive_opts("%s/%s" % (self.image.pool,
-                                                      self.image.name),
-                                           protocol="rbd",
-                                           format=imgmodel.FORMAT_RAW,
-                                           server=self.image.servers,
-                                           username=self.image.user,
-                                           secret=self.image.password)
-            else:
-                raise exception.UnsupportedImageModel(
-                    self.image.__class__.__name__)
-
-            self.handle.launch()
+            if not (APPLIANCE_POOL.enabled and self._setup_pooled()):
+                self.handle = _new_handle()
+                self._add_drive()
+                self.handle.launch()
 
             if mount:
                 self.setup_os()
@@ -238,34 +424,53 @@ class VFSGuestFS(vfs.VFS):
             self.teardown()
             raise
 
+    def _release_pooled(self):
+        """Detach the image and hand the appliance back to the pool.
+
+        Returns False if the appliance could not be cleaned up, in which
+        case it must be closed.
+        """
+        try:
+            if self.mount:
+                self.handle.aug_close()
+            # A failed setup may have left some filesystems mounted.
+            self.handle.umount_all()
+            # Nor must the volume groups of the image stay active in the
+            # appliance the next image is plugged into.
+            self.handle.vg_activate_all(False)
+            self.handle.remove_drive(self.label)
+            if self.handle.list_disk_labels():
+                raise RuntimeError("drives still attached")
+        except (RuntimeError, AttributeError) as e:
+            LOG.warning(_LW("Failed to detach %(image)s from the pooled "
+                            "appliance, closing it: %(e)s"),
+                        {'image': self.image, 'e': e})
+            return False
+        APPLIANCE_POOL.release(self.handle)
+        return True
+
     def teardown(self):
         LOG.debug("Tearing down appliance")
 
+        if self.handle is None:
+            return
+
         try:
+            if self.label is not None and self._release_pooled():
+                return
+
             try:
                 if self.mount:
                     self.handle.aug_close()
             except RuntimeError as e:
                 LOG.warning(_LW("Failed to close augeas %s"), e)
 
-            try:
-                self.handle.shutdown()
-            except AttributeError:
-                # Older libguestfs versions haven't an explicit shutdown
-                pass
-            except RuntimeError as e:
-                LOG.warning(_LW("Failed to shutdown appliance %s"), e)
-
-            try:
-                self.handle.close()
-            except AttributeError:
-                # Older libguestfs versions haven't an explicit close
-                pass
-            except RuntimeError as e:
-                LOG.warning(_LW("Failed to close guest handle %s"), e)
+            _close_handle(self.handle)
         finally:
             # dereference object and implicitly close()
             self.handle = None
+            self.label = None
+            self.mount = False
 
     @staticmethod
     def _canonicalize_path(path):
@@ -328,4 +533,4 @@ class VFSGuestFS(vfs.VFS):
         self.handle.chown(uid, gid, path)
 
     def get_image_fs(self):
-        return self.handle.vfs_type('/dev/sda')
+        return self.handle.vfs_type(self.device)
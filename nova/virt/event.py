@@ -115,3 +115,27 @@ class LifecycleEvent(InstanceEvent):
             self.timestamp,
             self.uuid,
             self.get_name())
+
+
+class LifecycleEventBatch(Event):
+    """Class for a batch of instance lifecycle events.
+
+    Drivers which coalesce lifecycle events emit them in
+    batches of this class, holding at most one (the latest)
+    LifecycleEvent per instance, so that the compute manager
+    can process them together.
+    """
+
+    def __init__(self, events, timestamp=None):
+        super(LifecycleEventBatch, self).__init__(timestamp)
+
+        self.events = list(events)
+
+    def get_events(self):
+        return self.events
+
+    def __repr__(self):
+        return "<%s: %s, %d events>" % (
+            self.__class__.__name__,
+            self.timestamp,
+            len(self.events))
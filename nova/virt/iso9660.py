@@ -0,0 +1,442 @@
+# Copyright 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-process ISO 9660 image writer.
+
+Builds the same kind of image as ``genisoimage -l -allow-lowercase
+-allow-multidot -ldots -J -r``: an ISO 9660 primary tree carrying Rock Ridge
+names and permissions plus a Joliet tree, both referring to the same file
+extents.  Only what config drives need is supported; files are held in
+memory and the image is written sequentially, so the target may be a
+regular file or a block device.
+"""
+
+import re
+import struct
+import time
+
+import six
+
+SECTOR_SIZE = 2048
+
+# Sectors 0-15 are the system area, volume descriptors start at 16.
+_FIRST_DESCRIPTOR = 16
+
+_MAX_NAME_LEN = 64
+_MAX_PRIMARY_NAME_LEN = 31
+
+_FILE_MODE = 0o100444
+_DIR_MODE = 0o040555
+
+_RRIP_ID = b'RRIP_1991A'
+_RRIP_DESCRIPTOR = (b'THE ROCK RIDGE INTERCHANGE PROTOCOL PROVIDES SUPPORT '
+                    b'FOR POSIX FILE SYSTEM SEMANTICS')
+_RRIP_SOURCE = b'PLEASE CONTACT DISC PUBLISHER FOR SPECIFICATION SOURCE.'
+
+_PRIMARY_INVALID_CHARS = re.compile('[^A-Za-z0-9_.]')
+
+
+def _both16(value):
+    return struct.pack('<H', value) + struct.pack('>H', value)
+
+
+def _both32(value):
+    return struct.pack('<I', value) + struct.pack('>I', value)
+
+
+def _sectors(length):
+    return (length + SECTOR_SIZE - 1) // SECTOR_SIZE
+
+
+def _padded(value, length, encoding='ascii'):
+    if encoding == 'utf-16-be':
+        return (value.ljust(length // 2)[:length // 2]).encode(encoding)
+    return value.ljust(length)[:length].encode(encoding)
+
+
+def _record_date(timestamp):
+    tm = time.gmtime(timestamp)
+    return struct.pack('7B', tm.tm_year - 1900, tm.tm_mon, tm.tm_mday,
+                       tm.tm_hour, tm.tm_min, tm.tm_sec, 0)
+
+
+def _descriptor_date(timestamp):
+    if timestamp is None:
+        return b'0' * 16 + b'\x00'
+    return time.strftime('%Y%m%d%H%M%S00',
+                         time.gmtime(timestamp)).encode('ascii') + b'\x00'
+
+
+def _susp_sp():
+    return b'SP' + struct.pack('5B', 7, 1, 0xbe, 0xef, 0)
+
+
+def _rrip_er():
+    length = 8 + len(_RRIP_ID) + len(_RRIP_DESCRIPTOR) + len(_RRIP_SOURCE)
+    return (b'ER' +
+            struct.pack('6B', length, 1, len(_RRIP_ID),
+                        len(_RRIP_DESCRIPTOR), len(_RRIP_SOURCE), 1) +
+            _RRIP_ID + _RRIP_DESCRIPTOR + _RRIP_SOURCE)
+
+
+def _rrip_px(mode, nlinks):
+    return (b'PX' + struct.pack('2B', 36, 1) + _both32(mode) +
+            _both32(nlinks) + _both32(0) + _both32(0))
+
+
+def _rrip_nm(name):
+    return b'NM' + struct.pack('3B', 5 + len(name), 1, 0) + name
+
+
+def _directory_record(identifier, extent, length, is_dir, date,
+                      system_use=b''):
+    pad = b'' if len(identifier) % 2 else b'\x00'
+    record_len = 33 + len(identifier) + len(pad) + len(system_use)
+    if record_len % 2:
+        system_use += b'\x00'
+        record_len += 1
+    if record_len > 255:
+        raise ValueError('directory record for %r is too long' % identifier)
+    return (struct.pack('2B', record_len, 0) +
+            _both32(extent) + _both32(length) + date +
+            struct.pack('3B', 0x02 if is_dir else 0x00, 0, 0) +
+            _both16(1) + struct.pack('B', len(identifier)) +
+            identifier + pad + system_use)
+
+
+class _Node(object):
+    def __init__(self, name, parent, data=None):
+        self.name = name
+        self.parent = parent
+        self.data = data
+        self.extent = 0
+        # Encoded name of the node in each tree (primary, joliet).
+        self.identifiers = {}
+
+    @property
+    def is_dir(self):
+        return False
+
+
+class _Directory(_Node):
+    def __init__(self, name, parent):
+        super(_Directory, self).__init__(name, parent)
+        self.children = {}
+        # Per tree layout, filled in by the writer.
+        self.extents = {}
+        self.lengths = {}
+        self.numbers = {}
+
+    @property
+    def is_dir(self):
+        return True
+
+    @property
+    def subdirs(self):
+        return [c for c in self.children.values() if c.is_dir]
+
+
+class _Tree(object):
+    """Naming and record layout of one of the two directory hierarchies."""
+
+    def __init__(self, key, rock_ridge):
+        self.key = key
+        self.rock_ridge = rock_ridge
+        self.directories = []
+
+    def identifier(self, node):
+        raise NotImplementedError()
+
+    def name_children(self, directory):
+        for name in sorted(directory.children):
+            child = directory.children[name]
+            child.identifiers[self.key] = self.identifier(child)
+
+    def sorted_children(self, directory):
+        return sorted(directory.children.values(),
+                      key=lambda c: c.identifiers[self.key])
+
+    def system_use(self, node, special=None, root=False):
+        if not self.rock_ridge:
+            return b''
+        if node.is_dir:
+            entries = _rrip_px(_DIR_MODE, 2 + len(node.subdirs))
+        else:
+            entries = _rrip_px(_FILE_MODE, 1)
+        if special is None:
+            entries += _rrip_nm(node.name.encode('utf-8'))
+        elif root:
+            entries = _susp_sp() + entries + _rrip_er()
+        return entries
+
+
+class _PrimaryTree(_Tree):
+    def __init__(self):
+        super(_PrimaryTree, self).__init__('primary', rock_ridge=True)
+
+    def identifier(self, node):
+        name = _PRIMARY_INVALID_CHARS.sub('_', node.name)
+        name = name[:_MAX_PRIMARY_NAME_LEN]
+        used = set(c.identifiers.get(self.key)
+                   for c in node.parent.children.values() if c is not node)
+        suffix = 0
+        candidate = name
+        while self._encode(candidate, node) in used:
+            suffix += 1
+            tail = '_%d' % suffix
+            candidate = name[:_MAX_PRIMARY_NAME_LEN - len(tail)] + tail
+        return self._encode(candidate, node)
+
+    @staticmethod
+    def _encode(name, node):
+        if node.is_dir:
+            return name.encode('ascii')
+        return (name + ';1').encode('ascii')
+
+
+class _JolietTree(_Tree):
+    def __init__(self):
+        super(_JolietTree, self).__init__('joliet', rock_ridge=False)
+
+    def identifier(self, node):
+        name = node.name
+        if not node.is_dir:
+            name += ';1'
+        return name.encode('utf-16-be')
+
+
+class ISO9660Writer(object):
+    """Lay out and write an ISO 9660 image with Joliet and Rock Ridge.
+
+    Typical use::
+
+        writer = ISO9660Writer('config-2', publisher='...')
+        for path, data in files:
+            writer.add_file(path, data)
+        with open(target, 'wb') as f:
+            writer.write(f)
+    """
+
+    def __init__(self, volume_id, publisher='', preparer='',
+                 application='', system_id='LINUX', timestamp=None):
+        self.volume_id = volume_id
+        self.publisher = publisher
+        self.preparer = preparer
+        self.application = application
+        self.system_id = system_id
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._root = _Directory('', None)
+        self._files = []
+
+    def add_file(self, path, data):
+        """Add a file; intermediate directories are created as needed."""
+        if isinstance(path, six.binary_type):
+            path = path.decode('utf-8')
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        parts = [p for p in path.split('/') if p]
+        if not parts:
+            raise ValueError('invalid file path %r' % path)
+        for part in parts:
+            if len(part) > _MAX_NAME_LEN or part in ('.', '..'):
+                raise ValueError('unsupported path component %r in %r'
+                                 % (part, path))
+
+        directory = self._root
+        for part in parts[:-1]:
+            child = directory.children.get(part)
+            if child is None:
+                child = _Directory(part, directory)
+                directory.children[part] = child
+            elif not child.is_dir:
+                raise ValueError('%r is a file, not a directory' % part)
+            directory = child
+
+        name = parts[-1]
+        existing = directory.children.get(name)
+        if existing is not None:
+            if existing.is_dir:
+                raise ValueError('%r is a directory, not a file' % path)
+            existing.data = data
+            return
+        node = _Node(name, directory, data)
+        directory.children[name] = node
+        self._files.append(node)
+
+    def _walk_directories(self, tree):
+        """Breadth first, children sorted: the path table order."""
+        ordered = [self._root]
+        index = 0
+        while index < len(ordered):
+            directory = ordered[index]
+            tree.name_children(directory)
+            ordered.extend(c for c in tree.sorted_children(directory)
+                           if c.is_dir)
+            index += 1
+        for number, directory in enumerate(ordered, 1):
+            directory.numbers[tree.key] = number
+        tree.directories = ordered
+
+    def _directory_records(self, tree, directory, date):
+        """Return the records of a directory extent, dot entries first."""
+        parent = directory.parent or directory
+        root = directory.parent is None
+        records = [
+            _directory_record(b'\x00', directory.extents.get(tree.key, 0),
+                              directory.lengths.get(tree.key, 0), True, date,
+                              tree.system_use(directory, '.', root)),
+            _directory_record(b'\x01', parent.extents.get(tree.key, 0),
+                              parent.lengths.get(tree.key, 0), True, date,
+                              tree.system_use(parent, '..')),
+        ]
+        for child in tree.sorted_children(directory):
+            if child.is_dir:
+                extent = child.extents.get(tree.key, 0)
+                length = child.lengths.get(tree.key, 0)
+            else:
+                extent = child.extent
+                length = len(child.data)
+            records.append(_directory_record(
+                child.identifiers[tree.key], extent, length, child.is_dir,
+                date, tree.system_use(child)))
+        return records
+
+    @staticmethod
+    def _pack_records(records):
+        """Pack records so that none straddles a sector boundary."""
+        extent = b''
+        for record in records:
+            used = len(extent) % SECTOR_SIZE
+            if used + len(record) > SECTOR_SIZE:
+                extent += b'\x00' * (SECTOR_SIZE - used)
+            extent += record
+        return extent + b'\x00' * (_sectors(len(extent)) * SECTOR_SIZE -
+                                   len(extent))
+
+    @staticmethod
+    def _path_table(tree, big_endian):
+        fmt = '>IH' if big_endian else '<IH'
+        table = b''
+        for directory in tree.directories:
+            if directory.parent is None:
+                identifier = b'\x00'
+                parent_number = 1
+            else:
+                identifier = directory.identifiers[tree.key]
+                parent_number = directory.parent.numbers[tree.key]
+            table += (struct.pack('2B', len(identifier), 0) +
+                      struct.pack(fmt, directory.extents.get(tree.key, 0),
+                                  parent_number) +
+                      identifier +
+                      (b'\x00' if len(identifier) % 2 else b''))
+        return table
+
+    def _layout(self):
+        date = _record_date(self.timestamp)
+        trees = (_PrimaryTree(), _JolietTree())
+        for tree in trees:
+            self._walk_directories(tree)
+            # Record lengths do not depend on extent locations, so the
+            # directory sizes can be computed before anything is placed.
+            for directory in tree.directories:
+                directory.lengths[tree.key] = len(self._pack_records(
+                    self._directory_records(tree, directory, date)))
+
+        # Four path tables (L and M for each tree); their size only depends
+        # on the identifiers.
+        path_table_sizes = [len(self._path_table(tree, False))
+                            for tree in trees]
+        sector = _FIRST_DESCRIPTOR + 3
+        path_table_extents = []
+        for size in path_table_sizes:
+            path_table_extents.append((sector, sector + _sectors(size)))
+            sector += 2 * _sectors(size)
+
+        for tree in trees:
+            for directory in tree.directories:
+                directory.extents[tree.key] = sector
+                sector += directory.lengths[tree.key] // SECTOR_SIZE
+
+        for node in self._files:
+            node.extent = sector if node.data else 0
+            sector += _sectors(len(node.data))
+
+        return date, trees, path_table_sizes, path_table_extents, sector
+
+    def _volume_descriptor(self, tree, date, total_sectors, path_table_size,
+                           path_table_extents):
+        joliet = tree.key == 'joliet'
+        encoding = 'utf-16-be' if joliet else 'ascii'
+        root = self._root
+        root_record = _directory_record(b'\x00', root.extents[tree.key],
+                                        root.lengths[tree.key], True, date)
+        created = _descriptor_date(self.timestamp)
+        descriptor = (
+            struct.pack('B', 2 if joliet else 1) + b'CD001' +
+            struct.pack('2B', 1, 0) +
+            _padded(self.system_id, 32, encoding) +
+            _padded(self.volume_id, 32, encoding) +
+            b'\x00' * 8 +
+            _both32(total_sectors) +
+            (b'%/E' + b'\x00' * 29 if joliet else b'\x00' * 32) +
+            _both16(1) + _both16(1) + _both16(SECTOR_SIZE) +
+            _both32(path_table_size) +
+            struct.pack('<I', path_table_extents[0]) + b'\x00' * 4 +
+            struct.pack('>I', path_table_extents[1]) + b'\x00' * 4 +
+            root_record +
+            _padded('', 128, encoding) +
+            _padded(self.publisher, 128, encoding) +
+            _padded(self.preparer, 128, encoding) +
+            _padded(self.application, 128, encoding) +
+            _padded('', 37, 'ascii') * 3 +
+            created + created + _descriptor_date(None) + created +
+            struct.pack('2B', 1, 0))
+        return descriptor + b'\x00' * (SECTOR_SIZE - len(descriptor))
+
+    def write(self, fileobj):
+        """Write the image to a file-like object opened for binary writing.
+
+        :returns: the size of the image in bytes
+        """
+        (date, trees, path_table_sizes, path_table_extents,
+         total_sectors) = self._layout()
+
+        def _emit(data):
+            fileobj.write(data)
+            remainder = len(data) % SECTOR_SIZE
+            if remainder:
+                fileobj.write(b'\x00' * (SECTOR_SIZE - remainder))
+
+        fileobj.write(b'\x00' * SECTOR_SIZE * _FIRST_DESCRIPTOR)
+        for index, tree in enumerate(trees):
+            _emit(self._volume_descriptor(tree, date, total_sectors,
+                                          path_table_sizes[index],
+                                          path_table_extents[index]))
+        _emit(b'\xff' + b'CD001' + b'\x01')
+
+        for tree in trees:
+            _emit(self._path_table(tree, big_endian=False))
+            _emit(self._path_table(tree, big_endian=True))
+
+        for tree in trees:
+            for directory in tree.directories:
+                fileobj.write(self._pack_records(
+                    self._directory_records(tree, directory, date)))
+
+        for node in self._files:
+            if node.data:
+                _emit(node.data)
+
+        return total_sectors * SECTOR_SIZE
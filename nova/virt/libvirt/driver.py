@@ -98,6 +98,8 @@ from nova.virt.libvirt import host
 from nova.virt.libvirt import imagebackend
 from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import instancejobtracker
+from nova.virt.libvirt import migration as libvirt_migration
+from nova.virt.libvirt import peercache
 from nova.virt.libvirt.storage import dmcrypt
 from nova.virt.libvirt.storage import lvm
 from nova.virt.libvirt.storage import rbd_utils
@@ -160,6 +162,46 @@ libvirt_opts = [
     cfg.IntOpt('live_migration_bandwidth',
                default=0,
                help='Maximum bandwidth to be used during migration, in Mbps'),
+    cfg.IntOpt('live_migration_downtime',
+               default=500,
+               help='Maximum permitted downtime, in milliseconds, for live '
+                    'migration switchover. Will be rounded up to a minimum '
+                    'of %dms' % libvirt_migration.DOWNTIME_MIN),
+    cfg.IntOpt('live_migration_downtime_steps',
+               default=10,
+               help='Number of incremental steps to reach max downtime '
+                    'value. Will be rounded up to a minimum of 1'),
+    cfg.IntOpt('live_migration_downtime_delay',
+               default=75,
+               help='Time to wait, in seconds, between each step increase '
+                    'of the migration downtime. Value is per GiB of guest '
+                    'RAM + disk to be transferred, with lower bound of a '
+                    'minimum of 2 GiB of RAM'),
+    cfg.IntOpt('live_migration_completion_timeout',
+               default=800,
+               help='Time to wait, in seconds, for migration to '
+                    'successfully complete transferring data before '
+                    'aborting the operation. Value is per GiB of guest RAM '
+                    '+ disk to be transferred, with lower bound of a '
+                    'minimum of 2 GiB of RAM. Set to 0 to disable timeouts'),
+    cfg.IntOpt('live_migration_progress_timeout',
+               default=150,
+               help='Time to wait, in seconds, for migration to make forward '
+                    'progress in transferring data before taking the '
+                    'live_migration_stalled_action. Set to 0 to disable '
+                    'timeouts'),
+    cfg.StrOpt('live_migration_stalled_action',
+               default=libvirt_migration.STALLED_ABORT,
+               choices=(libvirt_migration.STALLED_ABORT,
+                        libvirt_migration.STALLED_PAUSE),
+               help='What to do with a live migration not making progress '
+                    'for live_migration_progress_timeout seconds: abort it, '
+                    'or pause the guest so the migration can complete, '
+                    'aborting it if it is still stuck after another '
+                    'live_migration_progress_timeout. Adding '
+                    'VIR_MIGRATE_AUTO_CONVERGE to live_migration_flag lets '
+                    'QEMU throttle the guest before that, when it dirties '
+                    'memory faster than it can be transferred'),
     cfg.StrOpt('snapshot_image_format',
                choices=('raw', 'qcow2', 'vmdk', 'vdi'),
                help='Snapshot image format. Defaults to same as source image'),
@@ -226,7 +268,14 @@ libvirt_opts = [
                 default=[],
                 help='List of guid targets and ranges.'
                      'Syntax is guest-gid:host-gid:count'
-                     'Maximum of 5 allowed.')
+                     'Maximum of 5 allowed.'),
+    cfg.FloatOpt('lifecycle_event_batch_window',
+                 default=0.0,
+                 help='Number of seconds to collect domain lifecycle events '
+                      'for before dispatching them to the compute manager '
+                      'as one batch. Only the latest event of each domain '
+                      'within the window is dispatched. Zero dispatches '
+                      'every event on its own.'),
     ]
 
 CONF = cfg.CONF
@@ -410,9 +459,12 @@ class LibvirtDriver(driver.ComputeDriver):
         if libvirt is None:
             libvirt = importutils.import_module('libvirt')
 
-        self._host = host.Host(self._uri(), read_only,
-                               lifecycle_event_handler=self.emit_event,
-                               conn_event_handler=self._handle_conn_event)
+        self._host = host.Host(
+            self._uri(), read_only,
+            lifecycle_event_handler=self.emit_event,
+            conn_event_handler=self._handle_conn_event,
+            lifecycle_event_batch_window=(
+                CONF.libvirt.lifecycle_event_batch_window))
         self._initiator = None
         self._fc_wwnns = None
         self._fc_wwpns = None
@@ -573,6 +625,9 @@ class LibvirtDriver(driver.ComputeDriver):
                         {'version': self._version_to_string(
                             NEXT_MIN_LIBVIRT_VERSION)})
 
+        if CONF.libvirt.image_peer_cache_enabled:
+            peercache.get_cache().start_server()
+
     # TODO(sahid): This method is targeted for removal when the tests
     # have been updated to avoid its use
     #
@@ -5533,9 +5588,30 @@ class LibvirtDriver(driver.ComputeDriver):
         LOG.debug("Migration operation thread has finished",
                   instance=instance)
 
+    @staticmethod
+    def _live_migration_data_gb(instance, block_migration):
+        """Returns the GiB of guest RAM and, for block migrations, disk to
+        transfer, counting at least 2 GiB of RAM.
+        """
+        flavor = instance.flavor
+        data_gb = max(flavor.memory_mb * units.Mi / units.Gi, 2)
+        if block_migration:
+            data_gb += flavor.root_gb + flavor.ephemeral_gb
+        return data_gb
+
     def _live_migration_monitor(self, context, instance, dest, post_method,
                                 recover_method, block_migration,
                                 migrate_data, dom, finish_event):
+        data_gb = self._live_migration_data_gb(instance, block_migration)
+        controller = libvirt_migration.ConvergenceController(
+            instance, dom, data_gb,
+            CONF.libvirt.live_migration_downtime,
+            CONF.libvirt.live_migration_downtime_steps,
+            CONF.libvirt.live_migration_downtime_delay,
+            CONF.libvirt.live_migration_completion_timeout,
+            CONF.libvirt.live_migration_progress_timeout,
+            CONF.libvirt.live_migration_stalled_action)
+        start = time.time()
         n = 0
         while True:
             info = host.DomainJobInfo.for_domain(dom)
@@ -5587,6 +5663,11 @@ class LibvirtDriver(driver.ComputeDriver):
                 LOG.debug("Migration not running yet",
                           instance=instance)
             elif info.type == libvirt.VIR_DOMAIN_JOB_UNBOUNDED:
+                # Migration is still running, steer it towards completion:
+                # raise the max downtime, pause or abort it when it does
+                # not progress.
+                controller.update(info, time.time() - start)
+
                 # We loop every 500ms, so don't log on every
                 # iteration to avoid spamming logs for long
                 # running migrations. Just once every 5 secs
@@ -5625,16 +5706,12 @@ class LibvirtDriver(driver.ComputeDriver):
                         "remaining_memory": info.memory_remaining,
                         "total_memory": info.memory_total}, instance=instance)
 
-                # Migration is still running
-                #
-                # This is where we'd wire up calls to change live
-                # migration status. eg change max downtime, cancel
-                # the operation, change max bandwidth
                 n = n + 1
             elif info.type == libvirt.VIR_DOMAIN_JOB_COMPLETED:
                 # Migration is all done
                 LOG.info(_LI("Migration operation has completed"),
                          instance=instance)
+                controller.log_summary('completed', time.time() - start)
                 post_method(context, instance, dest, block_migration,
                             migrate_data)
                 break
@@ -5642,6 +5719,8 @@ class LibvirtDriver(driver.ComputeDriver):
                 # Migration did not succeed
                 LOG.error(_LE("Migration operation has aborted"),
                           instance=instance)
+                controller.log_summary('failed', time.time() - start)
+                controller.resume()
                 recover_method(context, instance, dest, block_migration,
                                migrate_data)
                 break
@@ -5649,6 +5728,8 @@ class LibvirtDriver(driver.ComputeDriver):
                 # Migration was stopped by admin
                 LOG.warn(_LW("Migration operation was cancelled"),
                          instance=instance)
+                controller.log_summary('cancelled', time.time() - start)
+                controller.resume()
                 recover_method(context, instance, dest, block_migration,
                                migrate_data)
                 break
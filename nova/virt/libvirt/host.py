@@ -32,6 +32,7 @@ import os
 import socket
 import sys
 import threading
+import time
 
 import eventlet
 from eventlet import greenio
@@ -196,7 +197,8 @@ class Host(object):
 
     def __init__(self, uri, read_only=False,
                  conn_event_handler=None,
-                 lifecycle_event_handler=None):
+                 lifecycle_event_handler=None,
+                 lifecycle_event_batch_window=0):
 
         global libvirt
         if libvirt is None:
@@ -221,6 +223,15 @@ class Host(object):
         #                STOPPED lifecycle event some seconds.
         self._lifecycle_delay = 15
 
+        # When batching, lifecycle events wait in _events_pending, keyed by
+        # domain UUID with the time they become due, and are dispatched
+        # together by a single flusher greenthread, due at
+        # _event_flush_due.
+        self._lifecycle_batch_window = lifecycle_event_batch_window
+        self._events_pending = {}
+        self._event_flusher = None
+        self._event_flush_due = None
+
     def _native_thread(self):
         """Receives async events coming in from libvirtd.
 
@@ -384,6 +395,10 @@ class Host(object):
 
     def _event_emit_delayed(self, event):
         """Emit events - possibly delayed."""
+        if self._lifecycle_batch_window > 0:
+            self._event_coalesce(event)
+            return
+
         def event_cleanup(gt, *args, **kwargs):
             """Callback function for greenthread. Called
             to cleanup the _events_delayed dictionary when a event
@@ -415,6 +430,56 @@ class Host(object):
         if self._lifecycle_event_handler is not None:
             self._lifecycle_event_handler(event)
 
+    def _event_coalesce(self, event):
+        """Queue an event for the next batch, replacing older ones.
+
+        Only the latest event of a domain is kept, so a pending (and
+        possibly delayed) STOPPED event is dropped when a newer event
+        arrives for the same domain, as happens during a reboot.
+        """
+        if event.uuid in self._events_pending:
+            LOG.debug("Replaced pending event for %s by lifecycle event",
+                      event.uuid)
+        due = time.time()
+        if event.transition == virtevent.EVENT_LIFECYCLE_STOPPED:
+            due += self._lifecycle_delay
+        self._events_pending[event.uuid] = (due, event)
+        self._schedule_event_flush(self._lifecycle_batch_window)
+
+    def _schedule_event_flush(self, delay):
+        """Make sure the flusher runs within delay seconds.
+
+        A flusher already due sooner is kept, one due later (waiting for
+        a delayed STOPPED event) is replaced by an earlier one.
+        """
+        due = time.time() + delay
+        if self._event_flusher is not None:
+            if self._event_flush_due <= due:
+                return
+            self._event_flusher.cancel()
+        self._event_flush_due = due
+        self._event_flusher = greenthread.spawn_after(
+            delay, self._flush_events)
+
+    def _flush_events(self):
+        """Dispatch the pending events which are due as one batch."""
+        self._event_flusher = None
+        self._event_flush_due = None
+        now = time.time()
+        due = [event for (when, event) in self._events_pending.values()
+               if when <= now]
+        for event in due:
+            del self._events_pending[event.uuid]
+
+        if self._events_pending:
+            next_due = min(when for (when, _event)
+                           in self._events_pending.values())
+            self._schedule_event_flush(max(self._lifecycle_batch_window,
+                                           next_due - now))
+        if due:
+            due.sort(key=operator.attrgetter('timestamp'))
+            self._event_emit(virtevent.LifecycleEventBatch(due))
+
     def _init_events_pipe(self):
         """Create a self-pipe for the native thread to synchronize on.
 
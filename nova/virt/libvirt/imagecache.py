@@ -20,9 +20,13 @@ http://wiki.openstack.org/nova-image-cache-management.
 
 """
 
+import collections
+import errno
 import hashlib
 import os
 import re
+import struct
+import tempfile
 import time
 
 from oslo_concurrency import lockutils
@@ -35,8 +39,10 @@ from oslo_utils import fileutils
 from nova.i18n import _LE
 from nova.i18n import _LI
 from nova.i18n import _LW
+from nova import paths
 from nova import utils
 from nova.virt import imagecache
+from nova.virt.libvirt import peercache
 from nova.virt.libvirt import utils as libvirt_utils
 
 LOG = logging.getLogger(__name__)
@@ -65,6 +71,20 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.BoolOpt('image_cache_incremental',
+                default=False,
+                help='Keep a record of each base image (inode, size, '
+                     'modification time, verified checksum and users) in '
+                     'image_cache_state_file between image cache manager '
+                     'passes, and only checksum base images again when '
+                     'their inode, size or modification time changed. The '
+                     'backing files of qcow2 instance disks are read from '
+                     'the image header instead of running qemu-img.'),
+    cfg.StrOpt('image_cache_state_file',
+               default=paths.state_path_def('imagecache_state.json'),
+               help='Where the image cache manager keeps its base image '
+                    'records when image_cache_incremental is enabled. This '
+                    'should be local to the compute node.'),
     ]
 
 CONF = cfg.CONF
@@ -235,10 +255,43 @@ def write_stored_checksum(target):
     write_stored_info(target, field='sha1', value=_hash_file(target))
 
 
+_QCOW2_MAGIC = b'QFI\xfb'
+_QCOW2_HEADER = struct.Struct('>4sIQI')
+# The qcow2 specification limits backing file names to 1023 bytes.
+_QCOW2_MAX_BACKING_FILE = 1023
+
+
+def _read_qcow2_backing_file(path):
+    """Read the backing file name from the header of a qcow2 image.
+
+    Returns a tuple of a boolean which is True if the image is qcow2, and
+    the base name of its backing file or None.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_QCOW2_HEADER.size)
+        if len(header) < _QCOW2_HEADER.size:
+            return False, None
+        magic, _version, offset, size = _QCOW2_HEADER.unpack(header)
+        if magic != _QCOW2_MAGIC:
+            return False, None
+        if not offset or not size or size > _QCOW2_MAX_BACKING_FILE:
+            return True, None
+        f.seek(offset)
+        backing_file = f.read(size).decode('utf-8')
+    return True, os.path.basename(backing_file)
+
+
+def _file_signature(path):
+    """Return the metadata used to detect changes to a base file."""
+    st = os.stat(path)
+    return {'inode': st.st_ino, 'size': st.st_size, 'mtime': st.st_mtime}
+
+
 class ImageCacheManager(imagecache.ImageCacheManager):
     def __init__(self):
         super(ImageCacheManager, self).__init__()
         self.lock_path = os.path.join(CONF.instances_path, 'locks')
+        self._base_file_state = None
         self._reset_state()
 
     def _reset_state(self):
@@ -251,19 +304,20 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self.back_swap_images = set()
         self.used_swap_images = set()
 
-        self.active_base_files = []
-        self.corrupt_base_files = []
-        self.originals = []
-        self.removable_base_files = []
-        self.unexplained_images = []
+        self.active_base_files = set()
+        self.corrupt_base_files = set()
+        self.originals = set()
+        self.removable_base_files = set()
+        self.unexplained_images = set()
+        self.base_file_users = collections.defaultdict(set)
 
     def _store_image(self, base_dir, ent, original=False):
         """Store a base image for later examination."""
         entpath = os.path.join(base_dir, ent)
         if os.path.isfile(entpath):
-            self.unexplained_images.append(entpath)
+            self.unexplained_images.add(entpath)
             if original:
-                self.originals.append(entpath)
+                self.originals.add(entpath)
 
     def _store_swap_image(self, ent):
         """Store base swap images for later examination."""
@@ -296,9 +350,21 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         return {'unexplained_images': self.unexplained_images,
                 'originals': self.originals}
 
+    def _get_disk_backing_file(self, disk_path):
+        if CONF.libvirt.image_cache_incremental:
+            try:
+                is_qcow2, backing_file = _read_qcow2_backing_file(disk_path)
+            except (IOError, OSError, UnicodeDecodeError) as e:
+                LOG.debug('Failed to read qcow2 header of %(disk)s: '
+                          '%(error)s', {'disk': disk_path, 'error': e})
+            else:
+                if is_qcow2:
+                    return backing_file
+        return libvirt_utils.get_disk_backing_file(disk_path)
+
     def _list_backing_images(self):
         """List the backing images currently in use."""
-        inuse_images = []
+        inuse_images = set()
         for ent in os.listdir(CONF.instances_path):
             if ent in self.instance_names:
                 LOG.debug('%s is a valid instance name', ent)
@@ -306,8 +372,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                 if os.path.exists(disk_path):
                     LOG.debug('%s has a disk file', ent)
                     try:
-                        backing_file = libvirt_utils.get_disk_backing_file(
-                            disk_path)
+                        backing_file = self._get_disk_backing_file(disk_path)
                     except processutils.ProcessExecutionError:
                         # (for bug 1261442)
                         if not os.path.exists(disk_path):
@@ -326,8 +391,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                             CONF.instances_path,
                             CONF.image_cache_subdirectory_name,
                             backing_file)
-                        if backing_path not in inuse_images:
-                            inuse_images.append(backing_path)
+                        inuse_images.add(backing_path)
+                        self.base_file_users[backing_path].add(ent)
 
                         if backing_path in self.unexplained_images:
                             LOG.warn(_LW('Instance %(instance)s is using a '
@@ -361,7 +426,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
 
         # Resized images
         resize_re = re.compile('.*/%s_[0-9]+$' % fingerprint)
-        for img in self.unexplained_images:
+        for img in sorted(self.unexplained_images):
             m = resize_re.match(img)
             if m:
                 yield img, False, True
@@ -386,6 +451,13 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             (stored_checksum, stored_timestamp) = read_stored_checksum(
                 base_file, timestamped=True)
             if stored_checksum:
+                if CONF.libvirt.image_cache_incremental:
+                    # The file has not been touched since we last verified
+                    # it, there is no point in reading it all again.
+                    record = self._base_file_record(base_file)
+                    if record and record.get('sha1') == stored_checksum:
+                        return True
+
                 # NOTE(mikal): Checksums are timestamped. If we have recently
                 # checksummed (possibly on another compute node if we are using
                 # shared storage), then we don't need to checksum again.
@@ -400,6 +472,9 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                     write_stored_info(base_file, field='sha1',
                                       value=stored_checksum)
 
+                signature = None
+                if CONF.libvirt.image_cache_incremental:
+                    signature = _file_signature(base_file)
                 current_checksum = _hash_file(base_file)
 
                 if current_checksum != stored_checksum:
@@ -407,9 +482,12 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                                   'verification failed'),
                               {'id': img_id,
                                'base_file': base_file})
+                    self._forget_verified(base_file)
                     return False
 
                 else:
+                    self._record_verified(base_file, signature,
+                                          current_checksum)
                     return True
 
             else:
@@ -426,12 +504,102 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                                  'checksum'),
                              {'id': img_id,
                               'base_file': base_file})
-                    write_stored_checksum(base_file)
+                    if CONF.libvirt.image_cache_incremental:
+                        signature = _file_signature(base_file)
+                        write_stored_checksum(base_file)
+                        self._record_verified(
+                            base_file, signature,
+                            read_stored_checksum(base_file,
+                                                 timestamped=False))
+                    else:
+                        write_stored_checksum(base_file)
 
                 return None
 
         return inner_verify_checksum()
 
+    def _base_file_record(self, base_file):
+        """Return the state record of a base file if it is still current.
+
+        A record is current if the inode, size and modification time of
+        the file have not changed since it was written.
+        """
+        if not CONF.libvirt.image_cache_incremental:
+            return None
+        self._load_base_file_state()
+        record = self._base_file_state.get(base_file)
+        if not record:
+            return None
+        try:
+            signature = _file_signature(base_file)
+        except OSError:
+            return None
+        for key, value in signature.items():
+            if record.get(key) != value:
+                return None
+        return record
+
+    def _record_verified(self, base_file, signature, checksum):
+        if not CONF.libvirt.image_cache_incremental:
+            return
+        self._load_base_file_state()
+        record = self._base_file_state.setdefault(base_file, {})
+        record.update(signature)
+        record['sha1'] = checksum
+        record['verified_at'] = time.time()
+
+    def _forget_verified(self, base_file):
+        if CONF.libvirt.image_cache_incremental:
+            self._load_base_file_state()
+            self._base_file_state.pop(base_file, None)
+
+    def _load_base_file_state(self):
+        """Load the base file records saved by a previous pass, once."""
+        if self._base_file_state is not None:
+            return
+        self._base_file_state = {}
+        state_file = CONF.libvirt.image_cache_state_file
+        try:
+            with open(state_file) as f:
+                state = jsonutils.loads(f.read())
+            self._base_file_state = state.get('base_files', {})
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                LOG.warn(_LW('Unable to read image cache state from '
+                             '%(state_file)s: %(error)s'),
+                         {'state_file': state_file, 'error': e})
+        except (ValueError, AttributeError) as e:
+            LOG.warn(_LW('Ignoring invalid image cache state in '
+                         '%(state_file)s: %(error)s'),
+                     {'state_file': state_file, 'error': e})
+
+    def _save_base_file_state(self):
+        """Atomically write the base file records to the state file."""
+        self._load_base_file_state()
+        base_files = {}
+        for base_file in (set(self._base_file_state) |
+                          set(self.base_file_users)):
+            if not os.path.exists(base_file):
+                continue
+            record = self._base_file_state.get(base_file, {})
+            record['users'] = sorted(self.base_file_users.get(base_file, ()))
+            base_files[base_file] = record
+        self._base_file_state = base_files
+
+        state_file = CONF.libvirt.image_cache_state_file
+        state_dir = os.path.dirname(os.path.abspath(state_file))
+        try:
+            fileutils.ensure_tree(state_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=state_dir,
+                                            prefix='.imagecache')
+            with os.fdopen(fd, 'w') as f:
+                f.write(jsonutils.dumps({'base_files': base_files}))
+            os.rename(tmp_path, state_file)
+        except (IOError, OSError) as e:
+            LOG.warn(_LW('Unable to write image cache state to '
+                         '%(state_file)s: %(error)s'),
+                     {'state_file': state_file, 'error': e})
+
     @staticmethod
     def _get_age_of_file(base_file):
         if not os.path.exists(base_file):
@@ -536,7 +704,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                           'local': local,
                           'remote': remote})
 
-                self.active_base_files.append(base_file)
+                self.active_base_files.add(base_file)
+                self.base_file_users[base_file].update(instances)
 
                 if not base_file:
                     LOG.warn(_LW('image %(id)s at (%(base_file)s): warning '
@@ -547,7 +716,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                                  'instance_list': ' '.join(instances)})
 
         if image_bad:
-            self.corrupt_base_files.append(base_file)
+            self.corrupt_base_files.add(base_file)
 
         if base_file:
             if not image_in_use:
@@ -555,7 +724,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                           'use',
                           {'id': img_id,
                            'base_file': base_file})
-                self.removable_base_files.append(base_file)
+                self.removable_base_files.add(base_file)
 
             else:
                 LOG.debug('image %(id)s at (%(base_file)s): image is in '
@@ -564,7 +733,11 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                            'base_file': base_file})
                 if os.path.exists(base_file):
                     libvirt_utils.chown(base_file, os.getuid())
+                    # Keep a current record current across the touch.
+                    record = self._base_file_record(base_file)
                     os.utime(base_file, None)
+                    if record is not None:
+                        record.update(_file_signature(base_file))
 
     def _age_and_verify_swap_images(self, context, base_dir):
         LOG.debug('Verify swap images')
@@ -595,30 +768,28 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                 self._handle_base_image(img, base_file)
 
                 if not image_small and not image_resized:
-                    self.originals.append(base_file)
+                    self.originals.add(base_file)
 
         # Elements remaining in unexplained_images might be in use
         inuse_backing_images = self._list_backing_images()
-        for backing_path in inuse_backing_images:
-            if backing_path not in self.active_base_files:
-                self.active_base_files.append(backing_path)
+        self.active_base_files.update(inuse_backing_images)
 
         # Anything left is an unknown base image
         for img in self.unexplained_images:
             LOG.warn(_LW('Unknown base file: %s'), img)
-            self.removable_base_files.append(img)
+            self.removable_base_files.add(img)
 
         # Dump these lists
         if self.active_base_files:
             LOG.info(_LI('Active base files: %s'),
-                     ' '.join(self.active_base_files))
+                     ' '.join(sorted(self.active_base_files)))
         if self.corrupt_base_files:
             LOG.info(_LI('Corrupt base files: %s'),
-                     ' '.join(self.corrupt_base_files))
+                     ' '.join(sorted(self.corrupt_base_files)))
 
         if self.removable_base_files:
             LOG.info(_LI('Removable base files: %s'),
-                     ' '.join(self.removable_base_files))
+                     ' '.join(sorted(self.removable_base_files)))
 
             if self.remove_unused_base_images:
                 for base_file in self.removable_base_files:
@@ -653,6 +824,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             return
         # reset the local statistics
         self._reset_state()
+        if CONF.libvirt.image_cache_incremental:
+            self._load_base_file_state()
         # read the cached images
         self._list_base_images(base_dir)
         # read running instances data
@@ -664,3 +837,9 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         # perform the aging and image verification
         self._age_and_verify_cached_images(context, all_instances, base_dir)
         self._age_and_verify_swap_images(context, base_dir)
+        if (CONF.libvirt.image_peer_cache_enabled and
+                self.remove_unused_base_images):
+            peercache.get_cache().prune(
+                CONF.remove_unused_original_minimum_age_seconds)
+        if CONF.libvirt.image_cache_incremental:
+            self._save_base_file_state()
@@ -0,0 +1,204 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Drives a running live migration towards completion.
+
+The controller is fed the job info of the migration by the driver's
+monitor loop, raises the maximum downtime allowed for the switch over step
+by step, and pauses or aborts the migration when it stops making progress.
+"""
+
+from oslo_log import log as logging
+from oslo_utils import importutils
+
+from nova.i18n import _LI
+from nova.i18n import _LW
+
+libvirt = None
+
+LOG = logging.getLogger(__name__)
+
+# Minimum max downtime libvirt is asked for, in milliseconds
+DOWNTIME_MIN = 100
+
+# Progress samples are recorded this often, in seconds
+SAMPLE_INTERVAL = 5
+
+STALLED_ABORT = 'abort'
+STALLED_PAUSE = 'pause'
+
+
+def downtime_steps(data_gb, downtime, steps, delay):
+    """Yields (time, downtime) pairs, the downtime in milliseconds to allow
+    from the time in seconds after the start of the migration.
+
+    The downtime grows exponentially over steps, up to downtime, and the
+    steps are spread over delay seconds per GiB of data to transfer, so the
+    migration of small guests gets less time before giving up guest
+    responsiveness.
+    """
+    downtime = max(downtime, DOWNTIME_MIN)
+    steps = max(steps, 1)
+    delay = int(delay * data_gb)
+
+    offset = downtime / float(steps + 1)
+    base = (downtime - offset) ** (1 / float(steps))
+    for i in range(steps + 1):
+        yield int(delay * i), int(offset + base ** i)
+
+
+class ConvergenceController(object):
+    """Steers a live migration through its job info.
+
+    - the max downtime is raised following downtime_steps;
+    - when data_remaining has not gone below its lowest value for
+      progress_timeout seconds, the guest is paused so the migration can
+      complete if stalled_action is 'pause', or else the migration is
+      aborted; once paused, it is aborted after another progress_timeout
+      without progress, and resume() runs the guest again when the
+      migration did not complete;
+    - the migration is aborted after completion_timeout seconds per GiB of
+      data to transfer.
+
+    A timeout of 0 disables the corresponding check.  The progress is
+    sampled every SAMPLE_INTERVAL seconds in samples, as (elapsed,
+    data_remaining, data_total, downtime) tuples, for log_summary to report
+    at the end of the migration.
+    """
+
+    def __init__(self, instance, dom, data_gb, downtime, downtime_steps_num,
+                 downtime_delay, completion_timeout, progress_timeout,
+                 stalled_action=STALLED_ABORT):
+        global libvirt
+        if libvirt is None:
+            libvirt = importutils.import_module('libvirt')
+
+        self.instance = instance
+        self.dom = dom
+        self.data_gb = data_gb
+        self.completion_timeout = completion_timeout * data_gb
+        self.progress_timeout = progress_timeout
+        self.stalled_action = stalled_action
+
+        self.steps = list(downtime_steps(data_gb, downtime,
+                                         downtime_steps_num, downtime_delay))
+        self.downtime = None
+        self.progress_watermark = None
+        self.progress_time = 0
+        self.paused = False
+        self.aborted = None
+        self.samples = []
+
+    def update(self, info, elapsed):
+        """Acts on the job info of the migration, elapsed seconds after it
+        started.
+        """
+        if self.aborted:
+            return
+
+        if (self.progress_watermark is None or
+                info.data_remaining < self.progress_watermark):
+            self.progress_watermark = info.data_remaining
+            self.progress_time = elapsed
+
+        if not self.samples or elapsed - self.samples[-1][0] >= (
+                SAMPLE_INTERVAL):
+            self.samples.append((elapsed, info.data_remaining,
+                                 info.data_total, self.downtime))
+
+        if self.completion_timeout and elapsed > self.completion_timeout:
+            self._abort(elapsed, 'completion timeout')
+            return
+
+        if (self.progress_timeout and
+                elapsed - self.progress_time > self.progress_timeout):
+            if self.stalled_action == STALLED_PAUSE and not self.paused:
+                self._pause(elapsed)
+            else:
+                self._abort(elapsed, 'no progress')
+            return
+
+        self._update_downtime(elapsed)
+
+    def _update_downtime(self, elapsed):
+        downtime = None
+        while self.steps and elapsed >= self.steps[0][0]:
+            downtime = self.steps.pop(0)[1]
+        if downtime is None:
+            return
+        LOG.debug("Increasing downtime to %(downtime)d ms after "
+                  "%(elapsed)d sec elapsed time",
+                  {"downtime": downtime, "elapsed": elapsed},
+                  instance=self.instance)
+        try:
+            self.dom.migrateSetMaxDowntime(downtime)
+            self.downtime = downtime
+        except libvirt.libvirtError as e:
+            LOG.warn(_LW("Unable to increase max downtime to %(downtime)d "
+                         "ms: %(e)s"), {"downtime": downtime, "e": e},
+                     instance=self.instance)
+
+    def _pause(self, elapsed):
+        LOG.warn(_LW("Live migration stuck for %d sec, pausing the guest "
+                     "so it can complete"),
+                 elapsed - self.progress_time, instance=self.instance)
+        try:
+            self.dom.suspend()
+        except libvirt.libvirtError as e:
+            LOG.warn(_LW("Failed to pause the guest: %s"), e,
+                     instance=self.instance)
+            self._abort(elapsed, 'no progress')
+            return
+        self.paused = True
+        # Give the paused migration another progress_timeout to progress
+        self.progress_time = elapsed
+
+    def _abort(self, elapsed, reason):
+        LOG.warn(_LW("Live migration not completed after %(elapsed)d sec "
+                     "(%(reason)s), aborting it"),
+                 {"elapsed": elapsed, "reason": reason},
+                 instance=self.instance)
+        try:
+            self.dom.abortJob()
+        except libvirt.libvirtError as e:
+            LOG.warn(_LW("Failed to abort migration %s"), e,
+                     instance=self.instance)
+            return
+        self.aborted = reason
+
+    def resume(self):
+        """Resumes the guest if it was paused, once the migration failed
+        or was cancelled.
+        """
+        if not self.paused:
+            return
+        LOG.info(_LI("Resuming the guest paused for the live migration"),
+                 instance=self.instance)
+        try:
+            self.dom.resume()
+        except libvirt.libvirtError as e:
+            LOG.warn(_LW("Failed to resume the guest: %s"), e,
+                     instance=self.instance)
+            return
+        self.paused = False
+
+    def log_summary(self, result, elapsed):
+        LOG.info(_LI("Live migration %(result)s after %(elapsed)d sec, "
+                     "%(gb)d GiB to transfer, max downtime %(downtime)s ms, "
+                     "paused: %(paused)s, aborted: %(aborted)s"),
+                 {"result": result, "elapsed": elapsed, "gb": self.data_gb,
+                  "downtime": self.downtime, "paused": self.paused,
+                  "aborted": self.aborted}, instance=self.instance)
+        LOG.debug("Live migration progress samples (elapsed, "
+                  "data_remaining, data_total, downtime): %s", self.samples,
+                  instance=self.instance)
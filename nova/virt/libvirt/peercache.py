@@ -0,0 +1,383 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Image cache tier shared between compute nodes.
+
+The images downloaded from Glance are hard linked, under their Glance
+checksum, in a content-addressed directory of the image cache, and served
+from there to the other compute nodes over HTTP:
+
+    GET /images/<checksum>    the image, 404 when it is not cached
+    GET /stats                the counters of the tier, as JSON
+
+A compute node missing an image in its own cache asks its peers for it
+before downloading it from Glance.  The peers are asked in an order
+derived from the checksum, the same on every compute node, so the copies
+of an image concentrate on a few of them.  What a peer sends is checked
+against the checksum before use.
+
+Concurrent fetches of the same image are serialized by a lock on its
+checksum, the later ones then find it in the cache, and a peer asking for
+an image which is being downloaded from Glance at the time waits for it
+rather than being told it is missing.
+"""
+
+import errno
+import hashlib
+import os
+import re
+import time
+
+import eventlet
+from eventlet import event
+from oslo_concurrency import lockutils
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import fileutils
+from oslo_utils import units
+import requests
+import webob.dec
+import webob.exc
+import webob.static
+
+from nova.i18n import _LE
+from nova.i18n import _LI
+from nova.i18n import _LW
+from nova import utils
+from nova.virt import images
+from nova import wsgi
+
+LOG = logging.getLogger(__name__)
+
+peer_cache_opts = [
+    cfg.BoolOpt('image_peer_cache_enabled',
+                default=False,
+                help='Fetch the images missing from the image cache from the '
+                     'image caches of the compute nodes listed in '
+                     'image_peer_cache_peers before Glance, and serve the '
+                     'images of the image cache to them. The images are '
+                     'served without authentication to whoever knows their '
+                     'checksum, so image_peer_cache_listen should only be '
+                     'reachable from the other compute nodes.'),
+    cfg.StrOpt('image_peer_cache_listen',
+               help='IP address the image cache is served to the other '
+                    'compute nodes on. Defaults to my_ip.'),
+    cfg.IntOpt('image_peer_cache_port',
+               default=8779,
+               help='Port the image cache is served to the other compute '
+                    'nodes on'),
+    cfg.ListOpt('image_peer_cache_peers',
+                default=[],
+                help='Addresses, as host:port, of the image caches of the '
+                     'compute nodes to fetch images from, typically the '
+                     'compute nodes of the same rack. The entry of this '
+                     'compute node, my_ip:image_peer_cache_port, is skipped '
+                     'so that all of them can share the same list.'),
+    cfg.IntOpt('image_peer_cache_timeout',
+               default=10,
+               help='Seconds to wait for a peer to accept a connection, or '
+                    'to send data on top of image_peer_cache_inflight_wait, '
+                    'before trying the next one'),
+    cfg.IntOpt('image_peer_cache_inflight_wait',
+               default=120,
+               help='Seconds a peer asking for an image which is being '
+                    'downloaded from Glance at the time waits for it to be '
+                    'done, before it is answered the image is missing'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(peer_cache_opts, 'libvirt')
+CONF.import_opt('instances_path', 'nova.compute.manager')
+CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
+CONF.import_opt('my_ip', 'nova.netconf')
+
+# Subdirectory of the image cache holding the images under their checksum
+SUBDIRECTORY = 'by-checksum'
+
+CHECKSUM_RE = re.compile('^[0-9a-f]{32}$')
+IMAGE_PATH_RE = re.compile('^/images/([0-9a-f]{32})$')
+
+# Suffix of the file whose modification time records when an image was
+# last used
+USED_SUFFIX = '.used'
+
+CHUNK_SIZE = 64 * units.Ki
+
+SOURCE_LOCAL = 'local'
+SOURCE_PEER = 'peer'
+SOURCE_GLANCE = 'glance'
+
+_CACHE = None
+
+
+def get_cache():
+    """Returns the peer image cache of this compute node."""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = PeerImageCache()
+    return _CACHE
+
+
+class PeerImageCache(object):
+    """Content-addressed image store shared with the peer compute nodes.
+
+    fetch() is a drop-in replacement for nova.virt.images.fetch, for
+    images.fetch_to_raw to download the images with.
+    """
+
+    def __init__(self, cache_dir=None, peers=None):
+        self.cache_dir = cache_dir or os.path.join(
+            CONF.instances_path, CONF.image_cache_subdirectory_name,
+            SUBDIRECTORY)
+        if peers is None:
+            peers = CONF.libvirt.image_peer_cache_peers
+        own = '%s:%d' % (CONF.my_ip, CONF.libvirt.image_peer_cache_port)
+        self.peers = [peer for peer in peers if peer != own]
+        self.stats = {'local': 0, 'peer': 0, 'glance': 0,
+                      'peer_errors': 0, 'served': 0}
+        # Event of each image being downloaded from Glance, by checksum
+        self._inflight = {}
+        self._server = None
+
+    def _path(self, checksum):
+        return os.path.join(self.cache_dir, checksum)
+
+    def _touch(self, checksum):
+        """Records that an image was used, for prune()."""
+        # The image itself is a hard link of a base file of the image
+        # cache, whose modification time the image cache manager checks,
+        # so it is left alone.
+        path = self._path(checksum) + USED_SUFFIX
+        try:
+            with open(path, 'a'):
+                os.utime(path, None)
+        except EnvironmentError as e:
+            LOG.warn(_LW("Unable to record the use of image %(checksum)s "
+                         "of the peer image cache: %(error)s"),
+                     {'checksum': checksum, 'error': e})
+
+    def _last_used(self, checksum):
+        try:
+            return os.path.getmtime(self._path(checksum) + USED_SUFFIX)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        return os.path.getmtime(self._path(checksum))
+
+    def ranked_peers(self, checksum):
+        """Returns the peers in the order they are asked for an image."""
+        return sorted(self.peers,
+                      key=lambda peer: hashlib.md5(checksum + peer).digest())
+
+    def fetch(self, context, image_href, path, user_id, project_id,
+              max_size=0):
+        """Downloads an image to path, from the cache tier when it holds
+        it, or else from Glance.
+        """
+        checksum = images.get_info(context, image_href).get('checksum')
+        if not checksum or not CHECKSUM_RE.match(checksum):
+            # Nothing to address the image by, Glance only has its data
+            images.fetch(context, image_href, path, user_id, project_id,
+                         max_size=max_size)
+            return
+        fileutils.ensure_tree(self.cache_dir)
+
+        @utils.synchronized('peer-image-' + checksum, external=True,
+                            lock_path=self.cache_dir)
+        def _fetch_sync():
+            return self._fetch(context, image_href, checksum, path,
+                               user_id, project_id, max_size)
+
+        source = _fetch_sync()
+        self.stats[source] += 1
+        stats = self.get_stats()
+        LOG.info(_LI("Fetched image %(image)s from %(source)s, hit ratio of "
+                     "the peer image cache %(hit_ratio).2f: %(hits)d of "
+                     "%(fetches)d images not downloaded from Glance, "
+                     "%(peer_errors)d peer errors"),
+                 dict(stats, image=image_href, source=source))
+
+    def _fetch(self, context, image_href, checksum, path, user_id,
+               project_id, max_size):
+        cached = self._path(checksum)
+        if os.path.exists(cached):
+            # An image with the same data was fetched under another id, or
+            # was removed from the image cache since.
+            _link_or_copy(cached, path)
+            self._touch(checksum)
+            return SOURCE_LOCAL
+
+        for peer in self.ranked_peers(checksum):
+            try:
+                if self._fetch_from_peer(peer, checksum, path):
+                    self._add(image_href, checksum, path)
+                    return SOURCE_PEER
+            except (requests.RequestException, EnvironmentError) as e:
+                LOG.warn(_LW("Failed to fetch image %(image)s from peer "
+                             "%(peer)s: %(error)s"),
+                         {'image': image_href, 'peer': peer, 'error': e})
+                self.stats['peer_errors'] += 1
+
+        # Only the Glance downloads are waited for by the peers: a node
+        # asking its peers cannot be waited for without risking peers
+        # waiting for each other.
+        done = self._inflight[checksum] = event.Event()
+        try:
+            images.fetch(context, image_href, path, user_id, project_id,
+                         max_size=max_size)
+            self._add(image_href, checksum, path)
+        finally:
+            del self._inflight[checksum]
+            done.send()
+        return SOURCE_GLANCE
+
+    def _add(self, image_href, checksum, path):
+        try:
+            os.link(path, self._path(checksum))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                LOG.warn(_LW("Unable to add image %(image)s to the peer "
+                             "image cache: %(error)s"),
+                         {'image': image_href, 'error': e})
+                return
+        self._touch(checksum)
+
+    def _fetch_from_peer(self, peer, checksum, path):
+        """Downloads an image from a peer, returning whether it had it."""
+        url = 'http://%s/images/%s' % (peer, checksum)
+        # The peer may wait for a Glance download before answering
+        timeout = CONF.libvirt.image_peer_cache_timeout
+        response = requests.get(
+            url, stream=True,
+            timeout=(timeout,
+                     timeout + CONF.libvirt.image_peer_cache_inflight_wait))
+        try:
+            if response.status_code == requests.codes.NOT_FOUND:
+                return False
+            response.raise_for_status()
+            md5 = hashlib.md5()
+            with fileutils.remove_path_on_error(path):
+                with open(path, 'wb') as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        md5.update(chunk)
+                        f.write(chunk)
+        finally:
+            response.close()
+
+        if md5.hexdigest() != checksum:
+            LOG.warn(_LW("Image %(checksum)s from peer %(peer)s has checksum "
+                         "%(actual)s, discarding it"),
+                     {'checksum': checksum, 'peer': peer,
+                      'actual': md5.hexdigest()})
+            self.stats['peer_errors'] += 1
+            os.unlink(path)
+            return False
+        return True
+
+    def get_stats(self):
+        """Returns the counters of the tier, with its hit ratio: the
+        fraction of the images fetched which were not downloaded from
+        Glance.
+        """
+        stats = dict(self.stats)
+        hits = stats['local'] + stats['peer']
+        stats['hits'] = hits
+        stats['fetches'] = hits + stats['glance']
+        stats['hit_ratio'] = (float(hits) / stats['fetches']
+                              if stats['fetches'] else 0.0)
+        return stats
+
+    def prune(self, maxage):
+        """Removes the images which were not used for maxage seconds."""
+        try:
+            entries = os.listdir(self.cache_dir)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return
+            raise
+        now = time.time()
+        for entry in entries:
+            if not CHECKSUM_RE.match(entry):
+                continue
+            path = self._path(entry)
+            try:
+                if now - self._last_used(entry) < maxage:
+                    continue
+                LOG.info(_LI('Removing image %s from the peer image cache'),
+                         entry)
+                os.unlink(path)
+                fileutils.delete_if_exists(path + USED_SUFFIX)
+                lockutils.remove_external_lock_file(
+                    'peer-image-' + entry, lock_file_prefix='nova-',
+                    lock_path=self.cache_dir)
+            except OSError as e:
+                LOG.error(_LE('Failed to remove %(path)s from the peer image '
+                              'cache: %(error)s'),
+                          {'path': path, 'error': e})
+
+    @webob.dec.wsgify
+    def app(self, req):
+        """WSGI application serving the cache to the peers."""
+        if req.method != 'GET':
+            raise webob.exc.HTTPMethodNotAllowed()
+        if req.path == '/stats':
+            return webob.Response(body=jsonutils.dumps(self.get_stats()),
+                                  content_type='application/json')
+        match = IMAGE_PATH_RE.match(req.path)
+        if not match:
+            raise webob.exc.HTTPNotFound()
+        checksum = match.group(1)
+
+        inflight = self._inflight.get(checksum)
+        if inflight is not None:
+            with eventlet.Timeout(CONF.libvirt.image_peer_cache_inflight_wait,
+                                  False):
+                inflight.wait()
+
+        path = self._path(checksum)
+        try:
+            f = open(path, 'rb')
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                raise webob.exc.HTTPNotFound()
+            raise
+        self._touch(checksum)
+        self.stats['served'] += 1
+        response = webob.Response(content_type='application/octet-stream')
+        response.content_length = os.fstat(f.fileno()).st_size
+        response.app_iter = webob.static.FileIter(f)
+        return response
+
+    def start_server(self):
+        """Starts serving the cache to the peers."""
+        host = CONF.libvirt.image_peer_cache_listen or CONF.my_ip
+        self._server = wsgi.Server('peer_image_cache', self.app, host=host,
+                                   port=CONF.libvirt.image_peer_cache_port)
+        self._server.start()
+        return self._server
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+
+def _link_or_copy(source, dest):
+    try:
+        os.link(source, dest)
+    except OSError:
+        with fileutils.remove_path_on_error(dest):
+            with open(source, 'rb') as src, open(dest, 'wb') as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    dst.write(chunk)
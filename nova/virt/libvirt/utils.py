@@ -33,6 +33,7 @@ from nova.i18n import _LI
 from nova import utils
 from nova.virt import images
 from nova.virt.libvirt import config as vconfig
+from nova.virt.libvirt import peercache
 from nova.virt import volumeutils
 
 libvirt_opts = [
@@ -392,8 +393,11 @@ def get_fs_info(path):
 
 def fetch_image(context, target, image_id, user_id, project_id, max_size=0):
     """Grab image."""
+    download = None
+    if CONF.libvirt.image_peer_cache_enabled:
+        download = peercache.get_cache().fetch
     images.fetch_to_raw(context, image_id, target, user_id, project_id,
-                        max_size=max_size)
+                        max_size=max_size, download=download)
 
 
 def get_instance_path(instance, forceold=False, relative=False):
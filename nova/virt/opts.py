@@ -30,6 +30,7 @@ import nova.virt.ironic.driver
 import nova.virt.libvirt.driver
 import nova.virt.libvirt.imagebackend
 import nova.virt.libvirt.imagecache
+import nova.virt.libvirt.peercache
 import nova.virt.libvirt.storage.lvm
 import nova.virt.libvirt.utils
 import nova.virt.libvirt.vif
@@ -81,6 +82,7 @@ def list_opts():
              nova.virt.libvirt.driver.libvirt_opts,
              nova.virt.libvirt.imagebackend.__imagebackend_opts,
              nova.virt.libvirt.imagecache.imagecache_opts,
+             nova.virt.libvirt.peercache.peer_cache_opts,
              nova.virt.libvirt.storage.lvm.lvm_opts,
              nova.virt.libvirt.utils.libvirt_opts,
              nova.virt.libvirt.vif.libvirt_vif_opts,
@@ -55,6 +55,7 @@ import uuid
 from xml.sax import saxutils
 import zlib
 
+from eventlet import greenthread
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import timeutils
@@ -70,6 +71,8 @@ _CLASSES = ['host', 'network', 'session', 'pool', 'SR', 'VBD',
             'PBD', 'VDI', 'VIF', 'PIF', 'VM', 'VLAN', 'task']
 
 _db_content = {}
+# (id, class, ref, operation) of the changes to _db_content, for event.from
+_events = []
 
 LOG = logging.getLogger(__name__)
 
@@ -77,6 +80,7 @@ LOG = logging.getLogger(__name__)
 def reset():
     for c in _CLASSES:
         _db_content[c] = {}
+    del _events[:]
     host = create_host('fake')
     create_vm('fake dom 0',
               'Running',
@@ -335,9 +339,36 @@ def _create_object(table, obj):
     ref = str(uuid.uuid4())
     obj['uuid'] = str(uuid.uuid4())
     _db_content[table][ref] = obj
+    record_event(table, ref, 'add')
     return ref
 
 
+def record_event(table, ref, operation='mod'):
+    """Records a change to an object, for event.from to return."""
+    _events.append((len(_events) + 1, table, ref, operation))
+
+
+def _event_matches(classes, table, ref):
+    return ('*' in classes or table in classes or
+            '%s/%s' % (table, ref) in classes)
+
+
+def _events_from(classes, token):
+    since = int(token or 0)
+    events = []
+    for event_id, table, ref, operation in _events[since:]:
+        if not _event_matches(classes, table, ref):
+            continue
+        event = {'id': str(event_id),
+                 'class': table.lower(),
+                 'operation': operation,
+                 'ref': ref}
+        if operation != 'del' and ref in _db_content[table]:
+            event['snapshot'] = _db_content[table][ref]
+        events.append(event)
+    return events
+
+
 def _create_sr(table, obj):
     sr_type = obj[6]
     # Forces fake to support iscsi only
@@ -576,6 +607,17 @@ class SessionBase(object):
     def SR_scan(self, _1, sr_ref):
         return
 
+    def event_from(self, _1, classes, token, timeout):
+        events = _events_from(classes, token)
+        if not events and timeout:
+            # The real call blocks until an event comes or the timeout
+            # passes; tests can make changes meanwhile by stubbing sleep.
+            greenthread.sleep(timeout)
+            events = _events_from(classes, token)
+        return {'events': events,
+                'valid_ref_counts': {},
+                'token': str(len(_events))}
+
     def VM_get_xenstore_data(self, _1, vm_ref):
         return _db_content['VM'][vm_ref].get('xenstore_data', {})
 
@@ -970,6 +1012,7 @@ class SessionBase(object):
             if (ref in _db_content[cls] and
                     field in _db_content[cls][ref]):
                 _db_content[cls][ref][field] = val
+                record_event(cls, ref)
                 return
 
         LOG.debug('Raising NotImplemented')
@@ -1018,6 +1061,7 @@ class SessionBase(object):
             destroy_func(ref)
         else:
             del _db_content[table][ref]
+        record_event(table, ref, 'del')
 
     def _async(self, name, params):
         task_ref = create_task(name)
@@ -20,7 +20,9 @@ their attributes like VDIs, VIFs, as well as their lookup functions.
 """
 
 import contextlib
+import errno
 import os
+import sys
 import time
 import urllib
 import uuid
@@ -28,6 +30,7 @@ from xml.dom import minidom
 from xml.parsers import expat
 
 from eventlet import greenthread
+from eventlet import tpool
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -136,6 +139,18 @@ MBR_SIZE_BYTES = MBR_SIZE_SECTORS * SECTOR_SIZE
 KERNEL_DIR = '/boot/guest'
 MAX_VDI_CHAIN_SIZE = 16
 PROGRESS_INTERVAL_SECONDS = 300
+# The first wait for a VHD coalesce, doubled up to vhd_coalesce_poll_interval
+VHD_COALESCE_MIN_POLL_INTERVAL = 0.5
+# Sparse copies read this much at once, and copy this much in each call
+# to a native thread
+SPARSE_COPY_BUFFER_SIZE = 4 * units.Mi
+SPARSE_COPY_SEGMENT_SIZE = 256 * units.Mi
+# os.SEEK_DATA/os.SEEK_HOLE only exist from Python 3.3, these are the
+# Linux values
+SEEK_DATA = getattr(os, 'SEEK_DATA',
+                    3 if sys.platform.startswith('linux') else None)
+SEEK_HOLE = getattr(os, 'SEEK_HOLE',
+                    4 if sys.platform.startswith('linux') else None)
 
 # Fudge factor to allow for the VHD chain to be slightly larger than
 # the partitioned space. Otherwise, legitimate images near their
@@ -2074,6 +2089,9 @@ def _wait_for_vhd_coalesce(session, instance, sr_ref, vdi_ref,
     vdi_uuid_list and vdi_ref that we expect to be coalesced, but any of those
     in vdi_uuid_list may also be coalesced (except the base UUID - which is
     guaranteed to remain)
+
+    Returns the duration of the wait, number of SR scans and of VDI events
+    seen, or None when no coalesce is expected.
     """
     # If the base disk was a leaf node, there will be no coalescing
     # after a VDI snapshot.
@@ -2095,34 +2113,93 @@ def _wait_for_vhd_coalesce(session, instance, sr_ref, vdi_ref,
     # When the VDI snapshot is taken, a new parent is created.
     # Assuming it is not one of the above cases, that new parent
     # can be coalesced, so we need to wait for that to happen.
-    max_attempts = CONF.xenserver.vhd_coalesce_max_attempts
+    # We give up after as long as vhd_coalesce_max_attempts polls would have
+    # taken, but wait for changes to the VDI with event.from rather than
+    # rescanning the SR at a fixed interval, where the host supports it.
+    poll_interval = CONF.xenserver.vhd_coalesce_poll_interval
+    timeout = CONF.xenserver.vhd_coalesce_max_attempts * poll_interval
+    interval = min(VHD_COALESCE_MIN_POLL_INTERVAL, poll_interval)
     # Remove the leaf node from list, to get possible good parents
     # when the coalesce has completed.
     # Its possible that other coalesce operation happen, so we need
     # to consider the full chain, rather than just the most recent parent.
     good_parent_uuids = vdi_uuid_list[1:]
-    for i in range(max_attempts):
-        # NOTE(sirp): This rescan is necessary to ensure the VM's `sm_config`
-        # matches the underlying VHDs.
-        # This can also kick XenServer into performing a pending coalesce.
-        _scan_sr(session, sr_ref)
+    start_time = timeutils.utcnow()
+    token = _vdi_event_token(session, vdi_ref)
+    stats = {'method': 'polling' if token is None else 'events',
+             'scans': 0, 'events': 0}
+    changed = False
+    while True:
+        if not changed:
+            # NOTE(sirp): This rescan is necessary to ensure the VM's
+            # `sm_config` matches the underlying VHDs.
+            # This can also kick XenServer into performing a pending
+            # coalesce.
+            _scan_sr(session, sr_ref)
+            stats['scans'] += 1
         parent_uuid = _get_vhd_parent_uuid(session, vdi_ref)
-        if parent_uuid and (parent_uuid not in good_parent_uuids):
-            LOG.debug("Parent %(parent_uuid)s not yet in parent list"
-                      " %(good_parent_uuids)s, waiting for coalesce...",
-                      {'parent_uuid': parent_uuid,
-                       'good_parent_uuids': good_parent_uuids},
-                      instance=instance)
-        else:
-            LOG.debug("Coalesce detected, because parent is: %s" % parent_uuid,
-                      instance=instance)
-            return
+        stats['duration'] = timeutils.delta_seconds(start_time,
+                                                    timeutils.utcnow())
+        if not parent_uuid or parent_uuid in good_parent_uuids:
+            break
+        LOG.debug("Parent %(parent_uuid)s not yet in parent list"
+                  " %(good_parent_uuids)s, waiting for coalesce...",
+                  {'parent_uuid': parent_uuid,
+                   'good_parent_uuids': good_parent_uuids},
+                  instance=instance)
+
+        remaining = timeout - stats['duration']
+        if remaining <= 0:
+            msg = (_("VHD coalesce not detected after %(duration).2f "
+                     "seconds and %(scans)d SR scans, giving up...") % stats)
+            raise exception.NovaException(msg)
+        wait = min(interval, remaining)
+        changed = False
+        if token is not None:
+            try:
+                changed, token = _wait_for_vdi_event(session, vdi_ref, token,
+                                                     wait)
+            except session.XenAPI.Failure as exc:
+                LOG.warning(_LW("Waiting for VDI events failed, polling "
+                                "for the VHD coalesce instead: %s"), exc,
+                            instance=instance)
+                token = None
+                stats['method'] = 'polling'
+        if token is None:
+            greenthread.sleep(wait)
+        if changed:
+            stats['events'] += 1
+        interval = min(interval * 2, poll_interval)
+
+    LOG.info(_LI("Coalesce detected after %(duration).2f seconds, "
+                 "%(scans)d SR scans and %(events)d VDI events "
+                 "(%(method)s)"), stats, instance=instance)
+    LOG.debug("Coalesce detected, because parent is: %s", parent_uuid,
+              instance=instance)
+    return stats
 
-        greenthread.sleep(CONF.xenserver.vhd_coalesce_poll_interval)
 
-    msg = (_("VHD coalesce attempts exceeded (%d)"
-             ", giving up...") % max_attempts)
-    raise exception.NovaException(msg)
+def _vdi_event_token(session, vdi_ref):
+    """Return a token to wait for changes to the VDI with, or None if the
+    host does not support event.from.
+    """
+    try:
+        return _wait_for_vdi_event(session, vdi_ref, '', 0)[1]
+    except session.XenAPI.Failure as exc:
+        LOG.debug("Cannot wait for events on VDI %(vdi_ref)s: %(exc)s",
+                  {'vdi_ref': vdi_ref, 'exc': exc})
+        return None
+
+
+def _wait_for_vdi_event(session, vdi_ref, token, timeout):
+    """Wait up to timeout seconds for the VDI record to change.
+
+    Returns whether it changed since the token, and the token to pass to
+    the next call.
+    """
+    result = session.call_xenapi('event.from', ['VDI/%s' % vdi_ref], token,
+                                 float(timeout))
+    return bool(result['events']), result['token']
 
 
 def _remap_vbd_dev(dev):
@@ -2366,13 +2443,100 @@ def _log_progress_if_required(left, last_log_time, virtual_size):
     return last_log_time
 
 
+def _data_extent(fd, offset, end):
+    """Returns the first extent of data of a file between offset and end,
+    as a (start, stop) pair, or None if there is no data there.
+
+    Files, or devices, not supporting SEEK_DATA/SEEK_HOLE are all data.
+    """
+    if SEEK_DATA is None:
+        return offset, end
+    try:
+        start = os.lseek(fd, offset, SEEK_DATA)
+    except OSError as e:
+        if e.errno == errno.ENXIO:
+            # No data past offset
+            return None
+        return offset, end
+    if start >= end:
+        return None
+    try:
+        stop = os.lseek(fd, start, SEEK_HOLE)
+    except OSError:
+        stop = end
+    return start, min(stop, end)
+
+
+def _write_at(fd, offset, data):
+    os.lseek(fd, offset, os.SEEK_SET)
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _write_nonzero_blocks(fd, offset, data, zero_block):
+    """Writes data at offset, seeking over the blocks of zeros.
+
+    Returns the number of bytes written.
+    """
+    length = len(data)
+    if data.count(b'\0') == length:
+        return 0
+    block_size = len(zero_block)
+    view = memoryview(data)
+    written = 0
+    run_start = None
+    for i in range(0, length, block_size):
+        if data.startswith(zero_block, i):
+            if run_start is not None:
+                _write_at(fd, offset + run_start, view[run_start:i])
+                written += i - run_start
+                run_start = None
+        elif run_start is None:
+            run_start = i
+    if run_start is not None:
+        _write_at(fd, offset + run_start, view[run_start:])
+        written += length - run_start
+    return written
+
+
+def _sparse_copy_range(src_fd, dst_fd, offset, end, block_size):
+    """Copies the data between offset and end of a file to another,
+    skipping the holes and the blocks of zeros.
+
+    Runs in a native thread, so must not log nor use eventlet.  Returns
+    the number of bytes written, and whether the end of the source was
+    reached before end.
+    """
+    zero_block = b'\0' * block_size
+    written = 0
+    while offset < end:
+        extent = _data_extent(src_fd, offset, end)
+        if extent is None:
+            break
+        offset, stop = extent
+        os.lseek(src_fd, offset, os.SEEK_SET)
+        while offset < stop:
+            data = os.read(src_fd, min(SPARSE_COPY_BUFFER_SIZE,
+                                       stop - offset))
+            if not data:
+                return written, True
+            written += _write_nonzero_blocks(dst_fd, offset, data,
+                                             zero_block)
+            offset += len(data)
+    return written, False
+
+
 def _sparse_copy(src_path, dst_path, virtual_size, block_size=4096):
-    """Copy data, skipping long runs of zeros to create a sparse file."""
+    """Copy data, skipping long runs of zeros to create a sparse file.
+
+    The data is read in large buffers, and holes of the source are not read
+    at all where SEEK_DATA/SEEK_HOLE are supported.  The copy runs in
+    native threads, segment by segment, so that it neither blocks the other
+    greenthreads nor holds up the eventlet hub.
+    """
     start_time = last_log_time = timeutils.utcnow()
-    EMPTY_BLOCK = '\0' * block_size
-    bytes_read = 0
-    skipped_bytes = 0
-    left = virtual_size
+    bytes_written = 0
+    offset = 0
 
     LOG.debug("Starting sparse_copy src=%(src_path)s dst=%(dst_path)s "
               "virtual_size=%(virtual_size)d block_size=%(block_size)d",
@@ -2384,31 +2548,34 @@ def _sparse_copy(src_path, dst_path, virtual_size, block_size=4096):
     # ownership of the devices.
     with utils.temporary_chown(src_path):
         with utils.temporary_chown(dst_path):
-            with open(src_path, "r") as src:
-                with open(dst_path, "w") as dst:
-                    data = src.read(min(block_size, left))
-                    while data:
-                        if data == EMPTY_BLOCK:
-                            dst.seek(block_size, os.SEEK_CUR)
-                            left -= block_size
-                            bytes_read += block_size
-                            skipped_bytes += block_size
-                        else:
-                            dst.write(data)
-                            data_len = len(data)
-                            left -= data_len
-                            bytes_read += data_len
-
-                        if left <= 0:
+            src_fd = os.open(src_path, os.O_RDONLY)
+            try:
+                dst_fd = os.open(dst_path,
+                                 os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+                try:
+                    while offset < virtual_size:
+                        end = min(offset + SPARSE_COPY_SEGMENT_SIZE,
+                                  virtual_size)
+                        written, eof = tpool.execute(
+                            _sparse_copy_range, src_fd, dst_fd, offset, end,
+                            block_size)
+                        bytes_written += written
+                        if eof:
                             break
-
-                        data = src.read(min(block_size, left))
-                        greenthread.sleep(0)
+                        offset = end
                         last_log_time = _log_progress_if_required(
-                            left, last_log_time, virtual_size)
+                            virtual_size - offset, last_log_time,
+                            virtual_size)
+                finally:
+                    os.close(dst_fd)
+            finally:
+                os.close(src_fd)
 
     duration = timeutils.delta_seconds(start_time, timeutils.utcnow())
-    compression_pct = float(skipped_bytes) / bytes_read * 100
+    compression_pct = 0.0
+    if virtual_size:
+        compression_pct = (float(virtual_size - bytes_written) /
+                           virtual_size * 100)
 
     LOG.debug("Finished sparse_copy in %(duration).2f secs, "
               "%(compression_pct).2f%% reduction in size",
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark for the iso9660 config drive writers.
+
+Builds the same synthetic config drive repeatedly with the external
+mkisofs/genisoimage path and with the builtin in-process writer, and prints
+the build latency percentiles and image size of each:
+
+    ./tools/config_drive_bench.py --drives 200 --files 20 --file-size 16384
+
+The external writer is skipped when mkisofs_cmd cannot be found.  Use
+--output to keep one image of each kind for inspection (for example with
+isoinfo -R -l / isoinfo -J -l, or by loop mounting them).
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from oslo_config import cfg
+
+from nova.virt import configdrive
+
+CONF = cfg.CONF
+
+WRITERS = ('external', 'builtin')
+
+
+def _percentile(values, percent):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100.0 * len(values))))
+    return values[index]
+
+
+def _which(cmd):
+    if os.path.dirname(cmd):
+        return os.access(cmd, os.X_OK)
+    return any(os.access(os.path.join(d, cmd), os.X_OK)
+               for d in os.environ.get('PATH', '').split(os.pathsep))
+
+
+def _metadata_files(files, file_size):
+    """Roughly what InstanceMetadata.metadata_for_config_drive yields."""
+    mdfiles = []
+    for version in ('2009-04-04', 'latest'):
+        mdfiles.append(('ec2/%s/meta-data.json' % version,
+                        '{"hostname": "bench", "instance-id": "i-1"}'))
+        mdfiles.append(('ec2/%s/user-data' % version, 'x' * file_size))
+    for version in ('2012-08-10', '2013-10-17', 'latest'):
+        for name in ('meta_data.json', 'vendor_data.json',
+                     'network_data.json'):
+            mdfiles.append(('openstack/%s/%s' % (version, name),
+                            '{"uuid": "bench", "files": []}'))
+        mdfiles.append(('openstack/%s/user_data' % version, 'x' * file_size))
+    for i in range(files):
+        mdfiles.append(('openstack/content/%04X' % i, 'c' * file_size))
+    return mdfiles
+
+
+def run(writer, mdfiles, drives, workdir, output):
+    CONF.set_override('config_drive_iso_writer', writer)
+    latencies = []
+    path = os.path.join(workdir, 'disk.config.%s' % writer)
+    for _ in range(drives):
+        builder = configdrive.ConfigDriveBuilder()
+        builder.mdfiles = mdfiles
+        start = time.time()
+        builder.make_drive(path)
+        latencies.append(time.time() - start)
+
+    print('%s:' % writer)
+    print('  %d drives in %.2fs, %.1f/s'
+          % (drives, sum(latencies), drives / sum(latencies)))
+    print('  latency p50 %.1fms p95 %.1fms p99 %.1fms max %.1fms'
+          % tuple(1000 * _percentile(latencies, p)
+                  for p in (50, 95, 99, 100)))
+    print('  image size: %d bytes' % os.path.getsize(path))
+    if output:
+        shutil.copy(path, os.path.join(output, os.path.basename(path)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--drives', type=int, default=100,
+                        help='config drives built with each writer')
+    parser.add_argument('--files', type=int, default=10,
+                        help='injected files in openstack/content')
+    parser.add_argument('--file-size', type=int, default=4096,
+                        help='size of user data and injected files')
+    parser.add_argument('--writer', action='append', dest='writers',
+                        choices=WRITERS,
+                        help='writer to benchmark, may be repeated')
+    parser.add_argument('--output',
+                        help='directory to keep the last image of each '
+                             'writer in')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    mdfiles = _metadata_files(args.files, args.file_size)
+    workdir = tempfile.mkdtemp()
+    try:
+        for writer in args.writers or WRITERS:
+            if writer == 'external' and not _which(CONF.mkisofs_cmd):
+                print('%s: skipped, %s not found' % (writer,
+                                                     CONF.mkisofs_cmd))
+                continue
+            run(writer, mdfiles, args.drives, workdir, args.output)
+    finally:
+        shutil.rmtree(workdir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Injection latency benchmark for the libguestfs VFS.
+
+Creates a small qcow2 image holding an ext4 filesystem and, for copies of
+it, checks whether it is extendable and injects an SSH key and a file the
+way a boot with file injection does, once launching a new appliance per
+access and once with the appliance pool enabled.  The latency percentiles
+per boot are printed for each pool size:
+
+    ./tools/guestfs_inject_bench.py --boots 20 --pool-size 0 --pool-size 2
+
+Needs libguestfs and its python bindings; the pool needs the libvirt
+backend (LIBGUESTFS_BACKEND=libvirt).  Set --tcg when KVM is unavailable.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from oslo_config import cfg
+from oslo_utils import importutils
+
+from nova.virt.disk import api as disk_api
+from nova.virt.disk.vfs import guestfs as vfsguestfs
+from nova.virt.image import model as imgmodel
+
+CONF = cfg.CONF
+
+KEY = 'ssh-rsa AAAAB3NzaC1yc2EAAAADAQABAAABAQ bench@example'
+FILES = [('/etc/motd', 'injected by guestfs_inject_bench\n')]
+
+
+def _percentile(values, percent):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100.0 * len(values))))
+    return values[index]
+
+
+def _make_image(path, size_mb):
+    guestfs = importutils.import_module('guestfs')
+    g = guestfs.GuestFS(python_return_dict=True)
+    g.disk_create(path, 'qcow2', size_mb * 1024 * 1024)
+    g.add_drive_opts(path, format='qcow2')
+    g.launch()
+    g.mkfs('ext4', '/dev/sda')
+    g.mount('/dev/sda', '/')
+    g.mkdir_p('/etc')
+    g.write('/etc/passwd', 'root:x:0:0:root:/root:/bin/sh\n')
+    g.write('/etc/group', 'root:x:0:\n')
+    g.shutdown()
+    g.close()
+
+
+def run(pool_size, boots, template, workdir):
+    CONF.set_override('appliance_pool_size', pool_size, group='guestfs')
+    vfsguestfs.APPLIANCE_POOL = vfsguestfs.AppliancePool()
+    if pool_size:
+        # Start from a warm pool, as a compute node would after its
+        # first boots.
+        vfsguestfs.APPLIANCE_POOL.release(
+            vfsguestfs.APPLIANCE_POOL.acquire())
+
+    latencies = []
+    for i in range(boots):
+        path = os.path.join(workdir, 'disk-%d.qcow2' % i)
+        shutil.copy(template, path)
+        image = imgmodel.LocalFileImage(path, imgmodel.FORMAT_QCOW2)
+        start = time.time()
+        disk_api.is_image_extendable(image)
+        disk_api.inject_data(image, key=KEY, files=FILES, partition=None,
+                             mandatory=('key', 'files'))
+        latencies.append(time.time() - start)
+        os.unlink(path)
+
+    print('appliance_pool_size=%d:' % pool_size)
+    print('  %d boots in %.2fs' % (boots, sum(latencies)))
+    print('  latency p50 %.2fs p95 %.2fs max %.2fs'
+          % tuple(_percentile(latencies, p) for p in (50, 95, 100)))
+    vfsguestfs.APPLIANCE_POOL.disable('benchmark finished')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--boots', type=int, default=10,
+                        help='images injected for each pool size')
+    parser.add_argument('--pool-size', type=int, action='append',
+                        dest='pool_sizes',
+                        help='appliance_pool_size to run with, may be '
+                             'repeated (default: 0 and 1)')
+    parser.add_argument('--image-size', type=int, default=64,
+                        help='size of the test image in MiB')
+    parser.add_argument('--tcg', action='store_true',
+                        help='do not use KVM for the appliance')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    vfsguestfs.force_tcg(args.tcg)
+    workdir = tempfile.mkdtemp()
+    try:
+        template = os.path.join(workdir, 'template.qcow2')
+        _make_image(template, args.image_size)
+        for pool_size in args.pool_sizes or [0, 1]:
+            run(pool_size, args.boots, template, workdir)
+    finally:
+        shutil.rmtree(workdir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Glance offload benchmark for the peer image cache of the libvirt driver.
+
+Starts one process per simulated compute node, each with its own image
+cache served on 127.0.0.1 and all the others as peers, and has every node
+fetch every image, in its own random order, the way a rack of compute nodes
+booting the same images does.  Glance is simulated by copying the image
+from a local file after a fixed delay.  The number of Glance downloads,
+the hit ratio of the tier and the fetch latency percentiles are printed:
+
+    ./tools/peer_image_cache_bench.py --nodes 8 --images 4 --image-size 64
+
+Run it with --no-peers for the baseline of every node going to Glance.
+"""
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+from oslo_utils import units
+
+CONF = cfg.CONF
+
+
+def _percentile(values, percent):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100.0 * len(values))))
+    return values[index]
+
+
+def _flag(workdir, name):
+    return os.path.join(workdir, name)
+
+
+def _set(workdir, name, data=None):
+    # The nodes are monkey patched by eventlet, which the multiprocessing
+    # queues and events do not get along with, files are used instead.
+    path = _flag(workdir, name)
+    with open(path + '.tmp', 'w') as f:
+        f.write(jsonutils.dumps(data))
+    os.rename(path + '.tmp', path)
+
+
+def _wait(workdir, name, processes=(), sleep=time.sleep):
+    path = _flag(workdir, name)
+    while not os.path.exists(path):
+        if any(p.exitcode for p in processes):
+            raise RuntimeError('a node failed')
+        sleep(0.05)
+    with open(path) as f:
+        return jsonutils.loads(f.read())
+
+
+def node(index, args, workdir, sources):
+    import eventlet
+    eventlet.monkey_patch(os=False)
+
+    from nova.virt import images
+    from nova.virt.libvirt import peercache
+
+    CONF([], project='nova')
+    ports = [args.base_port + i for i in range(args.nodes)]
+    CONF.set_override('my_ip', '127.0.0.1')
+    CONF.set_override('image_peer_cache_listen', '127.0.0.1',
+                      group='libvirt')
+    CONF.set_override('image_peer_cache_port', ports[index], group='libvirt')
+
+    def get_info(context, image_href):
+        return {'id': image_href, 'checksum': sources[image_href][1]}
+
+    def glance_fetch(context, image_href, path, user_id, project_id,
+                     max_size=0):
+        eventlet.sleep(args.glance_delay)
+        shutil.copyfile(sources[image_href][0], path)
+
+    images.get_info = get_info
+    images.fetch = glance_fetch
+
+    peers = [] if args.no_peers else ['127.0.0.1:%d' % p for p in ports]
+    cache = peercache.PeerImageCache(
+        cache_dir=os.path.join(workdir, 'node-%d' % index), peers=peers)
+    cache.start_server()
+    _set(workdir, 'ready-%d' % index)
+    # Keep serving the peers while waiting
+    _wait(workdir, 'start', sleep=eventlet.sleep)
+
+    latencies = []
+    order = sorted(sources)
+    random.Random(index).shuffle(order)
+    for image_href in order:
+        eventlet.sleep(random.random() * args.stagger)
+        path = os.path.join(workdir, 'node-%d-%s.part' % (index, image_href))
+        began = time.time()
+        cache.fetch(None, image_href, path, 'user', 'project')
+        latencies.append(time.time() - began)
+        os.unlink(path)
+
+    _set(workdir, 'results-%d' % index,
+         {'latencies': latencies, 'stats': cache.get_stats()})
+    _wait(workdir, 'done', sleep=eventlet.sleep)
+    cache.stop_server()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--nodes', type=int, default=8,
+                        help='compute nodes simulated')
+    parser.add_argument('--images', type=int, default=4,
+                        help='images fetched by every node')
+    parser.add_argument('--image-size', type=int, default=64,
+                        help='size of the images in MiB')
+    parser.add_argument('--glance-delay', type=float, default=1.0,
+                        help='seconds added to every Glance download')
+    parser.add_argument('--stagger', type=float, default=0.5,
+                        help='maximum random delay before each fetch, in '
+                             'seconds')
+    parser.add_argument('--base-port', type=int, default=18779,
+                        help='port of the first node, the others use the '
+                             'following ones')
+    parser.add_argument('--no-peers', action='store_true',
+                        help='do not use the peers, every node downloads '
+                             'from Glance')
+    parser.add_argument('--workdir',
+                        help='directory to create the caches in')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(dir=args.workdir)
+    processes = []
+    try:
+        sources = {}
+        for i in range(args.images):
+            image_href = 'image-%d' % i
+            path = os.path.join(workdir, image_href)
+            data = os.urandom(args.image_size * units.Mi)
+            with open(path, 'wb') as f:
+                f.write(data)
+            sources[image_href] = (path, hashlib.md5(data).hexdigest())
+
+        for i in range(args.nodes):
+            process = multiprocessing.Process(
+                target=node, args=(i, args, workdir, sources))
+            process.start()
+            processes.append(process)
+        for i in range(args.nodes):
+            _wait(workdir, 'ready-%d' % i, processes)
+
+        began = time.time()
+        _set(workdir, 'start')
+        latencies = []
+        totals = {}
+        for i in range(args.nodes):
+            result = _wait(workdir, 'results-%d' % i, processes)
+            latencies.extend(result['latencies'])
+            for key in ('local', 'peer', 'glance', 'peer_errors', 'served'):
+                totals[key] = totals.get(key, 0) + result['stats'][key]
+        elapsed = time.time() - began
+        _set(workdir, 'done')
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        shutil.rmtree(workdir)
+
+    fetches = totals['local'] + totals['peer'] + totals['glance']
+    print('%d nodes, %d images of %d MiB, peers %s:'
+          % (args.nodes, args.images, args.image_size,
+             'disabled' if args.no_peers else 'enabled'))
+    print('  %d fetches in %.2fs: %d from Glance, %d from peers, %d local, '
+          '%d peer errors'
+          % (fetches, elapsed, totals['glance'], totals['peer'],
+             totals['local'], totals['peer_errors']))
+    print('  hit ratio %.2f, Glance downloads per image %.1f'
+          % (float(fetches - totals['glance']) / fetches,
+             float(totals['glance']) / args.images))
+    print('  fetch latency p50 %.2fs p95 %.2fs max %.2fs'
+          % tuple(_percentile(latencies, p) for p in (50, 95, 100)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())